@@ -116,6 +116,26 @@ class AIPersonaEngine:
         else:
             return 0  # Normal
 
+    def find_threat_spans(self, message: str) -> List[Dict[str, Any]]:
+        """
+        Locate every threat keyword in a message
+        Returns: list of {category, keyword, start, end} character spans
+        """
+        message_lower = message.lower()
+        spans = []
+        
+        for category, keywords in self.threat_keywords.items():
+            for keyword in keywords:
+                for match in re.finditer(re.escape(keyword), message_lower):
+                    spans.append({
+                        'category': category,
+                        'keyword': keyword,
+                        'start': match.start(),
+                        'end': match.end()
+                    })
+        
+        return sorted(spans, key=lambda span: (span['start'], span['end']))
+    
     def classify_message_type(self, message: str) -> str:
         """
         Classify the type of message for appropriate response
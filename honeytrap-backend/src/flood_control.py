@@ -0,0 +1,148 @@
+"""
+Flood Control
+Token-bucket rate limiting and bounded per-session inbound queues for the chat server
+"""
+
+import os
+import time
+from collections import OrderedDict, deque
+from threading import Lock
+from typing import Optional, Tuple
+
+# Per-connection and per-IP send_message limits (tokens per second, burst size)
+CONNECTION_RATE = float(os.environ.get('HONEYTRAP_MESSAGE_RATE', 1.0))
+CONNECTION_BURST = int(os.environ.get('HONEYTRAP_MESSAGE_BURST', 5))
+IP_RATE = float(os.environ.get('HONEYTRAP_IP_MESSAGE_RATE', 3.0))
+IP_BURST = int(os.environ.get('HONEYTRAP_IP_MESSAGE_BURST', 15))
+
+# Messages waiting behind the one being answered, and what to do when that is full
+INBOX_SIZE = int(os.environ.get('HONEYTRAP_INBOX_SIZE', 5))
+INBOX_POLICY = os.environ.get('HONEYTRAP_INBOX_POLICY', 'coalesce')  # coalesce or reject
+MAX_COALESCED_CHARS = 2000
+
+
+class TokenBucketLimiter:
+    """Token buckets keyed by connection or IP address.
+    
+    Buckets are kept in least-recently-used order, so refills, lookups and
+    idle eviction are all O(1) (amortised) per call.
+    """
+    
+    def __init__(self, rate: float, capacity: int, idle_timeout: float = 600, max_keys: int = 100000, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        # A bucket idle this long has refilled completely, so dropping it loses nothing
+        self.idle_timeout = max(idle_timeout, capacity / rate)
+        self.max_keys = max_keys
+        self.clock = clock
+        self.buckets = OrderedDict()  # key -> [tokens, last_update]
+        self.lock = Lock()
+    
+    def consume(self, key: str, tokens: float = 1) -> float:
+        """Take tokens from a bucket; returns 0 if allowed, otherwise seconds until it would be"""
+        with self.lock:
+            now = self.clock()
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = [float(self.capacity), now]
+                self.buckets[key] = bucket
+            else:
+                bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+                self.buckets.move_to_end(key)
+            
+            self._evict(now)
+            
+            if bucket[0] >= tokens:
+                bucket[0] -= tokens
+                return 0.0
+            return (tokens - bucket[0]) / self.rate
+    
+    def refund(self, key: str, tokens: float = 1):
+        """Give back tokens taken for a request that was rejected by a later limit"""
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                bucket[0] = min(self.capacity, bucket[0] + tokens)
+    
+    def discard(self, key: str):
+        """Forget a bucket (e.g. when its connection closes)"""
+        with self.lock:
+            self.buckets.pop(key, None)
+    
+    def _evict(self, now: float):
+        """Drop idle buckets from the least recently used end"""
+        cutoff = now - self.idle_timeout
+        while self.buckets:
+            key, (tokens, last_update) = next(iter(self.buckets.items()))
+            if last_update >= cutoff and len(self.buckets) <= self.max_keys:
+                break
+            self.buckets.popitem(last=False)
+    
+    def __len__(self):
+        return len(self.buckets)
+
+
+class SessionInbox:
+    """Bounded queues of messages waiting to be answered, one per chat session.
+    
+    Each session is drained by at most one worker at a time; `offer` tells the
+    caller when it has to start that worker.
+    """
+    
+    QUEUED = 'queued'
+    COALESCED = 'coalesced'
+    REJECTED = 'rejected'
+    
+    def __init__(self, max_pending: int = INBOX_SIZE, policy: str = INBOX_POLICY, max_coalesced_chars: int = MAX_COALESCED_CHARS):
+        if policy not in ('coalesce', 'reject'):
+            raise ValueError(f"Unsupported inbox policy: {policy}")
+        self.max_pending = max_pending
+        self.policy = policy
+        self.max_coalesced_chars = max_coalesced_chars
+        self.queues = {}       # session_id -> deque of pending messages
+        self.draining = set()  # sessions with a running worker
+        self.lock = Lock()
+    
+    def offer(self, session_id: str, message: str) -> Tuple[str, bool]:
+        """Queue a message; returns (outcome, whether the caller must start a worker)"""
+        with self.lock:
+            queue = self.queues.setdefault(session_id, deque())
+            
+            if len(queue) < self.max_pending:
+                queue.append(message)
+                outcome = self.QUEUED
+            elif (self.policy == 'coalesce' and queue
+                  and len(queue[-1]) + len(message) + 1 <= self.max_coalesced_chars):
+                # Fold the new message into the last one still waiting
+                queue[-1] = f"{queue[-1]}\n{message}"
+                outcome = self.COALESCED
+            else:
+                return self.REJECTED, False
+            
+            start_worker = session_id not in self.draining
+            self.draining.add(session_id)
+            return outcome, start_worker
+    
+    def next_message(self, session_id: str) -> Optional[str]:
+        """Take the next message for a worker; None means the worker must stop"""
+        with self.lock:
+            queue = self.queues.get(session_id)
+            if queue:
+                return queue.popleft()
+            self.queues.pop(session_id, None)
+            self.draining.discard(session_id)
+            return None
+    
+    def pending(self, session_id: str) -> int:
+        """Number of messages waiting for a session"""
+        with self.lock:
+            return len(self.queues.get(session_id, ()))
+    
+    def clear(self, session_id: str):
+        """Drop everything waiting for a session (its worker stops after the current message)"""
+        with self.lock:
+            if session_id in self.draining:
+                self.queues.get(session_id, deque()).clear()
+            else:
+                self.queues.pop(session_id, None)
@@ -6,6 +6,11 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 from flask import Flask, send_from_directory
 from flask_cors import CORS
 from src.models.user import db
+from src.models.schema import ensure_schema
+from src.services import stats_buckets
+from src.services.evidence_ledger import evidence_ledger
+from src.services.report_service import report_service
+from src.services.query_cache import query_cache
 from src.models.chat import ChatSession, ChatMessage, Persona, Evidence, AuditLog
 from src.routes.user import user_bp
 from src.routes.chat import chat_bp
@@ -42,9 +47,16 @@ app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirnam
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 
+# Render evidence reports in the background within this app
+report_service.init_app(app)
+# Share query cache invalidations with the other server process through the database
+query_cache.init_app(app)
+
 # Initialize database and create default personas
 with app.app_context():
-    db.create_all()
+    ensure_schema()
+    evidence_ledger.backfill()
+    stats_buckets.backfill()
     
     # Create default personas if they don't exist
     if Persona.query.count() == 0:
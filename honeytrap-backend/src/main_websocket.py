@@ -3,15 +3,30 @@ import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
+# Cooperative async modes must patch the standard library before anything else is imported
+from src.serving import ASYNC_MODE, SERVER_DEBUG, SOCKETIO_LOGGING, SOCKETIO_OPTIONS, monkey_patch, run_blocking, monitor_event_loop
+monkey_patch()
+
 from flask import Flask, send_from_directory, request
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from src.models.user import db
+from src.models.schema import ensure_schema
+from src.services import stats_buckets
 from src.models.chat import ChatSession, ChatMessage, Persona, Evidence, AuditLog
 from src.routes.user import user_bp
 from src.routes.chat import chat_bp
 from src.routes.admin import admin_bp
 from src.ai_engine import AIPersonaEngine
+from src.metrics import metrics
+from src.services.alert_stream import alert_stream, ADMIN_ROOM
+from src.services.dashboard_counters import dashboard_counters, RESEED_INTERVAL
+from src.services.transcripts import get_transcript_page, transcript_room, DEFAULT_PAGE_SIZE
+from src.services.evidence_ledger import evidence_ledger, SEAL_INTERVAL
+from src.services.evidence_capture import enqueue_capture, evidence_capture_worker, CAPTURE_POLL_INTERVAL
+from src.services.report_service import report_service
+from src.services.query_cache import query_cache
+from src.flood_control import TokenBucketLimiter, SessionInbox, CONNECTION_RATE, CONNECTION_BURST, IP_RATE, IP_BURST
 import json
 import uuid
 from datetime import datetime
@@ -23,7 +38,8 @@ app.config['SECRET_KEY'] = 'honeytrap-secure-key-2024-hampshire-police'
 CORS(app, origins="*")
 
 # Initialize SocketIO with CORS support
-socketio = SocketIO(app, cors_allowed_origins="*", logger=True, engineio_logger=True)
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=ASYNC_MODE,
+                    logger=SOCKETIO_LOGGING, engineio_logger=SOCKETIO_LOGGING, **SOCKETIO_OPTIONS)
 
 # Initialize AI Engine
 ai_engine = AIPersonaEngine()
@@ -38,12 +54,31 @@ app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirnam
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 
+# Deliver admin alerts in sequenced batches over this server
+alert_stream.init_socketio(app, socketio)
+dashboard_counters.init_socketio(socketio)
+report_service.init_app(app)
+# Share query cache invalidations with the other server process through the database
+query_cache.init_app(app)
+
 # Store active WebSocket sessions
 active_sessions = {}
 
+# Socket id -> chat session id, so disconnects don't scan every session
+socket_sessions = {}
+
+# Flood control for send_message
+connection_limiter = TokenBucketLimiter(CONNECTION_RATE, CONNECTION_BURST)
+ip_limiter = TokenBucketLimiter(IP_RATE, IP_BURST)
+session_inbox = SessionInbox()
+
+_background_tasks_started = False
+
 # Initialize database and create default personas
 with app.app_context():
-    db.create_all()
+    ensure_schema()
+    evidence_ledger.backfill()
+    stats_buckets.backfill()
     
     # Create default personas if they don't exist
     if Persona.query.count() == 0:
@@ -123,22 +158,167 @@ with app.app_context():
         
         db.session.commit()
         print("Default personas created successfully!")
+    
+    # Dashboard counters are kept up to date by chat events from here on
+    dashboard_counters.seed()
+
+def run_db(func, *args, **kwargs):
+    """Run database work in its own app context without blocking the event loop"""
+    def call():
+        with app.app_context():
+            return func(*args, **kwargs)
+    return run_blocking(call)
+
+def ensure_background_tasks():
+    """Start server-wide background tasks once: at startup, or at the first connection when the app
+    is served some other way.
+    
+    This process runs the only evidence capture worker: the REST server
+    (main.py) just enqueues captures, so every capture reaches this
+    process's dashboard counters.
+    """
+    global _background_tasks_started
+    if _background_tasks_started:
+        return
+    _background_tasks_started = True
+    socketio.start_background_task(monitor_event_loop, socketio.sleep)
+    socketio.start_background_task(seal_evidence_ledger)
+    socketio.start_background_task(drain_evidence_queue)
+    socketio.start_background_task(reconcile_stats_buckets)
+    socketio.start_background_task(reseed_dashboard_counters)
+
+def seal_evidence_ledger():
+    """Periodically seal new evidence ledger entries into Merkle batches"""
+    while True:
+        socketio.sleep(SEAL_INTERVAL)
+        try:
+            run_db(evidence_ledger.seal_pending)
+        except Exception as e:
+            print(f'Error sealing evidence ledger: {str(e)}')
+
+def drain_evidence_queue():
+    """Build queued evidence snapshots off the chat reply path"""
+    while True:
+        socketio.sleep(CAPTURE_POLL_INTERVAL)
+        try:
+            for captured in run_db(evidence_capture_worker.drain):
+                dashboard_counters.evidence_captured(captured['session_created_at'], captured['session'])
+        except Exception as e:
+            print(f'Error capturing queued evidence: {str(e)}')
+
+def reconcile_stats_buckets():
+    """Periodically rebuild the dashboard stats buckets to correct drift from writes outside the ORM"""
+    while True:
+        socketio.sleep(stats_buckets.RECONCILE_INTERVAL)
+        try:
+            run_db(stats_buckets.reconcile)
+        except Exception as e:
+            print(f'Error reconciling stats buckets: {str(e)}')
+
+def reseed_dashboard_counters():
+    """Periodically reload the dashboard counters from the stats buckets, which the REST server also writes"""
+    while True:
+        socketio.sleep(RESEED_INTERVAL)
+        try:
+            run_db(dashboard_counters.seed)
+        except Exception as e:
+            print(f'Error reseeding dashboard counters: {str(e)}')
+
+def create_chat_session(session_id, persona_id, user_ip, greeting):
+    """Persist a new chat session together with its greeting message"""
+    chat_session = ChatSession(
+        session_id=session_id,
+        persona_id=persona_id,
+        user_ip=user_ip,
+        escalation_level=0
+    )
+    db.session.add(chat_session)
+    db.session.flush()
+    
+    greeting_msg = ChatMessage(
+        session_id=chat_session.id,
+        sender_type='decoy',
+        message_content=greeting,
+        timestamp=datetime.utcnow()
+    )
+    db.session.add(greeting_msg)
+    db.session.commit()
+    return chat_session.to_dict()
+
+def save_user_message(db_session_id, message):
+    """Persist an incoming suspect message as soon as it arrives"""
+    user_msg = ChatMessage(
+        session_id=db_session_id,
+        sender_type='user',
+        message_content=message,
+        timestamp=datetime.utcnow()
+    )
+    db.session.add(user_msg)
+    db.session.commit()
+    return user_msg.to_dict()
+
+def save_decoy_response(db_session_id, ai_response, threat_level, escalate, trigger_message_id):
+    """Persist the decoy's reply, any escalation of the session and any evidence capture request.
+    
+    Returns the stored message and, if the session escalated, its updated row.
+    """
+    chat_session = db.session.get(ChatSession, db_session_id)
+    if chat_session:
+        chat_session.last_activity = datetime.utcnow()
+        if escalate:
+            chat_session.escalation_level = threat_level
+    
+    ai_msg = ChatMessage(
+        session_id=db_session_id,
+        sender_type='decoy',
+        message_content=ai_response,
+        timestamp=datetime.utcnow(),
+        threat_level=threat_level
+    )
+    db.session.add(ai_msg)
+    
+    # High-risk messages are captured as evidence by the background worker
+    if threat_level >= 2:
+        enqueue_capture(db_session_id, trigger_message_id, threat_level, 'websocket_realtime')
+    
+    db.session.commit()
+    return ai_msg.to_dict(), chat_session.to_dict() if escalate and chat_session else None
+
+def publish_transcript(session_id, message):
+    """Send a newly stored message to officers tailing the session's transcript"""
+    socketio.emit('transcript_messages', {
+        'session_id': session_id,
+        'messages': [message],
+        'next_since': message['id'],
+        'has_more': False
+    }, to=transcript_room(session_id))
+
+def release_session(session_id):
+    """Forget a chat session whose socket has gone or moved on to a new chat"""
+    session_data = active_sessions.pop(session_id, None)
+    session_inbox.clear(session_id)
+    if session_data:
+        dashboard_counters.session_ended(session_data['platform_type'], session_data['escalation_level'] >= 2)
 
 # WebSocket Events
 @socketio.on('connect')
 def handle_connect():
+    ensure_background_tasks()
+    metrics.increment('websocket_connects')
     print(f'Client connected: {request.sid}')
     emit('connected', {'status': 'Connected to AI Honeytrap Network'})
 
 @socketio.on('disconnect')
 def handle_disconnect():
+    metrics.increment('websocket_disconnects')
     print(f'Client disconnected: {request.sid}')
-    # Clean up any session data
-    for session_id, data in list(active_sessions.items()):
-        if data.get('socket_id') == request.sid:
-            active_sessions[session_id]['connected'] = False
-            print(f'Marked session {session_id} as disconnected')
-            break
+    # Clean up any session data; a new join always starts a new session, so nothing is kept
+    connection_limiter.discard(request.sid)
+    session_id = socket_sessions.pop(request.sid, None)
+    if session_id:
+        release_session(session_id)
+        metrics.set_gauge('active_chat_sessions', len(active_sessions))
+        print(f'Released session {session_id}')
 
 @socketio.on('join_chat')
 def handle_join_chat(data):
@@ -148,43 +328,43 @@ def handle_join_chat(data):
         
         # Create new chat session
         session_id = str(uuid.uuid4())
-        persona = ai_engine.get_random_persona(platform_type)
+        persona = run_db(ai_engine.get_random_persona, platform_type)
+        greeting = ai_engine.get_greeting(persona)
         
-        # Create database session
-        chat_session = ChatSession(
-            session_id=session_id,
-            persona_id=persona['id'],
-            user_ip=request.environ.get('REMOTE_ADDR', 'unknown'),
-            escalation_level=0
+        # Create database session and greeting message
+        chat_session = run_db(
+            create_chat_session,
+            session_id,
+            persona['id'],
+            request.environ.get('REMOTE_ADDR', 'unknown'),
+            greeting
         )
-        db.session.add(chat_session)
-        db.session.commit()
+        db_session_id = chat_session['id']
+        
+        # A socket only ever drives one chat; drop the previous one if it re-joins
+        previous_session_id = socket_sessions.get(request.sid)
+        if previous_session_id:
+            release_session(previous_session_id)
+            leave_room(previous_session_id)
         
         # Store session info
         active_sessions[session_id] = {
             'socket_id': request.sid,
+            'db_id': db_session_id,
             'persona': persona,
             'platform_type': platform_type,
             'connected': True,
-            'escalation_level': 0
+            'escalation_level': 0,
+            'created_at': datetime.utcnow()
         }
+        socket_sessions[request.sid] = session_id
+        metrics.increment('chat_sessions_started')
+        dashboard_counters.session_started(platform_type, active_sessions[session_id]['created_at'], chat_session)
+        metrics.set_gauge('active_chat_sessions', len(active_sessions))
         
         # Join the session room
         join_room(session_id)
         
-        # Send initial greeting
-        greeting = ai_engine.get_greeting(persona)
-        
-        # Save greeting message
-        greeting_msg = ChatMessage(
-            session_id=session_id,
-            sender_type='decoy',
-            message_content=greeting,
-            timestamp=datetime.utcnow()
-        )
-        db.session.add(greeting_msg)
-        db.session.commit()
-        
         emit('chat_joined', {
             'session_id': session_id,
             'persona': persona,
@@ -192,7 +372,7 @@ def handle_join_chat(data):
         })
         
         print(f'Client {request.sid} joined chat session {session_id}')
-        
+    
     except Exception as e:
         print(f'Error in join_chat: {str(e)}')
         emit('error', {'message': 'Failed to join chat session'})
@@ -208,32 +388,77 @@ def handle_send_message(data):
             emit('error', {'message': 'Invalid message data'})
             return
         
-        if session_id not in active_sessions:
+        session_data = active_sessions.get(session_id)
+        if not session_data or session_data['socket_id'] != request.sid:
             emit('error', {'message': 'Session not found'})
             return
         
-        session_data = active_sessions[session_id]
+        # Rate limit per connection and per IP before doing any work; a message is charged to
+        # both buckets only if both admit it, so one flooding connection can't drain its IP's share
+        user_ip = request.environ.get('REMOTE_ADDR', 'unknown')
+        connection_wait = connection_limiter.consume(request.sid)
+        ip_wait = 0.0 if connection_wait else ip_limiter.consume(user_ip)
+        if ip_wait:
+            connection_limiter.refund(request.sid)
+        metrics.set_gauge('flood_limiter_keys', len(connection_limiter) + len(ip_limiter))
+        if connection_wait or ip_wait:
+            metrics.increment('flood_throttled_connection' if connection_wait else 'flood_throttled_ip')
+            emit('backpressure', {
+                'session_id': session_id,
+                'reason': 'rate_limited',
+                'action': 'rejected',
+                'retry_after': round(max(connection_wait, ip_wait), 2)
+            })
+            return
+        
+        # Queue behind the message currently being answered
+        outcome, start_worker = session_inbox.offer(session_id, message)
+        if outcome != SessionInbox.QUEUED:
+            metrics.increment(f'flood_queue_{outcome}')
+            emit('backpressure', {
+                'session_id': session_id,
+                'reason': 'queue_full',
+                'action': outcome,
+                'pending': session_inbox.pending(session_id)
+            })
+        
+        if start_worker:
+            socketio.start_background_task(drain_session_inbox, session_id)
+        
+    except Exception as e:
+        print(f'Error in send_message: {str(e)}')
+        emit('error', {'message': 'Failed to process message'})
+
+def drain_session_inbox(session_id):
+    """Answer a session's queued messages one at a time"""
+    message = session_inbox.next_message(session_id)
+    while message is not None:
+        process_message(session_id, message)
+        message = session_inbox.next_message(session_id)
+
+def process_message(session_id, message):
+    """Store a suspect message, generate the decoy's reply and capture evidence"""
+    session_data = active_sessions.get(session_id)
+    if not session_data:
+        return
+    
+    try:
         persona = session_data['persona']
         
         # Save user message
-        user_msg = ChatMessage(
-            session_id=session_id,
-            sender_type='user',
-            message_content=message,
-            timestamp=datetime.utcnow()
-        )
-        db.session.add(user_msg)
+        user_msg = run_db(save_user_message, session_data['db_id'], message)
+        publish_transcript(session_id, user_msg)
         
         # Emit user message to room
-        emit('message_received', {
+        socketio.emit('message_received', {
             'id': str(uuid.uuid4()),
             'sender_type': 'user',
             'message_content': message,
             'timestamp': datetime.utcnow().isoformat()
-        }, room=session_id)
+        }, to=session_id)
         
         # Show typing indicator
-        emit('typing_start', {'persona': persona['name']}, room=session_id)
+        socketio.emit('typing_start', {'persona': persona['name']}, to=session_id)
         
         # Generate AI response with realistic delay
         socketio.sleep(1 + (len(message) * 0.02))  # Realistic reading time
@@ -243,145 +468,129 @@ def handle_send_message(data):
         threat_level = response_data['threat_level']
         
         # Update escalation level if needed
-        if threat_level > session_data['escalation_level']:
+        escalate = threat_level > session_data['escalation_level']
+        became_high_risk = escalate and threat_level >= 2 and session_data['escalation_level'] < 2
+        if escalate:
             session_data['escalation_level'] = threat_level
-            
-            # Update database
-            chat_session = ChatSession.query.filter_by(session_id=session_id).first()
-            if chat_session:
-                chat_session.escalation_level = threat_level
-                db.session.commit()
         
-        # Save AI response
-        ai_msg = ChatMessage(
-            session_id=session_id,
-            sender_type='decoy',
-            message_content=ai_response,
-            timestamp=datetime.utcnow(),
-            threat_level=threat_level
+        # Save AI response (and the escalation, in the same transaction)
+        ai_msg, escalated_session = run_db(
+            save_decoy_response, session_data['db_id'], ai_response, threat_level, escalate, user_msg['id']
         )
-        db.session.add(ai_msg)
-        db.session.commit()
+        publish_transcript(session_id, ai_msg)
+        if became_high_risk:
+            dashboard_counters.session_escalated(session_data['created_at'], active=session_id in active_sessions,
+                                                 session=escalated_session)
+        elif escalated_session:
+            dashboard_counters.session_changed(escalated_session)
         
         # Simulate typing time based on response length
         typing_time = 0.5 + (len(ai_response) * 0.05)  # Realistic typing speed
         socketio.sleep(typing_time)
         
-        emit('typing_stop', room=session_id)
+        socketio.emit('typing_stop', to=session_id)
         
         # Send AI response
-        emit('message_received', {
+        socketio.emit('message_received', {
             'id': str(uuid.uuid4()),
             'sender_type': 'decoy',
             'message_content': ai_response,
             'timestamp': datetime.utcnow().isoformat(),
             'threat_level': threat_level,
             'persona': persona
-        }, room=session_id)
+        }, to=session_id)
         
-        # Handle evidence capture for high-risk messages
+        # Notify admin dashboards of high-risk messages (batched, sequenced and replayable)
         if threat_level >= 2:
-            capture_evidence_websocket(session_id, message, ai_response, threat_level)
-            
-            # Notify admin dashboard
-            emit('high_risk_alert', {
-                'session_id': session_id,
-                'threat_level': threat_level,
+            alert_stream.publish('high_risk', session_id, threat_level, {
                 'message': message,
                 'timestamp': datetime.utcnow().isoformat(),
                 'persona': persona
-            }, room='admin_room')
+            })
         
         print(f'Message processed for session {session_id}, threat level: {threat_level}')
         
     except Exception as e:
         print(f'Error in send_message: {str(e)}')
-        emit('error', {'message': 'Failed to process message'})
+        socketio.emit('error', {'message': 'Failed to process message'}, to=session_data['socket_id'])
 
 @socketio.on('join_admin')
-def handle_join_admin():
-    """Handle admin joining for real-time monitoring"""
-    join_room('admin_room')
-    emit('admin_joined', {'status': 'Connected to admin monitoring'})
+def handle_join_admin(data=None):
+    """Handle admin joining for real-time monitoring, replaying alerts missed while offline"""
+    join_room(ADMIN_ROOM)
+    
+    last_seq = data.get('last_seq') if isinstance(data, dict) else None
+    if last_seq is not None:
+        try:
+            last_seq = int(last_seq)
+        except (TypeError, ValueError):
+            # A bad cursor only costs the replay; the dashboard still joins
+            emit('error', {'message': 'Invalid last_seq'})
+            last_seq = None
+    
+    emit('admin_joined', {
+        'status': 'Connected to admin monitoring',
+        'last_seq': alert_stream.last_seq()
+    })
+    
+    # Resume the alert stream from the last sequence number this dashboard saw
+    if last_seq is not None:
+        alerts, truncated = alert_stream.resume(last_seq)
+        emit('alert_backlog', {
+            'alerts': alerts,
+            'last_seq': alerts[-1]['seq'] if alerts else last_seq,
+            'truncated': truncated
+        })
     
     # Send current active sessions
-    active_count = len([s for s in active_sessions.values() if s.get('connected', False)])
     emit('session_stats', {
-        'active_sessions': active_count,
-        'total_sessions': len(active_sessions)
+        'active_sessions': len(active_sessions),
+        'total_sessions': metrics.get_counter('chat_sessions_started')
     })
     
+    # Full dashboard counters; dashboard_delta events keep them current from here
+    emit('dashboard_snapshot', dashboard_counters.snapshot())
+    
     print(f'Admin client {request.sid} joined monitoring room')
 
-def capture_evidence_websocket(session_id, user_message, ai_response, threat_level):
-    """Capture evidence for high-risk interactions"""
+@socketio.on('subscribe_transcript')
+def handle_subscribe_transcript(data):
+    """Tail a session's transcript: one page after `since`, then new messages as they are stored"""
     try:
-        # Get the database session ID
-        chat_session = ChatSession.query.filter_by(session_id=session_id).first()
-        if not chat_session:
-            print(f'Chat session not found for evidence capture: {session_id}')
-            return
-        
-        # Create evidence content
-        evidence_content = json.dumps({
-            'user_message': user_message,
-            'ai_response': ai_response,
-            'threat_level': threat_level,
-            'timestamp': datetime.utcnow().isoformat(),
-            'session_id': session_id
-        })
+        session_id = data.get('session_id')
+        since = int(data.get('since', 0))
+        limit = int(data.get('limit', DEFAULT_PAGE_SIZE))
         
-        # Create evidence metadata
-        evidence_metadata_content = json.dumps({
-            'escalation_trigger': 'threat_level_' + str(threat_level),
-            'analysis_confidence': 0.85,
-            'capture_method': 'websocket_realtime',
-            'keywords_detected': get_detected_keywords(user_message),
-            'risk_assessment': get_risk_assessment(threat_level)
-        })
+        def load_page():
+            chat_session = ChatSession.query.filter_by(session_id=session_id).first()
+            if not chat_session:
+                return None
+            return get_transcript_page(chat_session.id, since=since, limit=limit)
         
-        # Generate hash for integrity
-        import hashlib
-        hash_value = hashlib.sha256(evidence_content.encode()).hexdigest()
+        # Join before reading so nothing stored in between is missed; clients drop ids <= their cursor
+        join_room(transcript_room(session_id))
+        page = run_db(load_page)
+        if page is None:
+            leave_room(transcript_room(session_id))
+            emit('error', {'message': 'Session not found'})
+            return
         
-        evidence = Evidence(
-            session_id=chat_session.id,  # Use the database ID, not the session_id string
-            evidence_type='high_risk_conversation',
-            content=evidence_content,
-            evidence_metadata=evidence_metadata_content,
-            hash_value=hash_value
-        )
-        db.session.add(evidence)
-        db.session.commit()
-        print(f'Evidence captured for session {session_id} (DB ID: {chat_session.id})')
-    except Exception as e:
-        print(f'Error capturing evidence: {str(e)}')
-
-def get_detected_keywords(message):
-    """Extract detected threat keywords from message"""
-    threat_keywords = [
-        'meet', 'meet up', 'come over', 'my place', 'your place',
-        'secret', 'don\'t tell', 'between us', 'our secret',
-        'send photo', 'send pic', 'picture', 'selfie', 'video call',
-        'address', 'where do you live', 'location'
-    ]
-    
-    detected = []
-    message_lower = message.lower()
-    for keyword in threat_keywords:
-        if keyword in message_lower:
-            detected.append(keyword)
+        # While has_more is set the client asks again with next_since
+        emit('transcript_messages', {'session_id': session_id, **page})
     
-    return detected
+    except Exception as e:
+        print(f'Error in subscribe_transcript: {str(e)}')
+        emit('error', {'message': 'Failed to subscribe to transcript'})
 
-def get_risk_assessment(threat_level):
-    """Get risk assessment description based on threat level"""
-    if threat_level >= 2:
-        return 'HIGH_RISK - Immediate attention required'
-    elif threat_level == 1:
-        return 'SUSPICIOUS - Monitor closely'
-    else:
-        return 'NORMAL - No immediate concern'
+@socketio.on('unsubscribe_transcript')
+def handle_unsubscribe_transcript(data):
+    """Stop tailing a session's transcript"""
+    leave_room(transcript_room(data.get('session_id')))
+
+@socketio.on('dashboard_snapshot')
+def handle_dashboard_snapshot():
+    """Resend the full dashboard counters (e.g. after a client missed a delta)"""
+    emit('dashboard_snapshot', dashboard_counters.snapshot())
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -400,5 +609,9 @@ def serve(path):
             return "index.html not found", 404
 
 if __name__ == '__main__':
-    socketio.run(app, host='0.0.0.0', port=5002, debug=True)
+    print(f'Starting chat server in {ASYNC_MODE} mode')
+    # In debug mode the reloader's parent only watches files; only its child serves
+    if not SERVER_DEBUG or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        ensure_background_tasks()
+    socketio.run(app, host='0.0.0.0', port=5002, debug=SERVER_DEBUG)
 
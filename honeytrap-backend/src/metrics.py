@@ -0,0 +1,52 @@
+"""
+Runtime Metrics
+Lightweight in-process counters and gauges for monitoring the honeytrap servers
+"""
+
+from collections import defaultdict
+from datetime import datetime
+from threading import Lock
+
+
+class MetricsRegistry:
+    """Thread-safe registry of counters and gauges"""
+    
+    def __init__(self):
+        self._lock = Lock()
+        self.counters = defaultdict(int)
+        self.gauges = {}
+        self.started_at = datetime.utcnow()
+    
+    def increment(self, name: str, value: int = 1):
+        """Increase a counter by value"""
+        with self._lock:
+            self.counters[name] += value
+    
+    def set_gauge(self, name: str, value):
+        """Record the current value of a gauge"""
+        with self._lock:
+            self.gauges[name] = value
+    
+    def observe_max(self, name: str, value):
+        """Keep the largest value ever observed for a gauge"""
+        with self._lock:
+            if value > self.gauges.get(name, value - 1):
+                self.gauges[name] = value
+    
+    def get_counter(self, name: str) -> int:
+        """Get the current value of a counter"""
+        with self._lock:
+            return self.counters.get(name, 0)
+    
+    def snapshot(self) -> dict:
+        """Get a copy of all metrics"""
+        with self._lock:
+            return {
+                'started_at': self.started_at.isoformat(),
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges)
+            }
+
+
+# Global metrics registry
+metrics = MetricsRegistry()
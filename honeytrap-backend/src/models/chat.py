@@ -15,7 +15,7 @@ class ChatSession(db.Model):
     escalation_level = db.Column(db.Integer, default=0)  # 0=normal, 1=suspicious, 2=high_risk
     evidence_captured = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    last_activity = db.Column(db.DateTime, default=datetime.utcnow)
+    last_activity = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # Indexed for the active-sessions count and keyset pagination
     
     # Relationships
     messages = db.relationship('ChatMessage', backref='session', lazy=True, cascade='all, delete-orphan')
@@ -38,6 +38,12 @@ class ChatSession(db.Model):
 
 class ChatMessage(db.Model):
     __tablename__ = 'chat_messages'
+    __table_args__ = (
+        # Keyset pagination of a session's transcript walks this index
+        db.Index('ix_chat_messages_session_id_id', 'session_id', 'id'),
+        # Threat timelines read a session's messages in time order
+        db.Index('ix_chat_messages_session_id_timestamp', 'session_id', 'timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.Integer, db.ForeignKey('chat_sessions.id'), nullable=False)
@@ -91,6 +97,10 @@ class Persona(db.Model):
 
 class Evidence(db.Model):
     __tablename__ = 'evidence'
+    __table_args__ = (
+        # Threat timelines read a session's evidence in capture order
+        db.Index('ix_evidence_session_id_created_at', 'session_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.Integer, db.ForeignKey('chat_sessions.id'), nullable=False)
@@ -122,7 +132,7 @@ class AuditLog(db.Model):
     session_id = db.Column(db.String(255), nullable=True)
     details = db.Column(db.Text, nullable=True)  # JSON string
     ip_address = db.Column(db.String(45), nullable=True)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # Indexed for keyset pagination
     
     def to_dict(self):
         return {
@@ -135,3 +145,139 @@ class AuditLog(db.Model):
             'timestamp': self.timestamp.isoformat()
         }
 
+class AdminAlert(db.Model):
+    __tablename__ = 'admin_alerts'
+    # AUTOINCREMENT so sequence numbers are never reused after old alerts are pruned
+    __table_args__ = {'sqlite_autoincrement': True}
+    
+    id = db.Column(db.Integer, primary_key=True)  # Monotonic alert sequence number
+    alert_type = db.Column(db.String(50), nullable=False, default='high_risk')
+    session_id = db.Column(db.String(255), nullable=True)
+    threat_level = db.Column(db.Integer, default=0)
+    payload = db.Column(db.Text, nullable=False)  # JSON string
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        alert = json.loads(self.payload)
+        alert.update({
+            'seq': self.id,
+            'alert_type': self.alert_type,
+            'session_id': self.session_id,
+            'threat_level': self.threat_level,
+            'created_at': self.created_at.isoformat()
+        })
+        return alert
+
+class LedgerBatch(db.Model):
+    __tablename__ = 'ledger_batches'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    first_entry_id = db.Column(db.Integer, nullable=False)
+    last_entry_id = db.Column(db.Integer, nullable=False)
+    entry_count = db.Column(db.Integer, nullable=False)
+    merkle_root = db.Column(db.String(64), nullable=False)
+    prev_chain_hash = db.Column(db.String(64), unique=True, nullable=False)  # Unique, so batches cannot fork
+    chain_hash = db.Column(db.String(64), nullable=False)  # Hash of prev_chain_hash and this batch
+    signature = db.Column(db.String(64))  # HMAC of chain_hash with the server's master key
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'first_entry_id': self.first_entry_id,
+            'last_entry_id': self.last_entry_id,
+            'entry_count': self.entry_count,
+            'merkle_root': self.merkle_root,
+            'prev_chain_hash': self.prev_chain_hash,
+            'chain_hash': self.chain_hash,
+            'signature': self.signature,
+            'created_at': self.created_at.isoformat()
+        }
+
+class EvidenceLedgerEntry(db.Model):
+    __tablename__ = 'evidence_ledger'
+    
+    id = db.Column(db.Integer, primary_key=True)  # Position in the chain, starting at 1
+    evidence_id = db.Column(db.Integer, db.ForeignKey('evidence.id'), unique=True, nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False)  # SHA-256 of the canonical evidence record
+    prev_hash = db.Column(db.String(64), unique=True, nullable=False)  # Unique, so the chain cannot fork
+    entry_hash = db.Column(db.String(64), nullable=False)
+    batch_id = db.Column(db.Integer, db.ForeignKey('ledger_batches.id'), nullable=True, index=True)
+    proof = db.Column(db.Text, nullable=True)  # JSON Merkle inclusion proof, set when the batch is sealed
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'evidence_id': self.evidence_id,
+            'content_hash': self.content_hash,
+            'prev_hash': self.prev_hash,
+            'entry_hash': self.entry_hash,
+            'batch_id': self.batch_id,
+            'proof': json.loads(self.proof) if self.proof else None,
+            'created_at': self.created_at.isoformat()
+        }
+
+class EvidenceCaptureRequest(db.Model):
+    __tablename__ = 'evidence_capture_queue'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.Integer, db.ForeignKey('chat_sessions.id'), nullable=False)
+    message_id = db.Column(db.Integer, db.ForeignKey('chat_messages.id'), nullable=False)  # Message that triggered capture
+    threat_level = db.Column(db.Integer, default=0)
+    capture_method = db.Column(db.String(50), nullable=False)  # 'websocket_realtime' or 'rest_api'
+    status = db.Column(db.String(20), default='pending', index=True)  # 'pending', 'done' or 'failed'
+    attempts = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text, nullable=True)
+    evidence_id = db.Column(db.Integer, db.ForeignKey('evidence.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime, nullable=True)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'session_id': self.session_id,
+            'message_id': self.message_id,
+            'threat_level': self.threat_level,
+            'capture_method': self.capture_method,
+            'status': self.status,
+            'attempts': self.attempts,
+            'error': self.error,
+            'evidence_id': self.evidence_id,
+            'created_at': self.created_at.isoformat(),
+            'processed_at': self.processed_at.isoformat() if self.processed_at else None
+        }
+
+class EvidenceBlob(db.Model):
+    __tablename__ = 'evidence_blobs'
+    
+    sha256 = db.Column(db.String(64), primary_key=True)  # Content address; blob lives at blobs/ab/cd/<sha256>
+    size_bytes = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, default=0, nullable=False)  # Evidence rows pointing at this blob
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    released_at = db.Column(db.DateTime, nullable=True)  # When ref_count last dropped to zero
+    
+    def to_dict(self):
+        return {
+            'sha256': self.sha256,
+            'size_bytes': self.size_bytes,
+            'ref_count': self.ref_count,
+            'created_at': self.created_at.isoformat(),
+            'released_at': self.released_at.isoformat() if self.released_at else None
+        }
+
+class StatsBucket(db.Model):
+    __tablename__ = 'stats_buckets'
+    
+    metric = db.Column(db.String(50), primary_key=True)  # e.g. 'sessions_started', 'evidence_captured'
+    granularity = db.Column(db.String(10), primary_key=True)  # 'hour' or 'day'
+    bucket_start = db.Column(db.DateTime, primary_key=True)  # UTC start of the hour or day
+    count = db.Column(db.Integer, default=0, nullable=False)
+    
+    def to_dict(self):
+        return {
+            'metric': self.metric,
+            'granularity': self.granularity,
+            'bucket_start': self.bucket_start.isoformat(),
+            'count': self.count
+        }
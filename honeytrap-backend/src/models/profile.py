@@ -42,7 +42,7 @@ class DecoyProfile(db.Model):
     evidence_captured = db.Column(db.Integer, default=0)
     
     # Metadata
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # Indexed for keyset pagination
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     created_by = db.Column(db.String(100), nullable=True)  # Officer ID
     
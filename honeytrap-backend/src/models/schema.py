@@ -0,0 +1,19 @@
+"""
+Schema Maintenance
+Brings existing databases up to date with indexes added to the models
+"""
+
+from src.models.user import db
+from src.services.message_search import ensure_search_index
+
+
+def ensure_schema():
+    """Create tables, any indexes missing from existing tables and the message search index (requires an app context)"""
+    db.create_all()
+    
+    # create_all only builds indexes together with new tables
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    
+    ensure_search_index()
@@ -1,17 +1,33 @@
-from flask import Blueprint, request, jsonify, send_file
-from src.models.chat import db, ChatSession, ChatMessage, Persona, Evidence, AuditLog
+from flask import Blueprint, Response, request, jsonify, send_file, current_app, stream_with_context
+from src.models.chat import db, ChatSession, ChatMessage, Persona, Evidence, AuditLog, AdminAlert
 from src.security import security_manager, require_auth, rate_limit
+from src.metrics import metrics
+from src.services.transcripts import last_message_id
+from src.services.evidence_ledger import evidence_ledger
+from src.services.evidence_audit import evidence_auditor, resolve_evidence_path
+from src.services.blob_store import blob_store, parse_blob_reference
+from src.services.case_export import CaseBundle
+from src.services.report_service import report_service, DONE, FAILED
+from src.services.snapshots import SNAPSHOT_SCRIPT
+from src.services.stats_buckets import (
+    window_total, metric_total, reconcile, SESSIONS_STARTED, HIGH_RISK_SESSIONS, EVIDENCE_CAPTURED, AUDIT_EVENTS
+)
+from src.services.pagination import keyset_page, DEFAULT_PAGE_SIZE
+from src.services.message_search import search_messages, rebuild_search_index, DEFAULT_LIMIT as SEARCH_LIMIT
+from src.services.query_cache import query_cache, ENDPOINT_TAGS
+from src.serving import run_blocking
 from datetime import datetime, timedelta
 import json
 import os
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-import tempfile
+import subprocess
+import sys
 
 admin_bp = Blueprint('admin', __name__)
 
+# Everything the dashboard statistics are computed from. Sessions whose last_activity alone moved
+# (every chat message) do not invalidate it, so the active count may lag by up to the cache TTL
+DASHBOARD_TAGS = ENDPOINT_TAGS['admin_dashboard']
+
 @admin_bp.route('/admin/login', methods=['POST'])
 @rate_limit(max_requests=5, window_minutes=15)  # Strict rate limiting for login
 def admin_login():
@@ -82,42 +98,93 @@ def get_dashboard_stats():
         
         # Get date range for filtering (default: last 30 days)
         days = request.args.get('days', 30, type=int)
-        start_date = datetime.utcnow() - timedelta(days=days)
-        
-        # Active sessions
-        active_sessions = ChatSession.query.filter(
-            ChatSession.last_activity >= datetime.utcnow() - timedelta(hours=1)
-        ).count()
-        
-        # Total sessions in period
-        total_sessions = ChatSession.query.filter(
-            ChatSession.created_at >= start_date
-        ).count()
-        
-        # High-risk sessions
-        high_risk_sessions = ChatSession.query.filter(
-            ChatSession.escalation_level >= 2,
-            ChatSession.created_at >= start_date
-        ).count()
-        
-        # Evidence captured
-        evidence_count = Evidence.query.join(ChatSession).filter(
-            ChatSession.created_at >= start_date
-        ).count()
-        
-        # Recent high-risk sessions
-        recent_high_risk = ChatSession.query.filter(
-            ChatSession.escalation_level >= 2
-        ).order_by(ChatSession.last_activity.desc()).limit(10).all()
+        
+        return jsonify(query_cache.get_or_compute(
+            'admin_dashboard', {'days': days}, DASHBOARD_TAGS, lambda: _dashboard_stats(days)
+        ))
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _dashboard_stats(days):
+    """Dashboard statistics over the last `days` days"""
+    start_date = datetime.utcnow() - timedelta(days=days)
+    
+    # Active sessions: a rolling hour, read from the last_activity index rather than hourly buckets
+    active_sessions = ChatSession.query.filter(
+        ChatSession.last_activity >= datetime.utcnow() - timedelta(hours=1)
+    ).count()
+    
+    # Windowed counts sum the stats buckets rather than scanning sessions
+    total_sessions = window_total(SESSIONS_STARTED, start_date)
+    high_risk_sessions = window_total(HIGH_RISK_SESSIONS, start_date)
+    evidence_count = window_total(EVIDENCE_CAPTURED, start_date)
+    
+    # Recent high-risk sessions
+    recent_high_risk = ChatSession.query.filter(
+        ChatSession.escalation_level >= 2
+    ).order_by(ChatSession.last_activity.desc()).limit(10).all()
+    
+    return {
+        'stats': {
+            'active_sessions': active_sessions,
+            'total_sessions': total_sessions,
+            'high_risk_sessions': high_risk_sessions,
+            'evidence_count': evidence_count
+        },
+        'recent_high_risk': [session.to_dict() for session in recent_high_risk]
+    }
+
+@admin_bp.route('/admin/stats/reconcile', methods=['POST'])
+@require_auth
+def reconcile_stats():
+    """Rebuild the dashboard stats buckets from the raw tables, entirely or from a given time"""
+    try:
+        data = request.get_json(silent=True) or {}
+        since = data.get('since')
+        since = datetime.fromisoformat(since) if since else None
+        
+        result = reconcile(since)
+        
+        security_manager.log_security_event(
+            'stats_reconciled',
+            f'User {request.current_user["user_id"]} reconciled stats since {since or "the start"}: '
+            f'{result["corrected"]} bucket(s) corrected',
+            request.remote_addr
+        )
+        return jsonify(result)
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/admin/metrics', methods=['GET'])
+@require_auth
+def get_runtime_metrics():
+    """Get runtime metrics (connections, event-loop lag, memory, query cache hit rates) for this server process"""
+    try:
+        snapshot = metrics.snapshot()
+        snapshot['query_cache'] = query_cache.stats()
+        return jsonify(snapshot)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/admin/alerts', methods=['GET'])
+@require_auth
+def get_alerts():
+    """Get sequenced admin alerts raised after a given sequence number"""
+    try:
+        after = request.args.get('after', 0, type=int)
+        limit = min(request.args.get('limit', 100, type=int), 500)
+        
+        alerts = AdminAlert.query.filter(
+            AdminAlert.id > after
+        ).order_by(AdminAlert.id).limit(limit).all()
         
         return jsonify({
-            'stats': {
-                'active_sessions': active_sessions,
-                'total_sessions': total_sessions,
-                'high_risk_sessions': high_risk_sessions,
-                'evidence_count': evidence_count
-            },
-            'recent_high_risk': [session.to_dict() for session in recent_high_risk]
+            'alerts': [alert.to_dict() for alert in alerts],
+            'last_seq': alerts[-1].id if alerts else after
         })
         
     except Exception as e:
@@ -125,31 +192,105 @@ def get_dashboard_stats():
 
 @admin_bp.route('/admin/sessions', methods=['GET'])
 def get_sessions():
-    """Get all chat sessions with filtering options"""
+    """Get chat sessions, most recently active first, a page at a time.
+    
+    Pass the returned `next_cursor` as `cursor` for the next page. With
+    `include_total=true` the response carries an approximate total from the
+    stats buckets where the filter has one.
+    """
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
+        per_page = request.args.get('per_page', DEFAULT_PAGE_SIZE, type=int)
+        cursor = request.args.get('cursor')
         escalation_level = request.args.get('escalation_level', type=int)
+        include_total = request.args.get('include_total', 'false').lower() == 'true'
         
         query = ChatSession.query
         
         if escalation_level is not None:
             query = query.filter(ChatSession.escalation_level >= escalation_level)
         
-        sessions = query.order_by(ChatSession.last_activity.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        page = keyset_page(query, ChatSession.last_activity, ChatSession.id, cursor, per_page)
+        
+        total = None
+        if include_total:
+            if escalation_level is None or escalation_level <= 0:
+                total = metric_total(SESSIONS_STARTED)
+            elif escalation_level == 2:
+                total = metric_total(HIGH_RISK_SESSIONS)
         
         return jsonify({
-            'sessions': [session.to_dict() for session in sessions.items],
+            'sessions': [session.to_dict() for session in page['items']],
             'pagination': {
-                'page': page,
-                'pages': sessions.pages,
                 'per_page': per_page,
-                'total': sessions.total
+                'next_cursor': page['next_cursor'],
+                'has_more': page['has_more'],
+                'total': total
             }
         })
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/admin/search/messages', methods=['GET'])
+@require_auth
+@rate_limit(max_requests=120, window_minutes=60)
+def search_transcripts():
+    """Full-text search across every chat transcript.
+    
+    `q` takes words, "quoted phrases", prefix* terms, AND/OR/NOT and
+    parentheses. Optional filters: `session_id` (database id),
+    `sender_type`, `since` and `until` (ISO timestamps). Results are newest
+    first; pass `next_before` back as `before` for the next page.
+    """
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'error': 'q is required'}), 400
+        since = request.args.get('since')
+        until = request.args.get('until')
+        
+        result = search_messages(
+            query,
+            session_id=request.args.get('session_id', type=int),
+            sender_type=request.args.get('sender_type'),
+            since=datetime.fromisoformat(since) if since else None,
+            until=datetime.fromisoformat(until) if until else None,
+            before=request.args.get('before', type=int),
+            limit=request.args.get('limit', SEARCH_LIMIT, type=int)
+        )
+        
+        security_manager.log_security_event(
+            'transcript_search',
+            f'User {request.current_user["user_id"]} searched transcripts for {query!r}',
+            request.remote_addr
+        )
+        return jsonify(result)
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/admin/search/rebuild', methods=['POST'])
+@require_auth
+def rebuild_transcript_search():
+    """Rebuild the transcript search index from the stored messages"""
+    try:
+        started = datetime.utcnow()
+        indexed = rebuild_search_index()
+        
+        security_manager.log_security_event(
+            'search_index_rebuilt',
+            f'User {request.current_user["user_id"]} rebuilt the transcript search index',
+            request.remote_addr
+        )
+        return jsonify({
+            'messages': indexed,
+            'seconds': round((datetime.utcnow() - started).total_seconds(), 2)
+        })
+        
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -162,54 +303,368 @@ def get_session_evidence(session_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@admin_bp.route('/admin/sessions/<int:session_id>/evidence', methods=['POST'])
+@require_auth
+def upload_session_evidence(session_id):
+    """Store uploaded screenshots, transcripts or attachments as evidence for a session"""
+    try:
+        chat_session = db.session.get(ChatSession, session_id)
+        if not chat_session:
+            return jsonify({'error': 'Session not found'}), 404
+        
+        files = request.files.getlist('files')
+        if not files:
+            return jsonify({'error': 'No files uploaded'}), 400
+        evidence_type = request.form.get('evidence_type', 'attachment')
+        
+        # Each file is hashed and deduplicated as it streams into the blob store
+        with blob_store.batch() as batch:
+            evidence_list = [
+                blob_store.add_evidence(batch, session_id, evidence_type, upload.stream, {
+                    'filename': upload.filename,
+                    'content_type': upload.mimetype,
+                    'uploaded_by': request.current_user['user_id']
+                })
+                for upload in files
+            ]
+            db.session.flush()
+        chat_session.evidence_captured = True
+        db.session.commit()
+        evidence_ledger.record_batch(evidence_list)
+        
+        security_manager.log_security_event(
+            'evidence_uploaded',
+            f'User {request.current_user["user_id"]} uploaded {len(evidence_list)} evidence file(s) to session {session_id}',
+            request.remote_addr
+        )
+        return jsonify([evidence.to_dict() for evidence in evidence_list]), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/admin/sessions/<int:session_id>/snapshots', methods=['POST'])
+@require_auth
+def capture_session_snapshots(session_id):
+    """Render the session's transcript as platform-styled PNG snapshots and store them as screenshot evidence"""
+    try:
+        chat_session = db.session.get(ChatSession, session_id)
+        if not chat_session:
+            return jsonify({'error': 'Session not found'}), 404
+        
+        data = request.get_json(silent=True) or {}
+        command = [sys.executable, SNAPSHOT_SCRIPT, '--database-uri', current_app.config['SQLALCHEMY_DATABASE_URI'],
+                   '--sessions', str(session_id)]
+        if data.get('window'):
+            command += ['--window', str(int(data['window']))]
+        if data.get('flagged_only'):
+            command.append('--flagged-only')
+        
+        # Rendered on a process pool in its own script, so spawned workers never re-import the server
+        completed = run_blocking(subprocess.run, command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            return jsonify({'error': completed.stderr.strip()[-2000:] or 'Snapshot rendering failed'}), 500
+        result = json.loads(completed.stdout.strip().splitlines()[-1])['sessions'][0]
+        
+        security_manager.log_security_event(
+            'snapshots_captured',
+            f'User {request.current_user["user_id"]} captured {len(result["evidence_ids"])} transcript snapshot(s) for session {session_id}',
+            request.remote_addr
+        )
+        db.session.expire_all()
+        evidence_list = Evidence.query.filter(Evidence.id.in_(result['evidence_ids'])).order_by(Evidence.id).all()
+        return jsonify({
+            'evidence': [evidence.to_dict() for evidence in evidence_list],
+            'skipped': result['skipped']
+        }), 201 if evidence_list else 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/admin/sessions/<int:session_id>/evidence/verify', methods=['GET'])
+@require_auth
+def verify_session_evidence(session_id):
+    """Verify a session's evidence against the ledger with Merkle inclusion proofs"""
+    try:
+        # Seal outstanding entries so every item can be checked against a batch root
+        evidence_ledger.seal_pending()
+        return jsonify(evidence_ledger.verify_case(session_id))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/admin/evidence/<int:evidence_id>/proof', methods=['GET'])
+@require_auth
+def get_evidence_proof(evidence_id):
+    """Get the ledger entry, batch root and inclusion proof for one evidence item"""
+    try:
+        proof = evidence_ledger.inclusion_proof(evidence_id)
+        if not proof:
+            return jsonify({'error': 'Evidence not in ledger'}), 404
+        return jsonify(proof)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/admin/evidence/<int:evidence_id>/file', methods=['GET'])
+@require_auth
+def download_evidence_file(evidence_id):
+    """Download an evidence file; served straight from disk so the server can use sendfile"""
+    try:
+        evidence = db.session.get(Evidence, evidence_id)
+        if not evidence or not evidence.file_path:
+            return jsonify({'error': 'Evidence file not found'}), 404
+        
+        path = resolve_evidence_path(evidence.file_path)
+        if not os.path.exists(path):
+            return jsonify({'error': 'Evidence file missing from store'}), 404
+        
+        metadata = json.loads(evidence.evidence_metadata) if evidence.evidence_metadata else {}
+        return send_file(
+            path,
+            mimetype=metadata.get('content_type') or 'application/octet-stream',
+            as_attachment=True,
+            download_name=metadata.get('filename') or f'evidence_{evidence_id}',
+            etag=parse_blob_reference(evidence.file_path) or True,
+            conditional=True
+        )
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/admin/evidence/verify', methods=['GET'])
+@require_auth
+def verify_evidence_ledger():
+    """Verify the entire evidence store in one pass over the ledger"""
+    try:
+        security_manager.log_security_event(
+            'ledger_verification',
+            f'User {request.current_user["user_id"]} verified the evidence ledger',
+            request.remote_addr
+        )
+        return jsonify(evidence_ledger.verify_all())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/admin/evidence/audit', methods=['POST'])
+@require_auth
+def start_evidence_audit():
+    """Start a full integrity audit of evidence records and files in the background"""
+    try:
+        data = request.get_json(silent=True) or {}
+        if not evidence_auditor.start(current_app.config['SQLALCHEMY_DATABASE_URI'], data.get('workers')):
+            return jsonify({'error': 'An audit is already running', **evidence_auditor.status()}), 409
+        
+        security_manager.log_security_event(
+            'evidence_audit_started',
+            f'User {request.current_user["user_id"]} started an evidence store audit',
+            request.remote_addr
+        )
+        return jsonify(evidence_auditor.status()), 202
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/admin/evidence/audit', methods=['GET'])
+@require_auth
+def get_evidence_audit():
+    """Get the progress of the running audit, or the signed summary of the last one"""
+    try:
+        return jsonify(evidence_auditor.status())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/admin/evidence/blobs/collect', methods=['POST'])
+@require_auth
+def collect_evidence_blobs():
+    """Delete evidence blobs that no evidence has referenced for the retention grace period"""
+    try:
+        deleted = blob_store.collect_garbage()
+        security_manager.log_security_event(
+            'evidence_blobs_collected',
+            f'User {request.current_user["user_id"]} removed {deleted} unreferenced evidence blob(s)',
+            request.remote_addr
+        )
+        return jsonify({'deleted': deleted})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Seconds the report download waits for rendering before handing back the job to poll
+REPORT_WAIT_SECONDS = 10
+
 @admin_bp.route('/admin/sessions/<int:session_id>/report', methods=['GET'])
 def generate_evidence_report(session_id):
-    """Generate a comprehensive evidence report for law enforcement"""
+    """Generate a comprehensive evidence report for law enforcement
+    
+    Returns the PDF if it is cached or renders quickly; otherwise 202 with a
+    job to poll at /admin/reports/jobs/<job_id>.
+    """
+    try:
+        job = report_service.submit(session_id)
+        if not job:
+            return jsonify({'error': 'Session not found'}), 404
+        
+        if not report_service.wait(job, REPORT_WAIT_SECONDS):
+            return jsonify(job.to_dict()), 202, {'Location': f'/api/admin/reports/jobs/{job.job_id}'}
+        return send_report(job)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/admin/sessions/<int:session_id>/report/jobs', methods=['POST'])
+@require_auth
+def submit_evidence_report(session_id):
+    """Queue an evidence report for rendering; joins a render of the same report already running"""
     try:
-        chat_session = ChatSession.query.get(session_id)
+        job = report_service.submit(session_id)
+        if not job:
+            return jsonify({'error': 'Session not found'}), 404
+        return jsonify(job.to_dict()), 200 if job.status == DONE else 202
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/admin/cases/report/jobs', methods=['POST'])
+@require_auth
+def submit_case_report():
+    """Queue a consolidated report across several sessions; poll and download it like any report job"""
+    try:
+        data = request.get_json(silent=True) or {}
+        session_ids = data.get('session_ids')
+        if (not isinstance(session_ids, list) or not session_ids
+                or not all(isinstance(session_id, int) for session_id in session_ids)):
+            return jsonify({'error': 'session_ids must be a non-empty list of session ids'}), 400
+        
+        job = report_service.submit_case(session_ids)
+        if not job:
+            return jsonify({'error': 'Session not found'}), 404
+        return (jsonify(job.to_dict()), 200 if job.status == DONE else 202,
+                {'Location': f'/api/admin/reports/jobs/{job.job_id}'})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/admin/reports/jobs/<job_id>', methods=['GET'])
+@require_auth
+def get_report_job(job_id):
+    """Get the status of a report job"""
+    try:
+        job = report_service.get(job_id)
+        if not job:
+            return jsonify({'error': 'Report job not found'}), 404
+        return jsonify(job.to_dict())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/admin/reports/jobs/<job_id>/download', methods=['GET'])
+@require_auth
+def download_report(job_id):
+    """Download a finished report"""
+    try:
+        job = report_service.get(job_id)
+        if not job:
+            return jsonify({'error': 'Report job not found'}), 404
+        if job.status != DONE:
+            return jsonify(job.to_dict()), 500 if job.status == FAILED else 409
+        return send_report(job)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def send_report(job):
+    """Send a finished job's PDF"""
+    if not os.path.exists(job.path):
+        # Expired from the cache since the job finished
+        return jsonify({'error': 'Report expired; request it again'}), 410
+    
+    return send_file(job.path, as_attachment=True, etag=job.cache_key, conditional=True,
+                     download_name=job.download_name)
+
+@admin_bp.route('/admin/sessions/<int:session_id>/export', methods=['GET'])
+@require_auth
+def export_case_bundle(session_id):
+    """Stream a session's complete case bundle as a tar archive; supports resuming with Range
+    
+    The bundle's report is rendered once and reused by every resume. If it
+    isn't ready within REPORT_WAIT_SECONDS, returns 202 with the rendering
+    job; request the export again once it is done.
+    """
+    try:
+        chat_session = db.session.get(ChatSession, session_id)
         if not chat_session:
             return jsonify({'error': 'Session not found'}), 404
         
-        # Get all messages and evidence
-        messages = ChatMessage.query.filter_by(session_id=session_id).order_by(ChatMessage.timestamp).all()
-        evidence_list = Evidence.query.filter_by(session_id=session_id).all()
+        # Seal outstanding ledger entries so every item ships with an inclusion proof
+        evidence_ledger.seal_pending()
+        until = last_message_id(session_id)
+        report_job = report_service.submit_bundle(session_id, until)
+        if not report_service.wait(report_job, REPORT_WAIT_SECONDS):
+            return (jsonify(report_job.to_dict()), 202,
+                    {'Location': f'/api/admin/reports/jobs/{report_job.job_id}', 'Retry-After': '5'})
+        if report_job.status != DONE:
+            return jsonify({'error': f'Report rendering failed: {report_job.error}'}), 500
         
-        # Generate PDF report
-        report_path = generate_pdf_report(chat_session, messages, evidence_list)
+        evidence_list = Evidence.query.filter_by(session_id=session_id).order_by(Evidence.id).all()
+        bundle = CaseBundle(chat_session, evidence_list, report_job.path, until)
+        
+        # Resume from a Range header or an ?offset= parameter, but only onto the same bundle:
+        # If-Range (or ?etag= with an offset) must match, otherwise the whole bundle is sent
+        if_range = request.if_range
+        start, stop, status = 0, bundle.size, 200
+        if request.range and ((if_range.etag is None and if_range.date is None) or if_range.etag == bundle.etag):
+            byte_range = request.range.range_for_length(bundle.size)
+            if byte_range is None:
+                return Response(status=416, headers={'Content-Range': f'bytes */{bundle.size}'})
+            start, stop = byte_range
+            status = 206
+        elif request.args.get('offset', type=int) and request.args.get('etag', if_range.etag) == bundle.etag:
+            start = request.args.get('offset', type=int)
+            if not 0 < start < bundle.size:
+                return Response(status=416, headers={'Content-Range': f'bytes */{bundle.size}'})
+            status = 206
+        
+        security_manager.log_security_event(
+            'case_exported',
+            f'User {request.current_user["user_id"]} exported case bundle for session {session_id} from byte {start}',
+            request.remote_addr
+        )
         
-        return send_file(report_path, as_attachment=True, 
-                        download_name=f'evidence_report_{chat_session.session_id}.pdf')
+        response = Response(
+            stream_with_context(bundle.stream(start, stop)),
+            status=status,
+            mimetype='application/x-tar',
+            direct_passthrough=True
+        )
+        response.headers['Content-Length'] = str(stop - start)
+        response.headers['Accept-Ranges'] = 'bytes'
+        response.headers['Content-Disposition'] = f'attachment; filename={bundle.filename}'
+        response.set_etag(bundle.etag)
+        if status == 206:
+            response.headers['Content-Range'] = f'bytes {start}-{stop - 1}/{bundle.size}'
+        return response
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @admin_bp.route('/admin/audit-logs', methods=['GET'])
 def get_audit_logs():
-    """Get audit logs with filtering"""
+    """Get audit logs, newest first, a page at a time (see get_sessions for cursors and totals)"""
     try:
-        page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 50, type=int)
+        cursor = request.args.get('cursor')
         action = request.args.get('action')
+        include_total = request.args.get('include_total', 'false').lower() == 'true'
         
         query = AuditLog.query
         
         if action:
             query = query.filter(AuditLog.action == action)
         
-        logs = query.order_by(AuditLog.timestamp.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        page = keyset_page(query, AuditLog.timestamp, AuditLog.id, cursor, per_page)
         
         return jsonify({
-            'logs': [log.to_dict() for log in logs.items],
+            'logs': [log.to_dict() for log in page['items']],
             'pagination': {
-                'page': page,
-                'pages': logs.pages,
                 'per_page': per_page,
-                'total': logs.total
+                'next_cursor': page['next_cursor'],
+                'has_more': page['has_more'],
+                'total': metric_total(AUDIT_EVENTS) if include_total and not action else None
             }
         })
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -237,117 +692,3 @@ def toggle_persona(persona_id):
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-
-def generate_pdf_report(chat_session, messages, evidence_list):
-    """Generate a PDF evidence report for law enforcement"""
-    # Create temporary file
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-    temp_path = temp_file.name
-    temp_file.close()
-    
-    # Create PDF document
-    doc = SimpleDocTemplate(temp_path, pagesize=letter)
-    styles = getSampleStyleSheet()
-    story = []
-    
-    # Title
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        spaceAfter=30,
-        alignment=1  # Center alignment
-    )
-    story.append(Paragraph("DIGITAL EVIDENCE REPORT", title_style))
-    story.append(Spacer(1, 20))
-    
-    # Case Information
-    story.append(Paragraph("CASE INFORMATION", styles['Heading2']))
-    case_data = [
-        ['Session ID:', chat_session.session_id],
-        ['Date Created:', chat_session.created_at.strftime('%Y-%m-%d %H:%M:%S UTC')],
-        ['Last Activity:', chat_session.last_activity.strftime('%Y-%m-%d %H:%M:%S UTC')],
-        ['Escalation Level:', f"Level {chat_session.escalation_level}"],
-        ['Evidence Captured:', 'Yes' if chat_session.evidence_captured else 'No'],
-        ['User IP Address:', chat_session.user_ip],
-        ['User Agent:', chat_session.user_agent or 'Not available']
-    ]
-    
-    case_table = Table(case_data, colWidths=[2*72, 4*72])
-    case_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-        ('BACKGROUND', (1, 0), (1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    story.append(case_table)
-    story.append(Spacer(1, 20))
-    
-    # Persona Information
-    story.append(Paragraph("DECOY PERSONA INFORMATION", styles['Heading2']))
-    persona = chat_session.persona
-    persona_data = [
-        ['Persona Name:', persona.name],
-        ['Age:', str(persona.age)],
-        ['Platform:', persona.platform_type.title()],
-        ['Personality Traits:', json.dumps(json.loads(persona.personality_traits), indent=2)]
-    ]
-    
-    persona_table = Table(persona_data, colWidths=[2*72, 4*72])
-    persona_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-        ('BACKGROUND', (1, 0), (1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    story.append(persona_table)
-    story.append(Spacer(1, 20))
-    
-    # Chat Messages
-    story.append(Paragraph("CHAT TRANSCRIPT", styles['Heading2']))
-    for message in messages:
-        sender = "SUSPECT" if message.sender_type == 'user' else f"DECOY ({persona.name})"
-        timestamp = message.timestamp.strftime('%Y-%m-%d %H:%M:%S UTC')
-        
-        # Message header
-        header_text = f"<b>{sender}</b> - {timestamp}"
-        if message.threat_level > 0:
-            header_text += f" <b>[THREAT LEVEL: {message.threat_level}]</b>"
-        
-        story.append(Paragraph(header_text, styles['Normal']))
-        
-        # Message content
-        content_style = ParagraphStyle(
-            'MessageContent',
-            parent=styles['Normal'],
-            leftIndent=20,
-            spaceAfter=10,
-            borderColor=colors.red if message.threat_level >= 2 else colors.orange if message.threat_level >= 1 else colors.grey,
-            borderWidth=1 if message.threat_level > 0 else 0,
-            borderPadding=5
-        )
-        story.append(Paragraph(message.message_content, content_style))
-        story.append(Spacer(1, 10))
-    
-    # Evidence Summary
-    if evidence_list:
-        story.append(Paragraph("EVIDENCE SUMMARY", styles['Heading2']))
-        for evidence in evidence_list:
-            story.append(Paragraph(f"<b>Evidence Type:</b> {evidence.evidence_type}", styles['Normal']))
-            story.append(Paragraph(f"<b>Created:</b> {evidence.created_at.strftime('%Y-%m-%d %H:%M:%S UTC')}", styles['Normal']))
-            story.append(Paragraph(f"<b>Hash:</b> {evidence.hash_value}", styles['Normal']))
-            story.append(Spacer(1, 10))
-    
-    # Build PDF
-    doc.build(story)
-    
-    return temp_path
-
@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
 from src.models.chat import db, ChatSession, ChatMessage, Persona, Evidence, AuditLog
 from src.ai_engine import AIPersonaEngine
+from src.services.transcripts import get_transcript_page, DEFAULT_PAGE_SIZE
+from src.services.evidence_capture import enqueue_capture
 from datetime import datetime
 import uuid
 import json
@@ -100,9 +102,10 @@ def send_message():
         if threat_level > chat_session.escalation_level:
             chat_session.escalation_level = threat_level
             
-            # Trigger evidence capture for high-risk messages
+            # Queue evidence capture for high-risk messages; it commits with the message
             if threat_level >= 2:
-                capture_evidence(chat_session, user_message)
+                db.session.flush()
+                enqueue_capture(chat_session.id, user_message.id, threat_level, 'rest_api')
         
         # Store AI response
         ai_message = ChatMessage(
@@ -125,17 +128,27 @@ def send_message():
 
 @chat_bp.route('/chat/history/<session_id>', methods=['GET'])
 def get_chat_history(session_id):
-    """Retrieve chat history for a session"""
+    """Retrieve chat history for a session, one page at a time.
+    
+    `since` returns messages after that message id (use the previous
+    response's `next_since` to page forward or tail a live chat); `before`
+    returns the page preceding that id.
+    """
     try:
         chat_session = ChatSession.query.filter_by(session_id=session_id).first()
         if not chat_session:
             return jsonify({'error': 'Session not found'}), 404
         
-        messages = ChatMessage.query.filter_by(session_id=chat_session.id).order_by(ChatMessage.timestamp).all()
+        page = get_transcript_page(
+            chat_session.id,
+            since=request.args.get('since', 0, type=int),
+            before=request.args.get('before', type=int),
+            limit=request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+        )
         
         return jsonify({
             'session': chat_session.to_dict(),
-            'messages': [msg.to_dict() for msg in messages]
+            **page
         })
         
     except Exception as e:
@@ -173,41 +186,3 @@ def create_persona():
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-
-def capture_evidence(chat_session, message):
-    """Capture evidence when escalation is detected"""
-    try:
-        # Create evidence record
-        evidence_data = {
-            'session_id': chat_session.session_id,
-            'message_id': message.id,
-            'user_ip': chat_session.user_ip,
-            'user_agent': chat_session.user_agent,
-            'timestamp': datetime.utcnow().isoformat()
-        }
-        
-        content = json.dumps(evidence_data)
-        hash_value = hashlib.sha256(content.encode()).hexdigest()
-        
-        evidence = Evidence(
-            session_id=chat_session.id,
-            evidence_type='threat_detection',
-            content=content,
-            hash_value=hash_value
-        )
-        
-        db.session.add(evidence)
-        chat_session.evidence_captured = True
-        
-        # Log evidence capture
-        audit_log = AuditLog(
-            action='evidence_captured',
-            session_id=chat_session.session_id,
-            details=json.dumps({'threat_level': message.threat_level}),
-            ip_address=chat_session.user_ip
-        )
-        db.session.add(audit_log)
-        
-    except Exception as e:
-        print(f"Error capturing evidence: {e}")
-
@@ -2,6 +2,8 @@ from flask import Blueprint, request, jsonify
 from src.models.user import db
 from src.models.profile import DecoyProfile, ProfileContent
 from src.services.content_manager import ContentManager
+from src.services.stats_buckets import window_total, CONTENT_POSTED
+from src.services.query_cache import query_cache, ENDPOINT_TAGS
 from src.security import require_auth, log_security_event
 from datetime import datetime, timedelta
 import json
@@ -217,48 +219,45 @@ def delete_content(content_id):
 def get_content_stats():
     """Get content statistics"""
     try:
-        # Overall stats
-        stats = {
-            'total_content': ProfileContent.query.count(),
-            'scheduled_content': ProfileContent.query.filter_by(status='scheduled').count(),
-            'posted_content': ProfileContent.query.filter_by(status='posted').count(),
-            'draft_content': ProfileContent.query.filter_by(status='draft').count(),
-            'platform_breakdown': {},
-            'content_type_breakdown': {}
-        }
-        
-        # Platform breakdown
-        platforms = db.session.query(
-            ProfileContent.platform_type,
-            db.func.count(ProfileContent.id)
-        ).group_by(ProfileContent.platform_type).all()
-        
-        for platform, count in platforms:
-            stats['platform_breakdown'][platform] = count
-        
-        # Content type breakdown
-        content_types = db.session.query(
-            ProfileContent.content_type,
-            db.func.count(ProfileContent.id)
-        ).group_by(ProfileContent.content_type).all()
-        
-        for content_type, count in content_types:
-            stats['content_type_breakdown'][content_type] = count
-        
-        # Recent activity (last 7 days)
-        week_ago = datetime.utcnow() - timedelta(days=7)
-        recent_posts = ProfileContent.query.filter(
-            ProfileContent.posted_time >= week_ago,
-            ProfileContent.status == 'posted'
-        ).count()
-        
-        stats['recent_posts'] = recent_posts
-        
-        return jsonify(stats)
+        return jsonify(query_cache.get_or_compute('content_stats', {}, ENDPOINT_TAGS['content_stats'], _content_stats))
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _content_stats():
+    """Content counts by status, platform and type, and posts in the last week"""
+    stats = {
+        'total_content': 0,
+        'scheduled_content': 0,
+        'posted_content': 0,
+        'draft_content': 0,
+        'platform_breakdown': {},
+        'content_type_breakdown': {}
+    }
+    
+    # One grouped pass gives the totals and both breakdowns
+    groups = db.session.query(
+        ProfileContent.platform_type,
+        ProfileContent.content_type,
+        ProfileContent.status,
+        db.func.count(ProfileContent.id)
+    ).group_by(ProfileContent.platform_type, ProfileContent.content_type, ProfileContent.status).all()
+    
+    for platform, content_type, status, count in groups:
+        stats['total_content'] += count
+        if status in ('scheduled', 'posted', 'draft'):
+            stats[f'{status}_content'] += count
+        stats['platform_breakdown'][platform] = stats['platform_breakdown'].get(platform, 0) + count
+        stats['content_type_breakdown'][content_type] = stats['content_type_breakdown'].get(content_type, 0) + count
+    
+    # Recent activity (last 7 days)
+    week_ago = datetime.utcnow() - timedelta(days=7)
+    recent_posts = window_total(CONTENT_POSTED, week_ago)
+    
+    stats['recent_posts'] = recent_posts
+    
+    return stats
+
 @content_bp.route('/content/templates', methods=['GET'])
 @require_auth
 def get_content_templates():
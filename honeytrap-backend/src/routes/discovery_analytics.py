@@ -1,13 +1,22 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from src.models.user import db
 from src.models.profile import DecoyProfile
-from src.services.discovery_analytics import DiscoveryAnalyticsService
+from src.services.discovery_analytics import DiscoveryAnalyticsService, utc_timestamp
+from src.services.analytics_ingest import AnalyticsIngestBuffer
+from src.services.analytics_export import DATASETS, FORMATS, export_chunks, parquet_available, parse_export_time
+from src.services.query_cache import query_cache, succeeded, ENDPOINT_TAGS
+from src.services.threat_timeline import ThreatTimeline, DEFAULT_LIMIT as DEFAULT_TIMELINE_LIMIT
 from src.security import require_auth, log_security_event
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
 
 discovery_analytics_bp = Blueprint('discovery_analytics', __name__)
 analytics_service = DiscoveryAnalyticsService()
+threat_timeline = ThreatTimeline(analytics_service.analytics_db_path)
+ingest_buffer = AnalyticsIngestBuffer(analytics_service)
+
+# Largest batch the bulk tracking routes accept in one request
+MAX_BULK_EVENTS = 5000
 
 @discovery_analytics_bp.route('/analytics/track-discovery', methods=['POST'])
 @require_auth
@@ -94,6 +103,158 @@ def track_engagement_event():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@discovery_analytics_bp.route('/analytics/track-discovery/bulk', methods=['POST'])
+@require_auth
+def track_profile_discoveries():
+    """Queue a batch of discovery events, sent as NDJSON or a JSON array"""
+    try:
+        events = read_bulk_events()
+        platforms = bulk_profile_platforms(events)
+        
+        queued, rejected = [], []
+        for line, event in events:
+            try:
+                profile_id = bulk_profile_id(event, platforms)
+                discovery_data = {
+                    'platform_type': event.get('platform_type', platforms[profile_id]),
+                    'discovery_method': event.get('discovery_method', 'unknown'),
+                    'user_ip': event.get('user_ip', request.remote_addr),
+                    'user_agent': event.get('user_agent', request.headers.get('User-Agent')),
+                    'referrer': event.get('referrer', request.headers.get('Referer')),
+                    'session_id': event.get('session_id'),
+                    'geolocation': event.get('geolocation', {}),
+                    'device_info': event.get('device_info', {})
+                }
+                queued.append((profile_id, discovery_data, bulk_event_timestamp(event)))
+            except ValueError as e:
+                rejected.append({'line': line, 'error': str(e)})
+        
+        ingest_buffer.add_discoveries(queued)
+        
+        log_security_event('profile_discoveries_tracked', {
+            'accepted': len(queued),
+            'rejected': len(rejected),
+            'user_ip': request.remote_addr
+        })
+        
+        return jsonify({
+            'success': True,
+            'accepted': len(queued),
+            'rejected': rejected
+        }), 202
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@discovery_analytics_bp.route('/analytics/track-engagement/bulk', methods=['POST'])
+@require_auth
+def track_engagement_events():
+    """Queue a batch of engagement events, sent as NDJSON or a JSON array, and analyze their threats"""
+    try:
+        events = read_bulk_events()
+        platforms = bulk_profile_platforms(events)
+        
+        queued, lines, rejected = [], [], []
+        for line, event in events:
+            try:
+                profile_id = bulk_profile_id(event, platforms)
+                session_id = event.get('session_id')
+                if not session_id:
+                    raise ValueError('Session ID is required')
+                event_data = {
+                    'event_type': event.get('event_type', 'message'),
+                    'event_details': event.get('event_details', {}),
+                    'timestamp': datetime.now().isoformat()
+                }
+                queued.append((profile_id, session_id, event_data, bulk_event_timestamp(event)))
+                lines.append(line)
+            except ValueError as e:
+                rejected.append({'line': line, 'error': str(e)})
+        
+        threat_analyses = ingest_buffer.add_engagements(queued)
+        
+        escalations = [
+            {'line': line, 'session_id': session_id, 'threat_level': threat_analysis['threat_level']}
+            for line, (_, session_id, _, _), threat_analysis in zip(lines, queued, threat_analyses)
+            if threat_analysis['threat_level'] >= 3
+        ]
+        
+        log_security_event('engagements_tracked', {
+            'accepted': len(queued),
+            'rejected': len(rejected),
+            'escalated_sessions': sorted({escalation['session_id'] for escalation in escalations}),
+            'user_ip': request.remote_addr
+        })
+        
+        return jsonify({
+            'success': True,
+            'accepted': len(queued),
+            'rejected': rejected,
+            'escalations': escalations,
+            'requires_escalation': bool(escalations)
+        }), 202
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def read_bulk_events():
+    """(line, event) pairs from an NDJSON body, one event per line, or from a JSON array"""
+    if request.is_json:
+        events = request.get_json()
+        if not isinstance(events, list):
+            raise ValueError('Expected a JSON array of events')
+        events = list(enumerate(events, 1))
+    else:
+        events = []
+        for line, text in enumerate(request.get_data(as_text=True).splitlines(), 1):
+            if not text.strip():
+                continue
+            try:
+                events.append((line, json.loads(text)))
+            except ValueError:
+                raise ValueError(f'Line {line} is not valid JSON')
+    
+    if not events:
+        raise ValueError('No events to track')
+    if len(events) > MAX_BULK_EVENTS:
+        raise ValueError(f'At most {MAX_BULK_EVENTS} events may be sent at once')
+    return events
+
+def bulk_profile_platforms(events):
+    """Platform of every existing profile the events refer to, looked up in one query"""
+    profile_ids = {
+        event.get('profile_id') for _, event in events
+        if isinstance(event, dict) and isinstance(event.get('profile_id'), int)
+    }
+    if not profile_ids:
+        return {}
+    return dict(db.session.query(DecoyProfile.id, DecoyProfile.platform_type).filter(
+        DecoyProfile.id.in_(profile_ids)
+    ).all())
+
+def bulk_profile_id(event, platforms):
+    if not isinstance(event, dict):
+        raise ValueError('Event must be a JSON object')
+    profile_id = event.get('profile_id')
+    if not profile_id:
+        raise ValueError('Profile ID is required')
+    if profile_id not in platforms:
+        raise ValueError('Profile not found')
+    return profile_id
+
+def bulk_event_timestamp(event):
+    """When the source saw the event, if it says; otherwise it is stamped when queued"""
+    if 'timestamp' not in event:
+        return None
+    try:
+        return utc_timestamp(parse_export_time(event['timestamp']))
+    except (TypeError, ValueError):
+        raise ValueError('Invalid timestamp; expected ISO 8601')
+
 @discovery_analytics_bp.route('/analytics/discovery-analytics', methods=['GET'])
 @require_auth
 def get_discovery_analytics():
@@ -105,7 +266,10 @@ def get_discovery_analytics():
         # Limit days to reasonable range
         days = min(max(days, 1), 365)
         
-        analytics_data = analytics_service.get_discovery_analytics(profile_id, days)
+        analytics_data = query_cache.get_or_compute(
+            'discovery_analytics', {'profile_id': profile_id, 'days': days}, ENDPOINT_TAGS['discovery_analytics'],
+            lambda: analytics_service.get_discovery_analytics(profile_id, days), succeeded
+        )
         
         return jsonify({
             'discovery_analytics': analytics_data,
@@ -128,7 +292,10 @@ def get_threat_analytics():
         # Limit days to reasonable range
         days = min(max(days, 1), 365)
         
-        threat_data = analytics_service.get_threat_analytics(days)
+        threat_data = query_cache.get_or_compute(
+            'threat_analytics', {'days': days}, ENDPOINT_TAGS['threat_analytics'],
+            lambda: analytics_service.get_threat_analytics(days), succeeded
+        )
         
         return jsonify({
             'threat_analytics': threat_data,
@@ -150,7 +317,10 @@ def get_platform_performance():
         # Limit days to reasonable range
         days = min(max(days, 1), 365)
         
-        performance_data = analytics_service.get_platform_performance_metrics(days)
+        performance_data = query_cache.get_or_compute(
+            'platform_performance', {'days': days}, ENDPOINT_TAGS['platform_performance'],
+            lambda: analytics_service.get_platform_performance_metrics(days), succeeded
+        )
         
         return jsonify({
             'platform_performance': performance_data,
@@ -172,7 +342,10 @@ def get_comprehensive_report():
         # Limit days to reasonable range
         days = min(max(days, 1), 365)
         
-        report = analytics_service.generate_comprehensive_report(days)
+        report = query_cache.get_or_compute(
+            'comprehensive_report', {'days': days}, ENDPOINT_TAGS['comprehensive_report'],
+            lambda: analytics_service.generate_comprehensive_report(days), succeeded
+        )
         
         log_security_event('analytics_report_generated', {
             'days': days,
@@ -279,29 +452,32 @@ def get_real_time_dashboard():
 @discovery_analytics_bp.route('/analytics/export-data', methods=['POST'])
 @require_auth
 def export_analytics_data():
-    """Export analytics data in various formats"""
+    """Export analytics data in various formats
+    
+    `json` returns report sections. `csv`, `ndjson` and `parquet` stream the
+    raw rows of one dataset between `start` and `end` (ISO dates, UTC, end
+    exclusive; defaults to the last `days` days), optionally only `columns`.
+    """
     try:
         data = request.get_json()
         
-        export_type = data.get('export_type', 'json')  # json, csv, pdf
+        export_type = data.get('export_type', 'json')  # json, csv, ndjson, parquet
         days = data.get('days', 30)
-        include_sections = data.get('include_sections', ['discovery', 'threats', 'performance'])
-        
-        # Generate comprehensive report
-        report = analytics_service.generate_comprehensive_report(days)
         
         if export_type == 'json':
-            # Filter report based on requested sections
+            include_sections = data.get('include_sections', ['discovery', 'threats', 'performance'])
+            
+            # Only compute the requested sections
             filtered_report = {}
             
             if 'discovery' in include_sections:
-                filtered_report['discovery_analytics'] = report.get('discovery_analytics', {})
+                filtered_report['discovery_analytics'] = analytics_service.get_discovery_analytics(days=days)
             
             if 'threats' in include_sections:
-                filtered_report['threat_analytics'] = report.get('threat_analytics', {})
+                filtered_report['threat_analytics'] = analytics_service.get_threat_analytics(days=days)
             
             if 'performance' in include_sections:
-                filtered_report['platform_performance'] = report.get('platform_performance', {})
+                filtered_report['platform_performance'] = analytics_service.get_platform_performance_metrics(days=days)
             
             filtered_report['export_metadata'] = {
                 'export_type': export_type,
@@ -319,12 +495,48 @@ def export_analytics_data():
             
             return jsonify(filtered_report)
         
-        else:
+        if export_type not in FORMATS:
+            return jsonify({
+                'error': f'Export type {export_type} not supported',
+                'available_types': ['json'] + list(FORMATS)
+            }), 400
+        
+        if export_type == 'parquet' and not parquet_available():
+            return jsonify({'error': 'Parquet export requires pyarrow'}), 400
+        
+        dataset = DATASETS.get(data.get('dataset'))
+        if not dataset:
+            return jsonify({'error': 'Unknown dataset', 'available_datasets': list(DATASETS)}), 400
+        
+        columns = data.get('columns') or list(dataset.columns)
+        unknown = [name for name in columns if name not in dataset.columns]
+        if unknown:
             return jsonify({
-                'error': f'Export type {export_type} not yet implemented',
-                'available_types': ['json']
+                'error': f'Unknown columns: {", ".join(map(str, unknown))}',
+                'available_columns': list(dataset.columns)
             }), 400
         
+        try:
+            end = parse_export_time(data['end']) if data.get('end') else datetime.utcnow()
+            start = parse_export_time(data['start']) if data.get('start') else end - timedelta(days=days)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'start and end must be ISO 8601 dates'}), 400
+        
+        log_security_event('analytics_data_exported', {
+            'export_type': export_type,
+            'dataset': dataset.name,
+            'columns': columns,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'user_ip': request.remote_addr
+        })
+        
+        mimetype, extension, _ = FORMATS[export_type]
+        filename = f'{dataset.name}_{start:%Y%m%d}_{end:%Y%m%d}.{extension}'
+        chunks = export_chunks(dataset, export_type, columns, start, end, analytics_service.analytics_db_path)
+        return Response(stream_with_context(chunks), mimetype=mimetype,
+                        headers={'Content-Disposition': f'attachment; filename={filename}'})
+        
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -388,32 +600,18 @@ def analyze_search_patterns():
 def get_threat_timeline(session_id):
     """Get detailed threat timeline for a specific session"""
     try:
-        # This would require querying engagement events for the session
-        # For now, return a placeholder structure
-        
-        timeline = {
-            'session_id': session_id,
-            'timeline_events': [
-                # This would be populated from engagement_events table
-            ],
-            'threat_progression': {
-                'initial_contact': None,
-                'escalation_points': [],
-                'current_threat_level': 0,
-                'evidence_collected': []
-            },
-            'risk_assessment': {
-                'current_risk_score': 0,
-                'risk_factors': [],
-                'recommended_actions': []
-            }
-        }
+        since = request.args.get('since')
+        since = datetime.fromisoformat(since) if since else None
+        limit = request.args.get('limit', DEFAULT_TIMELINE_LIMIT, type=int)
         
-        return jsonify({
-            'threat_timeline': timeline,
-            'note': 'Detailed timeline implementation requires integration with chat session data'
-        })
+        timeline = threat_timeline.get_timeline(session_id, since=since, limit=limit)
+        if timeline is None:
+            return jsonify({'error': 'Session not found'}), 404
+        
+        return jsonify({'threat_timeline': timeline})
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -3,6 +3,8 @@ from src.models.user import db
 from src.models.profile import DecoyProfile, ProfileContent, ProfileAnalytics
 from src.services.profile_generator import ProfileGenerator
 from src.security import require_auth, log_security_event
+from src.services.pagination import keyset_page, DEFAULT_PAGE_SIZE
+from src.services.query_cache import query_cache, ENDPOINT_TAGS
 from datetime import datetime
 import json
 
@@ -12,13 +14,18 @@ profile_generator = ProfileGenerator()
 @profiles_bp.route('/profiles', methods=['GET'])
 @require_auth
 def get_profiles():
-    """Get all decoy profiles with filtering options"""
+    """Get decoy profiles with filtering options, newest first, a page at a time.
+    
+    Pass the returned `next_cursor` as `cursor` for the next page; the total
+    is only counted when `include_total=true`.
+    """
     try:
         # Get query parameters
         platform = request.args.get('platform')
         status = request.args.get('status')
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 20))
+        per_page = int(request.args.get('per_page', DEFAULT_PAGE_SIZE))
+        cursor = request.args.get('cursor')
+        include_total = request.args.get('include_total', 'false').lower() == 'true'
         
         # Build query
         query = DecoyProfile.query
@@ -28,24 +35,24 @@ def get_profiles():
         if status:
             query = query.filter(DecoyProfile.status == status)
         
-        # Paginate results
-        profiles = query.paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        # Seek to the page rather than counting and offsetting
+        page = keyset_page(query, DecoyProfile.created_at, DecoyProfile.id, cursor, per_page)
         
         log_security_event('profile_list_accessed', {
             'user_ip': request.remote_addr,
             'filters': {'platform': platform, 'status': status},
-            'total_profiles': profiles.total
+            'returned_profiles': len(page['items'])
         })
         
         return jsonify({
-            'profiles': [profile.to_dict() for profile in profiles.items],
-            'total': profiles.total,
-            'pages': profiles.pages,
-            'current_page': page
+            'profiles': [profile.to_dict() for profile in page['items']],
+            'total': query.count() if include_total else None,
+            'next_cursor': page['next_cursor'],
+            'has_more': page['has_more']
         })
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -293,29 +300,41 @@ def update_analytics(profile_id):
 def get_profile_stats():
     """Get overall profile deployment statistics"""
     try:
-        stats = {
-            'total_profiles': DecoyProfile.query.count(),
-            'deployed_profiles': DecoyProfile.query.filter_by(status='deployed').count(),
-            'active_profiles': DecoyProfile.query.filter_by(status='active').count(),
-            'total_contacts': db.session.query(db.func.sum(DecoyProfile.contact_attempts)).scalar() or 0,
-            'total_evidence': db.session.query(db.func.sum(DecoyProfile.evidence_captured)).scalar() or 0,
-            'platform_breakdown': {}
-        }
-        
-        # Platform breakdown
-        platforms = db.session.query(
-            DecoyProfile.platform_type,
-            db.func.count(DecoyProfile.id)
-        ).group_by(DecoyProfile.platform_type).all()
-        
-        for platform, count in platforms:
-            stats['platform_breakdown'][platform] = count
-        
-        return jsonify(stats)
+        return jsonify(query_cache.get_or_compute('profile_stats', {}, ENDPOINT_TAGS['profile_stats'], _profile_stats))
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _profile_stats():
+    """Profile counts, contacts and evidence, in total and per platform"""
+    stats = {
+        'total_profiles': 0,
+        'deployed_profiles': 0,
+        'active_profiles': 0,
+        'total_contacts': 0,
+        'total_evidence': 0,
+        'platform_breakdown': {}
+    }
+    
+    # One grouped pass gives the totals and the platform breakdown
+    groups = db.session.query(
+        DecoyProfile.platform_type,
+        DecoyProfile.status,
+        db.func.count(DecoyProfile.id),
+        db.func.sum(DecoyProfile.contact_attempts),
+        db.func.sum(DecoyProfile.evidence_captured)
+    ).group_by(DecoyProfile.platform_type, DecoyProfile.status).all()
+    
+    for platform, status, count, contacts, evidence in groups:
+        stats['total_profiles'] += count
+        if status in ('deployed', 'active'):
+            stats[f'{status}_profiles'] += count
+        stats['total_contacts'] += contacts or 0
+        stats['total_evidence'] += evidence or 0
+        stats['platform_breakdown'][platform] = stats['platform_breakdown'].get(platform, 0) + count
+    
+    return stats
+
 @profiles_bp.route('/profiles/<int:profile_id>', methods=['DELETE'])
 @require_auth
 def delete_profile(profile_id):
@@ -1,5 +1,6 @@
 import os
 import hashlib
+import hmac
 import secrets
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
@@ -105,6 +106,16 @@ class SecurityManager:
         current_hash = self.generate_evidence_hash(evidence_data)
         return current_hash == stored_hash
     
+    def sign_data(self, data):
+        """Generate an HMAC-SHA256 signature over data with the master key"""
+        if isinstance(data, dict):
+            data = json.dumps(data, sort_keys=True, separators=(',', ':'))
+        return hmac.new(self.master_key, data.encode(), hashlib.sha256).hexdigest()
+    
+    def verify_signature(self, data, signature):
+        """Verify a signature produced by sign_data"""
+        return hmac.compare_digest(self.sign_data(data), signature)
+    
     def sanitize_input(self, input_data):
         """Sanitize user input to prevent injection attacks"""
         if isinstance(input_data, str):
@@ -188,3 +199,7 @@ def rate_limit(max_requests=100, window_minutes=60):
 # Initialize global security manager
 security_manager = SecurityManager()
 
+
+def log_security_event(event_type, details, ip_address=None):
+    """Log a security event through the global security manager"""
+    return security_manager.log_security_event(event_type, details, ip_address)
@@ -0,0 +1,148 @@
+"""
+Admin Alert Stream
+Persisted, sequenced and replayable alert feed for officers' dashboards
+"""
+
+import json
+import logging
+from collections import deque
+from datetime import datetime
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+from src.models.user import db
+from src.models.chat import AdminAlert
+from src.serving import run_blocking
+
+ADMIN_ROOM = 'admin_room'
+
+
+class AlertStream:
+    """Sequenced alert log with batched delivery and resume-from-sequence replay.
+    
+    Alerts raised within `batch_window` seconds are persisted in one
+    transaction and pushed to the admin room as a single batch. A reconnecting
+    dashboard sends the last sequence number it saw and gets everything after
+    it, served from an in-memory tail of recent alerts when possible and with
+    one indexed query otherwise.
+    """
+    
+    def __init__(self, batch_window: float = 0.5, max_alerts: int = 10000,
+                 replay_limit: int = 500, recent_size: int = 1000):
+        self.batch_window = batch_window
+        self.max_alerts = max_alerts          # Alerts kept in the database
+        self.replay_limit = replay_limit      # Most alerts returned by one resume
+        self.recent = deque(maxlen=recent_size)
+        self.pending = []
+        self.flush_scheduled = False
+        self.lock = Lock()
+        self.app = None
+        self.socketio = None
+    
+    def init_socketio(self, app, socketio):
+        """Attach the Flask app (for database access) and the Socket.IO server"""
+        self.app = app
+        self.socketio = socketio
+    
+    def publish(self, alert_type: str, session_id: Optional[str], threat_level: int, payload: Dict):
+        """Queue an alert for the next batch"""
+        with self.lock:
+            self.pending.append({
+                'alert_type': alert_type,
+                'session_id': session_id,
+                'threat_level': threat_level,
+                'payload': payload,
+                'created_at': datetime.utcnow()
+            })
+            if self.flush_scheduled:
+                return
+            self.flush_scheduled = True
+        
+        self.socketio.start_background_task(self._flush_after_window)
+    
+    def _flush_after_window(self):
+        """Wait for the batch window to close, then deliver the batch"""
+        self.socketio.sleep(self.batch_window)
+        try:
+            self.flush()
+        except Exception as e:
+            logging.error(f"Error flushing admin alerts: {str(e)}")
+    
+    def flush(self) -> List[Dict]:
+        """Persist pending alerts in one transaction and push them as one batch"""
+        with self.lock:
+            batch, self.pending = self.pending, []
+            self.flush_scheduled = False
+        
+        if not batch:
+            return []
+        
+        alerts = run_blocking(self._persist, batch)
+        
+        with self.lock:
+            self.recent.extend(alerts)
+        
+        self.socketio.emit('high_risk_alerts', {
+            'alerts': alerts,
+            'last_seq': alerts[-1]['seq']
+        }, to=ADMIN_ROOM)
+        return alerts
+    
+    def _persist(self, batch: List[Dict]) -> List[Dict]:
+        """Write a batch of alerts and prune the log beyond max_alerts"""
+        with self.app.app_context():
+            rows = [
+                AdminAlert(
+                    alert_type=item['alert_type'],
+                    session_id=item['session_id'],
+                    threat_level=item['threat_level'],
+                    payload=json.dumps(item['payload']),
+                    created_at=item['created_at']
+                )
+                for item in batch
+            ]
+            db.session.add_all(rows)
+            db.session.flush()
+            
+            # Keep the log bounded; sequence numbers stay monotonic because only the oldest go
+            newest_seq = rows[-1].id
+            AdminAlert.query.filter(AdminAlert.id <= newest_seq - self.max_alerts).delete(synchronize_session=False)
+            
+            db.session.commit()
+            return [row.to_dict() for row in rows]
+    
+    def resume(self, last_seq: int) -> Tuple[List[Dict], bool]:
+        """Get alerts after last_seq; the flag is True if more remain beyond replay_limit"""
+        with self.lock:
+            recent = list(self.recent)
+        
+        # Serve from memory when the tail still covers everything after last_seq
+        if recent and recent[0]['seq'] <= last_seq + 1:
+            missed = [alert for alert in recent if alert['seq'] > last_seq]
+            return missed[:self.replay_limit], len(missed) > self.replay_limit
+        
+        def query():
+            with self.app.app_context():
+                rows = AdminAlert.query.filter(
+                    AdminAlert.id > last_seq
+                ).order_by(AdminAlert.id).limit(self.replay_limit + 1).all()
+                return [row.to_dict() for row in rows]
+        
+        missed = run_blocking(query)
+        return missed[:self.replay_limit], len(missed) > self.replay_limit
+    
+    def last_seq(self) -> int:
+        """Sequence number of the newest delivered alert"""
+        with self.lock:
+            if self.recent:
+                return self.recent[-1]['seq']
+        
+        def query():
+            with self.app.app_context():
+                return db.session.query(db.func.max(AdminAlert.id)).scalar() or 0
+        
+        return run_blocking(query)
+
+
+# Global alert stream
+alert_stream = AlertStream()
@@ -0,0 +1,134 @@
+"""
+Analytics Database
+Pooled SQLite connections to the analytics database, configured once and reused for every query
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+from src.metrics import metrics
+
+# Idle connections kept per analytics database file
+POOL_SIZE = int(os.environ.get('HONEYTRAP_ANALYTICS_POOL_SIZE', 8))
+BUSY_TIMEOUT_MS = int(os.environ.get('HONEYTRAP_ANALYTICS_BUSY_TIMEOUT_MS', 5000))
+# Compiled statements kept per connection, keyed by SQL text
+STATEMENT_CACHE_SIZE = 128
+
+# Run once on each new connection; journal_mode is stored in the file, so it is set with the schema
+CONNECTION_PRAGMAS = (
+    f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}',
+    'PRAGMA synchronous = NORMAL',  # Durable at checkpoints; safe with WAL
+    'PRAGMA cache_size = -16384',  # 16 MiB page cache
+    'PRAGMA mmap_size = 268435456',  # Read through up to 256 MiB of memory-mapped file
+    'PRAGMA temp_store = MEMORY'
+)
+
+
+class AnalyticsDatabase:
+    """A pool of long-lived connections to one analytics SQLite file.
+    
+    Connections are configured when opened and then reused, so a query
+    costs no connect, pragma setup or statement compilation once the pool
+    is warm. Each connection keeps its compiled statements, which are
+    reused as long as the SQL text is constant, so callers pass values as
+    parameters. Connections are checked out per operation rather than pinned
+    to a thread, because the servers start a thread (or greenlet) per
+    request and pinned connections would never be reused.
+    """
+    
+    def __init__(self, path: str, pool_size: int = POOL_SIZE):
+        self.path = path
+        self.pool_size = pool_size
+        self.idle = []  # Most recently returned last, so the warmest connection is reused
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+    
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """A connection for the duration of the block; autocommit unless a transaction is begun"""
+        conn = self._checkout()
+        try:
+            yield conn
+        finally:
+            self._checkin(conn)
+    
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Cursor]:
+        """Cursor in a write transaction, committed on success and rolled back on error.
+        
+        BEGIN IMMEDIATE takes the write lock up front, so concurrent writers
+        queue on the busy timeout instead of failing to upgrade a read lock.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                yield cursor
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+            finally:
+                cursor.close()
+    
+    @contextmanager
+    def snapshot(self) -> Iterator[sqlite3.Cursor]:
+        """Cursor whose queries all see the same committed state (e.g. every section of one report)"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN')
+            try:
+                yield cursor
+            finally:
+                conn.rollback()  # Nothing to commit; this just ends the read transaction
+                cursor.close()
+    
+    def close(self):
+        """Close the idle connections (at shutdown, or before the file is replaced)"""
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            conn.close()
+    
+    def _checkout(self) -> sqlite3.Connection:
+        with self.lock:
+            if os.getpid() != self.pid:
+                # Never use a connection inherited across a fork; the parent still owns it
+                self.pid = os.getpid()
+                self.idle = []
+            if self.idle:
+                return self.idle.pop()
+        
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        metrics.increment('analytics_db_connections_opened')
+        return conn
+    
+    def _checkin(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        with self.lock:
+            if len(self.idle) < self.pool_size and os.getpid() == self.pid:
+                self.idle.append(conn)
+                return
+        conn.close()
+
+
+_databases: Dict[str, AnalyticsDatabase] = {}
+_databases_lock = threading.Lock()
+
+
+def analytics_database(path: str) -> AnalyticsDatabase:
+    """The shared connection pool for an analytics database file"""
+    path = os.path.abspath(path)
+    with _databases_lock:
+        database = _databases.get(path)
+        if database is None:
+            database = _databases[path] = AnalyticsDatabase(path)
+        return database
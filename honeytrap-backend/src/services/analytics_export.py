@@ -0,0 +1,221 @@
+"""
+Analytics Export
+Streams raw analytics and chat rows as CSV, NDJSON or Parquet without loading the result set into memory
+"""
+
+import csv
+import io
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import Boolean, DateTime, Float, Integer, select
+
+from src.models.user import db
+from src.models.chat import ChatSession, ChatMessage, Evidence
+from src.services.analytics_db import analytics_database
+
+# Rows fetched per round trip; also the size of each Parquet row group
+EXPORT_BATCH_ROWS = int(os.environ.get('HONEYTRAP_EXPORT_BATCH_ROWS', 5000))
+
+ANALYTICS = 'analytics'  # Tables in the discovery analytics SQLite file
+MAIN = 'main'  # Tables in the application database
+
+# Column kinds, which decide how values are written
+INT = 'int'
+FLOAT = 'float'
+BOOL = 'bool'
+TEXT = 'text'
+TIMESTAMP = 'timestamp'
+
+
+class ExportDataset:
+    """A table that can be exported: where it lives, its time column and its columns' kinds"""
+    
+    def __init__(self, name: str, source: str, time_column: str, columns: Dict[str, str], table=None):
+        self.name = name
+        self.source = source
+        self.time_column = time_column
+        self.columns = columns
+        self.table = table
+    
+    @classmethod
+    def from_model(cls, model, time_column: str) -> 'ExportDataset':
+        columns = {}
+        for column in model.__table__.columns:
+            if isinstance(column.type, Boolean):
+                columns[column.name] = BOOL
+            elif isinstance(column.type, Integer):
+                columns[column.name] = INT
+            elif isinstance(column.type, Float):
+                columns[column.name] = FLOAT
+            elif isinstance(column.type, DateTime):
+                columns[column.name] = TIMESTAMP
+            else:
+                columns[column.name] = TEXT
+        return cls(model.__tablename__, MAIN, time_column, columns, model.__table__)
+
+
+DATASETS = {dataset.name: dataset for dataset in [
+    ExportDataset('discovery_events', ANALYTICS, 'discovery_time', {
+        'id': INT, 'profile_id': INT, 'platform_type': TEXT, 'discovery_method': TEXT,
+        'discovery_time': TIMESTAMP, 'user_ip': TEXT, 'user_agent': TEXT, 'referrer': TEXT,
+        'session_id': TEXT, 'geolocation': TEXT, 'device_info': TEXT
+    }),
+    ExportDataset('engagement_events', ANALYTICS, 'timestamp', {
+        'id': INT, 'profile_id': INT, 'session_id': TEXT, 'event_type': TEXT, 'event_data': TEXT,
+        'timestamp': TIMESTAMP, 'threat_level': INT, 'escalation_indicators': TEXT
+    }),
+    ExportDataset('threat_analysis', ANALYTICS, 'analysis_timestamp', {
+        'id': INT, 'session_id': TEXT, 'profile_id': INT, 'threat_indicators': TEXT, 'risk_score': FLOAT,
+        'behavior_patterns': TEXT, 'escalation_timeline': TEXT, 'evidence_collected': TEXT,
+        'analysis_timestamp': TIMESTAMP
+    }),
+    ExportDataset.from_model(ChatSession, 'created_at'),
+    ExportDataset.from_model(ChatMessage, 'timestamp'),
+    ExportDataset.from_model(Evidence, 'created_at'),
+]}
+
+
+def parse_export_time(value: str) -> datetime:
+    """An ISO 8601 date or time as naive UTC, the way the tables store it"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _parse_timestamp(value) -> Optional[datetime]:
+    # The analytics tables keep CURRENT_TIMESTAMP text ('YYYY-MM-DD HH:MM:SS', UTC)
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+def iter_batches(dataset: ExportDataset, columns: List[str], start: datetime, end: datetime,
+                 analytics_db_path: str, batch_rows: int = EXPORT_BATCH_ROWS) -> Iterator[List[tuple]]:
+    """Rows of `columns` with start <= time < end in id order, `batch_rows` at a time.
+    
+    Rows come off a server-side cursor, so only one batch is ever in memory.
+    Application tables need an app context. Columns must be names from
+    `dataset.columns`, which callers validate first.
+    """
+    if dataset.source == MAIN:
+        table = dataset.table
+        time_column = table.c[dataset.time_column]
+        query = select(*[table.c[name] for name in columns]).where(
+            time_column >= start, time_column < end
+        ).order_by(table.c.id).execution_options(yield_per=batch_rows)
+        for partition in db.session.execute(query).partitions():
+            yield [tuple(row) for row in partition]
+        return
+    
+    timestamp_positions = [i for i, name in enumerate(columns) if dataset.columns[name] == TIMESTAMP]
+    with analytics_database(analytics_db_path).connection() as conn:
+        cursor = conn.execute(
+            f'SELECT {", ".join(columns)} FROM {dataset.name} '
+            f'WHERE {dataset.time_column} >= ? AND {dataset.time_column} < ? ORDER BY id',
+            (start.strftime('%Y-%m-%d %H:%M:%S'), end.strftime('%Y-%m-%d %H:%M:%S'))
+        )
+        while True:
+            rows = cursor.fetchmany(batch_rows)
+            if not rows:
+                break
+            if timestamp_positions:
+                rows = [list(row) for row in rows]
+                for row in rows:
+                    for i in timestamp_positions:
+                        row[i] = _parse_timestamp(row[i])
+            yield [tuple(row) for row in rows]
+
+
+def _text_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def csv_chunks(columns: List[str], kinds: List[str], batches: Iterable[List[tuple]]) -> Iterator[bytes]:
+    """CSV with a header row, one chunk per batch"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue().encode('utf-8')
+    
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_text_value(value) for value in row] for row in rows)
+        yield buffer.getvalue().encode('utf-8')
+
+
+def ndjson_chunks(columns: List[str], kinds: List[str], batches: Iterable[List[tuple]]) -> Iterator[bytes]:
+    """One JSON object per line, one chunk per batch"""
+    for rows in batches:
+        yield ''.join(
+            json.dumps(dict(zip(columns, map(_text_value, row)))) + '\n' for row in rows
+        ).encode('utf-8')
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file whose contents are handed out and dropped as they accumulate"""
+    
+    def __init__(self):
+        super().__init__()
+        self.buffer = bytearray()
+    
+    def writable(self):
+        return True
+    
+    def write(self, data):
+        self.buffer += data
+        return len(data)
+    
+    def take(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def parquet_chunks(columns: List[str], kinds: List[str], batches: Iterable[List[tuple]]) -> Iterator[bytes]:
+    """A Parquet file written one row group per batch, streamed as each is encoded"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    types = {INT: pa.int64(), FLOAT: pa.float64(), BOOL: pa.bool_(), TEXT: pa.string(), TIMESTAMP: pa.timestamp('us')}
+    schema = pa.schema([(name, types[kind]) for name, kind in zip(columns, kinds)])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for rows in batches:
+            arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+            writer.write_batch(pa.record_batch(arrays, schema=schema))
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# Export type -> (MIME type, file extension, writer)
+FORMATS = {
+    'csv': ('text/csv', 'csv', csv_chunks),
+    'ndjson': ('application/x-ndjson', 'ndjson', ndjson_chunks),
+    'parquet': ('application/vnd.apache.parquet', 'parquet', parquet_chunks),
+}
+
+
+def export_chunks(dataset: ExportDataset, export_type: str, columns: List[str], start: datetime, end: datetime,
+                  analytics_db_path: str) -> Iterator[bytes]:
+    """Encoded chunks of an export; see iter_batches for the row selection"""
+    writer = FORMATS[export_type][2]
+    kinds = [dataset.columns[name] for name in columns]
+    return writer(columns, kinds, iter_batches(dataset, columns, start, end, analytics_db_path))
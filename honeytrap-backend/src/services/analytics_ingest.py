@@ -0,0 +1,177 @@
+"""
+Analytics Ingestion
+In-memory buffer that writes analytics events to the analytics database in batches
+"""
+
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from src.metrics import metrics
+from src.services.discovery_analytics import utc_timestamp
+
+# Buffered events are written at least this often (seconds)...
+FLUSH_INTERVAL = float(os.environ.get('HONEYTRAP_INGEST_FLUSH_INTERVAL', 1.0))
+# ...or as soon as this many are waiting
+FLUSH_SIZE = int(os.environ.get('HONEYTRAP_INGEST_BATCH_SIZE', 500))
+
+
+class AnalyticsIngestBuffer:
+    """Discovery and engagement events queued in memory and written a batch at a time.
+    
+    Events are analysed when they are added, so callers still learn each
+    engagement's threat level, but their rows are written by a flusher
+    thread every `flush_interval` seconds, or as soon as `flush_size` are
+    waiting, in one transaction with executemany. A batch the database
+    cannot take (locked, unavailable) stays queued for the next flush; once
+    `max_pending` events are waiting, adding more first flushes in the
+    caller so a stalled writer pushes back on its sources. A batch that
+    fails for any other reason is retried an event at a time, and events
+    that still fail are logged and dropped so one bad event cannot hold up
+    the rest. The buffer drains at interpreter exit, but events still
+    queued when a process is killed are lost, so the single-event routes
+    keep writing synchronously.
+    """
+    
+    def __init__(self, service, flush_interval: float = FLUSH_INTERVAL, flush_size: int = FLUSH_SIZE,
+                 max_pending: Optional[int] = None):
+        self.service = service
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_pending = max_pending or flush_size * 20
+        self.discoveries = []  # (profile_id, discovery_data, timestamp)
+        self.engagements = []  # (profile_id, session_id, event_data, threat_analysis, timestamp)
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()  # One flush at a time, so batches land in arrival order
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+        self.pid = None
+        self.exit_hook_registered = False
+    
+    def add_discoveries(self, events: List[Tuple[int, Dict, Optional[str]]]):
+        """Queue (profile_id, discovery_data, timestamp or None for now) events"""
+        now = utc_timestamp()
+        self._enqueue([(profile_id, data, timestamp or now) for profile_id, data, timestamp in events], [])
+    
+    def add_engagements(self, events: List[Tuple[int, str, Dict, Optional[str]]]) -> List[Dict]:
+        """Queue (profile_id, session_id, event_data, timestamp or None for now) events.
+        
+        Returns each event's threat analysis, in order.
+        """
+        now = utc_timestamp()
+        rows = [
+            (profile_id, session_id, event_data, self.service.assess_engagement_event(event_data), timestamp or now)
+            for profile_id, session_id, event_data, timestamp in events
+        ]
+        self._enqueue([], rows)
+        return [row[3] for row in rows]
+    
+    def pending(self) -> int:
+        with self.lock:
+            return len(self.discoveries) + len(self.engagements)
+    
+    def flush(self) -> int:
+        """Write every queued event in one transaction; returns how many were written"""
+        with self.flush_lock:
+            with self.lock:
+                discoveries, self.discoveries = self.discoveries, []
+                engagements, self.engagements = self.engagements, []
+            if not discoveries and not engagements:
+                return 0
+            
+            try:
+                self.service.record_event_batch(discoveries, engagements)
+                written = len(discoveries) + len(engagements)
+            except sqlite3.OperationalError:
+                self._requeue(discoveries, engagements)
+                metrics.increment('analytics_ingest_flush_errors')
+                raise
+            except Exception as e:
+                metrics.increment('analytics_ingest_flush_errors')
+                logging.warning(f"Analytics batch of {len(discoveries) + len(engagements)} events failed, "
+                                f"writing them one at a time: {str(e)}")
+                written = self._write_singly(discoveries, engagements)
+        
+        metrics.increment('analytics_ingest_flushes')
+        metrics.increment('analytics_ingest_events_written', written)
+        metrics.set_gauge('analytics_ingest_pending', self.pending())
+        return written
+    
+    def _write_singly(self, discoveries: List[Tuple], engagements: List[Tuple]) -> int:
+        """Write events one transaction each, dropping those that fail; returns how many were written"""
+        events = [(event, None) for event in discoveries] + [(None, event) for event in engagements]
+        written = 0
+        for position, (discovery, engagement) in enumerate(events):
+            try:
+                self.service.record_event_batch([discovery] if discovery else [], [engagement] if engagement else [])
+                written += 1
+            except sqlite3.OperationalError:
+                # The database itself is failing; keep this event and the rest for the next flush
+                rest = events[position:]
+                self._requeue([d for d, _ in rest if d], [e for _, e in rest if e])
+                raise
+            except Exception as e:
+                metrics.increment('analytics_ingest_events_dropped')
+                logging.error(f"Dropping analytics event that cannot be written: {str(e)}: "
+                              f"{discovery or engagement!r}")
+        return written
+    
+    def _requeue(self, discoveries: List[Tuple], engagements: List[Tuple]):
+        """Put events back in front of anything queued since, for the next flush to retry"""
+        with self.lock:
+            self.discoveries[:0] = discoveries
+            self.engagements[:0] = engagements
+    
+    def close(self):
+        """Stop the flusher and write whatever is still queued"""
+        self.stopping.set()
+        self.wakeup.set()
+        if self.thread is not None and self.pid == os.getpid():
+            self.thread.join(timeout=self.flush_interval + 5)
+        try:
+            self.flush()
+        except Exception as e:
+            logging.error(f"Error draining analytics ingest buffer: {str(e)}")
+    
+    def _enqueue(self, discoveries: List[Tuple], engagements: List[Tuple]):
+        self._ensure_flusher()
+        if self.pending() >= self.max_pending:
+            # Raises before queueing if the database is still failing, so the caller can report it
+            self.flush()
+        
+        with self.lock:
+            self.discoveries.extend(discoveries)
+            self.engagements.extend(engagements)
+            pending = len(self.discoveries) + len(self.engagements)
+        metrics.set_gauge('analytics_ingest_pending', pending)
+        if pending >= self.flush_size:
+            self.wakeup.set()
+    
+    def _ensure_flusher(self):
+        with self.lock:
+            if self.pid != os.getpid():
+                # A forked child inherits the parent's queue but not its thread; the parent writes those events
+                self.pid = os.getpid()
+                self.discoveries, self.engagements = [], []
+                self.thread = None
+            if self.thread is not None and self.thread.is_alive():
+                return
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self._run, name='analytics-ingest', daemon=True)
+            self.thread.start()
+            if not self.exit_hook_registered:
+                atexit.register(self.close)
+                self.exit_hook_registered = True
+    
+    def _run(self):
+        while not self.stopping.is_set():
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"Error flushing analytics events: {str(e)}")
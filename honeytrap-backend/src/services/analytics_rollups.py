@@ -0,0 +1,220 @@
+"""
+Analytics Rollups
+Hourly and daily aggregates of discovery and engagement events, updated in the same transaction as the events
+"""
+
+import calendar
+import json
+from collections import Counter
+from itertools import combinations_with_replacement
+from datetime import datetime, timedelta
+from typing import Iterable, List, Tuple
+
+HOUR = 'hour'
+DAY = 'day'
+GRANULARITIES = (HOUR, DAY)
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'  # As CURRENT_TIMESTAMP stores it, so text order is time order
+
+ROLLUP_TABLES = ('discovery_rollups', 'discovery_hour_rollups', 'discovery_sessions', 'engagement_rollups',
+                 'indicator_rollups')
+
+# Discoveries per bucket and dimension; the epoch sum gives their average age in any window
+DISCOVERY_ROLLUP_UPSERT = '''
+    INSERT INTO discovery_rollups
+    (granularity, bucket_start, profile_id, platform_type, discovery_method, geolocation,
+     discoveries, discovery_epoch_sum)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (granularity, bucket_start, profile_id, platform_type, discovery_method, geolocation)
+    DO UPDATE SET discoveries = discoveries + excluded.discoveries,
+                  discovery_epoch_sum = discovery_epoch_sum + excluded.discovery_epoch_sum
+'''
+
+# Daily discoveries by hour of day; hour buckets carry their hour in bucket_start
+DISCOVERY_HOUR_ROLLUP_UPSERT = '''
+    INSERT INTO discovery_hour_rollups (bucket_start, profile_id, hour_of_day, discoveries)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (bucket_start, profile_id, hour_of_day)
+    DO UPDATE SET discoveries = discoveries + excluded.discoveries
+'''
+
+# Distinct sessions are not additive across buckets, so each keeps the time it was last seen
+DISCOVERY_SESSION_UPSERT = '''
+    INSERT INTO discovery_sessions (profile_id, session_id, last_seen)
+    VALUES (?, ?, ?)
+    ON CONFLICT (profile_id, session_id)
+    DO UPDATE SET last_seen = MAX(last_seen, excluded.last_seen)
+'''
+
+ENGAGEMENT_ROLLUP_UPSERT = '''
+    INSERT INTO engagement_rollups
+    (granularity, bucket_start, profile_id, threat_level, escalation_indicators, events)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (granularity, bucket_start, profile_id, threat_level, escalation_indicators)
+    DO UPDATE SET events = events + excluded.events
+'''
+
+# Events per indicator pair, each pair once in name order; an indicator paired with itself is its frequency
+INDICATOR_ROLLUP_UPSERT = '''
+    INSERT INTO indicator_rollups (granularity, bucket_start, profile_id, indicator, co_indicator, events)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (granularity, bucket_start, profile_id, indicator, co_indicator)
+    DO UPDATE SET events = events + excluded.events
+'''
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    if granularity == HOUR:
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _bucket_text(moment: datetime, granularity: str) -> str:
+    return bucket_start(moment, granularity).strftime(TIMESTAMP_FORMAT)
+
+
+def record_discoveries(cursor, rows: Iterable[Tuple]):
+    """Add discovery_events rows (as inserted, time last) to the rollups, on the caller's transaction"""
+    rollups, hours, sessions = Counter(), Counter(), {}
+    epoch_sums = Counter()
+    for profile_id, platform_type, method, _, _, _, session_id, geolocation, _, timestamp in rows:
+        moment = datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+        for granularity in GRANULARITIES:
+            key = (granularity, _bucket_text(moment, granularity), profile_id, platform_type,
+                   method or 'unknown', geolocation or '{}')
+            rollups[key] += 1
+            epoch_sums[key] += calendar.timegm(moment.timetuple())
+        hours[(_bucket_text(moment, DAY), profile_id, moment.hour)] += 1
+        if session_id:
+            sessions[(profile_id, session_id)] = max(timestamp, sessions.get((profile_id, session_id), timestamp))
+    
+    cursor.executemany(DISCOVERY_ROLLUP_UPSERT,
+                       [key + (count, epoch_sums[key]) for key, count in rollups.items()])
+    cursor.executemany(DISCOVERY_HOUR_ROLLUP_UPSERT, [key + (count,) for key, count in hours.items()])
+    cursor.executemany(DISCOVERY_SESSION_UPSERT, [key + (last_seen,) for key, last_seen in sessions.items()])
+
+
+def record_engagements(cursor, rows: Iterable[Tuple]):
+    """Add engagement_events rows (as inserted, time last) to the rollups, on the caller's transaction"""
+    rollups, pairs = Counter(), Counter()
+    for profile_id, _, _, _, threat_level, indicators, timestamp in rows:
+        moment = datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+        indicator_pairs = list(combinations_with_replacement(sorted(set(json.loads(indicators or '[]'))), 2))
+        for granularity in GRANULARITIES:
+            bucket = _bucket_text(moment, granularity)
+            rollups[(granularity, bucket, profile_id, threat_level or 0, indicators or '[]')] += 1
+            for indicator, co_indicator in indicator_pairs:
+                pairs[(granularity, bucket, profile_id, indicator, co_indicator)] += 1
+    cursor.executemany(ENGAGEMENT_ROLLUP_UPSERT, [key + (count,) for key, count in rollups.items()])
+    cursor.executemany(INDICATOR_ROLLUP_UPSERT, [key + (count,) for key, count in pairs.items()])
+
+
+def window_ranges(start: datetime, end: datetime) -> List[Tuple[str, str, str]]:
+    """(granularity, first bucket, end) ranges covering the hour containing `start` up to `end`.
+    
+    Whole days come from daily buckets and the partial days at either end
+    from hourly ones, including the current hour's, so a window reads one
+    bucket per day plus at most 48 hourly ones per dimension, however much
+    history is stored, and never the raw events.
+    """
+    first_hour = bucket_start(start, HOUR)
+    first_day = bucket_start(first_hour, DAY)
+    if first_day < first_hour:
+        first_day += timedelta(days=1)
+    last_day = bucket_start(end, DAY)
+    
+    text = lambda moment: moment.strftime(TIMESTAMP_FORMAT)
+    if first_day >= last_day:
+        return [(HOUR, text(first_hour), text(end))]
+    return [(HOUR, text(first_hour), text(first_day)), (DAY, text(first_day), text(last_day)),
+            (HOUR, text(last_day), text(end))]
+
+
+def window_clause(ranges: List[Tuple[str, str, str]], granularities: Tuple[str, ...] = GRANULARITIES,
+                  by_granularity: bool = True) -> Tuple[str, list]:
+    """WHERE condition selecting the `ranges` of the given granularities from a rollup table, and its parameters.
+    
+    Tables holding a single granularity (discovery_hour_rollups) pass by_granularity=False.
+    """
+    clauses, params = [], []
+    for granularity, first, end in ranges:
+        if granularity not in granularities:
+            continue
+        if by_granularity:
+            clauses.append('(granularity = ? AND bucket_start >= ? AND bucket_start < ?)')
+            params.append(granularity)
+        else:
+            clauses.append('(bucket_start >= ? AND bucket_start < ?)')
+        params.extend((first, end))
+    return '(' + (' OR '.join(clauses) or '0') + ')', params
+
+
+def backfill(cursor) -> bool:
+    """Build the rollups from the raw events if there are none yet (e.g. events stored before they existed)"""
+    for table in ('discovery_rollups', 'engagement_rollups'):
+        if cursor.execute(f'SELECT 1 FROM {table} LIMIT 1').fetchone() is not None:
+            return False
+    rebuild(cursor)
+    return True
+
+
+def rebuild(cursor):
+    """Replace the rollups with aggregates of the raw events, on the caller's transaction"""
+    for table in ROLLUP_TABLES:
+        cursor.execute(f'DELETE FROM {table}')
+    
+    bucket_formats = {HOUR: '%Y-%m-%d %H:00:00', DAY: '%Y-%m-%d 00:00:00'}
+    for granularity, bucket_format in bucket_formats.items():
+        cursor.execute('''
+            INSERT INTO discovery_rollups
+            (granularity, bucket_start, profile_id, platform_type, discovery_method, geolocation,
+             discoveries, discovery_epoch_sum)
+            SELECT ?, strftime(?, discovery_time), profile_id, platform_type,
+                   COALESCE(discovery_method, 'unknown'), COALESCE(geolocation, '{}'),
+                   COUNT(*), SUM(CAST(strftime('%s', discovery_time) AS INTEGER))
+            FROM discovery_events
+            WHERE discovery_time IS NOT NULL
+            GROUP BY 2, 3, 4, 5, 6
+        ''', (granularity, bucket_format))
+        cursor.execute('''
+            INSERT INTO engagement_rollups
+            (granularity, bucket_start, profile_id, threat_level, escalation_indicators, events)
+            SELECT ?, strftime(?, timestamp), profile_id, COALESCE(threat_level, 0),
+                   COALESCE(escalation_indicators, '[]'), COUNT(*)
+            FROM engagement_events
+            WHERE timestamp IS NOT NULL
+            GROUP BY 2, 3, 4, 5
+        ''', (granularity, bucket_format))
+    rebuild_indicators(cursor)
+    
+    cursor.execute('''
+        INSERT INTO discovery_hour_rollups (bucket_start, profile_id, hour_of_day, discoveries)
+        SELECT strftime('%Y-%m-%d 00:00:00', discovery_time), profile_id,
+               CAST(strftime('%H', discovery_time) AS INTEGER), COUNT(*)
+        FROM discovery_events
+        WHERE discovery_time IS NOT NULL
+        GROUP BY 1, 2, 3
+    ''')
+    cursor.execute('''
+        INSERT INTO discovery_sessions (profile_id, session_id, last_seen)
+        SELECT profile_id, session_id, strftime('%Y-%m-%d %H:%M:%S', MAX(discovery_time))
+        FROM discovery_events
+        WHERE session_id IS NOT NULL AND session_id != '' AND discovery_time IS NOT NULL
+        GROUP BY profile_id, session_id
+    ''')
+
+
+def rebuild_indicators(cursor):
+    """Replace indicator_rollups with aggregates of engagement_indicators, on the caller's transaction"""
+    cursor.execute('DELETE FROM indicator_rollups')
+    for granularity, bucket_format in ((HOUR, '%Y-%m-%d %H:00:00'), (DAY, '%Y-%m-%d 00:00:00')):
+        cursor.execute('''
+            INSERT INTO indicator_rollups (granularity, bucket_start, profile_id, indicator, co_indicator, events)
+            SELECT ?, strftime(?, event.timestamp), event.profile_id, one.indicator, other.indicator, COUNT(*)
+            FROM engagement_indicators one
+            JOIN engagement_indicators other
+              ON other.engagement_id = one.engagement_id AND other.indicator >= one.indicator
+            JOIN engagement_events event ON event.id = one.engagement_id
+            WHERE event.timestamp IS NOT NULL
+            GROUP BY 2, 3, 4, 5
+        ''', (granularity, bucket_format))
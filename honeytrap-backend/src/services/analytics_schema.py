@@ -0,0 +1,308 @@
+"""
+Analytics Schema
+Versioned schema of the analytics database, migrated in place when the service starts
+"""
+
+import json
+import logging
+import sqlite3
+from typing import Tuple
+
+
+def _create_event_tables(cursor):
+    """Version 1: the tables as first shipped (bar platform_metrics, whose DDL never applied)"""
+    
+    # Discovery events table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS discovery_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            profile_id INTEGER NOT NULL,
+            platform_type TEXT NOT NULL,
+            discovery_method TEXT,
+            discovery_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            user_ip TEXT,
+            user_agent TEXT,
+            referrer TEXT,
+            session_id TEXT,
+            geolocation TEXT,
+            device_info TEXT,
+            FOREIGN KEY (profile_id) REFERENCES decoy_profiles (id)
+        )
+    ''')
+    
+    # Engagement tracking table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS engagement_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            profile_id INTEGER NOT NULL,
+            session_id TEXT,
+            event_type TEXT NOT NULL,
+            event_data TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            threat_level INTEGER DEFAULT 0,
+            escalation_indicators TEXT,
+            FOREIGN KEY (profile_id) REFERENCES decoy_profiles (id)
+        )
+    ''')
+    
+    # Threat behavior analysis table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS threat_analysis (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            profile_id INTEGER NOT NULL,
+            threat_indicators TEXT,
+            risk_score REAL DEFAULT 0.0,
+            behavior_patterns TEXT,
+            escalation_timeline TEXT,
+            evidence_collected TEXT,
+            analysis_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (profile_id) REFERENCES decoy_profiles (id)
+        )
+    ''')
+    
+    # Per-session threat timelines read both tables by session in time order
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_engagement_events_session_time
+        ON engagement_events (session_id, timestamp)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_threat_analysis_session_time
+        ON threat_analysis (session_id, analysis_timestamp)
+    ''')
+    
+    # Geographic analysis table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS geographic_analysis (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            region TEXT NOT NULL,
+            country TEXT,
+            city TEXT,
+            threat_count INTEGER DEFAULT 0,
+            profile_discoveries INTEGER DEFAULT 0,
+            risk_level TEXT DEFAULT 'low',
+            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _add_keys_and_indexes(cursor):
+    """Version 2: unique keys for the upserts and indexes for the time-ranged reads"""
+    
+    # Platform metrics, one row per platform and day
+    legacy = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'platform_metrics'"
+    ).fetchone()
+    if legacy:
+        cursor.execute('ALTER TABLE platform_metrics RENAME TO platform_metrics_v1')
+    cursor.execute('''
+        CREATE TABLE platform_metrics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            platform_type TEXT NOT NULL,
+            metric_date DATE NOT NULL,
+            profile_views INTEGER DEFAULT 0,
+            contact_attempts INTEGER DEFAULT 0,
+            successful_engagements INTEGER DEFAULT 0,
+            threat_detections INTEGER DEFAULT 0,
+            evidence_captured INTEGER DEFAULT 0,
+            average_discovery_time REAL DEFAULT 0.0,
+            UNIQUE (metric_date, platform_type)  -- Date first, so reports range over days with it
+        )
+    ''')
+    if legacy:
+        # Duplicate days are merged into the row the unique key now allows
+        cursor.execute('''
+            INSERT INTO platform_metrics
+            (platform_type, metric_date, profile_views, contact_attempts, successful_engagements,
+             threat_detections, evidence_captured, average_discovery_time)
+            SELECT platform_type, metric_date, SUM(profile_views), SUM(contact_attempts),
+                   SUM(successful_engagements), SUM(threat_detections), SUM(evidence_captured),
+                   AVG(average_discovery_time)
+            FROM platform_metrics_v1
+            GROUP BY platform_type, metric_date
+        ''')
+        cursor.execute('DROP TABLE platform_metrics_v1')
+    
+    # Per-profile discovery counts, one row per profile
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS profile_discovery_stats (
+            profile_id INTEGER PRIMARY KEY,
+            total_views INTEGER NOT NULL DEFAULT 0,
+            last_viewed TIMESTAMP
+        )
+    ''')
+    
+    # Exports and rollup rebuilds read the event tables by time
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_discovery_events_time
+        ON discovery_events (discovery_time)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_engagement_events_time
+        ON engagement_events (timestamp)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_threat_analysis_time
+        ON threat_analysis (analysis_timestamp)
+    ''')
+    # High-risk sessions are read highest score first
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_threat_analysis_risk
+        ON threat_analysis (risk_score, analysis_timestamp)
+    ''')
+
+
+def _split_indicators(cursor):
+    """Version 3: escalation indicators one row per engagement event and indicator, and their rollups"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS engagement_indicators (
+            engagement_id INTEGER NOT NULL,
+            indicator TEXT NOT NULL,
+            PRIMARY KEY (engagement_id, indicator),
+            FOREIGN KEY (engagement_id) REFERENCES engagement_events (id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS indicator_rollups (
+            granularity TEXT NOT NULL,
+            bucket_start TIMESTAMP NOT NULL,
+            profile_id INTEGER NOT NULL,
+            indicator TEXT NOT NULL,
+            co_indicator TEXT NOT NULL,
+            events INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (granularity, bucket_start, profile_id, indicator, co_indicator)
+        ) WITHOUT ROWID
+    ''')
+    
+    # Split the JSON lists already stored on the events, then aggregate them
+    stored = cursor.execute('''
+        SELECT id, escalation_indicators FROM engagement_events
+        WHERE escalation_indicators IS NOT NULL AND escalation_indicators != '[]'
+    ''').fetchall()
+    rows = []
+    for engagement_id, indicators in stored:
+        try:
+            rows.extend((engagement_id, indicator) for indicator in json.loads(indicators))
+        except (ValueError, TypeError):
+            logging.warning(f"Skipping unreadable escalation indicators on engagement event {engagement_id}")
+    cursor.executemany('INSERT OR IGNORE INTO engagement_indicators (engagement_id, indicator) VALUES (?, ?)',
+                       rows)
+    cursor.execute('DELETE FROM indicator_rollups')
+    for granularity, bucket_format in (('hour', '%Y-%m-%d %H:00:00'), ('day', '%Y-%m-%d 00:00:00')):
+        cursor.execute('''
+            INSERT INTO indicator_rollups (granularity, bucket_start, profile_id, indicator, co_indicator, events)
+            SELECT ?, strftime(?, event.timestamp), event.profile_id, one.indicator, other.indicator, COUNT(*)
+            FROM engagement_indicators one
+            JOIN engagement_indicators other
+              ON other.engagement_id = one.engagement_id AND other.indicator >= one.indicator
+            JOIN engagement_events event ON event.id = one.engagement_id
+            WHERE event.timestamp IS NOT NULL
+            GROUP BY 2, 3, 4, 5
+        ''', (granularity, bucket_format))
+
+
+def _create_rollup_tables(cursor):
+    """Version 4: hourly and daily aggregates that the discovery and threat reports read.
+    
+    Files that already have them keep theirs; new ones are filled from the
+    raw events by analytics_rollups.backfill once the migration commits.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS discovery_rollups (
+            granularity TEXT NOT NULL,
+            bucket_start TIMESTAMP NOT NULL,
+            profile_id INTEGER NOT NULL,
+            platform_type TEXT NOT NULL,
+            discovery_method TEXT NOT NULL,
+            geolocation TEXT NOT NULL,
+            discoveries INTEGER NOT NULL DEFAULT 0,
+            discovery_epoch_sum INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (granularity, bucket_start, profile_id, platform_type, discovery_method, geolocation)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS discovery_hour_rollups (
+            bucket_start TIMESTAMP NOT NULL,
+            profile_id INTEGER NOT NULL,
+            hour_of_day INTEGER NOT NULL,
+            discoveries INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (bucket_start, profile_id, hour_of_day)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS discovery_sessions (
+            profile_id INTEGER NOT NULL,
+            session_id TEXT NOT NULL,
+            last_seen TIMESTAMP NOT NULL,
+            PRIMARY KEY (profile_id, session_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_discovery_sessions_last_seen
+        ON discovery_sessions (last_seen)
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS engagement_rollups (
+            granularity TEXT NOT NULL,
+            bucket_start TIMESTAMP NOT NULL,
+            profile_id INTEGER NOT NULL,
+            threat_level INTEGER NOT NULL,
+            escalation_indicators TEXT NOT NULL,
+            events INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (granularity, bucket_start, profile_id, threat_level, escalation_indicators)
+        ) WITHOUT ROWID
+    ''')
+
+
+# Version N is reached by applying MIGRATIONS[N - 1]; append, never edit, once released.
+# Each one writes out its own DDL rather than calling code that may change later.
+MIGRATIONS = (
+    _create_event_tables,
+    _add_keys_and_indexes,
+    _split_indicators,
+    _create_rollup_tables,
+)
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    """The version an analytics database is at, kept in its PRAGMA user_version"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> Tuple[int, int]:
+    """Bring an analytics database up to SCHEMA_VERSION in place; returns (previous, current) versions.
+    
+    Files from before the schema was versioned are at version 0, and every
+    migration tolerates the tables they already have. Pending migrations
+    run in one transaction that takes the write lock first, so a crash
+    leaves the file at its old version and concurrent workers starting
+    together migrate it once.
+    """
+    # Readers no longer block the writer (persistent, and cannot change inside a transaction)
+    conn.execute('PRAGMA journal_mode = WAL')
+    
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        previous = schema_version(conn)
+        if previous > SCHEMA_VERSION:
+            logging.warning(f"Analytics database is at schema version {previous}, newer than "
+                            f"{SCHEMA_VERSION}; leaving it as it is")
+            conn.rollback()
+            return previous, previous
+        
+        for version in range(previous + 1, SCHEMA_VERSION + 1):
+            MIGRATIONS[version - 1](cursor)
+        cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    
+    if previous < SCHEMA_VERSION:
+        logging.info(f"Analytics database migrated from schema version {previous} to {SCHEMA_VERSION}")
+    return previous, SCHEMA_VERSION
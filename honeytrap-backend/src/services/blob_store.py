@@ -0,0 +1,308 @@
+"""
+Blob Store
+Content-addressed, deduplicated storage for evidence files, with reference counting for retention
+"""
+
+import hashlib
+import io
+import json
+import mmap
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, attributes
+
+from src.models.user import db
+from src.models.chat import Evidence, EvidenceBlob
+
+BLOB_DIR = os.environ.get(
+    'HONEYTRAP_BLOB_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'blobs')
+)
+# Unreferenced blobs are kept this long before garbage collection removes them
+BLOB_GRACE_SECONDS = float(os.environ.get('HONEYTRAP_BLOB_GRACE_SECONDS', 86400))
+COPY_BLOCK_BYTES = 1024 * 1024
+
+# Evidence.file_path values of the form cas:<sha256> live in the blob store
+CAS_PREFIX = 'cas:'
+SHA256_PATTERN = re.compile(r'[0-9a-f]{64}')
+
+
+def blob_reference(sha256: str) -> str:
+    return f'{CAS_PREFIX}{sha256}'
+
+
+def parse_blob_reference(file_path: Optional[str]) -> Optional[str]:
+    """The blob hash an Evidence.file_path refers to, or None for ordinary paths"""
+    if file_path and file_path.startswith(CAS_PREFIX):
+        return file_path[len(CAS_PREFIX):]
+    return None
+
+
+def _fsync_directory(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class BlobWriteBatch:
+    """Blobs written together and made durable together.
+    
+    Each blob is hashed while it is streamed to a temporary file. On commit
+    every new file is fsynced, renamed to its content address and each
+    affected directory is fsynced once, so a batch of uploads costs one
+    directory sync per shard rather than one per file. Blobs that already
+    exist are dropped instead of being stored again.
+    """
+    
+    def __init__(self, store: 'BlobStore'):
+        self.store = store
+        self.pending = {}  # sha256 -> temporary path
+    
+    def write(self, source) -> Tuple[str, int]:
+        """Stream bytes or a file-like object into the batch; returns (sha256, size)"""
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = io.BytesIO(source)
+        
+        fd, temp_path = tempfile.mkstemp(dir=self.store.temp_dir)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                while True:
+                    chunk = source.read(COPY_BLOCK_BYTES)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        
+        sha256 = digest.hexdigest()
+        if sha256 in self.pending:
+            os.unlink(temp_path)
+        else:
+            # Kept even if the blob exists now: it may be collected before the batch commits
+            self.pending[sha256] = temp_path
+        return sha256, size
+    
+    def commit(self):
+        directories = set()
+        renames = []
+        for sha256, temp_path in self.pending.items():
+            target = self.store.path_for(sha256)
+            if os.path.exists(target):
+                os.unlink(temp_path)
+                continue
+            
+            shard = os.path.dirname(target)
+            if not os.path.isdir(shard):
+                os.makedirs(shard, exist_ok=True)
+                directories.update((os.path.dirname(shard), os.path.dirname(os.path.dirname(shard))))
+            with open(temp_path, 'rb') as f:
+                os.fsync(f.fileno())
+            renames.append((temp_path, target))
+        
+        for temp_path, target in renames:
+            os.replace(temp_path, target)
+            directories.add(os.path.dirname(target))
+        for directory in directories:
+            _fsync_directory(directory)
+        self.pending.clear()
+    
+    def abort(self):
+        for temp_path in self.pending.values():
+            try:
+                os.unlink(temp_path)
+            except FileNotFoundError:
+                pass
+        self.pending.clear()
+
+
+class BlobStore:
+    """Evidence blobs stored once each under blobs/ab/cd/<sha256>.
+    
+    Evidence rows reference blobs as cas:<sha256> and evidence_blobs keeps a
+    reference count per blob. A writer reserves its reference before the
+    batch commits its files. Garbage collection deletes a blob's row and
+    moves its file aside in one transaction, so the database's write lock
+    keeps a collection from removing a blob that is being re-added, and
+    unlinks the file only once the deletion has committed.
+    """
+    
+    def __init__(self, root: str = BLOB_DIR):
+        self.root = root
+        self.temp_dir = os.path.join(root, 'tmp')
+    
+    def path_for(self, sha256: str) -> str:
+        if not SHA256_PATTERN.fullmatch(sha256):
+            raise ValueError(f'Invalid blob hash: {sha256!r}')
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+    
+    def exists(self, sha256: str) -> bool:
+        return os.path.exists(self.path_for(sha256))
+    
+    @contextmanager
+    def batch(self):
+        """Write several blobs and make them durable together when the block exits"""
+        os.makedirs(self.temp_dir, exist_ok=True)
+        batch = BlobWriteBatch(self)
+        try:
+            yield batch
+        except BaseException:
+            batch.abort()
+            raise
+        batch.commit()
+    
+    def write(self, source) -> Tuple[str, int]:
+        """Store a single blob; returns (sha256, size)"""
+        with self.batch() as batch:
+            return batch.write(source)
+    
+    @contextmanager
+    def open(self, sha256: str):
+        """Read a blob through a memory map without copying it"""
+        with open(self.path_for(sha256), 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield memoryview(b'')
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped) as view:
+                    yield view
+    
+    def add_reference(self, sha256: str, size: int):
+        """Count one more reference to a blob in the caller's transaction"""
+        for _ in range(2):
+            updated = EvidenceBlob.query.filter_by(sha256=sha256).update(
+                {'ref_count': EvidenceBlob.ref_count + 1, 'released_at': None},
+                synchronize_session=False
+            )
+            if updated:
+                return
+            try:
+                with db.session.begin_nested():
+                    db.session.add(EvidenceBlob(sha256=sha256, size_bytes=size, ref_count=1))
+                return
+            except IntegrityError:
+                # Another writer created the row first; count against it instead
+                continue
+        raise RuntimeError(f'Could not reference blob {sha256}')
+    
+    def release(self, sha256: str):
+        """Drop one reference to a blob in the caller's transaction"""
+        _release(db.session, sha256)
+    
+    def add_evidence(self, batch: BlobWriteBatch, db_session_id: int, evidence_type: str, source,
+                     metadata: Optional[Dict] = None) -> Evidence:
+        """Store a blob as evidence for a chat session in the caller's transaction.
+        
+        Commit the database transaction after the batch has exited.
+        """
+        sha256, size = batch.write(source)
+        self.add_reference(sha256, size)
+        
+        evidence = Evidence(
+            session_id=db_session_id,
+            evidence_type=evidence_type,
+            file_path=blob_reference(sha256),
+            evidence_metadata=json.dumps({**(metadata or {}), 'size_bytes': size}),
+            hash_value=sha256
+        )
+        db.session.add(evidence)
+        return evidence
+    
+    def collect_garbage(self, grace_seconds: float = BLOB_GRACE_SECONDS) -> int:
+        """Delete blobs that have had no references for `grace_seconds` (requires an app context)"""
+        cutoff = datetime.utcnow() - timedelta(seconds=grace_seconds)
+        candidates = [row.sha256 for row in db.session.query(EvidenceBlob.sha256).filter(
+            EvidenceBlob.ref_count == 0,
+            EvidenceBlob.released_at < cutoff
+        ).all()]
+        
+        os.makedirs(self.temp_dir, exist_ok=True)
+        deleted = 0
+        for sha256 in candidates:
+            removed = EvidenceBlob.query.filter_by(sha256=sha256, ref_count=0).delete(synchronize_session=False)
+            if not removed:
+                db.session.commit()
+                continue
+            
+            # Out of the way of writers before the lock is released, but restorable until the row is gone
+            path, collected = self.path_for(sha256), os.path.join(self.temp_dir, f'{sha256}.collected')
+            try:
+                os.replace(path, collected)
+            except FileNotFoundError:
+                collected = None
+            try:
+                db.session.commit()
+            except BaseException:
+                db.session.rollback()
+                if collected:
+                    os.replace(collected, path)
+                raise
+            
+            # A crash before this leaves an unreferenced file in tmp/, which is harmless
+            if collected:
+                os.unlink(collected)
+            deleted += 1
+        return deleted
+
+
+def _release(session: Session, sha256: str):
+    blob = session.get(EvidenceBlob, sha256)
+    if blob and blob.ref_count > 0:
+        blob.ref_count -= 1
+        if blob.ref_count == 0:
+            blob.released_at = datetime.utcnow()
+
+
+def _load_previous(target, value, oldvalue, initiator):
+    return value
+
+
+# Keep the path being replaced even when the attribute had expired, so its blob can be released
+event.listen(Evidence.file_path, 'set', _load_previous, active_history=True, retval=True)
+
+
+@event.listens_for(Session, 'before_flush')
+def _release_dropped_blobs(session: Session, flush_context, instances):
+    """Release the blob of evidence that is deleted or re-pointed, so collection can reclaim it.
+    
+    Bulk deletes and updates bypass the ORM and are not counted.
+    """
+    for obj in session.deleted:
+        if isinstance(obj, Evidence):
+            history = attributes.get_history(obj, 'file_path')
+            sha256 = parse_blob_reference(history.deleted[0] if history.deleted else obj.file_path)
+            if sha256:
+                _release(session, sha256)
+    
+    for obj in session.dirty:
+        if not isinstance(obj, Evidence):
+            continue
+        history = attributes.get_history(obj, 'file_path')
+        if not history.deleted or history.deleted[0] == obj.file_path:
+            continue
+        previous = parse_blob_reference(history.deleted[0])
+        if previous:
+            _release(session, previous)
+        current = parse_blob_reference(obj.file_path)
+        if current:
+            blob = session.get(EvidenceBlob, current)
+            if blob:
+                blob.ref_count += 1
+                blob.released_at = None
+
+
+# Global blob store
+blob_store = BlobStore()
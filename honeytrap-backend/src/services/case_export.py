@@ -0,0 +1,206 @@
+"""
+Case Export
+Streams a complete case bundle (transcript, evidence, metadata, report and hash manifest) as a tar archive
+"""
+
+import calendar
+import hashlib
+import json
+import os
+import tarfile
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from src.models.chat import ChatSession, Evidence
+from src.services.evidence_audit import resolve_evidence_path
+from src.services.evidence_ledger import evidence_ledger
+from src.services.transcripts import iter_transcript
+
+EXPORT_BLOCK_BYTES = 1024 * 1024
+TAR_BLOCK_BYTES = 512
+BUNDLE_FORMAT_VERSION = 1
+
+# A segment's reader yields its bytes starting at the given offset into the segment
+Reader = Callable[[int], Iterator[bytes]]
+
+
+def _bytes_reader(data: bytes) -> Reader:
+    def read(offset):
+        if offset < len(data):
+            yield data[offset:]
+    return read
+
+
+def _file_reader(path: str) -> Reader:
+    def read(offset):
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            while True:
+                chunk = f.read(EXPORT_BLOCK_BYTES)
+                if not chunk:
+                    return
+                yield chunk
+    return read
+
+
+def _zeros_reader(size: int) -> Reader:
+    return _bytes_reader(b'\0' * size)
+
+
+class CaseBundle:
+    """A byte-for-byte reproducible tar archive of one chat session's case file.
+    
+    Every member's size and hash is worked out before the first byte is sent,
+    so the bundle has a known length and an ETag, and a download can resume
+    at any byte offset: members before the offset are skipped without being
+    read. The transcript is read up to the message id given as `until`, so
+    messages arriving during the download don't change the bundle.
+    """
+    
+    def __init__(self, chat_session: ChatSession, evidence_list: List[Evidence], report_path: str, until: int):
+        self.chat_session = chat_session
+        self.report_path = report_path
+        self.until = until
+        self.root = f'case_{chat_session.session_id}'
+        self.mtime = calendar.timegm(chat_session.created_at.utctimetuple())
+        self.segments = []  # (length, reader)
+        self.manifest = []  # (sha256, path within the bundle)
+        
+        transcript_size, transcript_hash = self._measure_transcript()
+        self._add_member('transcript.ndjson', transcript_size, transcript_hash, self._read_transcript)
+        
+        evidence_entries = []
+        for evidence in evidence_list:
+            evidence_entries.append(self._add_evidence(evidence))
+        
+        metadata = json.dumps(self._metadata(evidence_entries), indent=2, sort_keys=True).encode()
+        self._add_member('metadata.json', len(metadata), hashlib.sha256(metadata).hexdigest(),
+                         _bytes_reader(metadata))
+        
+        report_size, report_hash = self._measure_file(report_path)
+        self._add_member('report.pdf', report_size, report_hash, _file_reader(report_path))
+        
+        # The manifest comes last and lists every other member
+        manifest = ''.join(f'{digest}  {path}\n' for digest, path in self.manifest).encode()
+        self._add_member('manifest.sha256', len(manifest), None, _bytes_reader(manifest))
+        self.segments.append((2 * TAR_BLOCK_BYTES, _zeros_reader(2 * TAR_BLOCK_BYTES)))
+        
+        self.size = sum(length for length, _ in self.segments)
+        self.etag = hashlib.sha256(manifest).hexdigest()
+        self.filename = f'{self.root}.tar'
+    
+    def stream(self, start: int = 0, stop: Optional[int] = None) -> Iterator[bytes]:
+        """Yield the bundle's bytes from `start` up to (not including) `stop`"""
+        stop = self.size if stop is None else min(stop, self.size)
+        position = 0
+        for length, reader in self.segments:
+            segment_start, position = position, position + length
+            if position <= start:
+                continue
+            if segment_start >= stop:
+                return
+            
+            sent = max(start, segment_start)
+            for chunk in reader(sent - segment_start):
+                chunk = chunk[:stop - sent]
+                sent += len(chunk)
+                yield chunk
+                if sent >= stop:
+                    break
+    
+    def _add_member(self, path: str, size: int, sha256: Optional[str], reader: Reader):
+        info = tarfile.TarInfo(f'{self.root}/{path}')
+        info.size = size
+        info.mtime = self.mtime
+        info.mode = 0o644
+        header = info.tobuf(format=tarfile.PAX_FORMAT, encoding='utf-8', errors='strict')
+        
+        self.segments.append((len(header), _bytes_reader(header)))
+        self.segments.append((size, reader))
+        padding = -size % TAR_BLOCK_BYTES
+        if padding:
+            self.segments.append((padding, _zeros_reader(padding)))
+        if sha256:
+            self.manifest.append((sha256, path))
+    
+    def _add_evidence(self, evidence: Evidence) -> Dict:
+        metadata = json.loads(evidence.evidence_metadata) if evidence.evidence_metadata else {}
+        entry = {
+            'evidence_id': evidence.id,
+            'evidence_type': evidence.evidence_type,
+            'created_at': evidence.created_at.isoformat() if evidence.created_at else None,
+            'hash_value': evidence.hash_value,
+            'metadata': metadata,
+            'ledger': evidence_ledger.inclusion_proof(evidence.id),
+            'bundle_path': None
+        }
+        
+        if evidence.file_path:
+            path = resolve_evidence_path(evidence.file_path)
+            if not os.path.exists(path):
+                entry['missing'] = True
+                return entry
+            extension = os.path.splitext(metadata.get('filename') or '')[1] or '.bin'
+            entry['bundle_path'] = f'evidence/{evidence.id:06d}_{evidence.evidence_type}{extension}'
+            self._add_member(entry['bundle_path'], os.path.getsize(path), evidence.hash_value, _file_reader(path))
+        elif evidence.content is not None:
+            content = evidence.content.encode()
+            entry['bundle_path'] = f'evidence/{evidence.id:06d}_{evidence.evidence_type}.txt'
+            self._add_member(entry['bundle_path'], len(content), evidence.hash_value, _bytes_reader(content))
+        return entry
+    
+    def _metadata(self, evidence_entries: List[Dict]) -> Dict:
+        chat_session = self.chat_session
+        persona = chat_session.persona
+        return {
+            'format_version': BUNDLE_FORMAT_VERSION,
+            'session': {
+                'session_id': chat_session.session_id,
+                'created_at': chat_session.created_at.isoformat(),
+                'last_activity': chat_session.last_activity.isoformat() if chat_session.last_activity else None,
+                'escalation_level': chat_session.escalation_level,
+                'user_ip': chat_session.user_ip,
+                'user_agent': chat_session.user_agent,
+                'geolocation': chat_session.geolocation,
+                'vpn_detected': chat_session.vpn_detected
+            },
+            'persona': {
+                'name': persona.name,
+                'age': persona.age,
+                'platform_type': persona.platform_type
+            } if persona else None,
+            'transcript_until_message_id': self.until,
+            'evidence': evidence_entries
+        }
+    
+    def _transcript_lines(self) -> Iterator[bytes]:
+        for message in iter_transcript(self.chat_session.id, until=self.until):
+            yield json.dumps(message.to_dict(), sort_keys=True, separators=(',', ':')).encode() + b'\n'
+    
+    def _measure_transcript(self) -> Tuple[int, str]:
+        size = 0
+        digest = hashlib.sha256()
+        for line in self._transcript_lines():
+            size += len(line)
+            digest.update(line)
+        return size, digest.hexdigest()
+    
+    def _read_transcript(self, offset: int) -> Iterator[bytes]:
+        # Lines before the offset are regenerated and skipped; nothing is held in memory
+        position = 0
+        for line in self._transcript_lines():
+            end = position + len(line)
+            if end > offset:
+                yield line[max(0, offset - position):]
+            position = end
+    
+    @staticmethod
+    def _measure_file(path: str) -> Tuple[int, str]:
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(EXPORT_BLOCK_BYTES)
+                if not chunk:
+                    return size, digest.hexdigest()
+                digest.update(chunk)
+                size += len(chunk)
@@ -0,0 +1,245 @@
+"""
+Case Report
+Consolidated report across a suspect's chat sessions, rendered as parallel sections and merged into one PDF
+"""
+
+import heapq
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import chain
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from pypdf import PdfWriter
+from reportlab.platypus import Paragraph, Spacer, Table
+from reportlab.lib.styles import ParagraphStyle
+
+from src.models.user import db
+from src.models.chat import ChatSession, ChatMessage, Evidence, EvidenceLedgerEntry, LedgerBatch
+from src.services.report_renderer import (
+    styles, INFO_TABLE_STYLE, title_flowables, case_flowables, transcript_flowables,
+    evidence_flowables, render_flowables
+)
+from src.services.transcripts import iter_transcript
+
+CASE_REPORT_SCRIPT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))),
+    'scripts', 'render_case_report.py'
+)
+
+SESSION = 'session'
+TIMELINE = 'timeline'
+HASHES = 'hashes'
+
+TIMELINE_EXCERPT_CHARS = 200
+
+HASH_STYLE = ParagraphStyle('HashEntry', parent=styles['Code'], fontSize=7, leading=9, spaceAfter=6)
+
+# Flask app of a section worker process, created by _init_worker
+_worker_app = None
+
+
+def timeline_events(session_ids: Iterable[int]) -> Iterator[Tuple]:
+    """Session starts, flagged messages and captured evidence across sessions, oldest first.
+    
+    Each source is read in time order and the streams are merged lazily, so
+    the timeline never has to be held in memory. Yields
+    (time, session_id, kind, detail, threat_level).
+    """
+    sessions = ChatSession.query.filter(ChatSession.id.in_(list(session_ids))).all()
+    labels = {chat_session.id: chat_session.session_id for chat_session in sessions}
+    
+    started = sorted((chat_session.created_at, labels[chat_session.id], 'session_started',
+                      f'Session opened from {chat_session.user_ip}', 0) for chat_session in sessions)
+    
+    flagged = (
+        (message.timestamp, labels[message.session_id], 'message', message.message_content, message.threat_level)
+        for message in ChatMessage.query.filter(
+            ChatMessage.session_id.in_(labels),
+            ChatMessage.threat_level >= 1
+        ).order_by(ChatMessage.timestamp, ChatMessage.id).yield_per(500)
+    )
+    
+    captured = (
+        (evidence.created_at, labels[evidence.session_id], 'evidence',
+         f'{evidence.evidence_type} captured (sha256 {evidence.hash_value[:16]}...)', 0)
+        for evidence in Evidence.query.filter(
+            Evidence.session_id.in_(labels)
+        ).order_by(Evidence.created_at, Evidence.id).yield_per(500)
+    )
+    
+    return heapq.merge(started, flagged, captured, key=lambda event: event[0])
+
+
+def timeline_flowables(session_ids: List[int]) -> Iterator:
+    yield Paragraph("Events across all sessions in time order: sessions opened, messages the detector flagged "
+                    "and evidence captured.", styles['Normal'])
+    yield Spacer(1, 10)
+    for time, session_label, kind, detail, threat_level in timeline_events(session_ids):
+        text = detail if len(detail) <= TIMELINE_EXCERPT_CHARS else detail[:TIMELINE_EXCERPT_CHARS] + '...'
+        label = f'THREAT LEVEL {threat_level}' if kind == 'message' else kind.replace('_', ' ').upper()
+        yield Paragraph(
+            f"<b>{time.strftime('%Y-%m-%d %H:%M:%S UTC')}</b> [{escape(session_label)}] <b>{label}</b>: {escape(text)}",
+            styles['Normal']
+        )
+
+
+def hash_flowables(session_ids: List[int]) -> Iterator:
+    yield Paragraph("SHA-256 of every evidence item with its ledger entry hash and the Merkle root of the "
+                    "batch that sealed it.", styles['Normal'])
+    yield Spacer(1, 10)
+    rows = db.session.query(Evidence, ChatSession.session_id, EvidenceLedgerEntry, LedgerBatch.merkle_root).join(
+        ChatSession, Evidence.session_id == ChatSession.id
+    ).outerjoin(
+        EvidenceLedgerEntry, EvidenceLedgerEntry.evidence_id == Evidence.id
+    ).outerjoin(
+        LedgerBatch, LedgerBatch.id == EvidenceLedgerEntry.batch_id
+    ).filter(Evidence.session_id.in_(session_ids)).order_by(Evidence.session_id, Evidence.id).yield_per(500)
+    
+    for evidence, session_label, entry, merkle_root in rows:
+        yield Paragraph(
+            f"evidence {evidence.id} [{escape(session_label)}] {escape(evidence.evidence_type)}<br/>"
+            f"sha256       {evidence.hash_value}<br/>"
+            f"ledger entry {entry.entry_hash if entry else 'not in ledger'}<br/>"
+            f"batch root   {merkle_root or 'not yet sealed'}",
+            HASH_STYLE
+        )
+
+
+def render_section(kind: str, session_ids: List[int], output_path: str) -> Dict:
+    """Render one section of a case report to its own PDF (requires an app context)"""
+    if kind == SESSION:
+        chat_session = db.session.get(ChatSession, session_ids[0])
+        persona = chat_session.persona
+        title = f'Session {chat_session.session_id} ({persona.name}, {persona.platform_type.title()})'
+        evidence_list = Evidence.query.filter_by(session_id=chat_session.id).order_by(Evidence.id).yield_per(500)
+        flowables = chain(
+            title_flowables(title.upper()),
+            case_flowables(chat_session),
+            transcript_flowables(iter_transcript(chat_session.id), persona.name),
+            evidence_flowables(evidence_list)
+        )
+    elif kind == TIMELINE:
+        title = 'Case Timeline'
+        flowables = chain(title_flowables(title.upper()), timeline_flowables(session_ids))
+    elif kind == HASHES:
+        title = 'Hash Appendix'
+        flowables = chain(title_flowables(title.upper()), hash_flowables(session_ids))
+    else:
+        raise ValueError(f'Unknown case report section: {kind}')
+    
+    pages = render_flowables(output_path, flowables, invariant=True)
+    return {'kind': kind, 'title': title, 'path': output_path, 'pages': pages}
+
+
+def _init_worker(database_uri: str):
+    """Process-pool initializer: give the worker its own app and database connection"""
+    global _worker_app
+    from flask import Flask
+    
+    _worker_app = Flask(__name__)
+    _worker_app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    _worker_app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(_worker_app)
+
+
+def _render_section_job(kind: str, session_ids: List[int], output_path: str) -> Dict:
+    """Process-pool entry point"""
+    with _worker_app.app_context():
+        return render_section(kind, session_ids, output_path)
+
+
+def _plan_sections(session_ids: List[int]) -> List[Tuple[str, List[int], int]]:
+    """Sections in document order, each with a rough cost (rows it will lay out)"""
+    message_counts = dict(db.session.query(ChatMessage.session_id, db.func.count(ChatMessage.id)).filter(
+        ChatMessage.session_id.in_(session_ids)
+    ).group_by(ChatMessage.session_id).all())
+    flagged = ChatMessage.query.filter(ChatMessage.session_id.in_(session_ids), ChatMessage.threat_level >= 1).count()
+    evidence = Evidence.query.filter(Evidence.session_id.in_(session_ids)).count()
+    
+    sections = [(SESSION, [session_id], message_counts.get(session_id, 0)) for session_id in session_ids]
+    sections.append((TIMELINE, session_ids, flagged + evidence))
+    sections.append((HASHES, session_ids, evidence))
+    return sections
+
+
+def _index_flowables(sessions: List[ChatSession], sections: List[Dict], first_pages: List[int]) -> Iterator:
+    yield from title_flowables("CONSOLIDATED CASE REPORT")
+    
+    yield Paragraph("SESSIONS", styles['Heading2'])
+    session_rows = [['Session ID', 'Persona', 'Platform', 'Opened (UTC)', 'Escalation']]
+    for chat_session in sessions:
+        session_rows.append([
+            chat_session.session_id, chat_session.persona.name, chat_session.persona.platform_type.title(),
+            chat_session.created_at.strftime('%Y-%m-%d %H:%M'), f'Level {chat_session.escalation_level}'
+        ])
+    session_table = Table(session_rows, repeatRows=1)
+    session_table.setStyle(INFO_TABLE_STYLE)
+    yield session_table
+    yield Spacer(1, 20)
+    
+    yield Paragraph("INDEX", styles['Heading2'])
+    index_table = Table([[section['title'], str(page)] for section, page in zip(sections, first_pages)],
+                        colWidths=[5*72, 1*72], repeatRows=0)
+    index_table.setStyle(INFO_TABLE_STYLE)
+    yield index_table
+
+
+def render_case_report(session_ids: List[int], output_path: str, database_uri: str,
+                       workers: Optional[int] = None) -> Dict:
+    """Render a consolidated report for several sessions (requires an app context).
+    
+    Each session's transcript and evidence, the cross-session timeline and
+    the hash appendix are rendered by a pool of `workers` processes, largest
+    first, then merged behind an index page with one bookmark per section,
+    so the total time approaches that of the largest section.
+    """
+    sessions = ChatSession.query.filter(ChatSession.id.in_(session_ids)).order_by(ChatSession.created_at).all()
+    if len(sessions) != len(set(session_ids)):
+        raise ValueError('Unknown session in case')
+    session_ids = [chat_session.id for chat_session in sessions]
+    
+    plan = _plan_sections(session_ids)
+    workers = workers or min(len(plan), os.cpu_count() or 1)
+    
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output_path))) as workdir:
+        sections = [None] * len(plan)
+        # Spawned workers avoid forking a process that may be running other threads
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(database_uri,)) as pool:
+            futures = {}
+            for position in sorted(range(len(plan)), key=lambda i: plan[i][2], reverse=True):
+                kind, ids, _ = plan[position]
+                path = os.path.join(workdir, f'section-{position}.pdf')
+                futures[pool.submit(_render_section_job, kind, ids, path)] = position
+            for future in as_completed(futures):
+                sections[futures[future]] = future.result()
+        
+        # The index's own length shifts every section's first page; settle it first
+        index_path = os.path.join(workdir, 'index.pdf')
+        index_pages = 1
+        while True:
+            first_pages, page = [], index_pages + 1
+            for section in sections:
+                first_pages.append(page)
+                page += section['pages']
+            rendered = render_flowables(index_path, _index_flowables(sessions, sections, first_pages), invariant=True)
+            if rendered == index_pages:
+                break
+            index_pages = rendered
+        
+        writer = PdfWriter()
+        writer.append(index_path, outline_item='Index')
+        for section in sections:
+            writer.append(section['path'], outline_item=section['title'])
+        with open(output_path, 'wb') as f:
+            writer.write(f)
+    
+    return {
+        'sessions': len(sessions),
+        'pages': page - 1,
+        'sections': [{'title': section['title'], 'first_page': first} for section, first in zip(sections, first_pages)]
+    }
@@ -0,0 +1,203 @@
+"""
+Dashboard Counters
+In-memory dashboard statistics updated by chat events and pushed to admins as deltas
+"""
+
+import logging
+import os
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import Dict, List, Optional
+
+from src.services.alert_stream import ADMIN_ROOM
+from src.services.stats_buckets import daily_counts, SESSIONS_STARTED, HIGH_RISK_SESSIONS, EVIDENCE_CAPTURED
+
+# Seconds between reloads of the windowed counters from the stats buckets, which pick up
+# sessions and evidence written by the REST server
+RESEED_INTERVAL = float(os.environ.get('HONEYTRAP_DASHBOARD_RESEED_INTERVAL', 60))
+
+# Counters covering the dashboard's reporting window, bucketed by session creation day
+WINDOWED_COUNTERS = ('total_sessions', 'high_risk_sessions', 'evidence_count')
+
+# The stats bucket metric each windowed counter is seeded from
+BUCKET_METRICS = {
+    'total_sessions': SESSIONS_STARTED,
+    'high_risk_sessions': HIGH_RISK_SESSIONS,
+    'evidence_count': EVIDENCE_CAPTURED
+}
+
+
+class DashboardCounters:
+    """Incrementally maintained dashboard statistics.
+    
+    Chat, escalation and evidence events adjust the counters in O(1); changes
+    made within `flush_interval` seconds are pushed to the admin room as one
+    `dashboard_delta` carrying the new values of the changed counters, so the
+    cost of an update does not depend on how many officers are watching.
+    The delta also carries the latest row of each session that was opened,
+    escalated or had evidence captured in that interval, so dashboards
+    update their session lists without asking the REST server. Dashboards
+    load a full snapshot when they subscribe.
+    """
+    
+    def __init__(self, window_days: int = 30, flush_interval: float = 1.0, clock=datetime.utcnow):
+        self.window_days = window_days
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self.counters = {name: 0 for name in WINDOWED_COUNTERS}
+        self.counters.update({'active_sessions': 0, 'high_risk_active': 0, 'platforms': {}})
+        self.buckets = {name: {} for name in WINDOWED_COUNTERS}  # name -> day -> count
+        self.version = 0
+        self.dirty = set()
+        self.sessions = {}  # id -> latest ChatSession.to_dict() row not yet pushed
+        self.flush_scheduled = False
+        self.lock = Lock()
+        self.socketio = None
+    
+    def init_socketio(self, socketio):
+        """Attach the Socket.IO server that deltas are pushed through"""
+        self.socketio = socketio
+    
+    def seed(self):
+        """Load the windowed counters from the daily stats buckets (requires an app context).
+        
+        Called at startup and then every RESEED_INTERVAL seconds; counters the
+        reload changes are pushed to dashboards as a normal delta.
+        """
+        start_date = self._window_start()
+        loaded = {name: daily_counts(metric, start_date) for name, metric in BUCKET_METRICS.items()}
+        
+        with self.lock:
+            for name, buckets in loaded.items():
+                self.buckets[name] = buckets
+                total = sum(buckets.values())
+                if total != self.counters[name]:
+                    self.counters[name] = total
+                    self.dirty.add(name)
+        self._schedule_flush()
+    
+    def session_started(self, platform_type: str, created_at: datetime, session: Optional[Dict] = None):
+        """A chat session was opened"""
+        with self.lock:
+            self._add_windowed('total_sessions', created_at)
+            self._add('active_sessions', 1)
+            self._add_platform(platform_type, 1)
+            self._add_session(session)
+        self._schedule_flush()
+    
+    def session_ended(self, platform_type: str, high_risk: bool):
+        """A chat session's connection went away"""
+        with self.lock:
+            self._add('active_sessions', -1)
+            self._add_platform(platform_type, -1)
+            if high_risk:
+                self._add('high_risk_active', -1)
+        self._schedule_flush()
+    
+    def session_escalated(self, created_at: datetime, active: bool = True, session: Optional[Dict] = None):
+        """A chat session reached a high-risk threat level for the first time"""
+        with self.lock:
+            self._add_windowed('high_risk_sessions', created_at)
+            if active:
+                self._add('high_risk_active', 1)
+            self._add_session(session)
+        self._schedule_flush()
+    
+    def session_changed(self, session: Dict):
+        """A chat session's row changed without moving any counter (e.g. a further escalation)"""
+        with self.lock:
+            self._add_session(session)
+        self._schedule_flush()
+    
+    def evidence_captured(self, session_created_at: datetime, session: Optional[Dict] = None):
+        """Evidence was stored for a chat session"""
+        with self.lock:
+            self._add_windowed('evidence_count', session_created_at)
+            self._add_session(session)
+        self._schedule_flush()
+    
+    def snapshot(self) -> Dict:
+        """Get every counter together with the version of the last delta it includes"""
+        with self.lock:
+            self._expire()
+            counters = dict(self.counters)
+            counters['platforms'] = dict(counters['platforms'])
+            return {'version': self.version, 'counters': counters}
+    
+    def flush(self) -> Optional[Dict]:
+        """Push the counters changed since the last flush as one delta"""
+        with self.lock:
+            self.flush_scheduled = False
+            self._expire()
+            if not self.dirty and not self.sessions:
+                return None
+            
+            self.version += 1
+            changes = {name: self.counters[name] for name in self.dirty}
+            if 'platforms' in changes:
+                changes['platforms'] = dict(changes['platforms'])
+            sessions: List[Dict] = list(self.sessions.values())
+            self.dirty.clear()
+            self.sessions = {}
+            delta = {'version': self.version, 'changes': changes, 'sessions': sessions}
+        
+        self.socketio.emit('dashboard_delta', delta, to=ADMIN_ROOM)
+        return delta
+    
+    def _flush_after_interval(self):
+        """Wait for the flush interval to close, then push the delta"""
+        self.socketio.sleep(self.flush_interval)
+        try:
+            self.flush()
+        except Exception as e:
+            logging.error(f"Error pushing dashboard counters: {str(e)}")
+    
+    def _schedule_flush(self):
+        with self.lock:
+            if self.flush_scheduled or not (self.dirty or self.sessions) or self.socketio is None:
+                return
+            self.flush_scheduled = True
+        
+        self.socketio.start_background_task(self._flush_after_interval)
+    
+    def _add_session(self, session: Optional[Dict]):
+        if session is not None:
+            self.sessions[session['id']] = session
+    
+    def _add(self, name: str, value: int):
+        self.counters[name] = max(0, self.counters[name] + value)
+        self.dirty.add(name)
+    
+    def _add_platform(self, platform_type: str, value: int):
+        platforms = self.counters['platforms']
+        count = platforms.get(platform_type, 0) + value
+        if count > 0:
+            platforms[platform_type] = count
+        else:
+            platforms.pop(platform_type, None)
+        self.dirty.add('platforms')
+    
+    def _add_windowed(self, name: str, created_at: datetime):
+        day = created_at.date()
+        if day < self._window_start().date():
+            return
+        buckets = self.buckets[name]
+        buckets[day] = buckets.get(day, 0) + 1
+        self.counters[name] += 1
+        self.dirty.add(name)
+    
+    def _expire(self):
+        """Drop day buckets that have left the reporting window"""
+        first_day = self._window_start().date()
+        for name, buckets in self.buckets.items():
+            # At most window_days + 1 buckets, so a scan is cheap
+            for day in [day for day in buckets if day < first_day]:
+                self.counters[name] -= buckets.pop(day)
+                self.dirty.add(name)
+    
+    def _window_start(self) -> datetime:
+        return self.clock() - timedelta(days=self.window_days)
+
+
+# Global dashboard counters
+dashboard_counters = DashboardCounters()
@@ -1,6 +1,6 @@
 import os
+import calendar
 import json
-import sqlite3
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from collections import defaultdict, Counter
@@ -8,12 +8,40 @@ import logging
 from src.models.user import db
 from src.models.profile import DecoyProfile, ProfileContent, ProfileAnalytics
 from src.models.chat import ChatSession, ChatMessage, Evidence
+from src.services import analytics_rollups, analytics_schema
+from src.services.analytics_db import analytics_database
+from src.services.query_cache import query_cache, DISCOVERY, THREATS
+
+DISCOVERY_EVENT_INSERT = '''
+    INSERT INTO discovery_events 
+    (profile_id, platform_type, discovery_method, user_ip, user_agent, 
+     referrer, session_id, geolocation, device_info, discovery_time)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+ENGAGEMENT_EVENT_INSERT = '''
+    INSERT INTO engagement_events 
+    (profile_id, session_id, event_type, event_data, threat_level, escalation_indicators, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+ENGAGEMENT_INDICATOR_INSERT = '''
+    INSERT OR IGNORE INTO engagement_indicators (engagement_id, indicator)
+    VALUES (?, ?)
+'''
+
+
+def utc_timestamp(moment: Optional[datetime] = None) -> str:
+    """A time as the analytics tables store it ('YYYY-MM-DD HH:MM:SS', UTC, like CURRENT_TIMESTAMP)"""
+    return (moment or datetime.utcnow()).strftime('%Y-%m-%d %H:%M:%S')
+
 
 class DiscoveryAnalyticsService:
     """Advanced analytics service for tracking profile discovery and threat behavior"""
     
-    def __init__(self):
-        self.analytics_db_path = os.path.join(os.path.dirname(__file__), '..', 'database', 'analytics.db')
+    def __init__(self, analytics_db_path: Optional[str] = None):
+        self.analytics_db_path = analytics_db_path or os.path.join(os.path.dirname(__file__), '..', 'database', 'analytics.db')
+        self.db = analytics_database(self.analytics_db_path)
         self._initialize_analytics_db()
         
         # Discovery tracking categories
@@ -72,132 +100,40 @@ class DiscoveryAnalyticsService:
         """Initialize analytics database with required tables"""
         
         try:
-            conn = sqlite3.connect(self.analytics_db_path)
-            cursor = conn.cursor()
-            
-            # Discovery events table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS discovery_events (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    profile_id INTEGER NOT NULL,
-                    platform_type TEXT NOT NULL,
-                    discovery_method TEXT,
-                    discovery_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    user_ip TEXT,
-                    user_agent TEXT,
-                    referrer TEXT,
-                    session_id TEXT,
-                    geolocation TEXT,
-                    device_info TEXT,
-                    FOREIGN KEY (profile_id) REFERENCES decoy_profiles (id)
-                )
-            ''')
-            
-            # Engagement tracking table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS engagement_events (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    profile_id INTEGER NOT NULL,
-                    session_id TEXT,
-                    event_type TEXT NOT NULL,
-                    event_data TEXT,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    threat_level INTEGER DEFAULT 0,
-                    escalation_indicators TEXT,
-                    FOREIGN KEY (profile_id) REFERENCES decoy_profiles (id)
-                )
-            ''')
-            
-            # Threat behavior analysis table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS threat_analysis (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    session_id TEXT NOT NULL,
-                    profile_id INTEGER NOT NULL,
-                    threat_indicators TEXT,
-                    risk_score REAL DEFAULT 0.0,
-                    behavior_patterns TEXT,
-                    escalation_timeline TEXT,
-                    evidence_collected TEXT,
-                    analysis_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (profile_id) REFERENCES decoy_profiles (id)
-                )
-            ''')
-            
-            # Platform performance metrics table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS platform_metrics (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    platform_type TEXT NOT NULL,
-                    metric_date DATE NOT NULL,
-                    profile_views INTEGER DEFAULT 0,
-                    contact_attempts INTEGER DEFAULT 0,
-                    successful_engagements INTEGER DEFAULT 0,
-                    threat_detections INTEGER DEFAULT 0,
-                    evidence_captured INTEGER DEFAULT 0,
-                    average_discovery_time REAL DEFAULT 0.0,
-                    PRIMARY KEY (platform_type, metric_date)
-                )
-            ''')
-            
-            # Geographic analysis table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS geographic_analysis (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    region TEXT NOT NULL,
-                    country TEXT,
-                    city TEXT,
-                    threat_count INTEGER DEFAULT 0,
-                    profile_discoveries INTEGER DEFAULT 0,
-                    risk_level TEXT DEFAULT 'low',
-                    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            conn.commit()
-            conn.close()
+            with self.db.connection() as conn:
+                analytics_schema.migrate(conn)
             
             logging.info("Analytics database initialized successfully")
             
         except Exception as e:
             logging.error(f"Error initializing analytics database: {str(e)}")
+        
+        try:
+            with self.db.transaction() as cursor:
+                if analytics_rollups.backfill(cursor):
+                    logging.info("Analytics rollups built from stored events")
+        except Exception as e:
+            logging.error(f"Error building analytics rollups: {str(e)}")
 
     def track_profile_discovery(self, profile_id: int, discovery_data: Dict) -> Dict:
         """Track when and how a profile is discovered"""
         
         try:
-            conn = sqlite3.connect(self.analytics_db_path)
-            cursor = conn.cursor()
-            
-            # Extract discovery information
-            platform_type = discovery_data.get('platform_type')
-            discovery_method = discovery_data.get('discovery_method', 'unknown')
-            user_ip = discovery_data.get('user_ip')
-            user_agent = discovery_data.get('user_agent')
-            referrer = discovery_data.get('referrer')
-            session_id = discovery_data.get('session_id')
-            geolocation = json.dumps(discovery_data.get('geolocation', {}))
-            device_info = json.dumps(discovery_data.get('device_info', {}))
-            
-            # Insert discovery event
-            cursor.execute('''
-                INSERT INTO discovery_events 
-                (profile_id, platform_type, discovery_method, user_ip, user_agent, 
-                 referrer, session_id, geolocation, device_info)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (profile_id, platform_type, discovery_method, user_ip, user_agent,
-                  referrer, session_id, geolocation, device_info))
+            row = self._discovery_row(profile_id, discovery_data, utc_timestamp())
             
-            discovery_id = cursor.lastrowid
+            with self.db.transaction() as cursor:
+                # Insert discovery event
+                cursor.execute(DISCOVERY_EVENT_INSERT, row)
             
-            # Update profile analytics
-            self._update_profile_discovery_stats(cursor, profile_id, discovery_method)
+                discovery_id = cursor.lastrowid
+                analytics_rollups.record_discoveries(cursor, [row])
             
-            # Update platform metrics
-            self._update_platform_discovery_metrics(cursor, platform_type)
+                # Update profile analytics
+                self._update_profile_discovery_stats(cursor, profile_id, discovery_data.get('discovery_method', 'unknown'))
             
-            conn.commit()
-            conn.close()
+                # Update platform metrics
+                self._update_platform_discovery_metrics(cursor, discovery_data.get('platform_type'))
+            query_cache.invalidate(DISCOVERY)
             
             # Analyze discovery pattern
             discovery_analysis = self._analyze_discovery_pattern(profile_id, discovery_data)
@@ -219,32 +155,24 @@ class DiscoveryAnalyticsService:
         """Track engagement events and analyze threat indicators"""
         
         try:
-            conn = sqlite3.connect(self.analytics_db_path)
-            cursor = conn.cursor()
-            
-            event_type = event_data.get('event_type')
-            event_details = json.dumps(event_data.get('event_details', {}))
-            
             # Analyze threat indicators
             threat_analysis = self._analyze_threat_indicators(event_data)
             threat_level = threat_analysis['threat_level']
-            escalation_indicators = json.dumps(threat_analysis['indicators'])
             
-            # Insert engagement event
-            cursor.execute('''
-                INSERT INTO engagement_events 
-                (profile_id, session_id, event_type, event_data, threat_level, escalation_indicators)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (profile_id, session_id, event_type, event_details, threat_level, escalation_indicators))
+            row = self._engagement_row(profile_id, session_id, event_data, threat_analysis, utc_timestamp())
             
-            engagement_id = cursor.lastrowid
+            with self.db.transaction() as cursor:
+                # Insert engagement event
+                cursor.execute(ENGAGEMENT_EVENT_INSERT, row)
             
-            # Update threat analysis if significant
-            if threat_level >= 2:
-                self._update_threat_analysis(cursor, session_id, profile_id, threat_analysis)
+                engagement_id = cursor.lastrowid
+                self._record_engagement_indicators(cursor, engagement_id, [row])
+                analytics_rollups.record_engagements(cursor, [row])
             
-            conn.commit()
-            conn.close()
+                # Update threat analysis if significant
+                if threat_level >= 2:
+                    self._update_threat_analysis(cursor, session_id, profile_id, threat_analysis)
+            query_cache.invalidate(THREATS)
             
             return {
                 'success': True,
@@ -259,6 +187,95 @@ class DiscoveryAnalyticsService:
                 'error': str(e)
             }
 
+    def assess_engagement_event(self, event_data: Dict) -> Dict:
+        """Threat analysis of an engagement event, as track_engagement_event would record it"""
+        return self._analyze_threat_indicators(event_data)
+    
+    def record_event_batch(self, discoveries: List[Tuple[int, Dict, str]],
+                           engagements: List[Tuple[int, str, Dict, Dict, str]]):
+        """Write a batch of discovery and engagement events in one transaction.
+        
+        Discoveries are (profile_id, discovery_data, timestamp) and engagements
+        (profile_id, session_id, event_data, threat_analysis, timestamp), with
+        timestamps from utc_timestamp(). Events are inserted with executemany
+        and each profile, platform and session's aggregates are updated once
+        per batch, ending as they would after tracking the events one by one.
+        Raises on failure, leaving nothing written.
+        """
+        profile_views = Counter((profile_id, data.get('discovery_method', 'unknown'))
+                                for profile_id, data, _ in discoveries)
+        platform_views = Counter(data.get('platform_type') for _, data, _ in discoveries)
+        
+        # Each significant event replaces its session's analysis, so only the last one counts
+        session_analyses = {}
+        for profile_id, session_id, _, threat_analysis, _ in engagements:
+            if threat_analysis['threat_level'] >= 2:
+                session_analyses[session_id] = (profile_id, threat_analysis)
+        
+        discovery_rows = [self._discovery_row(*discovery) for discovery in discoveries]
+        engagement_rows = [self._engagement_row(*engagement) for engagement in engagements]
+        
+        with self.db.transaction() as cursor:
+            if discoveries:
+                cursor.executemany(DISCOVERY_EVENT_INSERT, discovery_rows)
+                analytics_rollups.record_discoveries(cursor, discovery_rows)
+                for (profile_id, discovery_method), views in profile_views.items():
+                    self._update_profile_discovery_stats(cursor, profile_id, discovery_method, views)
+                for platform_type, views in platform_views.items():
+                    self._update_platform_discovery_metrics(cursor, platform_type, views)
+            
+            if engagements:
+                cursor.executemany(ENGAGEMENT_EVENT_INSERT, engagement_rows)
+                last_engagement_id = cursor.execute('SELECT last_insert_rowid()').fetchone()[0]
+                self._record_engagement_indicators(cursor, last_engagement_id, engagement_rows)
+                analytics_rollups.record_engagements(cursor, engagement_rows)
+                for session_id, (profile_id, threat_analysis) in session_analyses.items():
+                    self._update_threat_analysis(cursor, session_id, profile_id, threat_analysis)
+        
+        if discoveries:
+            query_cache.invalidate(DISCOVERY)
+        if engagements:
+            query_cache.invalidate(THREATS)
+    
+    def _discovery_row(self, profile_id: int, discovery_data: Dict, timestamp: str) -> Tuple:
+        return (
+            profile_id,
+            discovery_data.get('platform_type'),
+            discovery_data.get('discovery_method', 'unknown'),
+            discovery_data.get('user_ip'),
+            discovery_data.get('user_agent'),
+            discovery_data.get('referrer'),
+            discovery_data.get('session_id'),
+            json.dumps(discovery_data.get('geolocation', {})),
+            json.dumps(discovery_data.get('device_info', {})),
+            timestamp
+        )
+    
+    def _engagement_row(self, profile_id: int, session_id: str, event_data: Dict, threat_analysis: Dict,
+                        timestamp: str) -> Tuple:
+        return (
+            profile_id,
+            session_id,
+            event_data.get('event_type'),
+            json.dumps(event_data.get('event_details', {})),
+            threat_analysis['threat_level'],
+            json.dumps(threat_analysis['indicators']),
+            timestamp
+        )
+    
+    def _record_engagement_indicators(self, cursor, last_engagement_id: int, engagement_rows: List[Tuple]):
+        """Store the indicators of engagement rows just inserted, the last with id `last_engagement_id`.
+        
+        The transaction holds the write lock and the table autoincrements, so
+        the rows have consecutive ids.
+        """
+        first_engagement_id = last_engagement_id - len(engagement_rows) + 1
+        cursor.executemany(ENGAGEMENT_INDICATOR_INSERT, [
+            (first_engagement_id + offset, indicator)
+            for offset, row in enumerate(engagement_rows)
+            for indicator in json.loads(row[5])
+        ])
+    
     def _analyze_discovery_pattern(self, profile_id: int, discovery_data: Dict) -> Dict:
         """Analyze discovery patterns for insights"""
         
@@ -440,51 +457,34 @@ class DiscoveryAnalyticsService:
         
         return actions
 
-    def _update_profile_discovery_stats(self, cursor, profile_id: int, discovery_method: str):
+    def _update_profile_discovery_stats(self, cursor, profile_id: int, discovery_method: str, views: int = 1):
         """Update profile discovery statistics"""
         
         try:
-            # Get or create profile analytics record
             cursor.execute('''
-                SELECT id FROM profile_analytics WHERE profile_id = ?
-            ''', (profile_id,))
-            
-            result = cursor.fetchone()
-            
-            if result:
-                # Update existing record
-                cursor.execute('''
-                    UPDATE profile_analytics 
-                    SET total_views = total_views + 1,
-                        last_viewed = CURRENT_TIMESTAMP
-                    WHERE profile_id = ?
-                ''', (profile_id,))
-            else:
-                # Create new record
-                cursor.execute('''
-                    INSERT INTO profile_analytics 
-                    (profile_id, total_views, last_viewed)
-                    VALUES (?, 1, CURRENT_TIMESTAMP)
-                ''', (profile_id,))
+                INSERT INTO profile_discovery_stats (profile_id, total_views, last_viewed)
+                VALUES (?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (profile_id) DO UPDATE SET
+                    total_views = total_views + excluded.total_views,
+                    last_viewed = excluded.last_viewed
+            ''', (profile_id, views))
             
         except Exception as e:
             logging.error(f"Error updating profile discovery stats: {str(e)}")
 
-    def _update_platform_discovery_metrics(self, cursor, platform_type: str):
+    def _update_platform_discovery_metrics(self, cursor, platform_type: str, views: int = 1):
         """Update platform-level discovery metrics"""
         
         try:
-            today = datetime.now().date()
+            today = datetime.utcnow().date().isoformat()
             
             # Update or insert platform metrics for today
             cursor.execute('''
-                INSERT OR REPLACE INTO platform_metrics 
-                (platform_type, metric_date, profile_views)
-                VALUES (?, ?, COALESCE((
-                    SELECT profile_views FROM platform_metrics 
-                    WHERE platform_type = ? AND metric_date = ?
-                ), 0) + 1)
-            ''', (platform_type, today, platform_type, today))
+                INSERT INTO platform_metrics (platform_type, metric_date, profile_views)
+                VALUES (?, ?, ?)
+                ON CONFLICT (metric_date, platform_type) DO UPDATE SET
+                    profile_views = profile_views + excluded.profile_views
+            ''', (platform_type, today, views))
             
         except Exception as e:
             logging.error(f"Error updating platform discovery metrics: {str(e)}")
@@ -564,90 +564,102 @@ class DiscoveryAnalyticsService:
         return recommendations
 
     def get_discovery_analytics(self, profile_id: Optional[int] = None, days: int = 30) -> Dict:
-        """Get comprehensive discovery analytics"""
+        """Get comprehensive discovery analytics, from the hour `days` ago, read from the rollups"""
         
         try:
-            conn = sqlite3.connect(self.analytics_db_path)
-            cursor = conn.cursor()
-            
-            # Date range
-            start_date = datetime.now() - timedelta(days=days)
-            
-            # Base query conditions
-            where_conditions = ['discovery_time >= ?']
-            params = [start_date]
-            
+            now = datetime.utcnow()
+            ranges = analytics_rollups.window_ranges(now - timedelta(days=days), now)
+            window, params = analytics_rollups.window_clause(ranges)
+            hour_window, hour_params = analytics_rollups.window_clause(ranges, (analytics_rollups.HOUR,))
+            day_window, day_params = analytics_rollups.window_clause(ranges, (analytics_rollups.DAY,),
+                                                                     by_granularity=False)
+            
+            # Optional profile filter
+            profile_clause = ''
+            profile_params = []
             if profile_id:
-                where_conditions.append('profile_id = ?')
-                params.append(profile_id)
-            
-            where_clause = ' AND '.join(where_conditions)
-            
-            # Get discovery events
-            cursor.execute(f'''
-                SELECT platform_type, discovery_method, COUNT(*) as count,
-                       AVG(julianday('now') - julianday(discovery_time)) * 24 as avg_hours_ago
-                FROM discovery_events 
-                WHERE {where_clause}
-                GROUP BY platform_type, discovery_method
-                ORDER BY count DESC
-            ''', params)
-            
-            discovery_breakdown = cursor.fetchall()
-            
-            # Get hourly distribution
-            cursor.execute(f'''
-                SELECT strftime('%H', discovery_time) as hour, COUNT(*) as count
-                FROM discovery_events 
-                WHERE {where_clause}
-                GROUP BY hour
-                ORDER BY hour
-            ''', params)
-            
-            hourly_distribution = cursor.fetchall()
-            
-            # Get geographic distribution
-            cursor.execute(f'''
-                SELECT geolocation, COUNT(*) as count
-                FROM discovery_events 
-                WHERE {where_clause} AND geolocation != '{{}}'
-                GROUP BY geolocation
-                ORDER BY count DESC
-                LIMIT 10
-            ''', params)
-            
-            geographic_data = cursor.fetchall()
-            
-            # Get total statistics
-            cursor.execute(f'''
-                SELECT COUNT(*) as total_discoveries,
-                       COUNT(DISTINCT profile_id) as unique_profiles,
-                       COUNT(DISTINCT session_id) as unique_sessions
-                FROM discovery_events 
-                WHERE {where_clause}
-            ''', params)
-            
-            total_stats = cursor.fetchone()
-            
-            conn.close()
+                profile_clause = ' AND profile_id = ?'
+                profile_params = [profile_id]
+            
+            with self.db.snapshot() as cursor:
+                # Get discovery breakdown
+                cursor.execute(f'''
+                    SELECT platform_type, discovery_method, SUM(discoveries) as count,
+                           SUM(discovery_epoch_sum) as epoch_sum
+                    FROM discovery_rollups 
+                    WHERE {window}{profile_clause}
+                    GROUP BY platform_type, discovery_method
+                    ORDER BY count DESC
+                ''', params + profile_params)
+            
+                discovery_breakdown = cursor.fetchall()
+            
+                # Get hourly distribution; whole days keep it per hour of day
+                cursor.execute(f'''
+                    SELECT hour, SUM(discoveries) as count FROM (
+                        SELECT hour_of_day as hour, discoveries
+                        FROM discovery_hour_rollups 
+                        WHERE {day_window}{profile_clause}
+                        UNION ALL
+                        SELECT CAST(strftime('%H', bucket_start) AS INTEGER), discoveries
+                        FROM discovery_rollups 
+                        WHERE {hour_window}{profile_clause}
+                    )
+                    GROUP BY hour
+                    ORDER BY hour
+                ''', day_params + profile_params + hour_params + profile_params)
+            
+                hourly_distribution = cursor.fetchall()
+            
+                # Get geographic distribution
+                cursor.execute(f'''
+                    SELECT geolocation, SUM(discoveries) as count
+                    FROM discovery_rollups 
+                    WHERE {window}{profile_clause} AND geolocation != '{{}}'
+                    GROUP BY geolocation
+                    ORDER BY count DESC
+                    LIMIT 10
+                ''', params + profile_params)
+            
+                geographic_data = cursor.fetchall()
+            
+                # Get total statistics
+                cursor.execute(f'''
+                    SELECT SUM(discoveries) as total_discoveries,
+                           COUNT(DISTINCT profile_id) as unique_profiles
+                    FROM discovery_rollups 
+                    WHERE {window}{profile_clause}
+                ''', params + profile_params)
+            
+                total_stats = cursor.fetchone()
+            
+                cursor.execute(f'''
+                    SELECT COUNT(DISTINCT session_id)
+                    FROM discovery_sessions 
+                    WHERE last_seen >= ?{profile_clause}
+                ''', [ranges[0][1]] + profile_params)
+            
+                unique_sessions = cursor.fetchone()[0]
+            
+            now_epoch = calendar.timegm(now.timetuple())
             
             return {
                 'period': f'{days} days',
-                'total_discoveries': total_stats[0] if total_stats else 0,
-                'unique_profiles': total_stats[1] if total_stats else 0,
-                'unique_sessions': total_stats[2] if total_stats else 0,
+                'total_discoveries': total_stats[0] or 0,
+                'unique_profiles': total_stats[1],
+                'unique_sessions': unique_sessions,
                 'discovery_breakdown': [
                     {
                         'platform': row[0],
                         'method': row[1],
                         'count': row[2],
-                        'avg_hours_ago': round(row[3], 2) if row[3] else 0
+                        'avg_hours_ago': round((now_epoch - row[3] / row[2]) / 3600, 2)
                     }
                     for row in discovery_breakdown
                 ],
                 'hourly_distribution': [
                     {
-                        'hour': int(row[0]),
+                        'hour': row[0],
                         'count': row[1]
                     }
                     for row in hourly_distribution
@@ -668,81 +680,82 @@ class DiscoveryAnalyticsService:
             }
 
     def get_threat_analytics(self, days: int = 30) -> Dict:
-        """Get comprehensive threat analytics"""
+        """Get comprehensive threat analytics, from the hour `days` ago, read from the rollups"""
         
         try:
-            conn = sqlite3.connect(self.analytics_db_path)
-            cursor = conn.cursor()
-            
-            start_date = datetime.now() - timedelta(days=days)
-            
-            # Get threat level distribution
-            cursor.execute('''
-                SELECT threat_level, COUNT(*) as count
-                FROM engagement_events 
-                WHERE timestamp >= ?
-                GROUP BY threat_level
-                ORDER BY threat_level
-            ''', (start_date,))
-            
-            threat_levels = cursor.fetchall()
-            
-            # Get threat indicators frequency
-            cursor.execute('''
-                SELECT escalation_indicators, COUNT(*) as count
-                FROM engagement_events 
-                WHERE timestamp >= ? AND escalation_indicators != '[]'
-                GROUP BY escalation_indicators
-                ORDER BY count DESC
-                LIMIT 10
-            ''', (start_date,))
-            
-            indicator_frequency = cursor.fetchall()
-            
-            # Get high-risk sessions
-            cursor.execute('''
-                SELECT session_id, profile_id, risk_score, threat_indicators, analysis_timestamp
-                FROM threat_analysis 
-                WHERE analysis_timestamp >= ? AND risk_score >= 60
-                ORDER BY risk_score DESC
-                LIMIT 20
-            ''', (start_date,))
-            
-            high_risk_sessions = cursor.fetchall()
-            
-            # Get platform threat distribution
-            cursor.execute('''
-                SELECT p.platform_type, AVG(e.threat_level) as avg_threat_level, 
-                       COUNT(*) as total_events, 
-                       SUM(CASE WHEN e.threat_level >= 3 THEN 1 ELSE 0 END) as high_threat_events
-                FROM engagement_events e
-                JOIN decoy_profiles p ON e.profile_id = p.id
-                WHERE e.timestamp >= ?
-                GROUP BY p.platform_type
-                ORDER BY avg_threat_level DESC
-            ''', (start_date,))
-            
-            platform_threats = cursor.fetchall()
-            
-            conn.close()
-            
-            # Process indicator frequency
-            processed_indicators = []
-            for row in indicator_frequency:
-                try:
-                    indicators = json.loads(row[0])
-                    for indicator in indicators:
-                        processed_indicators.append({
-                            'indicator': indicator,
-                            'count': row[1]
-                        })
-                except:
-                    continue
-            
-            # Aggregate indicator counts
-            indicator_counts = Counter()
-            for item in processed_indicators:
-                indicator_counts[item['indicator']] += item['count']
+            now = datetime.utcnow()
+            ranges = analytics_rollups.window_ranges(now - timedelta(days=days), now)
+            window, params = analytics_rollups.window_clause(ranges)
+            
+            with self.db.snapshot() as cursor:
+                # Get threat level distribution
+                cursor.execute(f'''
+                    SELECT threat_level, SUM(events) as count
+                    FROM engagement_rollups 
+                    WHERE {window}
+                    GROUP BY threat_level
+                    ORDER BY threat_level
+                ''', params)
+            
+                threat_levels = cursor.fetchall()
+            
+                # Get threat indicator frequencies (pairs of an indicator with itself) and co-occurrences
+                cursor.execute(f'''
+                    SELECT profile_id, indicator, co_indicator, SUM(events) as count
+                    FROM indicator_rollups 
+                    WHERE {window}
+                    GROUP BY profile_id, indicator, co_indicator
+                ''', params)
+            
+                indicator_pairs = cursor.fetchall()
+            
+                # Get high-risk sessions
+                cursor.execute('''
+                    SELECT session_id, profile_id, risk_score, threat_indicators, analysis_timestamp
+                    FROM threat_analysis 
+                    WHERE analysis_timestamp >= ? AND risk_score >= 60
+                    ORDER BY risk_score DESC
+                    LIMIT 20
+                ''', (ranges[0][1],))
+            
+                high_risk_sessions = cursor.fetchall()
+            
+                # Get per-profile threat totals, combined by platform below
+                cursor.execute(f'''
+                    SELECT profile_id, SUM(events) as total_events,
+                           SUM(threat_level * events) as threat_level_sum,
+                           SUM(CASE WHEN threat_level >= 3 THEN events ELSE 0 END) as high_threat_events
+                    FROM engagement_rollups 
+                    WHERE {window}
+                    GROUP BY profile_id
+                ''', params)
+            
+                profile_threats = cursor.fetchall()
+            
+            # Platforms live in the application database, not beside the analytics tables
+            platforms = self._profile_platforms([row[0] for row in profile_threats])
+            
+            # Combine indicator counts overall and by platform
+            indicator_counts, co_occurrences = Counter(), Counter()
+            platform_indicators = defaultdict(Counter)
+            for profile_id, indicator, co_indicator, count in indicator_pairs:
+                if indicator == co_indicator:
+                    indicator_counts[indicator] += count
+                    platform_indicators[platforms.get(profile_id, 'unknown')][indicator] += count
+                else:
+                    co_occurrences[(indicator, co_indicator)] += count
+            platform_totals = defaultdict(lambda: [0, 0, 0])
+            for profile_id, total_events, threat_level_sum, high_threat_events in profile_threats:
+                totals = platform_totals[platforms.get(profile_id, 'unknown')]
+                totals[0] += total_events
+                totals[1] += threat_level_sum
+                totals[2] += high_threat_events
+            
+            platform_threats = sorted(
+                ((platform, level_sum / events, events, high) for platform, (events, level_sum, high)
+                 in platform_totals.items()),
+                key=lambda row: row[1], reverse=True
+            )
             
             return {
                 'period': f'{days} days',
@@ -761,6 +774,13 @@ class DiscoveryAnalyticsService:
                     }
                     for indicator, count in indicator_counts.most_common(10)
                 ],
+                'indicator_co_occurrence': [
+                    {
+                        'indicators': list(pair),
+                        'count': count
+                    }
+                    for pair, count in co_occurrences.most_common(10)
+                ],
                 'high_risk_sessions': [
                     {
                         'session_id': row[0],
@@ -777,7 +797,11 @@ class DiscoveryAnalyticsService:
                         'avg_threat_level': round(row[1], 2),
                         'total_events': row[2],
                         'high_threat_events': row[3],
-                        'threat_rate': round((row[3] / row[2]) * 100, 1) if row[2] > 0 else 0
+                        'threat_rate': round((row[3] / row[2]) * 100, 1) if row[2] > 0 else 0,
+                        'top_indicators': [
+                            {'indicator': indicator, 'count': count}
+                            for indicator, count in platform_indicators[row[0]].most_common(5)
+                        ]
                     }
                     for row in platform_threats
                 ]
@@ -789,31 +813,38 @@ class DiscoveryAnalyticsService:
                 'period': f'{days} days'
             }
 
+    def _profile_platforms(self, profile_ids: List[int]) -> Dict[int, str]:
+        """Platform of each decoy profile, from the application database (requires an app context)"""
+        if not profile_ids:
+            return {}
+        return dict(db.session.query(DecoyProfile.id, DecoyProfile.platform_type).filter(
+            DecoyProfile.id.in_(profile_ids)
+        ).all())
+    
     def get_platform_performance_metrics(self, days: int = 30) -> Dict:
         """Get platform performance metrics"""
         
         try:
-            conn = sqlite3.connect(self.analytics_db_path)
-            cursor = conn.cursor()
+            # Metric dates are UTC days
+            start_date = (datetime.utcnow() - timedelta(days=days)).date().isoformat()
             
-            start_date = datetime.now() - timedelta(days=days)
-            
-            # Get platform metrics
-            cursor.execute('''
-                SELECT platform_type,
-                       SUM(profile_views) as total_views,
-                       SUM(contact_attempts) as total_contacts,
-                       SUM(successful_engagements) as total_engagements,
-                       SUM(threat_detections) as total_threats,
-                       SUM(evidence_captured) as total_evidence,
-                       AVG(average_discovery_time) as avg_discovery_time
-                FROM platform_metrics 
-                WHERE metric_date >= ?
-                GROUP BY platform_type
-                ORDER BY total_views DESC
-            ''', (start_date,))
-            
-            platform_metrics = cursor.fetchall()
+            with self.db.snapshot() as cursor:
+                # Get platform metrics
+                cursor.execute('''
+                    SELECT platform_type,
+                           SUM(profile_views) as total_views,
+                           SUM(contact_attempts) as total_contacts,
+                           SUM(successful_engagements) as total_engagements,
+                           SUM(threat_detections) as total_threats,
+                           SUM(evidence_captured) as total_evidence,
+                           AVG(average_discovery_time) as avg_discovery_time
+                    FROM platform_metrics 
+                    WHERE metric_date >= ?
+                    GROUP BY platform_type
+                    ORDER BY total_views DESC
+                ''', (start_date,))
+                
+                platform_metrics = cursor.fetchall()
             
             # Calculate effectiveness scores
             processed_metrics = []
@@ -850,8 +881,6 @@ class DiscoveryAnalyticsService:
                     'avg_discovery_time': round(row[6], 2) if row[6] else 0
                 })
             
-            conn.close()
-            
             return {
                 'period': f'{days} days',
                 'platform_metrics': processed_metrics,
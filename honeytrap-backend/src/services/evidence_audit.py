@@ -0,0 +1,258 @@
+"""
+Evidence Audit
+Streaming, parallel integrity audit of every evidence record and file, with a signed summary
+"""
+
+import hashlib
+import json
+import mmap
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from threading import Lock, Thread
+from typing import Callable, Dict, Optional
+
+from src.models.user import db
+from src.models.chat import Evidence, EvidenceLedgerEntry
+from src.security import security_manager
+from src.services.evidence_ledger import content_hash
+from src.services.blob_store import blob_store, parse_blob_reference
+
+# Relative Evidence.file_path values are resolved against this directory
+EVIDENCE_DIR = os.environ.get(
+    'HONEYTRAP_EVIDENCE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'evidence')
+)
+
+# Files at least this large are hashed in worker processes; smaller ones inline
+LARGE_FILE_BYTES = 4 * 1024 * 1024
+HASH_BLOCK_BYTES = 8 * 1024 * 1024
+MAX_LISTED_ITEMS = 1000
+
+AUDIT_SCRIPT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))),
+    'scripts', 'audit_evidence_store.py'
+)
+
+VERIFIED = 'verified'
+MISMATCHED = 'mismatched'
+MISSING = 'missing'
+
+
+def resolve_evidence_path(file_path: str) -> str:
+    sha256 = parse_blob_reference(file_path)
+    if sha256:
+        return blob_store.path_for(sha256)
+    return file_path if os.path.isabs(file_path) else os.path.join(EVIDENCE_DIR, file_path)
+
+
+def hash_file(path: str) -> Optional[str]:
+    """SHA-256 of a file read through a memory map; None if the file does not exist"""
+    try:
+        size = os.path.getsize(path)
+        digest = hashlib.sha256()
+        if size:
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped) as view:
+                    for offset in range(0, size, HASH_BLOCK_BYTES):
+                        digest.update(view[offset:offset + HASH_BLOCK_BYTES])
+        return digest.hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def _hash_file_job(evidence_id: int, path: str):
+    """Process-pool entry point"""
+    return evidence_id, hash_file(path), os.path.getsize(path) if os.path.exists(path) else 0
+
+
+class AuditRun:
+    """Tallies one audit and builds its signed summary"""
+    
+    def __init__(self, total_items: int, progress: Optional[Callable[[Dict], None]] = None):
+        self.total_items = total_items
+        self.progress = progress
+        self.started_at = datetime.utcnow()
+        self.started = time.monotonic()
+        self.counts = {VERIFIED: 0, MISMATCHED: 0, MISSING: 0}
+        self.listed = {MISMATCHED: [], MISSING: []}
+        self.bytes_hashed = 0
+        # Commits the summary to every individual outcome without listing them all. Item hashes
+        # are summed, so the digest doesn't depend on the order worker processes finish in.
+        self.outcome_digest = 0
+    
+    def record(self, evidence_id: int, status: str, reason: Optional[str] = None):
+        self.counts[status] += 1
+        item_hash = hashlib.sha256(f'{evidence_id}:{status}'.encode()).digest()
+        self.outcome_digest = (self.outcome_digest + int.from_bytes(item_hash, 'big')) % (1 << 256)
+        if status != VERIFIED and len(self.listed[status]) < MAX_LISTED_ITEMS:
+            self.listed[status].append({'evidence_id': evidence_id, 'reason': reason})
+    
+    def status(self) -> Dict:
+        checked = sum(self.counts.values())
+        return {
+            'total_items': self.total_items,
+            'checked_items': checked,
+            'percent_complete': round(100.0 * checked / self.total_items, 1) if self.total_items else 100.0,
+            'bytes_hashed': self.bytes_hashed,
+            'elapsed_seconds': round(time.monotonic() - self.started, 1),
+            **self.counts
+        }
+    
+    def report_progress(self):
+        if self.progress:
+            self.progress(self.status())
+    
+    def summary(self) -> Dict:
+        """Final results with an HMAC signature over all of them"""
+        summary = {
+            **self.status(),
+            'started_at': self.started_at.isoformat(),
+            'finished_at': datetime.utcnow().isoformat(),
+            'outcome_digest': f'{self.outcome_digest:064x}',
+            'mismatched_items': self.listed[MISMATCHED],
+            'missing_items': self.listed[MISSING]
+        }
+        return {'summary': summary, 'signature': security_manager.sign_data(summary)}
+
+
+def audit_evidence_store(workers: Optional[int] = None, chunk_size: int = 500,
+                         progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """Check every evidence item against its stored hash and ledger entry (requires an app context).
+    
+    Rows are streamed in chunks of `chunk_size`; large files are hashed by a
+    pool of `workers` processes with a bounded number of files in flight, so
+    memory use does not grow with the size of the store.
+    """
+    workers = workers or os.cpu_count() or 1
+    run = AuditRun(Evidence.query.count(), progress)
+    
+    rows = db.session.query(Evidence, EvidenceLedgerEntry.content_hash).outerjoin(
+        EvidenceLedgerEntry, EvidenceLedgerEntry.evidence_id == Evidence.id
+    ).order_by(Evidence.id).yield_per(chunk_size)
+    
+    in_flight = {}  # future -> expected hash
+    max_in_flight = workers * 2
+    
+    def collect(done):
+        for future in done:
+            expected = in_flight.pop(future)
+            evidence_id, digest, size = future.result()
+            run.bytes_hashed += size
+            _record_file_result(run, evidence_id, digest, expected)
+    
+    # Spawned workers avoid forking a process that may be running other threads
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        for scanned, (evidence, ledger_hash) in enumerate(rows, start=1):
+            if ledger_hash is not None and content_hash(evidence) != ledger_hash:
+                run.record(evidence.id, MISMATCHED, 'record differs from ledger')
+            elif evidence.file_path:
+                path = resolve_evidence_path(evidence.file_path)
+                size = os.path.getsize(path) if os.path.exists(path) else 0
+                if size < LARGE_FILE_BYTES:
+                    run.bytes_hashed += size
+                    _record_file_result(run, evidence.id, hash_file(path), evidence.hash_value)
+                else:
+                    if len(in_flight) >= max_in_flight:
+                        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    in_flight[pool.submit(_hash_file_job, evidence.id, path)] = evidence.hash_value
+            elif evidence.content is not None:
+                content = evidence.content.encode()
+                run.bytes_hashed += len(content)
+                if hashlib.sha256(content).hexdigest() == evidence.hash_value:
+                    run.record(evidence.id, VERIFIED)
+                else:
+                    run.record(evidence.id, MISMATCHED, 'content hash differs')
+            else:
+                run.record(evidence.id, MISSING, 'no content or file')
+            
+            if scanned % chunk_size == 0:
+                run.report_progress()
+        
+        collect(wait(in_flight).done)
+    
+    run.report_progress()
+    return run.summary()
+
+
+def _record_file_result(run: AuditRun, evidence_id: int, digest: Optional[str], expected: str):
+    if digest is None:
+        run.record(evidence_id, MISSING, 'file not found')
+    elif digest != expected:
+        run.record(evidence_id, MISMATCHED, 'file hash differs')
+    else:
+        run.record(evidence_id, VERIFIED)
+
+
+class EvidenceAuditor:
+    """Runs one audit at a time as a separate process and keeps its progress and result.
+    
+    The audit runs through scripts/audit_evidence_store.py so its worker
+    processes never re-import a server module.
+    """
+    
+    def __init__(self):
+        self.lock = Lock()
+        self.process = None
+        self.follower = None
+        self.progress = None
+        self.result = None
+        self.error = None
+    
+    def start(self, database_uri: str, workers: Optional[int] = None) -> bool:
+        """Start an audit; False if one is already running"""
+        with self.lock:
+            if self.is_running():
+                return False
+            
+            command = [sys.executable, AUDIT_SCRIPT, '--database-uri', database_uri, '--json-progress']
+            if workers:
+                command += ['--workers', str(workers)]
+            
+            self.progress, self.result, self.error = None, None, None
+            # Only stdout is read as the audit runs, so stderr goes to a file that can never fill up and block it
+            stderr = tempfile.TemporaryFile(mode='w+')
+            self.process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr, text=True)
+            self.follower = Thread(target=self._follow, args=(self.process, stderr), daemon=True)
+            self.follower.start()
+            return True
+    
+    def _follow(self, process, stderr):
+        """Read JSON progress lines until the audit process exits"""
+        with stderr:
+            for line in process.stdout:
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    continue
+                if 'progress' in message:
+                    self.progress = message['progress']
+                if 'result' in message:
+                    self.result = message['result']
+            
+            if process.wait() != 0 and self.result is None:
+                stderr.seek(0)
+                self.error = stderr.read().strip()[-2000:] or f'Audit exited with code {process.returncode}'
+    
+    def is_running(self) -> bool:
+        # Running until the process has exited and its last output has been read
+        return bool(self.follower and self.follower.is_alive())
+    
+    def status(self) -> Dict:
+        return {
+            'running': self.is_running(),
+            'progress': self.progress,
+            'result': self.result,
+            'error': self.error
+        }
+
+
+# Global evidence auditor
+evidence_auditor = EvidenceAuditor()
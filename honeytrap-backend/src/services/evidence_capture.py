@@ -0,0 +1,198 @@
+"""
+Evidence Capture
+Durable queue that takes evidence capture off the chat reply path, and the worker that drains it
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Dict, List
+
+from src.models.user import db
+from src.models.chat import ChatSession, ChatMessage, Evidence, AuditLog, EvidenceCaptureRequest
+from src.ai_engine import AIPersonaEngine
+from src.services.evidence_ledger import evidence_ledger
+
+CONTEXT_MESSAGES = int(os.environ.get('HONEYTRAP_EVIDENCE_CONTEXT_MESSAGES', 20))
+CAPTURE_BATCH_SIZE = 100
+CAPTURE_POLL_INTERVAL = 1.0
+MAX_CAPTURE_ATTEMPTS = 3
+
+detector = AIPersonaEngine()
+
+
+def enqueue_capture(db_session_id: int, message_id: int, threat_level: int,
+                    capture_method: str) -> EvidenceCaptureRequest:
+    """Queue evidence capture in the caller's transaction; commit it together with the message"""
+    capture_request = EvidenceCaptureRequest(
+        session_id=db_session_id,
+        message_id=message_id,
+        threat_level=threat_level,
+        capture_method=capture_method
+    )
+    db.session.add(capture_request)
+    return capture_request
+
+
+def get_risk_assessment(threat_level: int) -> str:
+    """Get risk assessment description based on threat level"""
+    if threat_level >= 2:
+        return 'HIGH_RISK - Immediate attention required'
+    elif threat_level == 1:
+        return 'SUSPICIOUS - Monitor closely'
+    else:
+        return 'NORMAL - No immediate concern'
+
+
+class EvidenceCaptureWorker:
+    """Turns queued capture requests into evidence snapshots, a batch at a time.
+    
+    A snapshot refers to the triggering message and the `context_messages`
+    before it by id and content hash rather than copying their text, and
+    records session metadata and the detector's keyword spans. The chat
+    server runs the one worker; should another process drain the queue too,
+    a batch that it finished first is rolled back and skipped.
+    """
+    
+    def __init__(self, batch_size: int = CAPTURE_BATCH_SIZE, context_messages: int = CONTEXT_MESSAGES):
+        self.batch_size = batch_size
+        self.context_messages = context_messages
+    
+    def process_batch(self) -> List[Dict]:
+        """Capture evidence for the oldest pending requests (requires an app context).
+        
+        Returns one {evidence_id, session_id, session_created_at, session} per stored snapshot, where
+        `session` is the chat session's row as the admin dashboard lists it.
+        """
+        requests = EvidenceCaptureRequest.query.filter_by(status='pending').order_by(
+            EvidenceCaptureRequest.id
+        ).limit(self.batch_size).all()
+        if not requests:
+            return []
+        
+        now = datetime.utcnow()
+        captured = []
+        for capture_request in requests:
+            capture_request.attempts = (capture_request.attempts or 0) + 1
+            try:
+                with db.session.begin_nested():
+                    evidence, chat_session = self._capture(capture_request, now)
+                captured.append((capture_request, evidence, chat_session))
+            except Exception as e:
+                capture_request.error = str(e)
+                if capture_request.attempts >= MAX_CAPTURE_ATTEMPTS:
+                    capture_request.status = 'failed'
+                    capture_request.processed_at = now
+        
+        db.session.flush()
+        for capture_request, evidence, chat_session in captured:
+            capture_request.evidence_id = evidence.id
+        
+        # Claim the batch; if another worker already did, drop everything built here
+        claimed = EvidenceCaptureRequest.query.filter(
+            EvidenceCaptureRequest.id.in_([capture_request.id for capture_request, _, _ in captured]),
+            EvidenceCaptureRequest.status == 'pending'
+        ).update({'status': 'done', 'processed_at': now}, synchronize_session=False)
+        if claimed != len(captured):
+            db.session.rollback()
+            return []
+        
+        db.session.commit()
+        
+        evidence_list = [evidence for _, evidence, _ in captured]
+        if evidence_list:
+            evidence_ledger.record_batch(evidence_list)
+        
+        return [
+            {
+                'evidence_id': evidence.id,
+                'session_id': chat_session.session_id,
+                'session_created_at': chat_session.created_at,
+                'session': chat_session.to_dict()
+            }
+            for _, evidence, chat_session in captured
+        ]
+    
+    def _capture(self, capture_request: EvidenceCaptureRequest, now: datetime):
+        chat_session = db.session.get(ChatSession, capture_request.session_id)
+        trigger = db.session.get(ChatMessage, capture_request.message_id)
+        if not chat_session or not trigger:
+            raise ValueError('Session or triggering message no longer exists')
+        
+        # The trigger and the messages before it, newest first from the (session_id, id) index
+        context = ChatMessage.query.filter(
+            ChatMessage.session_id == chat_session.id,
+            ChatMessage.id <= trigger.id
+        ).order_by(ChatMessage.id.desc()).limit(self.context_messages + 1).all()
+        
+        spans = detector.find_threat_spans(trigger.message_content)
+        snapshot = {
+            'session': {
+                'session_id': chat_session.session_id,
+                'persona_id': chat_session.persona_id,
+                'user_ip': chat_session.user_ip,
+                'user_agent': chat_session.user_agent,
+                'geolocation': chat_session.geolocation,
+                'vpn_detected': chat_session.vpn_detected,
+                'escalation_level': chat_session.escalation_level,
+                'created_at': chat_session.created_at.isoformat() if chat_session.created_at else None
+            },
+            'trigger_message_id': trigger.id,
+            'threat_level': capture_request.threat_level,
+            'messages': [
+                {
+                    'message_id': message.id,
+                    'sender_type': message.sender_type,
+                    'timestamp': message.timestamp.isoformat() if message.timestamp else None,
+                    'content_sha256': hashlib.sha256(message.message_content.encode()).hexdigest()
+                }
+                for message in reversed(context)
+            ],
+            'detector_spans': spans,
+            'requested_at': capture_request.created_at.isoformat(),
+            'captured_at': now.isoformat()
+        }
+        content = json.dumps(snapshot, sort_keys=True)
+        
+        evidence = Evidence(
+            session_id=chat_session.id,
+            evidence_type='conversation_snapshot',
+            content=content,
+            evidence_metadata=json.dumps({
+                'escalation_trigger': f'threat_level_{capture_request.threat_level}',
+                'capture_method': capture_request.capture_method,
+                'keywords_detected': sorted({span['keyword'] for span in spans}),
+                'risk_assessment': get_risk_assessment(capture_request.threat_level),
+                'context_messages': len(context) - 1
+            }, sort_keys=True),
+            hash_value=hashlib.sha256(content.encode()).hexdigest(),
+            created_at=now
+        )
+        db.session.add(evidence)
+        chat_session.evidence_captured = True
+        
+        db.session.add(AuditLog(
+            action='evidence_captured',
+            session_id=chat_session.session_id,
+            details=json.dumps({'threat_level': capture_request.threat_level, 'message_id': trigger.id}),
+            ip_address=chat_session.user_ip
+        ))
+        return evidence, chat_session
+    
+    def drain(self) -> List[Dict]:
+        """Process batches until the queue is empty (requires an app context)"""
+        captured = []
+        while True:
+            batch = self.process_batch()
+            captured.extend(batch)
+            if len(batch) < self.batch_size:
+                return captured
+    
+    def pending(self) -> int:
+        """Number of capture requests waiting"""
+        return EvidenceCaptureRequest.query.filter_by(status='pending').count()
+
+
+# Global evidence capture worker
+evidence_capture_worker = EvidenceCaptureWorker()
@@ -0,0 +1,349 @@
+"""
+Evidence Ledger
+Append-only, hash-chained evidence log sealed into Merkle batches with inclusion proofs
+"""
+
+import hashlib
+import json
+import os
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from src.models.user import db
+from src.models.chat import Evidence, EvidenceLedgerEntry, LedgerBatch
+from src.security import security_manager
+
+GENESIS_HASH = '0' * 64
+BATCH_SIZE = 256
+SEAL_INTERVAL = float(os.environ.get('HONEYTRAP_LEDGER_SEAL_INTERVAL', 60))  # Seconds between Merkle batches
+MAX_REPORTED_FAILURES = 100
+
+
+def canonical_evidence(evidence: Evidence) -> bytes:
+    """Serialise an evidence record the same way every time it is hashed"""
+    record = {
+        'id': evidence.id,
+        'session_id': evidence.session_id,
+        'evidence_type': evidence.evidence_type,
+        'file_path': evidence.file_path,
+        'content': evidence.content,
+        'evidence_metadata': evidence.evidence_metadata,
+        'hash_value': evidence.hash_value,
+        'created_at': evidence.created_at.isoformat() if evidence.created_at else None
+    }
+    return json.dumps(record, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def content_hash(evidence: Evidence) -> str:
+    return hashlib.sha256(canonical_evidence(evidence)).hexdigest()
+
+
+def chain_entry_hash(entry_id: int, prev_hash: str, evidence_content_hash: str) -> str:
+    """Hash linking a ledger entry to its predecessor"""
+    return hashlib.sha256(f'{entry_id}:{prev_hash}:{evidence_content_hash}'.encode()).hexdigest()
+
+
+def chain_batch_hash(prev_chain_hash: str, merkle_root: str, first_entry_id: int, last_entry_id: int) -> str:
+    """Hash linking a sealed batch to the previous one"""
+    return hashlib.sha256(f'{prev_chain_hash}:{merkle_root}:{first_entry_id}:{last_entry_id}'.encode()).hexdigest()
+
+
+def batch_signature_valid(batch: LedgerBatch) -> bool:
+    """Whether a batch's chain hash carries the server's signature"""
+    return bool(batch.signature) and security_manager.verify_signature(batch.chain_hash, batch.signature)
+
+
+# Leaves and inner nodes are hashed with different prefixes so one can't pass for the other
+def _leaf_hash(entry_hash: str) -> bytes:
+    return hashlib.sha256(b'\x00' + bytes.fromhex(entry_hash)).digest()
+
+
+def _node_hash(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(b'\x01' + left + right).digest()
+
+
+def build_merkle_tree(entry_hashes: List[str]) -> Tuple[str, List[List[List[str]]]]:
+    """Get the Merkle root of a batch and an inclusion proof for each entry.
+    
+    A proof is a list of [side, sibling_hash] pairs from leaf to root. An odd
+    node at the end of a level is carried up unchanged, never duplicated.
+    """
+    level = [_leaf_hash(entry_hash) for entry_hash in entry_hashes]
+    positions = list(range(len(level)))  # Index of each leaf's ancestor in the current level
+    proofs = [[] for _ in level]
+    
+    while len(level) > 1:
+        for leaf, position in enumerate(positions):
+            sibling = position ^ 1
+            if sibling < len(level):
+                proofs[leaf].append(['L' if sibling < position else 'R', level[sibling].hex()])
+        
+        level = [
+            _node_hash(level[i], level[i + 1]) if i + 1 < len(level) else level[i]
+            for i in range(0, len(level), 2)
+        ]
+        positions = [position // 2 for position in positions]
+    
+    return level[0].hex(), proofs
+
+
+def verify_inclusion(entry_hash: str, proof: Iterable, merkle_root: str) -> bool:
+    """Check a Merkle inclusion proof in O(log n)"""
+    node = _leaf_hash(entry_hash)
+    for side, sibling in proof:
+        sibling = bytes.fromhex(sibling)
+        node = _node_hash(sibling, node) if side == 'L' else _node_hash(node, sibling)
+    return node.hex() == merkle_root
+
+
+class EvidenceLedger:
+    """Append-only ledger over the evidence table.
+    
+    Every evidence row gets one chained entry once it is stored. Entries are
+    sealed into Merkle batches whose roots are chained too, so one evidence
+    item is verified with its stored inclusion proof and the whole store with
+    a single ordered pass. Each batch's chain hash is signed with the master
+    key, so someone who can write to the database but does not hold the key
+    cannot rewrite the evidence and re-seal the ledger to match.
+    """
+    
+    def __init__(self, batch_size: int = BATCH_SIZE):
+        self.batch_size = batch_size
+        self.lock = Lock()
+    
+    def record(self, evidence: Evidence, retries: int = 3) -> EvidenceLedgerEntry:
+        """Chain committed evidence into the ledger and commit the entry (requires an app context)"""
+        for _ in range(retries):
+            with self.lock:
+                try:
+                    entry = self._append(evidence)
+                    db.session.commit()
+                    return entry
+                except IntegrityError:
+                    # Another server process extended the chain first; retry on the new head
+                    db.session.rollback()
+        raise RuntimeError(f'Could not add evidence {evidence.id} to the ledger')
+    
+    def record_batch(self, evidence_list: List[Evidence], retries: int = 3) -> List[EvidenceLedgerEntry]:
+        """Chain several committed evidence items in one transaction"""
+        for _ in range(retries):
+            with self.lock:
+                try:
+                    entries = [self._append(evidence) for evidence in evidence_list]
+                    db.session.commit()
+                    return entries
+                except IntegrityError:
+                    db.session.rollback()
+        raise RuntimeError(f'Could not add {len(evidence_list)} evidence items to the ledger')
+    
+    def _append(self, evidence: Evidence) -> EvidenceLedgerEntry:
+        last = EvidenceLedgerEntry.query.order_by(EvidenceLedgerEntry.id.desc()).first()
+        entry_id = last.id + 1 if last else 1
+        prev_hash = last.entry_hash if last else GENESIS_HASH
+        evidence_content_hash = content_hash(evidence)
+        
+        entry = EvidenceLedgerEntry(
+            id=entry_id,
+            evidence_id=evidence.id,
+            content_hash=evidence_content_hash,
+            prev_hash=prev_hash,
+            entry_hash=chain_entry_hash(entry_id, prev_hash, evidence_content_hash)
+        )
+        db.session.add(entry)
+        db.session.flush()
+        return entry
+    
+    def backfill(self) -> int:
+        """Add entries for evidence not yet in the ledger (e.g. stored before it existed); returns how many"""
+        missing = Evidence.query.outerjoin(
+            EvidenceLedgerEntry, EvidenceLedgerEntry.evidence_id == Evidence.id
+        ).filter(EvidenceLedgerEntry.id.is_(None)).order_by(Evidence.id).all()
+        
+        for evidence in missing:
+            self.record(evidence)
+        return len(missing)
+    
+    def seal_pending(self) -> List[LedgerBatch]:
+        """Seal every unsealed entry into batches of at most batch_size"""
+        batches = []
+        while True:
+            batch = self.seal_batch()
+            if batch is None:
+                return batches
+            batches.append(batch)
+    
+    def seal_batch(self) -> Optional[LedgerBatch]:
+        """Seal the oldest unsealed entries into one Merkle batch and persist its root"""
+        with self.lock:
+            entries = EvidenceLedgerEntry.query.filter(
+                EvidenceLedgerEntry.batch_id.is_(None)
+            ).order_by(EvidenceLedgerEntry.id).limit(self.batch_size).all()
+            if not entries:
+                return None
+            
+            merkle_root, proofs = build_merkle_tree([entry.entry_hash for entry in entries])
+            
+            previous = LedgerBatch.query.order_by(LedgerBatch.id.desc()).first()
+            prev_chain_hash = previous.chain_hash if previous else GENESIS_HASH
+            chain_hash = chain_batch_hash(prev_chain_hash, merkle_root, entries[0].id, entries[-1].id)
+            batch = LedgerBatch(
+                first_entry_id=entries[0].id,
+                last_entry_id=entries[-1].id,
+                entry_count=len(entries),
+                merkle_root=merkle_root,
+                prev_chain_hash=prev_chain_hash,
+                chain_hash=chain_hash,
+                signature=security_manager.sign_data(chain_hash)
+            )
+            try:
+                db.session.add(batch)
+                db.session.flush()
+                
+                for entry, proof in zip(entries, proofs):
+                    entry.batch_id = batch.id
+                    entry.proof = json.dumps(proof)
+                
+                db.session.commit()
+            except IntegrityError:
+                # Another server process sealed these entries first
+                db.session.rollback()
+                return None
+            return batch
+    
+    def inclusion_proof(self, evidence_id: int) -> Optional[Dict]:
+        """Get an evidence item's ledger entry, batch and Merkle proof"""
+        entry = EvidenceLedgerEntry.query.filter_by(evidence_id=evidence_id).first()
+        if not entry:
+            return None
+        
+        batch = db.session.get(LedgerBatch, entry.batch_id) if entry.batch_id else None
+        return {
+            'entry': entry.to_dict(),
+            'batch': batch.to_dict() if batch else None
+        }
+    
+    def verify_case(self, db_session_id: int) -> Dict:
+        """Verify every evidence item of a chat session with its inclusion proof"""
+        rows = db.session.query(Evidence, EvidenceLedgerEntry, LedgerBatch).outerjoin(
+            EvidenceLedgerEntry, EvidenceLedgerEntry.evidence_id == Evidence.id
+        ).outerjoin(
+            LedgerBatch, LedgerBatch.id == EvidenceLedgerEntry.batch_id
+        ).filter(Evidence.session_id == db_session_id).order_by(Evidence.id).all()
+        
+        items = []
+        for evidence, entry, batch in rows:
+            items.append({'evidence_id': evidence.id, **self._verify_item(evidence, entry, batch)})
+        
+        return {
+            'session_id': db_session_id,
+            'verified': all(item['status'] in ('verified', 'unsealed') for item in items),
+            'items': items
+        }
+    
+    def _verify_item(self, evidence: Evidence, entry: Optional[EvidenceLedgerEntry],
+                     batch: Optional[LedgerBatch]) -> Dict:
+        if entry is None:
+            return {'status': 'failed', 'reason': 'not in ledger'}
+        if content_hash(evidence) != entry.content_hash:
+            return {'status': 'failed', 'reason': 'evidence modified'}
+        if chain_entry_hash(entry.id, entry.prev_hash, entry.content_hash) != entry.entry_hash:
+            return {'status': 'failed', 'reason': 'ledger entry modified'}
+        if batch is None:
+            # Chained but not yet covered by a Merkle root
+            return {'status': 'unsealed'}
+        if chain_batch_hash(batch.prev_chain_hash, batch.merkle_root,
+                            batch.first_entry_id, batch.last_entry_id) != batch.chain_hash:
+            return {'status': 'failed', 'reason': 'batch modified'}
+        if not batch_signature_valid(batch):
+            return {'status': 'failed', 'reason': 'batch signature invalid'}
+        if not verify_inclusion(entry.entry_hash, json.loads(entry.proof or '[]'), batch.merkle_root):
+            return {'status': 'failed', 'reason': 'inclusion proof does not match batch root'}
+        return {'status': 'verified', 'batch_id': batch.id}
+    
+    def verify_all(self, chunk_size: int = 1000) -> Dict:
+        """Verify the whole ledger in one ordered, streaming pass"""
+        failures = []
+        failure_count = 0
+        
+        def fail(entry_id, evidence_id, reason):
+            nonlocal failure_count
+            failure_count += 1
+            if len(failures) < MAX_REPORTED_FAILURES:
+                failures.append({'entry_id': entry_id, 'evidence_id': evidence_id, 'reason': reason})
+        
+        # Batch headers are small (one per batch_size entries)
+        batches = iter(LedgerBatch.query.order_by(LedgerBatch.id).all())
+        batch = next(batches, None)
+        prev_chain_hash = GENESIS_HASH
+        batch_leaves = []
+        
+        prev_hash = GENESIS_HASH
+        expected_id = 1
+        entry_count = 0
+        
+        rows = db.session.query(EvidenceLedgerEntry, Evidence).outerjoin(
+            Evidence, Evidence.id == EvidenceLedgerEntry.evidence_id
+        ).order_by(EvidenceLedgerEntry.id).yield_per(chunk_size)
+        
+        for entry, evidence in rows:
+            entry_count += 1
+            if entry.id != expected_id:
+                fail(entry.id, entry.evidence_id, f'entries missing before this one (expected {expected_id})')
+            if entry.prev_hash != prev_hash:
+                fail(entry.id, entry.evidence_id, 'chain broken')
+            if chain_entry_hash(entry.id, entry.prev_hash, entry.content_hash) != entry.entry_hash:
+                fail(entry.id, entry.evidence_id, 'ledger entry modified')
+            if evidence is None:
+                fail(entry.id, entry.evidence_id, 'evidence deleted')
+            elif content_hash(evidence) != entry.content_hash:
+                fail(entry.id, entry.evidence_id, 'evidence modified')
+            
+            expected_id = entry.id + 1
+            prev_hash = entry.entry_hash
+            
+            if batch is None or entry.id < batch.first_entry_id:
+                if entry.batch_id is not None:
+                    fail(entry.id, entry.evidence_id, 'entry assigned to an unknown batch')
+                continue
+            
+            batch_leaves.append(entry.entry_hash)
+            if entry.batch_id != batch.id:
+                fail(entry.id, entry.evidence_id, f'entry not assigned to batch {batch.id}')
+            
+            if entry.id == batch.last_entry_id:
+                merkle_root, _ = build_merkle_tree(batch_leaves)
+                if merkle_root != batch.merkle_root or len(batch_leaves) != batch.entry_count:
+                    fail(entry.id, None, f'batch {batch.id} root does not match its entries')
+                if batch.prev_chain_hash != prev_chain_hash or chain_batch_hash(
+                        prev_chain_hash, batch.merkle_root, batch.first_entry_id, batch.last_entry_id) != batch.chain_hash:
+                    fail(entry.id, None, f'batch {batch.id} chain broken')
+                if not batch_signature_valid(batch):
+                    fail(entry.id, None, f'batch {batch.id} signature invalid')
+                
+                prev_chain_hash = batch.chain_hash
+                batch_leaves = []
+                batch = next(batches, None)
+        
+        if batch is not None:
+            fail(None, None, f'batch {batch.id} refers to missing entries')
+        
+        unledgered = Evidence.query.outerjoin(
+            EvidenceLedgerEntry, EvidenceLedgerEntry.evidence_id == Evidence.id
+        ).filter(EvidenceLedgerEntry.id.is_(None)).count()
+        if unledgered:
+            fail(None, None, f'{unledgered} evidence items are not in the ledger')
+        
+        return {
+            'verified': failure_count == 0,
+            'entries_checked': entry_count,
+            'head_hash': prev_hash,
+            'head_chain_hash': prev_chain_hash,
+            'failure_count': failure_count,
+            'failures': failures
+        }
+
+
+# Global evidence ledger
+evidence_ledger = EvidenceLedger()
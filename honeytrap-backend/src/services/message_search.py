@@ -0,0 +1,217 @@
+"""
+Message Search
+Full-text search over chat transcripts: an FTS5 table on SQLite, a GIN tsvector index on PostgreSQL
+"""
+
+import html
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from src.models.user import db
+from src.models.chat import ChatMessage, ChatSession
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+FTS_TABLE = 'chat_messages_fts'
+PG_INDEX = 'ix_chat_messages_content_tsv'
+# No stemming on either backend, so both match the same words
+PG_CONFIG = 'simple'
+
+# Highlight markers that cannot occur in escaped text; swapped for <mark> after escaping
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+_SQLITE_SETUP = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        message_content, content='chat_messages', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    # External-content FTS tables are kept in step by triggers, so bulk inserts are indexed too
+    f"""CREATE TRIGGER IF NOT EXISTS chat_messages_fts_insert AFTER INSERT ON chat_messages BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, message_content) VALUES (new.id, new.message_content);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS chat_messages_fts_delete AFTER DELETE ON chat_messages BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, message_content) VALUES ('delete', old.id, old.message_content);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS chat_messages_fts_update AFTER UPDATE OF message_content ON chat_messages BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, message_content) VALUES ('delete', old.id, old.message_content);
+        INSERT INTO {FTS_TABLE}(rowid, message_content) VALUES (new.id, new.message_content);
+    END"""
+]
+
+_TOKEN = re.compile(r'"([^"]*)"|(\()|(\))|([^\s()"]+)')
+OPERATORS = ('AND', 'OR', 'NOT')
+
+
+def _dialect() -> str:
+    return db.engine.dialect.name
+
+
+def ensure_search_index():
+    """Create the search index if it is missing, indexing existing messages (requires an app context)"""
+    if _dialect() == 'postgresql':
+        db.session.execute(db.text(
+            f"CREATE INDEX IF NOT EXISTS {PG_INDEX} ON chat_messages "
+            f"USING GIN (to_tsvector('{PG_CONFIG}', message_content))"
+        ))
+        db.session.commit()
+        return
+    
+    exists = db.session.execute(db.text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+    ), {'name': FTS_TABLE}).first()
+    for statement in _SQLITE_SETUP:
+        db.session.execute(db.text(statement))
+    db.session.commit()
+    if not exists:
+        rebuild_search_index()
+
+
+def rebuild_search_index() -> int:
+    """Rebuild the whole index from chat_messages in one pass; returns how many messages it covers"""
+    if _dialect() == 'postgresql':
+        db.session.execute(db.text(f'REINDEX INDEX {PG_INDEX}'))
+    else:
+        db.session.execute(db.text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        db.session.execute(db.text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"))
+    db.session.commit()
+    return db.session.query(db.func.count(ChatMessage.id)).scalar()
+
+
+def parse_query(query: str) -> List[Tuple]:
+    """Split a search into terms, "quoted phrases", prefix* terms, AND/OR/NOT and parentheses.
+    
+    Adjacent terms are joined with AND. Raises ValueError if the operators or
+    parentheses don't form a valid expression.
+    """
+    tokens = []
+    for phrase, open_paren, close_paren, word in _TOKEN.findall(query):
+        if open_paren or close_paren:
+            token = (open_paren or close_paren,)
+        elif word in OPERATORS:
+            token = ('op', word)
+        elif word.rstrip('*'):
+            token = ('term', word.rstrip('*'), word.endswith('*'))
+        elif phrase.strip():
+            token = ('phrase', phrase.strip(), False)
+        else:
+            continue  # Empty phrases and bare wildcards
+        if token[0] in ('term', 'phrase', '(') and tokens and tokens[-1][0] in ('term', 'phrase', ')'):
+            tokens.append(('op', 'AND'))
+        tokens.append(token)
+    
+    # Operands and operators must alternate, with balanced parentheses
+    expect_operand, depth = True, 0
+    for token in tokens:
+        kind = token[0]
+        if kind in ('term', 'phrase', '(') and not expect_operand or kind in ('op', ')') and expect_operand:
+            raise ValueError('Invalid search query')
+        if kind == '(':
+            depth += 1
+        elif kind == ')':
+            depth -= 1
+            if depth < 0:
+                raise ValueError('Invalid search query')
+        else:
+            expect_operand = kind == 'op'
+    if not tokens or expect_operand or depth:
+        raise ValueError('Invalid search query')
+    return tokens
+
+
+def _fts5_expression(tokens: List[Tuple]) -> str:
+    parts = []
+    for token in tokens:
+        if token[0] in ('term', 'phrase'):
+            # Quoting hands punctuation to the tokenizer instead of the query parser
+            parts.append('"' + token[1].replace('"', '""') + '"' + ('*' if token[2] else ''))
+        else:
+            parts.append(token[-1])
+    return ' '.join(parts)
+
+
+def _tsquery_expression(tokens: List[Tuple]) -> str:
+    parts = []
+    for token in tokens:
+        if token[0] in ('term', 'phrase'):
+            lexemes = re.findall(r'\w+', token[1].lower())
+            if not lexemes:
+                raise ValueError('Search terms must contain letters or digits')
+            if token[2]:
+                lexemes[-1] += ':*'
+            parts.append('(' + ' <-> '.join(lexemes) + ')')
+        elif token[0] == 'op':
+            parts.append({'AND': '&', 'OR': '|', 'NOT': '& !'}[token[1]])
+        else:
+            parts.append(token[0])
+    return ' '.join(parts)
+
+
+def _highlight(snippet: str) -> str:
+    return html.escape(snippet).replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>')
+
+
+def search_messages(query: str, session_id: Optional[int] = None, sender_type: Optional[str] = None,
+                    since: Optional[datetime] = None, until: Optional[datetime] = None,
+                    before: Optional[int] = None, limit: int = DEFAULT_LIMIT) -> Dict:
+    """Find messages matching `query`, newest first, with highlighted snippets (requires an app context).
+    
+    Results come in message id order straight from the index, so the cost
+    depends on the page size rather than how many messages match. Pass the
+    returned `next_before` back as `before` for the next page.
+    """
+    limit = max(1, min(limit, MAX_LIMIT))
+    tokens = parse_query(query)
+    
+    if _dialect() == 'postgresql':
+        tsquery = db.func.to_tsquery(PG_CONFIG, _tsquery_expression(tokens))
+        snippet = db.func.ts_headline(
+            PG_CONFIG, ChatMessage.message_content, tsquery,
+            f'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, MaxWords=24, MinWords=8, MaxFragments=2'
+        )
+        search = db.session.query(ChatMessage, snippet).filter(
+            db.func.to_tsvector(PG_CONFIG, ChatMessage.message_content).op('@@')(tsquery)
+        )
+        order_column = ChatMessage.id
+    else:
+        fts = db.table(FTS_TABLE, db.column('rowid', db.Integer))
+        snippet = db.literal_column(f"snippet({FTS_TABLE}, 0, char(2), char(3), '…', 16)")
+        search = db.session.query(ChatMessage, snippet).join(fts, fts.c.rowid == ChatMessage.id).filter(
+            db.text(f'{FTS_TABLE} MATCH :match').bindparams(match=_fts5_expression(tokens))
+        )
+        order_column = fts.c.rowid
+    
+    if session_id is not None:
+        search = search.filter(ChatMessage.session_id == session_id)
+    if sender_type:
+        search = search.filter(ChatMessage.sender_type == sender_type)
+    if since:
+        search = search.filter(ChatMessage.timestamp >= since)
+    if until:
+        search = search.filter(ChatMessage.timestamp < until)
+    if before is not None:
+        search = search.filter(order_column < before)
+    
+    rows = search.order_by(order_column.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    # Label results with the public session id investigators know them by
+    session_labels = dict(db.session.query(ChatSession.id, ChatSession.session_id).filter(
+        ChatSession.id.in_({message.session_id for message, _ in rows})
+    ).all()) if rows else {}
+    
+    results = []
+    for message, text in rows:
+        result = message.to_dict()
+        result['chat_session_id'] = session_labels.get(message.session_id)
+        result['snippet'] = _highlight(text or '')
+        results.append(result)
+    
+    return {
+        'results': results,
+        'next_before': rows[-1].ChatMessage.id if has_more else None,
+        'has_more': has_more
+    }
@@ -0,0 +1,61 @@
+"""
+Pagination
+Keyset (cursor) pagination for listings ordered newest first, so every page costs the same however deep it is
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Dict, Optional
+
+from src.models.user import db
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(sort_value: datetime, row_id: int) -> str:
+    """Opaque cursor pointing just past a row"""
+    payload = json.dumps([sort_value.isoformat(), row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    """Sort value and id from a cursor; raises ValueError if it is malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(sort_value), int(row_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def keyset_page(query, sort_column, id_column, cursor: Optional[str] = None,
+                limit: int = DEFAULT_PAGE_SIZE) -> Dict:
+    """Get up to `limit` rows of `query` ordered by (`sort_column`, `id_column`) descending.
+    
+    Pass the returned `next_cursor` back as `cursor` for the following page.
+    The position is a seek on the sort column's index rather than an OFFSET,
+    and no COUNT is run. `sort_column` must not be NULL.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        # A row-value comparison seeks on the index; the equivalent OR scans it
+        query = query.filter(db.tuple_(sort_column, id_column) < db.tuple_(sort_value, row_id))
+    
+    rows = query.order_by(sort_column.desc(), id_column.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+    
+    return {
+        'items': rows,
+        'next_cursor': next_cursor,
+        'has_more': has_more
+    }
@@ -0,0 +1,407 @@
+"""
+Query Cache
+Cached results of expensive read endpoints, keyed by endpoint and parameters and invalidated by tag when writes land
+"""
+
+import json
+import logging
+import os
+import time
+from collections import OrderedDict, defaultdict
+from itertools import chain
+from threading import Lock
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import bindparam, event, inspect, text
+from sqlalchemy.orm import Session
+
+from src.metrics import metrics
+from src.models.user import db
+from src.models.chat import ChatSession, ChatMessage, Evidence
+from src.models.profile import DecoyProfile, ProfileContent, ProfileAnalytics
+
+# Results kept in each process's LRU
+CACHE_SIZE = int(os.environ.get('HONEYTRAP_QUERY_CACHE_SIZE', 512))
+# Upper bound on an entry's age; reports over windows ending "now" drift even without writes
+CACHE_TTL = float(os.environ.get('HONEYTRAP_QUERY_CACHE_TTL', 300))
+# Optional Redis URL; when set, results as well as invalidations are shared by every worker
+CACHE_URL = os.environ.get('HONEYTRAP_QUERY_CACHE_URL')
+
+# Tags: what a cached result was computed from
+SESSIONS = 'sessions'
+SESSION_ACTIVITY = 'session_activity'  # Only sessions' last_activity, which every chat message moves
+MESSAGES = 'messages'
+EVIDENCE = 'evidence'
+PROFILES = 'profiles'
+CONTENT = 'content'
+STATS = 'stats'  # Stats buckets rewritten by reconciliation
+DISCOVERY = 'discovery'  # Analytics database: discovery events and platform metrics
+THREATS = 'threats'  # Analytics database: engagement events and threat analyses
+
+# Tags each cached endpoint is computed from. Writes only invalidate tags some endpoint depends on,
+# so this is declared here, where every process that writes (the chat server included) can see it
+ENDPOINT_TAGS = {
+    'admin_dashboard': (SESSIONS, EVIDENCE, STATS),
+    'content_stats': (CONTENT, STATS),
+    'profile_stats': (PROFILES,),
+    'discovery_analytics': (DISCOVERY,),
+    'threat_analytics': (THREATS,),
+    'platform_performance': (DISCOVERY,),
+    'comprehensive_report': (DISCOVERY, THREATS)
+}
+
+# Models whose committed changes invalidate each tag
+MODEL_TAGS = {
+    ChatSession: SESSIONS,
+    ChatMessage: MESSAGES,
+    Evidence: EVIDENCE,
+    DecoyProfile: PROFILES,
+    ProfileAnalytics: PROFILES,
+    ProfileContent: CONTENT
+}
+
+# Attributes whose changes, when they are all that changed, invalidate a narrower tag than their model's
+ATTRIBUTE_TAGS = {
+    ChatSession: (frozenset({'last_activity'}), SESSION_ACTIVITY)
+}
+
+HIT = 'hit'
+SHARED_HIT = 'shared_hit'
+MISS = 'miss'
+
+
+def succeeded(result) -> bool:
+    """Whether a service result is a real answer rather than an {'error': ...} report"""
+    return not (isinstance(result, dict) and 'error' in result)
+
+
+def cache_key(name: str, params: Dict) -> str:
+    """Endpoint name plus its parameters in a canonical order"""
+    return f"{name}:{json.dumps(params, sort_keys=True, separators=(',', ':'), default=str)}"
+
+
+class RedisBackend:
+    """Results and tag generations kept in Redis so every worker shares them"""
+    
+    def __init__(self, url: str, prefix: str = 'honeytrap:query-cache:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+    
+    def generations(self, tags: Tuple[str, ...]) -> Tuple[int, ...]:
+        values = self.client.mget([f'{self.prefix}tag:{tag}' for tag in tags])
+        return tuple(int(value or 0) for value in values)
+    
+    def bump(self, tags: Iterable[str]):
+        pipeline = self.client.pipeline()
+        for tag in tags:
+            pipeline.incr(f'{self.prefix}tag:{tag}')
+        pipeline.execute()
+    
+    def get(self, key: str) -> Tuple[Optional[str], float]:
+        """Stored payload and its remaining lifetime in seconds"""
+        pipeline = self.client.pipeline()
+        pipeline.get(f'{self.prefix}value:{key}')
+        pipeline.pttl(f'{self.prefix}value:{key}')
+        payload, ttl_ms = pipeline.execute()
+        return payload, max(ttl_ms or 0, 0) / 1000
+    
+    def set(self, key: str, payload: str, ttl: float):
+        self.client.set(f'{self.prefix}value:{key}', payload, px=max(int(ttl * 1000), 1))
+
+
+class DatabaseBackend:
+    """Tag generations kept in a table of the application database, shared by every process using it.
+    
+    Results stay in each process's LRU, so only generations are read from
+    the table. ORM commits bump theirs on their own connection, in the same
+    transaction as the rows they wrote.
+    """
+    
+    def __init__(self, engine):
+        self.engine = engine
+        with engine.begin() as conn:
+            conn.execute(text('''
+                CREATE TABLE IF NOT EXISTS query_cache_generations (
+                    tag VARCHAR(64) PRIMARY KEY,
+                    generation INTEGER NOT NULL
+                )
+            '''))
+    
+    def generations(self, tags: Tuple[str, ...]) -> Tuple[int, ...]:
+        if not tags:
+            return ()
+        query = text('SELECT tag, generation FROM query_cache_generations WHERE tag IN :tags').bindparams(
+            bindparam('tags', expanding=True)
+        )
+        with self.engine.connect() as conn:
+            stored = dict(conn.execute(query, {'tags': list(tags)}).all())
+        return tuple(stored.get(tag, 0) for tag in tags)
+    
+    def bump(self, tags: Iterable[str], connection=None):
+        """Bump `tags` on `connection`'s transaction, or in a transaction of their own"""
+        if connection is None:
+            with self.engine.begin() as conn:
+                self.bump(tags, conn)
+            return
+        connection.execute(text('''
+            INSERT INTO query_cache_generations (tag, generation) VALUES (:tag, 1)
+            ON CONFLICT (tag) DO UPDATE SET generation = query_cache_generations.generation + 1
+        '''), [{'tag': tag} for tag in tags])
+    
+    def get(self, key: str) -> Tuple[Optional[str], float]:
+        return None, 0.0
+    
+    def set(self, key: str, payload: str, ttl: float):
+        pass
+
+
+def create_backend(url: Optional[str]):
+    """Shared backend for a URL, or None to cache in this process only"""
+    if not url:
+        return None
+    try:
+        return RedisBackend(url)
+    except ImportError:
+        logging.warning("HONEYTRAP_QUERY_CACHE_URL is set but the redis package is not installed; "
+                        "caching query results per process only")
+        return None
+
+
+class QueryCache:
+    """LRU of read results, each stamped with the generations of the tags it depends on.
+    
+    Writes bump their tags' generations rather than searching for affected
+    entries, so invalidation is O(tags) and an entry is stale as soon as any
+    of its tags has moved on. Generations are read before the result is
+    computed, so a write that commits mid-computation still invalidates it.
+    With a shared backend, generations (and, with Redis, results) live there
+    and the local LRU saves the round trip of fetching and decoding results.
+    Committed writes only bump the `watched` tags: those of ENDPOINT_TAGS plus
+    any other tags this process has looked results up by.
+    """
+    
+    def __init__(self, max_entries: int = CACHE_SIZE, ttl: float = CACHE_TTL, backend=None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend
+        self.clock = clock
+        self.watched = set(chain.from_iterable(ENDPOINT_TAGS.values()))
+        self.entries = OrderedDict()  # key -> (generations, expires at, value)
+        self.generations = defaultdict(int)  # tag -> generation, when there is no shared backend
+        self.counts = defaultdict(lambda: defaultdict(int))  # name -> outcome -> lookups
+        self.lock = Lock()
+    
+    def init_app(self, app):
+        """Share tag generations through the app's database, unless Redis already shares them"""
+        if self.backend is None:
+            with app.app_context():
+                self.backend = DatabaseBackend(db.engine)
+    
+    def get_or_compute(self, name: str, params: Dict, tags: Iterable[str], compute: Callable[[], object],
+                       cacheable: Optional[Callable[[object], bool]] = None):
+        """Cached result of `compute()` for this endpoint and parameters.
+        
+        The result is shared between callers, so it must be JSON-serialisable
+        and must not be modified. Results failing `cacheable` (e.g. error
+        reports) are returned without being stored.
+        """
+        key = cache_key(name, params)
+        tags = tuple(tags)
+        self.watched.update(tags)
+        
+        try:
+            generations = self._generations(tags)
+        except Exception as e:
+            logging.error(f"Error reading query cache generations: {str(e)}")
+            self._record(name, 'error')
+            return compute()
+        
+        now = self.clock()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == generations and entry[1] > now:
+                self.entries.move_to_end(key)
+                hit = True
+            else:
+                hit = False
+        if hit:
+            self._record(name, HIT)
+            return entry[2]
+        
+        if self.backend is not None:
+            value = self._shared_get(key, generations, now)
+            if value is not None:
+                self._record(name, SHARED_HIT)
+                return value[0]
+        
+        value = compute()
+        self._record(name, MISS)
+        if cacheable is not None and not cacheable(value):
+            return value
+        self._store(key, generations, now + self.ttl, value)
+        if self.backend is not None:
+            try:
+                self.backend.set(key, json.dumps({'generations': generations, 'value': value}, default=str), self.ttl)
+            except Exception as e:
+                logging.error(f"Error writing shared query cache: {str(e)}")
+        return value
+    
+    def invalidate(self, *tags: str, shared: bool = True):
+        """Mark every result depending on any of `tags` as stale.
+        
+        Pass shared=False when the shared generations have already been bumped
+        (see bump_in_transaction), so only this process's are.
+        """
+        if not tags:
+            return
+        with self.lock:
+            for tag in tags:
+                self.generations[tag] += 1
+        
+        if self.backend is not None and shared:
+            try:
+                self.backend.bump(tags)
+            except Exception as e:
+                # Other workers keep their results until the TTL; ours are dropped now
+                logging.error(f"Error invalidating shared query cache: {str(e)}")
+                with self.lock:
+                    self.entries.clear()
+        metrics.increment('query_cache_invalidations', len(tags))
+    
+    def bump_in_transaction(self, connection, tags: Iterable[str]) -> bool:
+        """Bump the shared generations on a write's own connection, if they are kept in its database.
+        
+        Returns whether they were, in which case they become visible with the
+        write and are rolled back with it.
+        """
+        if not isinstance(self.backend, DatabaseBackend) or connection.engine is not self.backend.engine:
+            return False
+        self.backend.bump(tags, connection)
+        return True
+    
+    def clear(self):
+        """Drop this process's cached results and hit counts"""
+        with self.lock:
+            self.entries.clear()
+            self.counts.clear()
+    
+    def stats(self) -> Dict:
+        """Lookups and hit rate per endpoint"""
+        with self.lock:
+            return {name: self._summary(counts) for name, counts in self.counts.items()}
+    
+    def _generations(self, tags: Tuple[str, ...]) -> Tuple[int, ...]:
+        if self.backend is not None:
+            return self.backend.generations(tags)
+        with self.lock:
+            return tuple(self.generations[tag] for tag in tags)
+    
+    def _shared_get(self, key: str, generations: Tuple[int, ...], now: float) -> Optional[Tuple]:
+        try:
+            payload, remaining = self.backend.get(key)
+            if payload is None:
+                return None
+            stored = json.loads(payload)
+        except Exception as e:
+            logging.error(f"Error reading shared query cache: {str(e)}")
+            return None
+        if tuple(stored['generations']) != generations:
+            return None
+        self._store(key, generations, now + remaining, stored['value'])
+        return (stored['value'],)
+    
+    def _store(self, key: str, generations: Tuple[int, ...], expires_at: float, value):
+        with self.lock:
+            self.entries[key] = (generations, expires_at, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            size = len(self.entries)
+        metrics.set_gauge('query_cache_entries', size)
+    
+    def _record(self, name: str, outcome: str):
+        with self.lock:
+            self.counts[name][outcome] += 1
+            hit_rate = self._summary(self.counts[name])['hit_rate']
+        metrics.increment(f'query_cache_{outcome}')
+        metrics.set_gauge(f'query_cache_hit_rate_{name}', hit_rate)
+    
+    @staticmethod
+    def _summary(counts: Dict[str, int]) -> Dict:
+        lookups = sum(counts.values())
+        hits = counts.get(HIT, 0) + counts.get(SHARED_HIT, 0)
+        return {
+            'lookups': lookups,
+            'hits': counts.get(HIT, 0),
+            'shared_hits': counts.get(SHARED_HIT, 0),
+            'misses': counts.get(MISS, 0),
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0
+        }
+
+
+def _model_tags(objects) -> set:
+    return {MODEL_TAGS[type(obj)] for obj in objects if type(obj) in MODEL_TAGS}
+
+
+def _dirty_tags(objects) -> set:
+    tags = set()
+    for obj in objects:
+        tag = MODEL_TAGS.get(type(obj))
+        if tag is None:
+            continue
+        narrower = ATTRIBUTE_TAGS.get(type(obj))
+        if narrower is not None:
+            changed = {attr.key for attr in inspect(obj).attrs if attr.history.has_changes()}
+            if changed <= narrower[0]:
+                tag = narrower[1]
+        tags.add(tag)
+    return tags
+
+
+def _stage_tags(session: Session, tags: set):
+    """Remember tags to invalidate once the session commits, bumping shared generations kept in its database now"""
+    staged = session.info.setdefault('query_cache_tags', set())
+    # Nothing cached depends on the rest (e.g. messages), so chat writes skip bumping them
+    new_tags = (tags & query_cache.watched) - staged
+    if new_tags and query_cache.bump_in_transaction(session.connection(), sorted(new_tags)):
+        session.info['query_cache_bumped'] = True
+    staged.update(new_tags)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_flushed_tags(session: Session, flush_context):
+    dirty = [obj for obj in session.dirty if session.is_modified(obj, include_collections=False)]
+    tags = _model_tags(session.new) | _dirty_tags(dirty) | _model_tags(session.deleted)
+    if tags:
+        _stage_tags(session, tags)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_tags(orm_execute_state):
+    # Query.update()/delete() skip the flush, so tag them from the statement
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        tag = MODEL_TAGS.get(mapper.class_) if mapper is not None else None
+        if tag:
+            _stage_tags(orm_execute_state.session, {tag})
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session: Session):
+    # Only once the rows are visible, so a concurrent read cannot re-cache the old ones
+    tags = session.info.pop('query_cache_tags', None)
+    bumped = session.info.pop('query_cache_bumped', False)
+    if tags:
+        query_cache.invalidate(*sorted(tags), shared=not bumped)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back(session: Session):
+    session.info.pop('query_cache_tags', None)
+    session.info.pop('query_cache_bumped', None)
+
+
+# Global query cache
+query_cache = QueryCache(backend=create_backend(CACHE_URL))
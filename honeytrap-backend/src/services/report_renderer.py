@@ -0,0 +1,191 @@
+"""
+Report Renderer
+Renders the PDF evidence report for a chat session
+"""
+
+import json
+import os
+import tempfile
+from itertools import chain
+from typing import Iterable, Iterator
+from xml.sax.saxutils import escape
+
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib import colors
+
+# Flowables kept queued ahead of the page being laid out
+STORY_BUFFER = 64
+
+styles = getSampleStyleSheet()
+
+TITLE_STYLE = ParagraphStyle(
+    'CustomTitle',
+    parent=styles['Heading1'],
+    fontSize=18,
+    spaceAfter=30,
+    alignment=1  # Center alignment
+)
+
+INFO_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+    ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+    ('BACKGROUND', (1, 0), (1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+
+def _message_style(name, border_color, border_width):
+    return ParagraphStyle(
+        name,
+        parent=styles['Normal'],
+        leftIndent=20,
+        spaceAfter=10,
+        borderColor=border_color,
+        borderWidth=border_width,
+        borderPadding=5
+    )
+
+
+# One style per threat band, shared by every message in every report
+NORMAL_MESSAGE_STYLE = _message_style('MessageContent', colors.grey, 0)
+SUSPICIOUS_MESSAGE_STYLE = _message_style('SuspiciousMessageContent', colors.orange, 1)
+HIGH_RISK_MESSAGE_STYLE = _message_style('HighRiskMessageContent', colors.red, 1)
+
+
+def message_style(threat_level: int) -> ParagraphStyle:
+    if threat_level >= 2:
+        return HIGH_RISK_MESSAGE_STYLE
+    if threat_level >= 1:
+        return SUSPICIOUS_MESSAGE_STYLE
+    return NORMAL_MESSAGE_STYLE
+
+
+class StreamingStory(list):
+    """A story that pulls flowables from an iterator as the document lays them out.
+    
+    ReportLab consumes a story from the front and pushes split remainders
+    back onto it, so keeping `buffer_size` flowables queued is enough; pages
+    are written as they fill instead of after the whole story is built.
+    """
+    
+    def __init__(self, flowables: Iterable, buffer_size: int = STORY_BUFFER):
+        super().__init__()
+        self.flowables = iter(flowables)
+        self.buffer_size = buffer_size
+        self.exhausted = False
+    
+    def _fill(self):
+        while not self.exhausted and list.__len__(self) < self.buffer_size:
+            try:
+                self.append(next(self.flowables))
+            except StopIteration:
+                self.exhausted = True
+    
+    def __len__(self):
+        self._fill()
+        return list.__len__(self)
+    
+    def __getitem__(self, index):
+        self._fill()
+        return list.__getitem__(self, index)
+
+
+def title_flowables(title: str) -> Iterator:
+    yield Paragraph(escape(title), TITLE_STYLE)
+    yield Spacer(1, 20)
+
+
+def case_flowables(chat_session) -> Iterator:
+    # Case Information
+    yield Paragraph("CASE INFORMATION", styles['Heading2'])
+    case_data = [
+        ['Session ID:', chat_session.session_id],
+        ['Date Created:', chat_session.created_at.strftime('%Y-%m-%d %H:%M:%S UTC')],
+        ['Last Activity:', chat_session.last_activity.strftime('%Y-%m-%d %H:%M:%S UTC')],
+        ['Escalation Level:', f"Level {chat_session.escalation_level}"],
+        ['Evidence Captured:', 'Yes' if chat_session.evidence_captured else 'No'],
+        ['User IP Address:', chat_session.user_ip],
+        ['User Agent:', chat_session.user_agent or 'Not available']
+    ]
+    case_table = Table(case_data, colWidths=[2*72, 4*72])
+    case_table.setStyle(INFO_TABLE_STYLE)
+    yield case_table
+    yield Spacer(1, 20)
+    
+    # Persona Information
+    yield Paragraph("DECOY PERSONA INFORMATION", styles['Heading2'])
+    persona = chat_session.persona
+    persona_data = [
+        ['Persona Name:', persona.name],
+        ['Age:', str(persona.age)],
+        ['Platform:', persona.platform_type.title()],
+        ['Personality Traits:', json.dumps(json.loads(persona.personality_traits), indent=2)]
+    ]
+    persona_table = Table(persona_data, colWidths=[2*72, 4*72])
+    persona_table.setStyle(INFO_TABLE_STYLE)
+    yield persona_table
+    yield Spacer(1, 20)
+
+
+def transcript_flowables(messages: Iterable, persona_name: str) -> Iterator:
+    yield Paragraph("CHAT TRANSCRIPT", styles['Heading2'])
+    decoy = f"DECOY ({escape(persona_name)})"
+    for message in messages:
+        sender = "SUSPECT" if message.sender_type == 'user' else decoy
+        timestamp = message.timestamp.strftime('%Y-%m-%d %H:%M:%S UTC')
+        
+        # Message header
+        header_text = f"<b>{sender}</b> - {timestamp}"
+        if message.threat_level > 0:
+            header_text += f" <b>[THREAT LEVEL: {message.threat_level}]</b>"
+        yield Paragraph(header_text, styles['Normal'])
+        
+        # Message content, escaped so suspects' text can't be read as markup
+        yield Paragraph(escape(message.message_content), message_style(message.threat_level))
+        yield Spacer(1, 10)
+
+
+def evidence_flowables(evidence_list: Iterable) -> Iterator:
+    for index, evidence in enumerate(evidence_list):
+        if index == 0:
+            yield Paragraph("EVIDENCE SUMMARY", styles['Heading2'])
+        yield Paragraph(f"<b>Evidence Type:</b> {escape(evidence.evidence_type)}", styles['Normal'])
+        yield Paragraph(f"<b>Created:</b> {evidence.created_at.strftime('%Y-%m-%d %H:%M:%S UTC')}", styles['Normal'])
+        yield Paragraph(f"<b>Hash:</b> {evidence.hash_value}", styles['Normal'])
+        yield Spacer(1, 10)
+
+
+def generate_pdf_report(chat_session, messages, evidence_list, output_path=None, invariant=False):
+    """Generate a PDF evidence report for law enforcement
+    
+    `messages` and `evidence_list` may be any iterables (such as
+    iter_transcript) and are consumed as pages are laid out, so memory use
+    doesn't grow with the length of the transcript. Writes to `output_path`,
+    or to a new temporary file the caller must remove. With `invariant`, the
+    same data always renders to the same bytes.
+    """
+    if output_path is None:
+        fd, output_path = tempfile.mkstemp(suffix='.pdf')
+        os.close(fd)
+    
+    render_flowables(output_path, chain(
+        title_flowables("DIGITAL EVIDENCE REPORT"),
+        case_flowables(chat_session),
+        transcript_flowables(messages, chat_session.persona.name),
+        evidence_flowables(evidence_list)
+    ), invariant)
+    
+    return output_path
+
+
+def render_flowables(output_path: str, flowables: Iterable, invariant: bool = False) -> int:
+    """Lay out a stream of flowables page by page; returns the number of pages"""
+    doc = SimpleDocTemplate(output_path, pagesize=letter, invariant=invariant)
+    doc.build(StreamingStory(flowables))
+    return doc.page
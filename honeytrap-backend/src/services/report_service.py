@@ -0,0 +1,302 @@
+"""
+Report Service
+Renders evidence reports on a worker pool, caches them by content and coalesces duplicate requests
+"""
+
+import glob
+import hashlib
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from threading import Event, Lock
+from typing import Callable, List, Optional
+
+from src.models.user import db
+from src.models.chat import ChatSession, Evidence
+from src.services.report_renderer import generate_pdf_report
+from src.services.case_report import CASE_REPORT_SCRIPT
+from src.services.transcripts import iter_transcript
+from src.serving import run_blocking
+
+REPORT_CACHE_DIR = os.environ.get(
+    'HONEYTRAP_REPORT_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'reports')
+)
+REPORT_WORKERS = int(os.environ.get('HONEYTRAP_REPORT_WORKERS', 2))
+# Case reports each run a process pool as wide as the CPU count, so only this many render at once
+CASE_REPORT_JOBS = int(os.environ.get('HONEYTRAP_CASE_REPORT_JOBS', 1))
+# Cached reports and finished jobs are dropped after this many seconds
+REPORT_CACHE_TTL = float(os.environ.get('HONEYTRAP_REPORT_CACHE_TTL', 86400))
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def report_fingerprint(chat_session: ChatSession, until: Optional[int] = None) -> str:
+    """Hash of everything a session's report shows, with messages up to id `until` (requires an app context).
+    
+    Messages are streamed in batches, so this stays cheap next to rendering.
+    """
+    digest = hashlib.sha256()
+    persona = chat_session.persona
+    digest.update(repr((
+        chat_session.session_id, chat_session.created_at, chat_session.last_activity,
+        chat_session.escalation_level, chat_session.evidence_captured, chat_session.user_ip,
+        chat_session.user_agent, persona.name, persona.age, persona.platform_type, persona.personality_traits
+    )).encode())
+    
+    for message in iter_transcript(chat_session.id, until=until):
+        digest.update(repr((message.id, message.sender_type, message.timestamp, message.threat_level)).encode())
+        digest.update(hashlib.sha256(message.message_content.encode()).digest())
+    
+    evidence_rows = db.session.query(
+        Evidence.id, Evidence.evidence_type, Evidence.created_at, Evidence.hash_value
+    ).filter(Evidence.session_id == chat_session.id).order_by(Evidence.id).all()
+    for row in evidence_rows:
+        digest.update(repr(tuple(row)).encode())
+    return digest.hexdigest()
+
+
+class ReportJob:
+    """One requested report and where its rendering has got to.
+    
+    A job covers a single session's report, or a consolidated case report
+    when `session_ids` is given.
+    """
+    
+    def __init__(self, session_id: Optional[int], cache_key: str, path: str, download_name: str,
+                 session_ids: Optional[List[int]] = None):
+        self.job_id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.session_ids = session_ids
+        self.download_name = download_name
+        self.cache_key = cache_key
+        self.path = path
+        self.supersedes = None  # Glob of the reports this one replaces once rendered
+        self.status = QUEUED
+        self.error = None
+        self.created_at = datetime.utcnow()
+        self.submitted = time.time()
+        self.finished_at = None
+        self.finished = time.monotonic()
+        self.done = Event()
+    
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'session_id': self.session_id,
+            'session_ids': self.session_ids,
+            'cache_key': self.cache_key,
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class ReportService:
+    """Evidence reports rendered in the background.
+    
+    A report is cached under the session id and a fingerprint of the
+    messages and evidence it shows, so it is rendered again only when those
+    change. Requests for a report that is already being rendered join the
+    running job instead of starting another, and rendering happens on a
+    small thread pool so request threads return straight away. Case reports
+    queue on a pool of their own `case_workers` threads, so they never hold
+    up session reports and at most that many case process pools run at once.
+    """
+    
+    def __init__(self, cache_dir: str = REPORT_CACHE_DIR, workers: int = REPORT_WORKERS,
+                 cache_ttl: float = REPORT_CACHE_TTL, case_workers: int = CASE_REPORT_JOBS):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.case_workers = case_workers
+        self.cache_ttl = cache_ttl
+        self.lock = Lock()
+        self.jobs = {}  # job id -> job
+        self.in_flight = {}  # cache key -> queued or running job
+        self.executor = None
+        self.case_executor = None
+        self.app = None
+    
+    def init_app(self, app):
+        """Attach the Flask app whose context reports are rendered in"""
+        self.app = app
+    
+    def submit(self, session_id: int) -> Optional[ReportJob]:
+        """Get a job for the session's current report (requires an app context).
+        
+        Returns a finished job if the report is cached, the running job if one
+        is already rendering it, or a newly queued job; None if there is no
+        such session.
+        """
+        chat_session = db.session.get(ChatSession, session_id)
+        if not chat_session:
+            return None
+        
+        cache_key = report_fingerprint(chat_session)
+        job = ReportJob(session_id, cache_key, os.path.join(self.cache_dir, f'{session_id}-{cache_key}.pdf'),
+                        f'evidence_report_{chat_session.session_id}.pdf')
+        job.supersedes = os.path.join(self.cache_dir, f'{session_id}-*.pdf')
+        return self._start(job, self._render_session)
+    
+    def submit_case(self, session_ids: List[int]) -> Optional[ReportJob]:
+        """Get a job for a consolidated report across several sessions (requires an app context).
+        
+        Cached, coalesced and returned like `submit`; None if any session doesn't exist.
+        """
+        sessions = ChatSession.query.filter(ChatSession.id.in_(session_ids)).order_by(ChatSession.id).all()
+        if not sessions or len(sessions) != len(set(session_ids)):
+            return None
+        
+        digest = hashlib.sha256()
+        for chat_session in sessions:
+            digest.update(f'{chat_session.id}:{report_fingerprint(chat_session)}\n'.encode())
+        cache_key = digest.hexdigest()
+        job = ReportJob(None, cache_key, os.path.join(self.cache_dir, f'case-{cache_key}.pdf'),
+                        f'case_report_{cache_key[:12]}.pdf', [chat_session.id for chat_session in sessions])
+        return self._start(job, self._render_case, case=True)
+    
+    def submit_bundle(self, session_id: int, until: int) -> Optional[ReportJob]:
+        """Get a job for the byte-for-byte reproducible report a case bundle ships (requires an app context).
+        
+        The report covers messages up to id `until`. It is cached and
+        coalesced like `submit`, so resuming a bundle download reuses the
+        render instead of repeating it. Older bundle reports are left to
+        expire rather than superseded, as a download may still be reading one.
+        """
+        chat_session = db.session.get(ChatSession, session_id)
+        if not chat_session:
+            return None
+        
+        # Kept apart from the session's ordinary report, which renders the same content to different bytes
+        cache_key = hashlib.sha256(f'bundle:{report_fingerprint(chat_session, until)}'.encode()).hexdigest()
+        job = ReportJob(session_id, cache_key, os.path.join(self.cache_dir, f'bundle-{session_id}-{cache_key}.pdf'),
+                        f'evidence_report_{chat_session.session_id}.pdf')
+        return self._start(job, lambda job, path: self._render_bundle(job, until, path))
+    
+    def _start(self, job: ReportJob, render: Callable[[ReportJob, str], None], case: bool = False) -> ReportJob:
+        with self.lock:
+            self._expire()
+            running = self.in_flight.get(job.cache_key)
+            if running:
+                return running
+            
+            self.jobs[job.job_id] = job
+            if os.path.exists(job.path):
+                os.utime(job.path)
+                job.status = DONE
+                job.finished_at = job.created_at
+                job.done.set()
+                return job
+            
+            self.in_flight[job.cache_key] = job
+            if case:
+                if self.case_executor is None:
+                    self.case_executor = ThreadPoolExecutor(max_workers=self.case_workers,
+                                                            thread_name_prefix='case-report')
+                executor = self.case_executor
+            else:
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='report')
+                executor = self.executor
+        
+        executor.submit(self._render, job, render)
+        return job
+    
+    def get(self, job_id: str) -> Optional[ReportJob]:
+        with self.lock:
+            return self.jobs.get(job_id)
+    
+    def wait(self, job: ReportJob, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for a job to finish; True if it has"""
+        return job.done.wait(timeout)
+    
+    def _render(self, job: ReportJob, render: Callable[[ReportJob, str], None]):
+        job.status = RUNNING
+        temp_path = None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            os.close(fd)
+            
+            # Under gevent, render on a native thread so the event loop keeps serving
+            run_blocking(render, job, temp_path)
+            
+            os.replace(temp_path, job.path)
+            temp_path = None
+            if job.supersedes:
+                self._remove_superseded(job)
+            job.status = DONE
+        except Exception as e:
+            logging.error(f"Error rendering report {job.download_name}: {str(e)}")
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            if temp_path:
+                os.unlink(temp_path)
+            job.finished_at = datetime.utcnow()
+            job.finished = time.monotonic()
+            with self.lock:
+                self.in_flight.pop(job.cache_key, None)
+            job.done.set()
+    
+    def _render_session(self, job: ReportJob, path: str):
+        with self.app.app_context():
+            chat_session = db.session.get(ChatSession, job.session_id)
+            evidence_list = Evidence.query.filter_by(session_id=job.session_id).order_by(Evidence.id).yield_per(500)
+            generate_pdf_report(chat_session, iter_transcript(job.session_id), evidence_list, path)
+    
+    def _render_bundle(self, job: ReportJob, until: int, path: str):
+        with self.app.app_context():
+            chat_session = db.session.get(ChatSession, job.session_id)
+            evidence_list = Evidence.query.filter_by(session_id=job.session_id).order_by(Evidence.id).yield_per(500)
+            generate_pdf_report(chat_session, iter_transcript(job.session_id, until=until), evidence_list, path,
+                                invariant=True)
+    
+    def _render_case(self, job: ReportJob, path: str):
+        # Sections render in a process pool, which runs from its own script so
+        # spawned workers never re-import the server module
+        command = [sys.executable, CASE_REPORT_SCRIPT, '--database-uri', self.app.config['SQLALCHEMY_DATABASE_URI'],
+                   '--output', path, '--sessions', *map(str, job.session_ids)]
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise RuntimeError(completed.stderr.strip()[-2000:] or f'Case report exited with code {completed.returncode}')
+    
+    def _remove_superseded(self, job: ReportJob):
+        """Delete the reports this one replaces that were last used before it was requested"""
+        for path in glob.glob(job.supersedes):
+            try:
+                # A report requested after this job may already have finished; keep it
+                if path != job.path and os.path.getmtime(path) < job.submitted:
+                    os.unlink(path)
+            except FileNotFoundError:
+                pass
+    
+    def _expire(self):
+        """Forget old finished jobs and delete reports nobody has asked for lately"""
+        now = time.monotonic()
+        for job_id in [job_id for job_id, job in self.jobs.items()
+                       if job.status in (DONE, FAILED) and now - job.finished > self.cache_ttl]:
+            del self.jobs[job_id]
+        
+        # Includes temporary files left behind by a crash mid-render
+        cutoff = time.time() - self.cache_ttl
+        for path in glob.glob(os.path.join(self.cache_dir, '*.pdf')) + glob.glob(os.path.join(self.cache_dir, '*.tmp')):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+
+# Global report service
+report_service = ReportService()
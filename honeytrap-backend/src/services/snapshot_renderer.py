@@ -0,0 +1,293 @@
+"""
+Snapshot Renderer
+Draws a window of a chat transcript as a PNG in the visual style of the decoy's platform
+"""
+
+import io
+from datetime import datetime
+from functools import lru_cache
+from typing import List, Sequence, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+SNAPSHOT_WIDTH = 720
+MARGIN = 16
+LINE_SPACING = 4
+MESSAGE_SPACING = 12
+
+TEXT_SIZE = 15
+SMALL_SIZE = 12
+HEADER_SIZE = 17
+
+# Right-edge marks beside messages the detector flagged
+FLAG_COLORS = {1: (255, 153, 0), 2: (230, 0, 0)}
+FLAG_WIDTH = 5
+
+DEFAULT_PLATFORM = 'discord'
+
+PLATFORM_STYLES = {
+    'discord': {
+        'label': 'Discord',
+        'layout': 'flat',
+        'background': (49, 51, 56),
+        'header_background': (43, 45, 49),
+        'header_text': (242, 243, 245),
+        'text': (219, 222, 225),
+        'muted': (148, 155, 164),
+        'suspect_name': (242, 243, 245),
+        'decoy_name': (201, 205, 251),
+        'suspect_accent': (88, 101, 242),
+        'decoy_accent': (235, 69, 158)
+    },
+    'snapchat': {
+        'label': 'Snapchat',
+        'layout': 'labelled',
+        'background': (255, 255, 255),
+        'header_background': (255, 252, 0),
+        'header_text': (0, 0, 0),
+        'text': (22, 22, 22),
+        'muted': (140, 140, 140),
+        'suspect_name': (15, 173, 255),
+        'decoy_name': (242, 60, 87),
+        'suspect_accent': (15, 173, 255),
+        'decoy_accent': (242, 60, 87)
+    },
+    'tiktok': {
+        'label': 'TikTok',
+        'layout': 'bubbles',
+        'background': (255, 255, 255),
+        'header_background': (248, 248, 248),
+        'header_text': (22, 24, 35),
+        'text': (22, 24, 35),
+        'muted': (138, 139, 145),
+        'suspect_name': (22, 24, 35),
+        'decoy_name': (255, 255, 255),
+        'suspect_accent': (241, 241, 242),
+        'decoy_accent': (47, 128, 237)
+    }
+}
+
+# One message as handed to the renderer: (id, sender_type, content, timestamp, threat_level)
+SnapshotMessage = Tuple[int, str, str, datetime, int]
+
+
+@lru_cache(maxsize=None)
+def _font(size: int) -> ImageFont.FreeTypeFont:
+    # Pillow's bundled font, so every host draws the same pixels
+    return ImageFont.load_default(size=size)
+
+
+@lru_cache(maxsize=None)
+def _line_height(size: int) -> int:
+    ascent, descent = _font(size).getmetrics()
+    return ascent + descent + LINE_SPACING
+
+
+@lru_cache(maxsize=8192)
+def _glyph(size: int, char: str) -> Tuple[Image.Image, int, int, float]:
+    """A glyph's coverage mask, offsets and advance, rasterised once per process"""
+    font = _font(size)
+    left, top, right, bottom = font.getbbox(char)
+    mask = None
+    if right > left and bottom > top:
+        mask = Image.new('L', (right - left, bottom - top), 0)
+        ImageDraw.Draw(mask).text((-left, -top), char, font=font, fill=255)
+    return mask, left, top, font.getlength(char)
+
+
+@lru_cache(maxsize=65536)
+def text_width(size: int, text: str) -> float:
+    """Width of text as _draw_text lays it out, cached per process"""
+    return sum(_glyph(size, char)[3] for char in text)
+
+
+def _draw_text(draw: ImageDraw.ImageDraw, xy: Tuple[float, float], text: str, size: int, color):
+    # Rasterising a line costs ~100x compositing its cached glyphs
+    x, y = xy
+    for char in text:
+        mask, left, top, advance = _glyph(size, char)
+        if mask:
+            draw.bitmap((round(x + left), round(y + top)), mask, fill=color)
+        x += advance
+
+
+def wrap_text(text: str, size: int, max_width: float) -> List[str]:
+    """Break text into lines no wider than `max_width`, splitting overlong words"""
+    space = text_width(size, ' ')
+    lines = []
+    for paragraph in text.split('\n'):
+        line, width = '', 0.0
+        for word in paragraph.split(' '):
+            word_width = text_width(size, word)
+            if line and width + space + word_width <= max_width:
+                line, width = f'{line} {word}', width + space + word_width
+                continue
+            if line:
+                lines.append(line)
+            line, width = '', 0.0
+            while word_width > max_width:
+                # Take as many characters as fit
+                cut, cut_width = 0, 0.0
+                while cut < len(word) and cut_width + text_width(size, word[cut]) <= max_width:
+                    cut_width += text_width(size, word[cut])
+                    cut += 1
+                cut = max(cut, 1)
+                lines.append(word[:cut])
+                word = word[cut:]
+                word_width = text_width(size, word)
+            line, width = word, word_width
+        lines.append(line)
+    return lines
+
+
+def _text_ops(lines: List[str], x: float, y: float, size: int, color) -> Tuple[List[tuple], float]:
+    ops = []
+    for line in lines:
+        ops.append(('text', (x, y), line, size, color))
+        y += _line_height(size)
+    return ops, y
+
+
+def _flag_op(message: SnapshotMessage, top: float, bottom: float) -> List[tuple]:
+    color = FLAG_COLORS.get(min(message[4] or 0, 2))
+    if not color:
+        return []
+    return [('rect', (SNAPSHOT_WIDTH - FLAG_WIDTH, top, SNAPSHOT_WIDTH - 1, bottom), color, 0)]
+
+
+def _sender(message: SnapshotMessage) -> str:
+    return 'suspect' if message[1] == 'user' else 'decoy'
+
+
+def _starts_group(messages: Sequence[SnapshotMessage], index: int) -> bool:
+    return index == 0 or _sender(messages[index - 1]) != _sender(messages[index])
+
+
+def _flat_ops(style, persona_name, messages, y) -> Tuple[List[tuple], float]:
+    """Discord: avatar, name and time heading each run of messages from one sender"""
+    ops = []
+    avatar = 40
+    x = MARGIN + avatar + 12
+    max_width = SNAPSHOT_WIDTH - x - MARGIN - FLAG_WIDTH
+    for index, message in enumerate(messages):
+        sender = _sender(message)
+        top = y
+        if _starts_group(messages, index):
+            if index:
+                y += MESSAGE_SPACING
+                top = y
+            ops.append(('ellipse', (MARGIN, y, MARGIN + avatar, y + avatar), style[f'{sender}_accent']))
+            name = 'Suspect' if sender == 'suspect' else persona_name
+            ops.append(('text', (x, y), name, TEXT_SIZE, style[f'{sender}_name']))
+            ops.append(('text', (x + text_width(TEXT_SIZE, name) + 8, y + 2),
+                        message[3].strftime('%Y-%m-%d %H:%M'), SMALL_SIZE, style['muted']))
+            y += _line_height(TEXT_SIZE)
+        text_ops, y = _text_ops(wrap_text(message[2], TEXT_SIZE, max_width), x, y, TEXT_SIZE, style['text'])
+        ops += text_ops
+        ops += _flag_op(message, top, y)
+        if _starts_group(messages, index):
+            y = max(y, top + avatar)
+    return ops, y
+
+
+def _labelled_ops(style, persona_name, messages, y) -> Tuple[List[tuple], float]:
+    """Snapchat: coloured sender label over a coloured bar beside the text"""
+    ops = []
+    x = MARGIN + 10
+    max_width = SNAPSHOT_WIDTH - x - MARGIN - FLAG_WIDTH
+    for index, message in enumerate(messages):
+        sender = _sender(message)
+        if _starts_group(messages, index):
+            if index:
+                y += MESSAGE_SPACING
+            label = 'SUSPECT' if sender == 'suspect' else 'ME'
+            ops.append(('text', (MARGIN, y), label, SMALL_SIZE, style[f'{sender}_name']))
+            ops.append(('text', (MARGIN + text_width(SMALL_SIZE, label) + 8, y),
+                        message[3].strftime('%Y-%m-%d %H:%M'), SMALL_SIZE, style['muted']))
+            y += _line_height(SMALL_SIZE)
+        top = y
+        text_ops, y = _text_ops(wrap_text(message[2], TEXT_SIZE, max_width), x, y, TEXT_SIZE, style['text'])
+        ops.append(('rect', (MARGIN, top, MARGIN + 2, y - LINE_SPACING), style[f'{sender}_accent'], 0))
+        ops += text_ops
+        ops += _flag_op(message, top, y)
+    return ops, y
+
+
+def _bubble_ops(style, persona_name, messages, y) -> Tuple[List[tuple], float]:
+    """TikTok: rounded bubbles, the decoy's on the right"""
+    ops = []
+    padding = 10
+    max_width = (SNAPSHOT_WIDTH - 2 * MARGIN) * 0.7 - 2 * padding
+    for index, message in enumerate(messages):
+        sender = _sender(message)
+        if _starts_group(messages, index):
+            if index:
+                y += MESSAGE_SPACING
+            stamp = message[3].strftime('%Y-%m-%d %H:%M')
+            ops.append(('text', ((SNAPSHOT_WIDTH - text_width(SMALL_SIZE, stamp)) / 2, y),
+                        stamp, SMALL_SIZE, style['muted']))
+            y += _line_height(SMALL_SIZE) + 4
+        lines = wrap_text(message[2], TEXT_SIZE, max_width)
+        width = max(text_width(TEXT_SIZE, line) for line in lines) + 2 * padding
+        height = len(lines) * _line_height(TEXT_SIZE) - LINE_SPACING + 2 * padding
+        left = SNAPSHOT_WIDTH - MARGIN - FLAG_WIDTH - width if sender == 'decoy' else MARGIN
+        ops.append(('rect', (left, y, left + width, y + height), style[f'{sender}_accent'], 14))
+        text_ops, _ = _text_ops(lines, left + padding, y + padding, TEXT_SIZE, style[f'{sender}_name'])
+        ops += text_ops
+        ops += _flag_op(message, y, y + height)
+        y += height + 4
+    return ops, y
+
+
+LAYOUTS = {'flat': _flat_ops, 'labelled': _labelled_ops, 'bubbles': _bubble_ops}
+
+
+def render_snapshot(platform: str, persona_name: str, session_label: str,
+                    messages: Sequence[SnapshotMessage]) -> bytes:
+    """Draw a transcript window as a PNG.
+    
+    The same messages always produce the same bytes (given the same Pillow
+    release), so a snapshot's hash is stable and re-rendering it adds no new
+    evidence.
+    """
+    style = PLATFORM_STYLES.get(platform, PLATFORM_STYLES[DEFAULT_PLATFORM])
+    header_height = _line_height(HEADER_SIZE) + 2 * MARGIN
+    ops = [
+        ('rect', (0, 0, SNAPSHOT_WIDTH - 1, header_height), style['header_background'], 0),
+        ('text', (MARGIN, MARGIN), f"{persona_name} ({style['label']})",
+         HEADER_SIZE, style['header_text'])
+    ]
+    
+    body_ops, y = LAYOUTS[style['layout']](style, persona_name, messages, header_height + MARGIN)
+    ops += body_ops
+    
+    # Say what this is, so it can't be mistaken for a capture of the device
+    y += MARGIN
+    footer = (f'Session {session_label}, messages {messages[0][0]}-{messages[-1][0]}. '
+              f'Rendered from the stored transcript; times UTC; right-edge marks flag threats.')
+    for line in wrap_text(footer, SMALL_SIZE, SNAPSHOT_WIDTH - 2 * MARGIN):
+        ops.append(('text', (MARGIN, y), line, SMALL_SIZE, style['muted']))
+        y += _line_height(SMALL_SIZE)
+    
+    image = Image.new('RGB', (SNAPSHOT_WIDTH, int(y + MARGIN)), style['background'])
+    draw = ImageDraw.Draw(image)
+    for op in ops:
+        if op[0] == 'text':
+            _draw_text(draw, op[1], op[2], op[3], op[4])
+        elif op[0] == 'rect':
+            if op[3]:
+                draw.rounded_rectangle(op[1], radius=op[3], fill=op[2])
+            else:
+                draw.rectangle(op[1], fill=op[2])
+        else:
+            draw.ellipse(op[1], fill=op[2])
+    
+    output = io.BytesIO()
+    image.save(output, format='PNG')
+    return output.getvalue()
+
+
+def render_snapshot_job(job: tuple) -> Tuple[int, int, bytes]:
+    """Worker-pool entry point: (platform, persona_name, session_label, messages) -> (first id, last id, PNG)"""
+    platform, persona_name, session_label, messages = job
+    return messages[0][0], messages[-1][0], render_snapshot(platform, persona_name, session_label, messages)
@@ -0,0 +1,85 @@
+"""
+Transcript Snapshots
+Turns windows of a session's transcript into screenshot evidence
+"""
+
+import hashlib
+import io
+import os
+from typing import Callable, Dict, Iterator, List
+
+from src.models.user import db
+from src.models.chat import ChatSession, Evidence
+from src.services.blob_store import blob_store
+from src.services.evidence_ledger import evidence_ledger
+from src.services.snapshot_renderer import SnapshotMessage, render_snapshot_job
+from src.services.transcripts import iter_transcript
+
+SNAPSHOT_SCRIPT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))),
+    'scripts', 'render_snapshots.py'
+)
+
+# Messages drawn in each snapshot
+SNAPSHOT_WINDOW = int(os.environ.get('HONEYTRAP_SNAPSHOT_WINDOW', 20))
+
+SCREENSHOT = 'screenshot'
+
+
+def transcript_windows(db_session_id: int, window: int = SNAPSHOT_WINDOW,
+                       flagged_only: bool = False) -> Iterator[List[SnapshotMessage]]:
+    """Consecutive runs of `window` messages, optionally only runs with a flagged message"""
+    messages = []
+    for message in iter_transcript(db_session_id):
+        messages.append((message.id, message.sender_type, message.message_content,
+                         message.timestamp, message.threat_level or 0))
+        if len(messages) == window:
+            if not flagged_only or any(m[4] >= 1 for m in messages):
+                yield messages
+            messages = []
+    if messages and (not flagged_only or any(m[4] >= 1 for m in messages)):
+        yield messages
+
+
+def capture_snapshots(chat_session: ChatSession, window: int = SNAPSHOT_WINDOW, flagged_only: bool = False,
+                      map_function: Callable = map) -> Dict:
+    """Render a session's transcript windows and store them as screenshot evidence (requires an app context).
+    
+    `map_function` runs the renders, e.g. a process pool's map. Snapshots
+    render deterministically, so windows already captured are skipped and
+    capturing twice adds nothing.
+    """
+    persona = chat_session.persona
+    existing = {row.hash_value for row in db.session.query(Evidence.hash_value).filter_by(
+        session_id=chat_session.id, evidence_type=SCREENSHOT
+    )}
+    jobs = ((persona.platform_type, persona.name, chat_session.session_id, messages)
+            for messages in transcript_windows(chat_session.id, window, flagged_only))
+    
+    evidence_list, skipped = [], 0
+    with blob_store.batch() as batch:
+        for first_id, last_id, png in map_function(render_snapshot_job, jobs):
+            sha256 = hashlib.sha256(png).hexdigest()
+            if sha256 in existing:
+                skipped += 1
+                continue
+            existing.add(sha256)
+            evidence_list.append(blob_store.add_evidence(batch, chat_session.id, SCREENSHOT, io.BytesIO(png), {
+                'filename': f'snapshot_{chat_session.session_id}_{first_id}-{last_id}.png',
+                'content_type': 'image/png',
+                'platform': persona.platform_type,
+                'first_message_id': first_id,
+                'last_message_id': last_id
+            }))
+        db.session.flush()
+    
+    if evidence_list:
+        chat_session.evidence_captured = True
+    db.session.commit()
+    evidence_ledger.record_batch(evidence_list)
+    
+    return {
+        'session_id': chat_session.id,
+        'evidence_ids': [evidence.id for evidence in evidence_list],
+        'skipped': skipped
+    }
@@ -0,0 +1,296 @@
+"""
+Stats Buckets
+Hourly and daily aggregate counts for dashboard statistics, updated in the same transaction as the rows they count
+"""
+
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, attributes
+
+from src.models.user import db
+from src.models.chat import ChatSession, Evidence, AuditLog, StatsBucket
+from src.models.profile import ProfileContent
+from src.services.query_cache import query_cache, STATS
+
+# Seconds between rebuilds of the buckets from the raw tables
+RECONCILE_INTERVAL = float(os.environ.get('HONEYTRAP_STATS_RECONCILE_INTERVAL', 86400))
+
+HOUR = 'hour'
+DAY = 'day'
+GRANULARITIES = (HOUR, DAY)
+
+SESSIONS_STARTED = 'sessions_started'  # By session creation time
+HIGH_RISK_SESSIONS = 'high_risk_sessions'  # Sessions at escalation level 2+, by creation time
+EVIDENCE_CAPTURED = 'evidence_captured'  # Evidence items, by their session's creation time
+CONTENT_POSTED = 'content_posted'  # Posted decoy content, by posting time
+AUDIT_EVENTS = 'audit_events'  # Audit log entries, by timestamp
+
+_table = StatsBucket.__table__
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    if granularity == HOUR:
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _committed(obj, key: str):
+    """The attribute's value as last loaded from the database"""
+    history = attributes.get_history(obj, key)
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(obj, key)
+
+
+def _session_counts(created_at, escalation_level) -> Dict[str, datetime]:
+    counts = {SESSIONS_STARTED: created_at}
+    if (escalation_level or 0) >= 2:
+        counts[HIGH_RISK_SESSIONS] = created_at
+    return counts
+
+
+def _content_counts(status, posted_time) -> Dict[str, datetime]:
+    return {CONTENT_POSTED: posted_time} if status == 'posted' and posted_time else {}
+
+
+def _add(deltas, counts: Dict[str, datetime], sign: int):
+    for metric, moment in counts.items():
+        if moment is None:
+            continue
+        for granularity in GRANULARITIES:
+            deltas[(metric, granularity, bucket_start(moment, granularity))] += sign
+
+
+def _session_created_at(session: Session, session_ids) -> Dict[int, datetime]:
+    rows = session.connection().execute(
+        select(ChatSession.id, ChatSession.created_at).where(ChatSession.id.in_(session_ids))
+    )
+    return dict(rows.all())
+
+
+def apply_deltas(connection, deltas: Dict[Tuple[str, str, datetime], int]):
+    """Add to bucket counts, creating buckets as needed, on the caller's connection"""
+    rows = [{'metric': metric, 'granularity': granularity, 'bucket_start': start, 'count': delta}
+            for (metric, granularity, start), delta in deltas.items() if delta]
+    if not rows:
+        return
+    if connection.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    statement = insert(_table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[_table.c.metric, _table.c.granularity, _table.c.bucket_start],
+        set_={'count': _table.c.count + statement.excluded.count}
+    )
+    connection.execute(statement, rows)
+
+
+def _load_previous(target, value, oldvalue, initiator):
+    return value
+
+
+# Keep the value being replaced even when the attribute had expired, so changes can be taken back out of their buckets
+for _attribute in (ChatSession.created_at, ChatSession.escalation_level, ProfileContent.status,
+                   ProfileContent.posted_time):
+    event.listen(_attribute, 'set', _load_previous, active_history=True, retval=True)
+
+
+@event.listens_for(Session, 'before_flush')
+def _count_deletions(session: Session, flush_context, instances):
+    """Take deleted rows out of their buckets while their values and parents can still be loaded"""
+    deltas = defaultdict(int)
+    for obj in session.deleted:
+        if isinstance(obj, ChatSession):
+            _add(deltas, _session_counts(_committed(obj, 'created_at'), _committed(obj, 'escalation_level')), -1)
+        elif isinstance(obj, Evidence):
+            chat_session = session.get(ChatSession, _committed(obj, 'session_id')) if obj.session_id else None
+            if chat_session is not None:
+                _add(deltas, {EVIDENCE_CAPTURED: chat_session.created_at}, -1)
+        elif isinstance(obj, ProfileContent):
+            _add(deltas, _content_counts(_committed(obj, 'status'), _committed(obj, 'posted_time')), -1)
+        elif isinstance(obj, AuditLog):
+            _add(deltas, {AUDIT_EVENTS: _committed(obj, 'timestamp')}, -1)
+    # Replaced on every flush, so a flush that fails leaves nothing behind
+    session.info['stats_bucket_deltas'] = deltas
+
+
+@event.listens_for(Session, 'after_flush')
+def _count_flushed_changes(session: Session, flush_context):
+    """Turn the sessions, evidence and content just written into bucket deltas in the same transaction"""
+    deltas = session.info.pop('stats_bucket_deltas', None) or defaultdict(int)
+    new_evidence = defaultdict(int)  # chat session id -> evidence added
+    
+    for obj in session.new:
+        if isinstance(obj, ChatSession):
+            _add(deltas, _session_counts(obj.created_at, obj.escalation_level), 1)
+        elif isinstance(obj, Evidence):
+            new_evidence[obj.session_id] += 1
+        elif isinstance(obj, ProfileContent):
+            _add(deltas, _content_counts(obj.status, obj.posted_time), 1)
+        elif isinstance(obj, AuditLog):
+            _add(deltas, {AUDIT_EVENTS: obj.timestamp}, 1)
+    
+    for obj in session.dirty:
+        if isinstance(obj, ChatSession):
+            state = inspect(obj)
+            if any(state.attrs[key].history.has_changes() for key in ('created_at', 'escalation_level')):
+                _add(deltas, _session_counts(_committed(obj, 'created_at'), _committed(obj, 'escalation_level')), -1)
+                _add(deltas, _session_counts(obj.created_at, obj.escalation_level), 1)
+        elif isinstance(obj, ProfileContent):
+            state = inspect(obj)
+            if any(state.attrs[key].history.has_changes() for key in ('status', 'posted_time')):
+                _add(deltas, _content_counts(_committed(obj, 'status'), _committed(obj, 'posted_time')), -1)
+                _add(deltas, _content_counts(obj.status, obj.posted_time), 1)
+    
+    if new_evidence:
+        created = _session_created_at(session, list(new_evidence))
+        for session_id, added in new_evidence.items():
+            if session_id in created:
+                _add(deltas, {EVIDENCE_CAPTURED: created[session_id]}, added)
+    
+    apply_deltas(session.connection(), deltas)
+
+
+def window_total(metric: str, start: datetime, end: Optional[datetime] = None) -> int:
+    """Count for `metric` from the hour containing `start` up to `end` (requires an app context).
+    
+    Whole days come from daily buckets and the partial days at either end
+    from hourly ones, so a window of any length sums at most a few dozen rows.
+    """
+    end = end or datetime.utcnow()
+    first_hour = bucket_start(start, HOUR)
+    first_day = bucket_start(first_hour, DAY)
+    if first_day < first_hour:
+        first_day += timedelta(days=1)
+    last_day = bucket_start(end, DAY)
+    
+    hourly = StatsBucket.bucket_start >= first_hour
+    if first_day < last_day:
+        hourly = db.or_(
+            db.and_(StatsBucket.bucket_start >= first_hour, StatsBucket.bucket_start < first_day),
+            StatsBucket.bucket_start >= last_day
+        )
+    ranges = db.and_(StatsBucket.granularity == HOUR, hourly, StatsBucket.bucket_start < end)
+    if first_day < last_day:
+        ranges = db.or_(ranges, db.and_(
+            StatsBucket.granularity == DAY,
+            StatsBucket.bucket_start >= first_day,
+            StatsBucket.bucket_start < last_day
+        ))
+    
+    total = db.session.query(db.func.sum(StatsBucket.count)).filter(StatsBucket.metric == metric, ranges).scalar()
+    return int(total or 0)
+
+
+def daily_counts(metric: str, start: datetime) -> Dict:
+    """Daily bucket counts for `metric` from the day containing `start` (requires an app context)"""
+    rows = db.session.query(StatsBucket.bucket_start, StatsBucket.count).filter(
+        StatsBucket.metric == metric,
+        StatsBucket.granularity == DAY,
+        StatsBucket.bucket_start >= bucket_start(start, DAY),
+        StatsBucket.count != 0
+    ).all()
+    return {row.bucket_start.date(): row.count for row in rows}
+
+
+def metric_total(metric: str) -> int:
+    """All-time count for `metric` from the daily buckets (requires an app context)"""
+    total = db.session.query(db.func.sum(StatsBucket.count)).filter(
+        StatsBucket.metric == metric,
+        StatsBucket.granularity == DAY
+    ).scalar()
+    return int(total or 0)
+
+
+def _bucket_expression(column, granularity: str, dialect: str):
+    """SQL for the start of the bucket containing `column`, matching bucket_start()"""
+    if dialect == 'postgresql':
+        return db.func.date_trunc(granularity, column)
+    # SQLite text timestamps sort and truncate as strings
+    return db.func.strftime('%Y-%m-%d %H:00:00' if granularity == HOUR else '%Y-%m-%d 00:00:00', column)
+
+
+def _rebuilt_counts(since: Optional[datetime]) -> Dict[Tuple[str, str, datetime], int]:
+    counts = {}
+    dialect = db.session.get_bind().dialect.name
+    
+    def bucket(column, granularity):
+        return _bucket_expression(column, granularity, dialect)
+    
+    def collect(metric, granularity, query, column):
+        if since is not None:
+            query = query.filter(column >= since)
+        for start, count in query.group_by(bucket(column, granularity)).all():
+            if start is None:
+                continue
+            if isinstance(start, str):
+                start = datetime.fromisoformat(start)
+            counts[(metric, granularity, start)] = count
+    
+    for granularity in GRANULARITIES:
+        created = bucket(ChatSession.created_at, granularity)
+        collect(SESSIONS_STARTED, granularity,
+                db.session.query(created, db.func.count(ChatSession.id)), ChatSession.created_at)
+        collect(HIGH_RISK_SESSIONS, granularity,
+                db.session.query(created, db.func.count(ChatSession.id)).filter(ChatSession.escalation_level >= 2),
+                ChatSession.created_at)
+        collect(EVIDENCE_CAPTURED, granularity,
+                db.session.query(created, db.func.count(Evidence.id)).join(
+                    ChatSession, Evidence.session_id == ChatSession.id
+                ), ChatSession.created_at)
+        collect(CONTENT_POSTED, granularity,
+                db.session.query(bucket(ProfileContent.posted_time, granularity),
+                                 db.func.count(ProfileContent.id)).filter(ProfileContent.status == 'posted'),
+                ProfileContent.posted_time)
+        collect(AUDIT_EVENTS, granularity,
+                db.session.query(bucket(AuditLog.timestamp, granularity), db.func.count(AuditLog.id)),
+                AuditLog.timestamp)
+    return counts
+
+
+def reconcile(since: Optional[datetime] = None) -> Dict:
+    """Rebuild buckets from the raw tables, from the day containing `since` or entirely (requires an app context).
+    
+    Catches drift from writes that bypass the ORM (bulk updates, manual
+    SQL). Runs in one transaction that takes the write lock first, so live
+    updates wait rather than being lost.
+    """
+    if since is not None:
+        since = bucket_start(since, DAY)
+    scope = StatsBucket.bucket_start >= since if since is not None else db.true()
+    
+    try:
+        # An empty delete takes SQLite's write lock before anything is read
+        db.session.execute(_table.delete().where(db.false()))
+        
+        rebuilt = _rebuilt_counts(since)
+        existing = {(row.metric, row.granularity, row.bucket_start): row.count
+                    for row in db.session.query(StatsBucket).filter(scope).all()}
+        
+        corrections = {key: rebuilt.get(key, 0) - count for key, count in existing.items()
+                       if rebuilt.get(key, 0) != count}
+        corrections.update({key: count for key, count in rebuilt.items() if key not in existing})
+        apply_deltas(db.session.connection(), corrections)
+        db.session.execute(_table.delete().where(scope, _table.c.count == 0))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    
+    if corrections:
+        logging.warning(f"Stats reconciliation corrected {len(corrections)} bucket(s)")
+        query_cache.invalidate(STATS)
+    return {'buckets': len(rebuilt), 'corrected': len(corrections)}
+
+
+def backfill() -> Optional[Dict]:
+    """Build the buckets from the raw tables if there are none yet (e.g. data stored before they existed)"""
+    if db.session.query(StatsBucket.metric).first() is not None:
+        return None
+    return reconcile()
@@ -0,0 +1,326 @@
+"""
+Threat Timeline
+Per-session timeline merged from chat messages, engagement events, threat analyses and evidence
+"""
+
+import bisect
+import heapq
+import json
+import os
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from src.models.user import db
+from src.models.chat import ChatSession, ChatMessage, Evidence
+from src.services.analytics_db import analytics_database
+
+# Sessions whose merged timelines are kept in memory
+TIMELINE_CACHE_SIZE = int(os.environ.get('HONEYTRAP_TIMELINE_CACHE_SIZE', 256))
+DEFAULT_LIMIT = 1000
+MAX_LIMIT = 5000
+
+MESSAGE = 'message'
+ENGAGEMENT = 'engagement'
+THREAT_ANALYSIS = 'threat_analysis'
+EVIDENCE = 'evidence'
+
+# Sources that only ever gain rows, so a cached timeline can be extended
+APPENDABLE = (MESSAGE, ENGAGEMENT, EVIDENCE)
+
+# Ties at the same instant sort in this order
+SOURCE_ORDER = {MESSAGE: 0, ENGAGEMENT: 1, EVIDENCE: 2, THREAT_ANALYSIS: 3}
+
+RECOMMENDED_ACTIONS = {
+    0: ['Continue monitoring'],
+    1: ['Review the flagged messages', 'Keep the decoy engaged to gather context'],
+    2: ['Preserve the transcript and evidence', 'Refer to the duty officer for safeguarding review'],
+    3: ['Escalate to the duty officer immediately', 'Prepare an evidence report for referral']
+}
+
+# (time, source order, row id, event) - sortable without comparing the event dicts
+TimelineEntry = Tuple[datetime, int, int, Dict]
+
+
+def _parse_time(value) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+def _parse_json(value, default):
+    try:
+        return json.loads(value) if value else default
+    except (TypeError, ValueError):
+        return default
+
+
+def _entry(source: str, row_id: int, time: datetime, threat_level: int, details: Dict) -> TimelineEntry:
+    return (time, SOURCE_ORDER[source], row_id, {
+        'id': f'{source}:{row_id}',
+        'type': source,
+        'time': time.isoformat(),
+        'threat_level': threat_level or 0,
+        'details': details
+    })
+
+
+class TimelineSummary:
+    """Threat progression folded from timeline events one at a time, so appends stay cheap"""
+    
+    def __init__(self):
+        self.initial_contact = None
+        self.current_threat_level = 0
+        self.escalation_points = []
+        self.evidence_collected = []
+        self.risk_factors = set()
+    
+    def add(self, entry: TimelineEntry):
+        time, _, _, event = entry
+        details = event['details']
+        if event['type'] == MESSAGE and details['sender_type'] == 'user' and self.initial_contact is None:
+            self.initial_contact = event['time']
+        if event['type'] == EVIDENCE:
+            self.evidence_collected.append({'evidence_id': details['evidence_id'], 'time': event['time'],
+                                            'evidence_type': details['evidence_type']})
+        if event['type'] == ENGAGEMENT:
+            self.risk_factors.update(details['indicators'])
+        if event['threat_level'] > self.current_threat_level:
+            self.current_threat_level = event['threat_level']
+            self.escalation_points.append({'event_id': event['id'], 'time': event['time'],
+                                           'threat_level': event['threat_level']})
+    
+    def to_dict(self, analysis: Optional[TimelineEntry], escalation_level: int) -> Dict:
+        threat_level = max(self.current_threat_level, escalation_level or 0)
+        risk_factors = set(self.risk_factors)
+        risk_score = 0
+        if analysis:
+            risk_factors.update(analysis[3]['details']['indicators'])
+            risk_score = analysis[3]['details']['risk_score']
+        return {
+            'threat_progression': {
+                'initial_contact': self.initial_contact,
+                'escalation_points': self.escalation_points,
+                'current_threat_level': threat_level,
+                'evidence_collected': self.evidence_collected
+            },
+            'risk_assessment': {
+                'current_risk_score': risk_score,
+                'risk_factors': sorted(risk_factors),
+                'recommended_actions': RECOMMENDED_ACTIONS[min(threat_level, 3)]
+            }
+        }
+
+
+class CachedTimeline:
+    """One session's merged events, the watermark of each source, and its summary"""
+    
+    def __init__(self, version: Dict):
+        self.version = version
+        self.entries: List[TimelineEntry] = []
+        self.times: List[datetime] = []
+        self.analysis: Optional[TimelineEntry] = None
+        self.summary = TimelineSummary()
+        self.lock = Lock()  # Held while extending and while a response is read out
+    
+    def extend(self, entries: List[TimelineEntry]):
+        entries.sort(key=lambda entry: entry[:3])
+        if self.entries and entries and entries[0][:3] < self.entries[-1][:3]:
+            # Late arrivals land inside the timeline; re-sort rather than append
+            self.entries = list(heapq.merge(self.entries, entries, key=lambda entry: entry[:3]))
+            self.times = [entry[0] for entry in self.entries]
+            self.summary = TimelineSummary()
+            entries = self.entries
+        else:
+            self.entries.extend(entries)
+            self.times.extend(entry[0] for entry in entries)
+        for entry in entries:
+            self.summary.add(entry)
+
+
+class ThreatTimeline:
+    """Merged per-session threat timelines, cached until the session changes.
+    
+    Each source is read from an index on (session, time) and merged in
+    order. A cached timeline is checked against a version built from index
+    lookups (newest row id and row count per source); when rows have only
+    been added, just the new rows are read and appended.
+    """
+    
+    def __init__(self, analytics_db_path: str, cache_size: int = TIMELINE_CACHE_SIZE):
+        self.analytics_db_path = analytics_db_path
+        self.db = analytics_database(analytics_db_path)
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # public session id -> CachedTimeline
+        self.lock = Lock()
+    
+    def get_timeline(self, session_label: str, since: Optional[datetime] = None,
+                     limit: int = DEFAULT_LIMIT) -> Optional[Dict]:
+        """Get a session's timeline, optionally only events at or after `since` (requires an app context).
+        
+        Returns None if nothing at all is recorded for the session. Events at
+        exactly `since` are returned again, so incremental callers should
+        de-duplicate by event `id`; pass `next_since` back as `since`.
+        """
+        limit = max(1, min(limit, MAX_LIMIT))
+        chat_session = ChatSession.query.filter_by(session_id=session_label).first()
+        
+        # One read transaction, so the version and the rows read match
+        with self.db.snapshot() as conn:
+            version = self._version(conn, session_label, chat_session)
+            with self.lock:
+                cached = self.cache.get(session_label)
+                if cached is not None:
+                    self.cache.move_to_end(session_label)
+            if cached is None or cached.version != version:
+                cached = self._refresh(conn, session_label, chat_session, cached, version)
+                with self.lock:
+                    self.cache[session_label] = cached
+                    self.cache.move_to_end(session_label)
+                    while len(self.cache) > self.cache_size:
+                        self.cache.popitem(last=False)
+        
+        with cached.lock:
+            if not cached.entries and cached.analysis is None and chat_session is None:
+                return None
+            return self._read(cached, session_label, chat_session, since, limit)
+    
+    @staticmethod
+    def _read(cached: CachedTimeline, session_label: str, chat_session: Optional[ChatSession],
+              since: Optional[datetime], limit: int) -> Dict:
+        start = bisect.bisect_left(cached.times, since) if since else 0
+        window = cached.entries[start:start + limit]
+        events = [entry[3] for entry in window]
+        if cached.analysis and (since is None or cached.analysis[0] >= since):
+            # The analysis row is rewritten in place, so it is merged in at read time
+            if not window or cached.analysis[:3] < window[-1][:3] or start + limit >= len(cached.entries):
+                events = [entry[3] for entry in heapq.merge(window, [cached.analysis], key=lambda entry: entry[:3])]
+        has_more = start + limit < len(cached.entries)
+        
+        timeline = {
+            'session_id': session_label,
+            'timeline_events': events,
+            'next_since': events[-1]['time'] if events else (since.isoformat() if since else None),
+            'has_more': has_more,
+            'total_events': len(cached.entries) + (1 if cached.analysis else 0)
+        }
+        timeline.update(cached.summary.to_dict(cached.analysis, chat_session.escalation_level if chat_session else 0))
+        return timeline
+    
+    def _version(self, conn, session_label: str, chat_session: Optional[ChatSession]) -> Dict:
+        """Cheap fingerprint of everything in the timeline: newest id and row count per source"""
+        version = {
+            ENGAGEMENT: conn.execute(
+                'SELECT MAX(id), COUNT(*) FROM engagement_events WHERE session_id = ?', (session_label,)
+            ).fetchone(),
+            THREAT_ANALYSIS: conn.execute(
+                'SELECT MAX(id), MAX(analysis_timestamp) FROM threat_analysis WHERE session_id = ?', (session_label,)
+            ).fetchone()
+        }
+        if chat_session is not None:
+            version[MESSAGE] = tuple(db.session.query(
+                db.func.max(ChatMessage.id), db.func.count(ChatMessage.id)
+            ).filter(ChatMessage.session_id == chat_session.id).one())
+            version[EVIDENCE] = tuple(db.session.query(
+                db.func.max(Evidence.id), db.func.count(Evidence.id)
+            ).filter(Evidence.session_id == chat_session.id).one())
+        return version
+    
+    def _refresh(self, conn, session_label: str, chat_session: Optional[ChatSession],
+                 cached: Optional[CachedTimeline], version: Dict) -> CachedTimeline:
+        if cached is not None:
+            # Read only rows past each source's watermark; if their number doesn't
+            # account for the change in row count, something was removed, so rebuild
+            after = {source: (cached.version.get(source) or (None,))[0] or 0 for source in APPENDABLE}
+            new_entries = self._source_entries(conn, session_label, chat_session, after)
+            if all(len(new_entries[source]) == self._added(cached.version.get(source), version.get(source))
+                   for source in APPENDABLE):
+                analysis = self._analysis_entry(conn, session_label)
+                with cached.lock:
+                    cached.version = version
+                    cached.extend([entry for entries in new_entries.values() for entry in entries])
+                    cached.analysis = analysis
+                return cached
+        
+        cached = CachedTimeline(version)
+        new_entries = self._source_entries(conn, session_label, chat_session, {})
+        cached.extend([entry for entries in new_entries.values() for entry in entries])
+        cached.analysis = self._analysis_entry(conn, session_label)
+        return cached
+    
+    def _source_entries(self, conn, session_label: str, chat_session: Optional[ChatSession],
+                        after: Dict[str, int]) -> Dict[str, List[TimelineEntry]]:
+        entries = {
+            ENGAGEMENT: list(self._engagement_entries(conn, session_label, after.get(ENGAGEMENT, 0))),
+            MESSAGE: [],
+            EVIDENCE: []
+        }
+        if chat_session is not None:
+            entries[MESSAGE] = list(self._message_entries(chat_session.id, after.get(MESSAGE, 0)))
+            entries[EVIDENCE] = list(self._evidence_entries(chat_session.id, after.get(EVIDENCE, 0)))
+        return entries
+    
+    @staticmethod
+    def _added(old: Optional[tuple], new: Optional[tuple]) -> int:
+        return ((new or (None, 0))[1] or 0) - ((old or (None, 0))[1] or 0)
+    
+    def _message_entries(self, db_session_id: int, after_id: int) -> Iterator[TimelineEntry]:
+        rows = ChatMessage.query.filter(
+            ChatMessage.session_id == db_session_id,
+            ChatMessage.id > after_id
+        ).order_by(ChatMessage.timestamp, ChatMessage.id).yield_per(1000)
+        for message in rows:
+            yield _entry(MESSAGE, message.id, message.timestamp, message.threat_level, {
+                'message_id': message.id,
+                'sender_type': message.sender_type,
+                'message_content': message.message_content,
+                'sentiment_score': message.sentiment_score
+            })
+    
+    def _evidence_entries(self, db_session_id: int, after_id: int) -> Iterator[TimelineEntry]:
+        rows = db.session.query(
+            Evidence.id, Evidence.evidence_type, Evidence.created_at, Evidence.hash_value
+        ).filter(
+            Evidence.session_id == db_session_id,
+            Evidence.id > after_id
+        ).order_by(Evidence.created_at, Evidence.id)
+        for row in rows:
+            yield _entry(EVIDENCE, row.id, row.created_at, 0, {
+                'evidence_id': row.id,
+                'evidence_type': row.evidence_type,
+                'hash_value': row.hash_value
+            })
+    
+    def _engagement_entries(self, conn, session_label: str, after_id: int) -> Iterator[TimelineEntry]:
+        rows = conn.execute('''
+            SELECT id, profile_id, event_type, event_data, timestamp, threat_level, escalation_indicators
+            FROM engagement_events
+            WHERE session_id = ? AND id > ?
+            ORDER BY timestamp, id
+        ''', (session_label, after_id))
+        for row_id, profile_id, event_type, event_data, timestamp, threat_level, indicators in rows:
+            yield _entry(ENGAGEMENT, row_id, _parse_time(timestamp), threat_level, {
+                'profile_id': profile_id,
+                'event_type': event_type,
+                'event_data': _parse_json(event_data, {}),
+                'indicators': _parse_json(indicators, [])
+            })
+    
+    def _analysis_entry(self, conn, session_label: str) -> Optional[TimelineEntry]:
+        row = conn.execute('''
+            SELECT id, threat_indicators, risk_score, behavior_patterns, analysis_timestamp
+            FROM threat_analysis
+            WHERE session_id = ?
+            ORDER BY analysis_timestamp DESC, id DESC
+            LIMIT 1
+        ''', (session_label,)).fetchone()
+        if row is None:
+            return None
+        row_id, indicators, risk_score, behavior_patterns, timestamp = row
+        patterns = _parse_json(behavior_patterns, {})
+        return _entry(THREAT_ANALYSIS, row_id, _parse_time(timestamp), patterns.get('threat_level', 0), {
+            'indicators': _parse_json(indicators, []),
+            'risk_score': risk_score,
+            'risk_level': patterns.get('risk_level')
+        })
@@ -0,0 +1,74 @@
+"""
+Transcripts
+Keyset-paginated access to chat transcripts, for history pages and live tailing
+"""
+
+from typing import Dict, Iterator, Optional
+
+from src.models.user import db
+from src.models.chat import ChatMessage
+
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 500
+
+
+def transcript_room(session_id: str) -> str:
+    """Socket.IO room that receives a session's new messages"""
+    return f'transcript:{session_id}'
+
+
+def get_transcript_page(db_session_id: int, since: int = 0, before: Optional[int] = None,
+                        limit: int = DEFAULT_PAGE_SIZE) -> Dict:
+    """Get up to `limit` messages after the `since` message id (or just before `before`).
+    
+    Pass the returned `next_since` back as `since` to fetch the next page, or to
+    poll for messages added since the last call.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = ChatMessage.query.filter(ChatMessage.session_id == db_session_id)
+    
+    if before is not None:
+        # Scrolling back: newest first from the index, returned oldest first
+        rows = query.filter(ChatMessage.id < before).order_by(ChatMessage.id.desc()).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = list(reversed(rows[:limit]))
+    else:
+        rows = query.filter(ChatMessage.id > since).order_by(ChatMessage.id).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+    
+    return {
+        'messages': [message.to_dict() for message in rows],
+        'next_since': rows[-1].id if rows else since,
+        'has_more': has_more
+    }
+
+
+def iter_transcript(db_session_id: int, batch_size: int = MAX_PAGE_SIZE,
+                    until: Optional[int] = None) -> Iterator[ChatMessage]:
+    """Yield a session's messages in order, loading at most `batch_size` at a time.
+    
+    Pass `until` to stop at that message id, so repeated passes see the same messages.
+    """
+    since = 0
+    while True:
+        query = ChatMessage.query.filter(
+            ChatMessage.session_id == db_session_id,
+            ChatMessage.id > since
+        )
+        if until is not None:
+            query = query.filter(ChatMessage.id <= until)
+        rows = query.order_by(ChatMessage.id).limit(batch_size).all()
+        
+        yield from rows
+        
+        if len(rows) < batch_size:
+            return
+        since = rows[-1].id
+
+
+def last_message_id(db_session_id: int) -> int:
+    """Id of a session's newest message, or 0 if it has none"""
+    return db.session.query(db.func.max(ChatMessage.id)).filter(
+        ChatMessage.session_id == db_session_id
+    ).scalar() or 0
@@ -0,0 +1,79 @@
+"""
+Serving Mode Configuration
+Selects the Socket.IO async mode for the chat server and keeps blocking work off the event loop
+"""
+
+import os
+import time
+import resource
+
+from src.metrics import metrics
+
+# threading (default, Werkzeug dev server) or gevent; eventlet is not a dependency and is not supported
+ASYNC_MODE = os.environ.get('HONEYTRAP_ASYNC_MODE', 'threading').lower()
+if ASYNC_MODE not in ('threading', 'gevent'):
+    raise ValueError(f"Unsupported HONEYTRAP_ASYNC_MODE: {ASYNC_MODE} (use 'threading' or 'gevent')")
+
+# Debug mode and the reloader only make sense on the threading dev server
+SERVER_DEBUG = os.environ.get('HONEYTRAP_DEBUG', '1' if ASYNC_MODE == 'threading' else '0') == '1'
+
+# Per-event Socket.IO logging costs a log line per packet for every idle decoy connection
+SOCKETIO_LOGGING = os.environ.get('HONEYTRAP_SOCKETIO_LOGGING', '1' if SERVER_DEBUG else '0') == '1'
+
+# Socket.IO server options that bound per-connection memory
+SOCKETIO_OPTIONS = {
+    'ping_interval': int(os.environ.get('HONEYTRAP_PING_INTERVAL', 25)),
+    'ping_timeout': int(os.environ.get('HONEYTRAP_PING_TIMEOUT', 20)),
+    'max_http_buffer_size': int(os.environ.get('HONEYTRAP_MAX_MESSAGE_BYTES', 64 * 1024)),
+}
+
+
+def monkey_patch():
+    """Patch the standard library for gevent mode.
+    
+    Must run before Flask, SQLAlchemy or the socket libraries are imported.
+    """
+    if ASYNC_MODE == 'gevent':
+        from gevent import monkey
+        monkey.patch_all()
+
+
+def run_blocking(func, *args, **kwargs):
+    """Run a blocking call (SQLite access, file I/O) without stalling the event loop.
+    
+    In gevent mode the call runs on a native worker thread while the
+    calling greenlet yields; in threading mode it simply runs inline.
+    """
+    if ASYNC_MODE == 'gevent':
+        from gevent import get_hub
+        return get_hub().threadpool.apply(func, args, kwargs)
+    return func(*args, **kwargs)
+
+
+def current_rss_kb() -> int:
+    """Get the resident set size of this process in kilobytes"""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    # Peak RSS is the best we can do without procfs
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def monitor_event_loop(sleep, interval: float = 1.0):
+    """Measure how late the event loop wakes up and sample process memory.
+    
+    Runs forever as a Socket.IO background task; `sleep` must be the
+    server's cooperative sleep (socketio.sleep).
+    """
+    while True:
+        started = time.monotonic()
+        sleep(interval)
+        lag_ms = max(0.0, (time.monotonic() - started - interval) * 1000)
+        
+        metrics.set_gauge('event_loop_lag_ms', round(lag_ms, 2))
+        metrics.observe_max('event_loop_lag_max_ms', round(lag_ms, 2))
+        metrics.set_gauge('process_rss_kb', current_rss_kb())
@@ -8,6 +8,7 @@ import ProfileManagement from './ProfileManagement'
 import ContentManagement from './ContentManagement'
 import AnalyticsDashboard from './AnalyticsDashboard'
 import SocialAccountManager from './SocialAccountManager'
+import { useDashboardCounters } from '@/hooks/use-dashboard-counters'
 import { 
   Shield, 
   Users, 
@@ -23,6 +24,20 @@ import {
   BarChart3
 } from 'lucide-react'
 
+const RECENT_HIGH_RISK_LIMIT = 10
+
+const authHeaders = () => ({ 'Authorization': `Bearer ${localStorage.getItem('adminToken')}` })
+
+// Replace rows by id, add new ones, and keep the most recently active first
+const mergeRows = (rows, changed) => {
+  if (changed.length === 0) {
+    return rows
+  }
+  const byId = new Map(rows.map((row) => [row.id, row]))
+  changed.forEach((row) => byId.set(row.id, row))
+  return [...byId.values()].sort((a, b) => new Date(b.last_activity) - new Date(a.last_activity))
+}
+
 const AdminDashboard = () => {
   const navigate = useNavigate()
   const [stats, setStats] = useState({
@@ -33,17 +48,35 @@ const AdminDashboard = () => {
   })
   const [sessions, setSessions] = useState([])
   const [recentHighRisk, setRecentHighRisk] = useState([])
+  const [sessionsLoaded, setSessionsLoaded] = useState(false)
+
+  // Session rows pushed with the counters are merged in place, so nothing is re-fetched per event
+  const mergeSessions = (changed) => {
+    setRecentHighRisk((current) => mergeRows(current, changed.filter((row) => row.escalation_level >= 2))
+      .slice(0, RECENT_HIGH_RISK_LIMIT))
+    setSessions((current) => sessionsLoaded ? mergeRows(current, changed) : current)
+  }
+  const liveCounters = useDashboardCounters(mergeSessions)
 
   useEffect(() => {
     fetchDashboardData()
-    // Set up polling for real-time updates
-    const interval = setInterval(fetchDashboardData, 30000) // Update every 30 seconds
-    return () => clearInterval(interval)
   }, [])
 
+  // Counters are pushed by the chat server as they change, so there is nothing to poll
+  useEffect(() => {
+    if (liveCounters) {
+      setStats({
+        active_sessions: liveCounters.active_sessions,
+        total_sessions: liveCounters.total_sessions,
+        high_risk_sessions: liveCounters.high_risk_sessions,
+        evidence_count: liveCounters.evidence_count
+      })
+    }
+  }, [liveCounters])
+
   const fetchDashboardData = async () => {
     try {
-      const response = await fetch('http://localhost:5001/api/admin/dashboard')
+      const response = await fetch('http://localhost:5001/api/admin/dashboard', { headers: authHeaders() })
       const data = await response.json()
       setStats(data.stats)
       setRecentHighRisk(data.recent_high_risk)
@@ -54,9 +87,10 @@ const AdminDashboard = () => {
 
   const fetchSessions = async () => {
     try {
-      const response = await fetch('http://localhost:5001/api/admin/sessions')
+      const response = await fetch('http://localhost:5001/api/admin/sessions', { headers: authHeaders() })
       const data = await response.json()
       setSessions(data.sessions)
+      setSessionsLoaded(true)
     } catch (error) {
       console.error('Failed to fetch sessions:', error)
     }
@@ -64,7 +98,18 @@ const AdminDashboard = () => {
 
   const generateReport = async (sessionId) => {
     try {
-      const response = await fetch(`http://localhost:5001/api/admin/sessions/${sessionId}/report`)
+      let response = await fetch(`http://localhost:5001/api/admin/sessions/${sessionId}/report`, { headers: authHeaders() })
+
+      // Large reports render in the background; poll the job until it's ready
+      if (response.status === 202) {
+        let job = await response.json()
+        while (job.status === 'queued' || job.status === 'running') {
+          await new Promise(resolve => setTimeout(resolve, 2000))
+          job = await (await fetch(`http://localhost:5001/api/admin/reports/jobs/${job.job_id}`, { headers: authHeaders() })).json()
+        }
+        response = await fetch(`http://localhost:5001/api/admin/reports/jobs/${job.job_id}/download`, { headers: authHeaders() })
+      }
+
       if (response.ok) {
         const blob = await response.blob()
         const url = window.URL.createObjectURL(blob)
@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import './AnalyticsDashboard.css';
+import { useDashboardCounters } from '@/hooks/use-dashboard-counters';
 
 const AnalyticsDashboard = () => {
   const [activeTab, setActiveTab] = useState('overview');
@@ -12,15 +13,12 @@ const AnalyticsDashboard = () => {
   const [comprehensiveReport, setComprehensiveReport] = useState({});
   const [selectedProfile, setSelectedProfile] = useState(null);
   const [profiles, setProfiles] = useState([]);
+  const liveCounters = useDashboardCounters();
 
   useEffect(() => {
     fetchRealTimeData();
     fetchProfiles();
     fetchAnalyticsData();
-    
-    // Set up real-time updates
-    const interval = setInterval(fetchRealTimeData, 30000); // Update every 30 seconds
-    return () => clearInterval(interval);
   }, []);
 
   useEffect(() => {
@@ -149,7 +147,7 @@ const AnalyticsDashboard = () => {
           </div>
           <div className="stat-card real-time">
             <h4>Active Sessions</h4>
-            <div className="stat-number">{realTimeData.real_time_data?.active_sessions?.total_active || 0}</div>
+            <div className="stat-number">{liveCounters?.active_sessions ?? realTimeData.real_time_data?.active_sessions?.total_active ?? 0}</div>
             <span className="stat-period">Currently active</span>
           </div>
           <div className="stat-card alert">
@@ -0,0 +1,52 @@
+import * as React from "react"
+import socketService from "@/services/socketService"
+
+const CHAT_SERVER_URL = "http://localhost:5002"
+
+// Live dashboard counters: a snapshot on subscribe, then small deltas pushed by the chat server.
+// Deltas also carry the rows of sessions that changed, which are handed to onSessions.
+export function useDashboardCounters(onSessions) {
+  const [counters, setCounters] = React.useState(null)
+  const versionRef = React.useRef(null)
+  const onSessionsRef = React.useRef(onSessions)
+  onSessionsRef.current = onSessions
+
+  React.useEffect(() => {
+    let unsubscribers = []
+
+    const onSnapshot = (data) => {
+      versionRef.current = data.version
+      setCounters(data.counters)
+    }
+
+    const onDelta = (data) => {
+      if (versionRef.current == null || data.version <= versionRef.current) {
+        return
+      }
+      if (data.version !== versionRef.current + 1) {
+        // Missed a delta; fetch the full counters again
+        socketService.requestDashboardSnapshot()
+        return
+      }
+      versionRef.current = data.version
+      setCounters((current) => ({ ...current, ...data.changes }))
+      if (data.sessions?.length && onSessionsRef.current) {
+        onSessionsRef.current(data.sessions)
+      }
+    }
+
+    socketService.connect(CHAT_SERVER_URL)
+      .then(() => {
+        unsubscribers = [
+          socketService.addEventListener("dashboard_snapshot", onSnapshot),
+          socketService.addEventListener("dashboard_delta", onDelta)
+        ]
+        socketService.joinAdmin()
+      })
+      .catch((error) => console.error("Failed to subscribe to dashboard counters:", error))
+
+    return () => unsubscribers.forEach((unsubscribe) => unsubscribe())
+  }, [])
+
+  return counters
+}
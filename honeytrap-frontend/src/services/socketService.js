@@ -5,6 +5,8 @@ class SocketService {
     this.socket = null
     this.isConnected = false
     this.eventListeners = new Map()
+    this.isAdmin = false
+    this.lastAlertSeq = null
   }
 
   connect(serverUrl = 'http://localhost:5002') {
@@ -22,6 +24,10 @@ class SocketService {
       this.socket.on('connect', () => {
         console.log('Connected to WebSocket server')
         this.isConnected = true
+        // Resume the admin alert stream after a reconnect
+        if (this.isAdmin) {
+          this.joinAdmin()
+        }
         resolve()
       })
 
@@ -52,9 +58,14 @@ class SocketService {
       'message_received',
       'typing_start',
       'typing_stop',
-      'high_risk_alert',
+      'backpressure',
+      'high_risk_alerts',
+      'alert_backlog',
       'admin_joined',
       'session_stats',
+      'dashboard_snapshot',
+      'dashboard_delta',
+      'transcript_messages',
       'error'
     ]
 
@@ -63,6 +74,20 @@ class SocketService {
         this.notifyListeners(event, data)
       })
     })
+
+    // Remember the last alert sequence number so reconnects only fetch what was missed
+    const trackAlertSeq = (data) => {
+      if (data && data.last_seq != null) {
+        this.lastAlertSeq = Math.max(this.lastAlertSeq ?? 0, data.last_seq)
+      }
+    }
+    this.socket.on('high_risk_alerts', trackAlertSeq)
+    this.socket.on('alert_backlog', trackAlertSeq)
+    this.socket.on('admin_joined', (data) => {
+      if (this.lastAlertSeq == null && data) {
+        this.lastAlertSeq = data.last_seq
+      }
+    })
   }
 
   disconnect() {
@@ -70,6 +95,7 @@ class SocketService {
       this.socket.disconnect()
       this.socket = null
       this.isConnected = false
+      this.isAdmin = false
       this.eventListeners.clear()
     }
   }
@@ -94,7 +120,30 @@ class SocketService {
     if (!this.isConnected) {
       throw new Error('Not connected to server')
     }
-    this.socket.emit('join_admin')
+    this.isAdmin = true
+    this.socket.emit('join_admin', this.lastAlertSeq != null ? { last_seq: this.lastAlertSeq } : {})
+  }
+
+  // Transcript methods: fetch messages after `since`, then receive new ones as they arrive
+  subscribeTranscript(sessionId, since = 0) {
+    if (!this.isConnected) {
+      throw new Error('Not connected to server')
+    }
+    this.socket.emit('subscribe_transcript', { session_id: sessionId, since })
+  }
+
+  unsubscribeTranscript(sessionId) {
+    if (!this.isConnected) {
+      throw new Error('Not connected to server')
+    }
+    this.socket.emit('unsubscribe_transcript', { session_id: sessionId })
+  }
+
+  requestDashboardSnapshot() {
+    if (!this.isConnected) {
+      throw new Error('Not connected to server')
+    }
+    this.socket.emit('dashboard_snapshot')
   }
 
   // Event listener management
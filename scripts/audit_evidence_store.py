@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+AI Honeytrap Network - Evidence Store Audit
+Verifies every evidence record and file against its stored hash and the
+evidence ledger, and writes an HMAC-signed summary for court disclosure
+
+Examples:
+    python scripts/audit_evidence_store.py --workers 16 --output audit.json
+    python scripts/audit_evidence_store.py --verify audit.json
+"""
+
+import os
+import sys
+import json
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'honeytrap-backend'))
+
+DEFAULT_DATABASE_URI = 'sqlite:///' + os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'honeytrap-backend', 'src', 'database', 'app.db'
+)
+
+
+def print_progress(progress):
+    """Human-readable progress line"""
+    print(f"[{progress['elapsed_seconds']:>8.1f}s] {progress['checked_items']}/{progress['total_items']} "
+          f"({progress['percent_complete']}%) verified={progress['verified']} "
+          f"mismatched={progress['mismatched']} missing={progress['missing']} "
+          f"hashed={progress['bytes_hashed'] / (1024 * 1024):.1f} MiB", file=sys.stderr)
+
+
+def print_json(key):
+    """Machine-readable line, for callers following the audit's stdout"""
+    def emit(value):
+        print(json.dumps({key: value}), flush=True)
+    return emit
+
+
+def main():
+    """Main entry point"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="AI Honeytrap Network Evidence Store Audit")
+    parser.add_argument("--database-uri", default=DEFAULT_DATABASE_URI, help="SQLAlchemy URI of the evidence database")
+    parser.add_argument("--workers", type=int, default=None, help="Processes hashing large files (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Evidence rows read per database round trip")
+    parser.add_argument("--json-progress", action="store_true", help="Print progress and result as JSON lines")
+    parser.add_argument("--output", help="Write the signed summary to this file")
+    parser.add_argument("--verify", metavar="SUMMARY", help="Check the signature of a saved summary and exit")
+    
+    args = parser.parse_args()
+    
+    from src.security import security_manager
+    
+    if args.verify:
+        with open(args.verify) as f:
+            signed = json.load(f)
+        valid = security_manager.verify_signature(signed['summary'], signed['signature'])
+        print("Signature valid" if valid else "Signature INVALID")
+        sys.exit(0 if valid else 1)
+    
+    from flask import Flask
+    from src.models.user import db
+    from src.models.schema import ensure_schema
+    from src.services.evidence_audit import audit_evidence_store
+    
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    
+    with app.app_context():
+        # Databases from before the evidence ledger have no ledger tables yet
+        ensure_schema()
+        result = audit_evidence_store(
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            progress=print_json('progress') if args.json_progress else print_progress
+        )
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    
+    if args.json_progress:
+        print_json('result')(result)
+    else:
+        summary = result['summary']
+        print(f"Verified: {summary['verified']}  Mismatched: {summary['mismatched']}  Missing: {summary['missing']}")
+        print(f"Signature: {result['signature']}")
+    
+    sys.exit(0 if result['summary']['mismatched'] == 0 and result['summary']['missing'] == 0 else 1)
+
+
+if __name__ == "__main__":
+    main()
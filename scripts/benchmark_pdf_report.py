@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+AI Honeytrap Network - PDF Report Benchmark
+Renders evidence reports for synthetic transcripts of increasing size and
+reports render time and peak memory for each
+
+Each size runs in a fresh process so its peak RSS is not inflated by the
+sizes before it.
+
+Examples:
+    python scripts/benchmark_pdf_report.py
+    python scripts/benchmark_pdf_report.py --sizes 1000 10000 --json
+"""
+
+import os
+import sys
+import json
+import subprocess
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'honeytrap-backend'))
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+
+def render_once(message_count):
+    """Build a throwaway database with `message_count` messages and render its report"""
+    import resource
+    import tempfile
+    import time
+    from datetime import datetime, timedelta
+    from flask import Flask
+    from src.models.user import db
+    from src.models.chat import ChatSession, ChatMessage, Persona
+    from src.services.report_renderer import generate_pdf_report
+    from src.services.transcripts import iter_transcript
+    
+    workdir = tempfile.mkdtemp()
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    db.init_app(app)
+    
+    with app.app_context():
+        db.create_all()
+        persona = Persona(name='Emma', age=13, platform_type='discord', personality_traits='{}',
+                          language_style='{}', response_patterns='{}')
+        db.session.add(persona)
+        db.session.flush()
+        chat_session = ChatSession(session_id='benchmark', persona_id=persona.id, user_ip='203.0.113.7')
+        db.session.add(chat_session)
+        db.session.flush()
+        
+        started = datetime.utcnow()
+        rows = [
+            {
+                'session_id': chat_session.id,
+                'sender_type': 'user' if i % 2 == 0 else 'decoy',
+                'message_content': f'Message {i}: hey what are you up to this weekend? want to meet up somewhere quiet',
+                'threat_level': (0, 0, 0, 1, 2)[i % 5],
+                'timestamp': started + timedelta(seconds=i)
+            }
+            for i in range(message_count)
+        ]
+        db.session.execute(ChatMessage.__table__.insert(), rows)
+        db.session.commit()
+        del rows
+        
+        output_path = os.path.join(workdir, 'report.pdf')
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        generate_pdf_report(chat_session, iter_transcript(chat_session.id), [], output_path)
+        elapsed = time.perf_counter() - start
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        
+        result = {
+            'messages': message_count,
+            'seconds': round(elapsed, 2),
+            'peak_rss_mb': round(peak_rss / 1024, 1),
+            'render_rss_growth_mb': round((peak_rss - rss_before) / 1024, 1),
+            'pdf_mb': round(os.path.getsize(output_path) / (1024 * 1024), 2)
+        }
+    
+    for name in os.listdir(workdir):
+        os.unlink(os.path.join(workdir, name))
+    os.rmdir(workdir)
+    return result
+
+
+def main():
+    """Main entry point"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="AI Honeytrap Network PDF Report Benchmark")
+    parser.add_argument("--sizes", type=int, nargs='+', default=DEFAULT_SIZES, help="Transcript lengths to render")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--render", type=int, help=argparse.SUPPRESS)  # Child process mode
+    
+    args = parser.parse_args()
+    
+    if args.render:
+        print(json.dumps(render_once(args.render)))
+        return
+    
+    results = []
+    for size in args.sizes:
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--render', str(size)],
+                                capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+        if not args.json:
+            result = results[-1]
+            print(f"{result['messages']:>8} messages  {result['seconds']:>8.2f}s  "
+                  f"peak RSS {result['peak_rss_mb']:>7.1f} MiB  (+{result['render_rss_growth_mb']:.1f} MiB rendering)  "
+                  f"PDF {result['pdf_mb']:.2f} MiB")
+    
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
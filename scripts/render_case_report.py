@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+AI Honeytrap Network - Consolidated Case Report
+Renders one PDF covering several chat sessions (per-session transcripts and
+evidence, a cross-session timeline and a hash appendix) with the sections
+rendered in parallel
+
+Examples:
+    python scripts/render_case_report.py --sessions 12 40 41 --output case.pdf
+    python scripts/render_case_report.py --sessions 12 40 --workers 4 --output case.pdf
+"""
+
+import os
+import sys
+import json
+import time
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'honeytrap-backend'))
+
+DEFAULT_DATABASE_URI = 'sqlite:///' + os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'honeytrap-backend', 'src', 'database', 'app.db'
+)
+
+
+def main():
+    """Main entry point"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="AI Honeytrap Network Consolidated Case Report")
+    parser.add_argument("--database-uri", default=DEFAULT_DATABASE_URI, help="SQLAlchemy URI of the evidence database")
+    parser.add_argument("--sessions", type=int, nargs='+', required=True, help="Database ids of the case's chat sessions")
+    parser.add_argument("--output", required=True, help="Where to write the PDF")
+    parser.add_argument("--workers", type=int, default=None, help="Processes rendering sections (default: one per section, up to CPU count)")
+    
+    args = parser.parse_args()
+    
+    from flask import Flask
+    from src.models.user import db
+    from src.services.case_report import render_case_report
+    
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    
+    start = time.perf_counter()
+    with app.app_context():
+        result = render_case_report(args.sessions, args.output, args.database_uri, args.workers)
+    result['seconds'] = round(time.perf_counter() - start, 2)
+    
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
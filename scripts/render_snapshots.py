@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+AI Honeytrap Network - Transcript Snapshots
+Renders chat sessions' transcripts as platform-styled PNG snapshots on a
+process pool and stores them as screenshot evidence
+
+Examples:
+    python scripts/render_snapshots.py --sessions 12 40 41
+    python scripts/render_snapshots.py --sessions 12 --flagged-only --window 10 --workers 4
+"""
+
+import os
+import sys
+import json
+import time
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'honeytrap-backend'))
+
+DEFAULT_DATABASE_URI = 'sqlite:///' + os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'honeytrap-backend', 'src', 'database', 'app.db'
+)
+
+
+def main():
+    """Main entry point"""
+    import argparse
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    
+    parser = argparse.ArgumentParser(description="AI Honeytrap Network Transcript Snapshots")
+    parser.add_argument("--database-uri", default=DEFAULT_DATABASE_URI, help="SQLAlchemy URI of the evidence database")
+    parser.add_argument("--sessions", type=int, nargs='+', required=True, help="Database ids of the chat sessions")
+    parser.add_argument("--window", type=int, default=None, help="Messages per snapshot (default: HONEYTRAP_SNAPSHOT_WINDOW)")
+    parser.add_argument("--flagged-only", action="store_true", help="Only snapshot windows with a flagged message")
+    parser.add_argument("--workers", type=int, default=None, help="Rendering processes (default: CPU count)")
+    
+    args = parser.parse_args()
+    
+    from flask import Flask
+    from src.models.user import db
+    from src.models.chat import ChatSession
+    from src.services.snapshots import SNAPSHOT_WINDOW, capture_snapshots
+    from src.services import stats_buckets  # noqa: F401 - keeps the dashboard buckets counting this evidence
+    
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    
+    start = time.perf_counter()
+    results = []
+    # Spawned workers only render; all database and blob writes stay in this process
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=context) as pool:
+        with app.app_context():
+            for session_id in args.sessions:
+                chat_session = db.session.get(ChatSession, session_id)
+                if not chat_session:
+                    print(f"Unknown session {session_id}", file=sys.stderr)
+                    sys.exit(1)
+                results.append(capture_snapshots(
+                    chat_session, args.window or SNAPSHOT_WINDOW, args.flagged_only,
+                    lambda render, jobs: pool.map(render, jobs, chunksize=4)
+                ))
+    seconds = time.perf_counter() - start
+    
+    rendered = sum(len(result['evidence_ids']) + result['skipped'] for result in results)
+    print(json.dumps({
+        'sessions': results,
+        'snapshots': rendered,
+        'seconds': round(seconds, 2),
+        'per_minute': round(rendered / seconds * 60, 1) if seconds else None
+    }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+AI Honeytrap Network - WebSocket Soak Test
+Holds thousands of mostly idle decoy connections against the chat server and
+records per-connection memory and event-loop lag
+
+Start the server in an async mode first, e.g.:
+    HONEYTRAP_ASYNC_MODE=gevent python src/main_websocket.py
+
+Requires the async Socket.IO client: pip install "python-socketio[asyncio_client]"
+"""
+
+import sys
+import json
+import time
+import asyncio
+import urllib.request
+from datetime import datetime
+from typing import Dict, List, Any
+
+import socketio
+
+
+class SoakTest:
+    """Opens idle WebSocket connections in waves and samples server health"""
+    
+    def __init__(self, server_url: str, connections: int, concurrency: int,
+                 hold_seconds: int, join_fraction: float, username: str, password: str):
+        """Initialize the soak test"""
+        self.server_url = server_url.rstrip('/')
+        self.connections = connections
+        self.concurrency = concurrency
+        self.hold_seconds = hold_seconds
+        self.join_fraction = join_fraction
+        self.username = username
+        self.password = password
+        self.token = None
+        self.clients: List[socketio.AsyncClient] = []
+        self.failures = 0
+        self.connect_times: List[float] = []
+        self.samples: List[Dict[str, Any]] = []
+    
+    def _http_json(self, path: str, payload: Dict = None) -> Dict:
+        """Call a JSON endpoint on the server"""
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        data = json.dumps(payload).encode() if payload is not None else None
+        request = urllib.request.Request(f'{self.server_url}{path}', data=data, headers=headers)
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return json.loads(response.read())
+    
+    def _login(self):
+        """Log in as admin so server metrics can be read"""
+        result = self._http_json('/api/admin/login', {'username': self.username, 'password': self.password})
+        self.token = result['token']
+    
+    def _sample_metrics(self, label: str) -> Dict[str, Any]:
+        """Record the server's memory and event-loop lag gauges"""
+        gauges = self._http_json('/api/admin/metrics').get('gauges', {})
+        sample = {
+            'label': label,
+            'time': datetime.utcnow().isoformat(),
+            'connected': len(self.clients),
+            'rss_kb': gauges.get('process_rss_kb', 0),
+            'event_loop_lag_ms': gauges.get('event_loop_lag_ms', 0),
+            'event_loop_lag_max_ms': gauges.get('event_loop_lag_max_ms', 0)
+        }
+        self.samples.append(sample)
+        print(f"[{label}] connections={sample['connected']} rss={sample['rss_kb']} KB "
+              f"lag={sample['event_loop_lag_ms']} ms (max {sample['event_loop_lag_max_ms']} ms)")
+        return sample
+    
+    async def _open_connection(self, index: int, semaphore: asyncio.Semaphore):
+        """Open one decoy connection, optionally joining a chat"""
+        async with semaphore:
+            client = socketio.AsyncClient(reconnection=False)
+            started = time.monotonic()
+            try:
+                await client.connect(self.server_url, transports=['websocket'])
+                if index < self.connections * self.join_fraction:
+                    await client.emit('join_chat', {'platform_type': 'discord'})
+                self.connect_times.append(time.monotonic() - started)
+                self.clients.append(client)
+            except Exception as e:
+                self.failures += 1
+                if self.failures <= 5:
+                    print(f"Connection {index} failed: {e}")
+    
+    async def run(self) -> Dict[str, Any]:
+        """Run the soak test and return a summary"""
+        self._login()
+        # Give the server's monitor a moment to take its first sample
+        await asyncio.sleep(2)
+        baseline = self._sample_metrics('baseline')
+        
+        semaphore = asyncio.Semaphore(self.concurrency)
+        wave_size = max(self.connections // 10, 1)
+        for wave_start in range(0, self.connections, wave_size):
+            wave = range(wave_start, min(wave_start + wave_size, self.connections))
+            await asyncio.gather(*(self._open_connection(i, semaphore) for i in wave))
+            await asyncio.sleep(1)
+            self._sample_metrics(f'ramp {len(self.clients)}')
+        
+        # Hold the connections idle while the server pings them
+        hold_until = time.monotonic() + self.hold_seconds
+        while time.monotonic() < hold_until:
+            await asyncio.sleep(min(10, max(hold_until - time.monotonic(), 0)))
+            self._sample_metrics('hold')
+        loaded = self.samples[-1]
+        
+        await asyncio.gather(*(client.disconnect() for client in self.clients), return_exceptions=True)
+        
+        connected = len(self.clients)
+        rss_delta_kb = loaded['rss_kb'] - baseline['rss_kb']
+        lag_values = [s['event_loop_lag_ms'] for s in self.samples if s['label'] == 'hold']
+        connect_times = sorted(self.connect_times)
+        
+        return {
+            'server_url': self.server_url,
+            'requested_connections': self.connections,
+            'connected': connected,
+            'failures': self.failures,
+            'baseline_rss_kb': baseline['rss_kb'],
+            'loaded_rss_kb': loaded['rss_kb'],
+            'per_connection_kb': round(rss_delta_kb / connected, 2) if connected else None,
+            'event_loop_lag_avg_ms': round(sum(lag_values) / len(lag_values), 2) if lag_values else None,
+            'event_loop_lag_max_ms': loaded['event_loop_lag_max_ms'],
+            'connect_p50_ms': round(connect_times[len(connect_times) // 2] * 1000, 1) if connect_times else None,
+            'connect_p99_ms': round(connect_times[int(len(connect_times) * 0.99)] * 1000, 1) if connect_times else None,
+            'samples': self.samples
+        }
+
+
+def main():
+    """Main function"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="AI Honeytrap Network WebSocket Soak Test")
+    parser.add_argument("--server-url", default="http://localhost:5002", help="Chat server URL")
+    parser.add_argument("--connections", type=int, default=10000, help="Number of idle connections to hold")
+    parser.add_argument("--concurrency", type=int, default=200, help="Connections opened in parallel")
+    parser.add_argument("--hold", type=int, default=120, help="Seconds to hold the connections")
+    parser.add_argument("--join-fraction", type=float, default=0.0,
+                        help="Fraction of connections that also join a chat session")
+    parser.add_argument("--username", default="admin", help="Admin username for reading metrics")
+    parser.add_argument("--password", default="hampshire2024", help="Admin password for reading metrics")
+    parser.add_argument("--output", help="Write the JSON summary to this file")
+    
+    args = parser.parse_args()
+    
+    test = SoakTest(args.server_url, args.connections, args.concurrency, args.hold,
+                    args.join_fraction, args.username, args.password)
+    summary = asyncio.run(test.run())
+    
+    print()
+    print("Soak test summary")
+    print("=" * 60)
+    for key, value in summary.items():
+        if key != 'samples':
+            print(f"{key}: {value}")
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+    
+    sys.exit(0 if summary['failures'] == 0 else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Admin Alert Stream Tests
+Tests for sequenced, batched and replayable admin alerts
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'honeytrap-backend'))
+
+from flask import Flask
+from src.models.user import db
+from src.models.chat import AdminAlert
+from src.services.alert_stream import AlertStream, ADMIN_ROOM
+
+
+class FakeSocketIO:
+    """Records emits and background tasks instead of running a server"""
+    
+    def __init__(self):
+        self.emitted = []
+        self.tasks = []
+    
+    def emit(self, event, data, to=None):
+        self.emitted.append((event, data, to))
+    
+    def start_background_task(self, target, *args):
+        self.tasks.append(target)
+    
+    def sleep(self, seconds):
+        pass
+
+
+class TestAlertStream(unittest.TestCase):
+    """Test the admin alert stream"""
+    
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{self.db_path}'
+        db.init_app(self.app)
+        with self.app.app_context():
+            db.create_all()
+        
+        self.socketio = FakeSocketIO()
+        self.stream = AlertStream(max_alerts=5, recent_size=3)
+        self.stream.init_socketio(self.app, self.socketio)
+    
+    def tearDown(self):
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+    
+    def _publish(self, count):
+        for i in range(count):
+            self.stream.publish('high_risk', f'session-{i}', 2, {'message': f'alert {i}'})
+    
+    def test_alerts_in_window_are_sent_as_one_batch(self):
+        """Several alerts raised together cost one flush task and one emit"""
+        self._publish(3)
+        
+        self.assertEqual(len(self.socketio.tasks), 1)
+        self.socketio.tasks[0]()
+        
+        self.assertEqual(len(self.socketio.emitted), 1)
+        event, data, room = self.socketio.emitted[0]
+        self.assertEqual((event, room), ('high_risk_alerts', ADMIN_ROOM))
+        self.assertEqual([alert['seq'] for alert in data['alerts']], [1, 2, 3])
+        self.assertEqual(data['last_seq'], 3)
+        self.assertEqual(data['alerts'][0]['message'], 'alert 0')
+    
+    def test_resume_from_memory(self):
+        """Resuming within the in-memory tail returns only missed alerts"""
+        self._publish(3)
+        self.stream.flush()
+        
+        alerts, truncated = self.stream.resume(1)
+        
+        self.assertEqual([alert['seq'] for alert in alerts], [2, 3])
+        self.assertFalse(truncated)
+    
+    def test_resume_from_database(self):
+        """Resuming before the in-memory tail falls back to the persisted log"""
+        self._publish(4)
+        self.stream.flush()
+        self.stream.recent.clear()
+        
+        alerts, truncated = self.stream.resume(0)
+        
+        self.assertEqual([alert['seq'] for alert in alerts], [1, 2, 3, 4])
+        self.assertFalse(truncated)
+    
+    def test_resume_is_truncated_at_replay_limit(self):
+        """Large gaps are capped and flagged"""
+        self.stream.replay_limit = 2
+        self._publish(4)
+        self.stream.flush()
+        
+        alerts, truncated = self.stream.resume(0)
+        
+        self.assertEqual([alert['seq'] for alert in alerts], [1, 2])
+        self.assertTrue(truncated)
+    
+    def test_log_is_bounded_and_sequence_monotonic(self):
+        """Old alerts are pruned without sequence numbers being reused"""
+        self._publish(4)
+        self.stream.flush()
+        self._publish(4)
+        self.stream.flush()
+        
+        with self.app.app_context():
+            seqs = [alert.id for alert in AdminAlert.query.order_by(AdminAlert.id)]
+        self.assertEqual(seqs, [4, 5, 6, 7, 8])
+        self.assertEqual(self.stream.last_seq(), 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
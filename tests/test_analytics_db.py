@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Analytics Database Tests
+Tests for pooled connections to the analytics database
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'honeytrap-backend'))
+
+from src.metrics import metrics
+from src.services.analytics_db import AnalyticsDatabase, analytics_database
+from src.services.discovery_analytics import DiscoveryAnalyticsService
+
+
+class TestAnalyticsDatabase(unittest.TestCase):
+    """Test the analytics connection pool"""
+    
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.analytics_db_path = os.path.join(self.workdir, 'analytics.db')
+        self.service = DiscoveryAnalyticsService(self.analytics_db_path)
+        self.db = self.service.db
+    
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.workdir)
+    
+    def track(self, message='hi'):
+        return self.service.track_engagement_event(1, 'case-a', {
+            'event_type': 'message', 'event_details': {'message_content': message}
+        })
+    
+    def count(self):
+        with self.db.connection() as conn:
+            return conn.execute('SELECT COUNT(*) FROM engagement_events').fetchone()[0]
+    
+    def test_connections_are_configured_and_reused(self):
+        """Ingestion reuses pooled connections configured with WAL and the connection pragmas"""
+        self.assertIs(analytics_database(self.analytics_db_path), self.db)
+        self.track()
+        opened = metrics.get_counter('analytics_db_connections_opened')
+        for _ in range(50):
+            self.assertTrue(self.track()['success'])
+        self.service.get_threat_analytics()
+        self.assertEqual(metrics.get_counter('analytics_db_connections_opened'), opened)
+        
+        with self.db.connection() as conn:
+            self.assertEqual(conn.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+            self.assertEqual(conn.execute('PRAGMA synchronous').fetchone()[0], 1)
+            self.assertEqual(conn.execute('PRAGMA busy_timeout').fetchone()[0], 5000)
+    
+    def test_failed_transactions_roll_back_and_return_the_connection(self):
+        """An error inside a transaction undoes its writes and the connection goes back to the pool"""
+        with self.assertRaises(ValueError):
+            with self.db.transaction() as cursor:
+                cursor.execute("INSERT INTO engagement_events (profile_id, event_type) VALUES (1, 'message')")
+                raise ValueError('boom')
+        self.assertEqual(self.count(), 0)
+        self.assertEqual(len(self.db.idle), 1)
+        self.assertFalse(self.db.idle[0].in_transaction)
+    
+    def test_snapshot_reads_one_committed_state(self):
+        """Writes committed during a snapshot are not seen by it"""
+        self.track()
+        with self.db.snapshot() as cursor:
+            before = cursor.execute('SELECT COUNT(*) FROM engagement_events').fetchone()[0]
+            self.track()
+            after = cursor.execute('SELECT COUNT(*) FROM engagement_events').fetchone()[0]
+        self.assertEqual((before, after), (1, 1))
+        self.assertEqual(self.count(), 2)
+    
+    def test_concurrent_ingestion(self):
+        """Threads writing at once all succeed and the pool stays within its size"""
+        results = []
+        
+        def worker():
+            for _ in range(25):
+                results.append(self.track('what school do you go to')['success'])
+        
+        threads = [threading.Thread(target=worker) for _ in range(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(results, [True] * 300)
+        self.assertEqual(self.count(), 300)
+        self.assertLessEqual(len(self.db.idle), self.db.pool_size)
+    
+    def test_pool_size_bounds_idle_connections(self):
+        """Connections beyond the pool size are closed when returned"""
+        db = AnalyticsDatabase(self.analytics_db_path, pool_size=1)
+        with db.connection(), db.connection():
+            pass
+        self.assertEqual(len(db.idle), 1)
+        db.close()
+        self.assertEqual(db.idle, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
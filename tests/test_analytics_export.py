@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Analytics Export Tests
+Tests for streaming CSV, NDJSON and Parquet exports of analytics and chat rows
+"""
+
+import csv
+import io
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'honeytrap-backend'))
+
+import pyarrow.parquet as pq
+from flask import Flask
+from src.models.user import db
+from src.models.chat import ChatSession, ChatMessage, Persona
+from src.security import security_manager
+from src.routes import discovery_analytics as analytics_routes
+from src.services.analytics_export import (
+    DATASETS, export_chunks, iter_batches, parquet_chunks, parse_export_time
+)
+from src.services.discovery_analytics import DiscoveryAnalyticsService
+
+
+class TestAnalyticsExport(unittest.TestCase):
+    """Test streaming analytics exports"""
+    
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.analytics_db_path = os.path.join(self.workdir, 'analytics.db')
+        self.service = DiscoveryAnalyticsService(self.analytics_db_path)
+        
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(self.workdir, 'app.db')}"
+        db.init_app(self.app)
+        self.app.register_blueprint(analytics_routes.discovery_analytics_bp, url_prefix='/api')
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        
+        self.start = datetime(2024, 3, 1)
+        conn = sqlite3.connect(self.analytics_db_path)
+        conn.executemany(
+            'INSERT INTO engagement_events (profile_id, session_id, event_type, event_data, timestamp, threat_level) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            [(1, f's{i % 3}', 'message', '{}', (self.start + timedelta(hours=i)).strftime('%Y-%m-%d %H:%M:%S'), i % 3)
+             for i in range(50)]
+        )
+        conn.commit()
+        conn.close()
+        
+        persona = Persona(name='Emma', age=13, platform_type='discord', personality_traits='{}',
+                          language_style='{}', response_patterns='{}')
+        db.session.add(persona)
+        db.session.flush()
+        chat_session = ChatSession(session_id='s1', persona_id=persona.id, user_ip='127.0.0.1', created_at=self.start)
+        db.session.add(chat_session)
+        db.session.flush()
+        for i in range(30):
+            db.session.add(ChatMessage(session_id=chat_session.id, sender_type='user', message_content=f'hi, "{i}"',
+                                       threat_level=i % 3, timestamp=self.start + timedelta(minutes=i)))
+        db.session.commit()
+        
+        self.original_service = analytics_routes.analytics_service
+        analytics_routes.analytics_service = self.service
+        self.client = self.app.test_client()
+        self.headers = {'Authorization': f"Bearer {security_manager.generate_session_token('admin')}"}
+    
+    def tearDown(self):
+        analytics_routes.analytics_service = self.original_service
+        db.session.remove()
+        self.ctx.pop()
+        shutil.rmtree(self.workdir)
+    
+    def test_batches_respect_range_projection_and_size(self):
+        """Rows come back in bounded batches, in range and with only the requested columns"""
+        dataset = DATASETS['engagement_events']
+        batches = list(iter_batches(dataset, ['id', 'timestamp'], self.start, self.start + timedelta(hours=25),
+                                    self.analytics_db_path, batch_rows=10))
+        
+        self.assertEqual([len(batch) for batch in batches], [10, 10, 5])
+        rows = [row for batch in batches for row in batch]
+        self.assertEqual([row[0] for row in rows], list(range(1, 26)))
+        self.assertEqual(rows[-1][1], self.start + timedelta(hours=24))
+    
+    def test_csv_and_ndjson_of_chat_messages(self):
+        """Application tables export through the same writers"""
+        dataset = DATASETS['chat_messages']
+        end = self.start + timedelta(minutes=10)
+        
+        text = b''.join(export_chunks(dataset, 'csv', ['id', 'message_content', 'timestamp'], self.start, end,
+                                      self.analytics_db_path)).decode()
+        rows = list(csv.reader(io.StringIO(text)))
+        self.assertEqual(rows[0], ['id', 'message_content', 'timestamp'])
+        self.assertEqual(len(rows), 11)
+        self.assertEqual(rows[1], ['1', 'hi, "0"', self.start.isoformat()])
+        
+        lines = b''.join(export_chunks(dataset, 'ndjson', ['id', 'threat_level'], self.start, end,
+                                       self.analytics_db_path)).decode().splitlines()
+        self.assertEqual(json.loads(lines[2]), {'id': 3, 'threat_level': 2})
+    
+    def test_parquet_written_in_row_groups(self):
+        """Parquet output is a valid file with one row group per batch"""
+        dataset = DATASETS['engagement_events']
+        path = os.path.join(self.workdir, 'export.parquet')
+        batches = iter_batches(dataset, ['id', 'timestamp', 'threat_level'], self.start, self.start + timedelta(days=7),
+                               self.analytics_db_path, batch_rows=20)
+        with open(path, 'wb') as f:
+            for chunk in parquet_chunks(['id', 'timestamp', 'threat_level'], ['int', 'timestamp', 'int'], batches):
+                f.write(chunk)
+        
+        parquet = pq.ParquetFile(path)
+        self.assertEqual(parquet.metadata.num_row_groups, 3)
+        table = parquet.read()
+        self.assertEqual(table.num_rows, 50)
+        self.assertEqual(table.column('timestamp')[1].as_py(), self.start + timedelta(hours=1))
+    
+    def test_export_route_streams_requested_format(self):
+        """The endpoint streams an attachment and rejects unknown datasets and columns"""
+        response = self.client.post('/api/analytics/export-data', headers=self.headers, json={
+            'export_type': 'ndjson', 'dataset': 'engagement_events', 'columns': ['id', 'session_id'],
+            'start': '2024-03-01T00:00:00Z', 'end': '2024-03-01T05:00:00+00:00'
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        self.assertIn('engagement_events_20240301_20240301.ndjson', response.headers['Content-Disposition'])
+        self.assertEqual(len(response.get_data().splitlines()), 5)
+        
+        response = self.client.post('/api/analytics/export-data', headers=self.headers,
+                                    json={'export_type': 'csv', 'dataset': 'engagement_events', 'columns': ['nope']})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('available_columns', response.get_json())
+        
+        response = self.client.post('/api/analytics/export-data', headers=self.headers,
+                                    json={'export_type': 'csv', 'dataset': 'personas'})
+        self.assertEqual(response.status_code, 400)
+    
+    def test_export_times_are_naive_utc(self):
+        """Offsets are converted to the naive UTC the tables store"""
+        self.assertEqual(parse_export_time('2024-03-01T02:00:00+02:00'), datetime(2024, 3, 1))
+        self.assertEqual(parse_export_time('2024-03-01'), datetime(2024, 3, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Analytics Ingestion Tests
+Tests for buffered analytics events and the bulk tracking routes
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'honeytrap-backend'))
+
+from flask import Flask
+from src.models.user import db
+from src.models.profile import DecoyProfile
+from src.security import security_manager
+from src.routes import discovery_analytics as analytics_routes
+from src.services.analytics_ingest import AnalyticsIngestBuffer
+from src.services.discovery_analytics import DiscoveryAnalyticsService
+
+GROOMING = {'event_type': 'message',
+            'event_details': {'message_content': 'how old are you? lets meet up, dont tell your parents'}}
+
+
+class TestAnalyticsIngest(unittest.TestCase):
+    """Test batched analytics ingestion"""
+    
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.service = DiscoveryAnalyticsService(os.path.join(self.workdir, 'analytics.db'))
+        # Flushed explicitly by the tests, never by size or the clock
+        self.buffer = AnalyticsIngestBuffer(self.service, flush_interval=3600, flush_size=10000)
+        
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(self.workdir, 'app.db')}"
+        db.init_app(self.app)
+        self.app.register_blueprint(analytics_routes.discovery_analytics_bp, url_prefix='/api')
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.profile = DecoyProfile(name='Mia', username='mia', age=13, location='Leeds', platform_type='discord')
+        db.session.add(self.profile)
+        db.session.commit()
+        
+        self.original_buffer = analytics_routes.ingest_buffer
+        analytics_routes.ingest_buffer = self.buffer
+        self.client = self.app.test_client()
+        self.headers = {'Authorization': f"Bearer {security_manager.generate_session_token('admin')}"}
+    
+    def tearDown(self):
+        analytics_routes.ingest_buffer = self.original_buffer
+        self.buffer.close()
+        self.service.db.close()
+        db.session.remove()
+        self.ctx.pop()
+        shutil.rmtree(self.workdir)
+    
+    def rows(self, sql):
+        with self.service.db.connection() as conn:
+            return conn.execute(sql).fetchall()
+    
+    def post_ndjson(self, path, events):
+        body = '\n'.join(event if isinstance(event, str) else json.dumps(event) for event in events)
+        return self.client.post(path, data=body, content_type='application/x-ndjson', headers=self.headers)
+    
+    def test_flush_writes_one_transaction(self):
+        """Queued events are written together with the aggregates tracking them one by one would leave"""
+        analyses = self.buffer.add_engagements([
+            (1, 'case-a', GROOMING, None),
+            (1, 'case-a', {'event_type': 'message', 'event_details': {'message_content': 'hi'}}, None),
+            (1, 'case-b', GROOMING, '2024-03-01 20:00:00')
+        ])
+        self.assertEqual([analysis['threat_level'] >= 2 for analysis in analyses], [True, False, True])
+        self.buffer.add_discoveries([(1, {'platform_type': 'discord', 'discovery_method': 'search'}, None)])
+        self.assertEqual(self.rows('SELECT COUNT(*) FROM engagement_events'), [(0,)])
+        
+        with mock.patch.object(self.service.db, 'transaction', wraps=self.service.db.transaction) as transaction:
+            self.assertEqual(self.buffer.flush(), 4)
+        self.assertEqual(transaction.call_count, 1)
+        self.assertEqual(self.buffer.pending(), 0)
+        
+        self.assertEqual(self.rows('SELECT session_id, timestamp FROM engagement_events WHERE id = 3'),
+                         [('case-b', '2024-03-01 20:00:00')])
+        self.assertEqual(self.rows('SELECT discovery_method FROM discovery_events'), [('search',)])
+        self.assertEqual(self.rows('SELECT session_id FROM threat_analysis ORDER BY session_id'),
+                         [('case-a',), ('case-b',)])
+    
+    def test_failed_flush_keeps_the_batch(self):
+        """A batch the database cannot take stays queued, ahead of later events, and a full buffer pushes back"""
+        self.buffer.max_pending = 2
+        self.buffer.add_engagements([(1, 'case-a', GROOMING, None)])
+        failure = sqlite3.OperationalError('disk I/O error')
+        with mock.patch.object(self.service, 'record_event_batch', side_effect=failure):
+            with self.assertRaises(sqlite3.OperationalError):
+                self.buffer.flush()
+            self.buffer.add_engagements([(1, 'case-b', GROOMING, None)])
+            with self.assertRaises(sqlite3.OperationalError):
+                self.buffer.add_engagements([(1, 'case-c', GROOMING, None)])
+        self.assertEqual(self.buffer.pending(), 2)
+        
+        self.buffer.close()
+        self.assertEqual(self.rows('SELECT session_id FROM engagement_events ORDER BY id'),
+                         [('case-a',), ('case-b',)])
+    
+    def test_bad_event_is_dropped_from_its_batch(self):
+        """An event that cannot be written is dropped and the rest of its batch is written"""
+        self.buffer.add_engagements([(1, 'case-a', GROOMING, None)])
+        self.buffer.add_discoveries([(1, {'platform_type': 'discord', 'device_info': {'seen': object()}}, None)])
+        self.buffer.add_engagements([(1, 'case-b', GROOMING, None)])
+        
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.buffer.pending(), 0)
+        self.assertEqual(self.rows('SELECT session_id FROM engagement_events ORDER BY id'),
+                         [('case-a',), ('case-b',)])
+        self.assertEqual(self.rows('SELECT COUNT(*) FROM discovery_events'), [(0,)])
+    
+    def test_flusher_thread_writes_on_size(self):
+        """Reaching the size threshold wakes the flusher without waiting for the interval"""
+        self.buffer.flush_size = 3
+        self.buffer.add_engagements([(1, 'case-a', GROOMING, None)] * 3)
+        deadline = time.monotonic() + 5
+        while self.buffer.pending() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.rows('SELECT COUNT(*) FROM engagement_events'), [(3,)])
+        self.buffer.close()
+        self.assertFalse(self.buffer.thread.is_alive())
+    
+    def test_bulk_engagement_route(self):
+        """NDJSON lines are validated one by one, and escalations are reported before the batch is written"""
+        self.assertEqual(self.client.post('/api/analytics/track-engagement/bulk', data='{}').status_code, 401)
+        response = self.post_ndjson('/api/analytics/track-engagement/bulk', [
+            {'profile_id': self.profile.id, 'session_id': 'case-a', 'event_details': GROOMING['event_details']},
+            '',
+            {'profile_id': self.profile.id},
+            {'profile_id': 999, 'session_id': 'case-b'},
+            {'profile_id': self.profile.id, 'session_id': 'case-c', 'timestamp': 'yesterday'},
+            {'profile_id': self.profile.id, 'session_id': 'case-d', 'timestamp': '2024-03-01T21:00:00+01:00'}
+        ])
+        self.assertEqual(response.status_code, 202)
+        result = response.get_json()
+        self.assertEqual(result['accepted'], 2)
+        self.assertEqual([item['line'] for item in result['rejected']], [3, 4, 5])
+        self.assertEqual(result['rejected'][1]['error'], 'Profile not found')
+        self.assertTrue(result['requires_escalation'])
+        self.assertEqual([item['session_id'] for item in result['escalations']], ['case-a'])
+        
+        self.buffer.flush()
+        self.assertEqual(self.rows('SELECT session_id, timestamp FROM engagement_events ORDER BY id')[1],
+                         ('case-d', '2024-03-01 20:00:00'))
+        
+        response = self.post_ndjson('/api/analytics/track-engagement/bulk', ['{"profile_id": 1', '{}'])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['error'], 'Line 1 is not valid JSON')
+    
+    def test_bulk_discovery_route(self):
+        """A JSON array is accepted too, with each event defaulting to its profile's platform"""
+        response = self.client.post('/api/analytics/track-discovery/bulk', headers=self.headers, json=[
+            {'profile_id': self.profile.id, 'discovery_method': 'hashtag'},
+            {'profile_id': self.profile.id, 'platform_type': 'tiktok'}
+        ])
+        self.assertEqual(response.get_json()['accepted'], 2)
+        self.buffer.flush()
+        self.assertEqual(self.rows('SELECT platform_type, discovery_method FROM discovery_events ORDER BY id'),
+                         [('discord', 'hashtag'), ('tiktok', 'unknown')])
+        
+        response = self.client.post('/api/analytics/track-discovery/bulk', headers=self.headers,
+                                    json={'profile_id': self.profile.id})
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
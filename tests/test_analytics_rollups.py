@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Analytics Rollup Tests
+Tests for the hourly and daily aggregates behind the discovery and threat reports
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from itertools import combinations
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'honeytrap-backend'))
+
+from flask import Flask
+from src.models.user import db
+from src.models.profile import DecoyProfile
+from src.services import analytics_rollups
+from src.services.analytics_rollups import DAY, HOUR, window_ranges
+from src.services.discovery_analytics import DiscoveryAnalyticsService, utc_timestamp
+
+GROOMING = {'event_type': 'message',
+            'event_details': {'message_content': 'how old are you? lets meet up, dont tell your parents'}}
+CHAT = {'event_type': 'message', 'event_details': {'message_content': 'hi'}}
+
+
+class TestAnalyticsRollups(unittest.TestCase):
+    """Test rollup maintenance and the reports read from them"""
+    
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.analytics_db_path = os.path.join(self.workdir, 'analytics.db')
+        self.service = DiscoveryAnalyticsService(self.analytics_db_path)
+        self.now = datetime.utcnow()
+        
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(self.workdir, 'app.db')}"
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        db.session.add_all([
+            DecoyProfile(name='Mia', username='mia', age=13, location='Leeds', platform_type='discord'),
+            DecoyProfile(name='Zoe', username='zoe', age=14, location='York', platform_type='tiktok')
+        ])
+        db.session.commit()
+    
+    def tearDown(self):
+        self.service.db.close()
+        db.session.remove()
+        self.ctx.pop()
+        shutil.rmtree(self.workdir)
+    
+    def ago(self, hours):
+        return utc_timestamp(self.now - timedelta(hours=hours))
+    
+    def ingest(self):
+        """Events spread over 40 days, both sides of each window edge"""
+        discoveries, engagements = [], []
+        for hours in (0, 1, 5, 23, 25, 24 * 7, 24 * 29 + 3, 24 * 31, 24 * 40):
+            for profile_id, method in ((1, 'search'), (2, 'hashtag')):
+                data = {'platform_type': 'discord' if profile_id == 1 else 'tiktok', 'discovery_method': method,
+                        'session_id': f'visit-{hours % 3}', 'geolocation': {'city': 'Leeds'} if hours % 2 else {}}
+                discoveries.append((profile_id, data, self.ago(hours)))
+            engagements.append((1, f'case-{hours}', GROOMING, self.service.assess_engagement_event(GROOMING),
+                                self.ago(hours)))
+            engagements.append((2, f'case-{hours}', CHAT, self.service.assess_engagement_event(CHAT),
+                                self.ago(hours)))
+        self.service.record_event_batch(discoveries, engagements)
+    
+    def query(self, sql, params=()):
+        with self.service.db.connection() as conn:
+            return conn.execute(sql, params).fetchall()
+    
+    def rollup_contents(self):
+        return {table: sorted(self.query(f'SELECT * FROM {table}')) for table in analytics_rollups.ROLLUP_TABLES}
+    
+    def test_window_ranges(self):
+        """Whole days come from daily buckets, the ragged ends (including the current hour) from hourly ones"""
+        self.assertEqual(window_ranges(datetime(2024, 3, 1, 9, 30), datetime(2024, 3, 4, 14, 5)), [
+            (HOUR, '2024-03-01 09:00:00', '2024-03-02 00:00:00'),
+            (DAY, '2024-03-02 00:00:00', '2024-03-04 00:00:00'),
+            (HOUR, '2024-03-04 00:00:00', '2024-03-04 14:05:00')
+        ])
+        self.assertEqual(window_ranges(datetime(2024, 3, 1, 9, 30), datetime(2024, 3, 1, 14, 5)),
+                         [(HOUR, '2024-03-01 09:00:00', '2024-03-01 14:05:00')])
+    
+    def test_reports_match_the_raw_events(self):
+        """The reports equal aggregates of the raw events in the window, and never read those events"""
+        self.ingest()
+        first_hour = window_ranges(self.now - timedelta(days=30), self.now)[0][1]
+        report = self.service.get_discovery_analytics(days=30)
+        
+        raw = self.query('''
+            SELECT COUNT(*), COUNT(DISTINCT profile_id), COUNT(DISTINCT session_id)
+            FROM discovery_events WHERE discovery_time >= ?
+        ''', (first_hour,))[0]
+        self.assertEqual((report['total_discoveries'], report['unique_profiles'], report['unique_sessions']), raw)
+        raw_hours = self.query('''
+            SELECT CAST(strftime('%H', discovery_time) AS INTEGER), COUNT(*)
+            FROM discovery_events WHERE discovery_time >= ? GROUP BY 1 ORDER BY 1
+        ''', (first_hour,))
+        self.assertEqual([(item['hour'], item['count']) for item in report['hourly_distribution']], raw_hours)
+        raw_breakdown = dict(((platform, method), (count, hours)) for platform, method, count, hours in self.query('''
+            SELECT platform_type, discovery_method, COUNT(*),
+                   AVG(julianday(?) - julianday(discovery_time)) * 24
+            FROM discovery_events WHERE discovery_time >= ? GROUP BY 1, 2
+        ''', (utc_timestamp(self.now), first_hour)))
+        for item in report['discovery_breakdown']:
+            count, hours = raw_breakdown[(item['platform'], item['method'])]
+            self.assertEqual(item['count'], count)
+            self.assertAlmostEqual(item['avg_hours_ago'], hours, delta=0.01)
+        self.assertEqual(report['geographic_distribution'], [{'location': {'city': 'Leeds'}, 'count': 10}])
+        
+        threats = self.service.get_threat_analytics(days=30)
+        self.assertNotIn('error', threats)
+        self.assertEqual(sum(item['count'] for item in threats['threat_level_distribution']), 14)
+        self.assertEqual([item['platform'] for item in threats['platform_threat_analysis']], ['discord', 'tiktok'])
+        self.assertEqual(threats['platform_threat_analysis'][0]['total_events'], 7)
+        
+        # With the raw events gone the reports are unchanged
+        with self.service.db.transaction() as cursor:
+            cursor.execute('DELETE FROM discovery_events')
+            cursor.execute('DELETE FROM engagement_events')
+        self.assertEqual(self.service.get_discovery_analytics(days=30), report)
+        self.assertEqual(self.service.get_threat_analytics(days=30)['threat_level_distribution'],
+                         threats['threat_level_distribution'])
+    
+    def test_profile_filter(self):
+        """A profile's report counts only its own buckets"""
+        self.ingest()
+        report = self.service.get_discovery_analytics(profile_id=2, days=90)
+        self.assertEqual(report['total_discoveries'], 9)
+        self.assertEqual([(item['platform'], item['method']) for item in report['discovery_breakdown']],
+                         [('tiktok', 'hashtag')])
+        self.assertEqual(report['unique_profiles'], 1)
+    
+    def test_indicator_counts_cover_every_combination(self):
+        """Indicator frequencies, co-occurrences and platform counts include combinations beyond the commonest ten"""
+        names = sorted(self.service.threat_indicators)
+        engagements = [(1, 'case-a', CHAT, {'threat_level': 1, 'indicators': list(pair)}, self.ago(1))
+                       for pair in combinations(names, 2)]  # 28 combinations, each indicator in 7
+        engagements += [(2, 'case-b', CHAT, {'threat_level': 1, 'indicators': indicators}, self.ago(1))
+                        for indicators in (['gift_offers'], ['meeting_requests', 'age_focused'])]
+        self.service.record_event_batch([], engagements)
+        
+        # One row per event and indicator, against the right event
+        stored = self.query('SELECT id, escalation_indicators FROM engagement_events')
+        for engagement_id, indicators in stored:
+            self.assertEqual(
+                [row[0] for row in self.query('SELECT indicator FROM engagement_indicators WHERE engagement_id = ?',
+                                              (engagement_id,))],
+                sorted(json.loads(indicators))
+            )
+        
+        threats = self.service.get_threat_analytics(days=1)
+        self.assertEqual({item['indicator']: item['count'] for item in threats['top_threat_indicators']},
+                         {name: 8 if name in ('age_focused', 'gift_offers', 'meeting_requests') else 7
+                          for name in names})
+        self.assertEqual(threats['indicator_co_occurrence'][0],
+                         {'indicators': ['age_focused', 'meeting_requests'], 'count': 2})
+        self.assertEqual(len(threats['indicator_co_occurrence']), 10)
+        platforms = {item['platform']: item for item in threats['platform_threat_analysis']}
+        self.assertEqual(sorted((item['indicator'], item['count']) for item in platforms['tiktok']['top_indicators']),
+                         [('age_focused', 1), ('gift_offers', 1), ('meeting_requests', 1)])
+    
+    def test_incremental_rollups_match_a_rebuild(self):
+        """Rollups kept up at ingestion equal those rebuilt from the raw events"""
+        self.ingest()
+        self.service.track_profile_discovery(1, {'platform_type': 'discord', 'session_id': 'visit-9'})
+        self.service.track_engagement_event(1, 'case-x', GROOMING)
+        incremental = self.rollup_contents()
+        
+        with self.service.db.transaction() as cursor:
+            analytics_rollups.rebuild(cursor)
+        self.assertEqual(self.rollup_contents(), incremental)
+    
+    def test_backfill_from_existing_events(self):
+        """Events stored before the rollups existed are aggregated when the service starts"""
+        conn = sqlite3.connect(self.analytics_db_path)
+        conn.executemany(
+            'INSERT INTO engagement_events (profile_id, session_id, event_type, timestamp, threat_level) '
+            'VALUES (?, ?, ?, ?, ?)',
+            [(1, 'case-a', 'message', self.ago(2), 3), (1, 'case-a', 'message', self.ago(24 * 10), None)]
+        )
+        conn.commit()
+        conn.close()
+        
+        DiscoveryAnalyticsService(self.analytics_db_path)
+        distribution = self.service.get_threat_analytics(days=30)['threat_level_distribution']
+        self.assertEqual(distribution, [{'threat_level': 0, 'count': 1}, {'threat_level': 3, 'count': 1}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Analytics Schema Tests
+Tests for the versioned analytics schema, its in-place migration and the indexes behind each query
+"""
+
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'honeytrap-backend'))
+
+from flask import Flask
+from src.models.user import db
+from src.models.chat import ChatSession, ChatMessage, Persona
+from src.models.profile import DecoyProfile
+from src.services import analytics_schema
+from src.services.analytics_export import DATASETS, ANALYTICS, iter_batches
+from src.services.discovery_analytics import DiscoveryAnalyticsService
+from src.services.threat_timeline import ThreatTimeline
+
+GROOMING = {'event_type': 'message',
+            'event_details': {'message_content': 'how old are you? lets meet up, dont tell your parents'}}
+
+
+class TestAnalyticsSchema(unittest.TestCase):
+    """Test the analytics schema and its migrations"""
+    
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.analytics_db_path = os.path.join(self.workdir, 'analytics.db')
+        self.services = []
+    
+    def tearDown(self):
+        for service in self.services:
+            service.db.close()
+        shutil.rmtree(self.workdir)
+    
+    def service(self):
+        service = DiscoveryAnalyticsService(self.analytics_db_path)
+        self.services.append(service)
+        return service
+    
+    def query(self, sql):
+        conn = sqlite3.connect(self.analytics_db_path)
+        try:
+            return conn.execute(sql).fetchall()
+        finally:
+            conn.close()
+    
+    def test_new_database_is_current(self):
+        """A new file gets the latest schema, and repeated discoveries accumulate in one metrics row"""
+        service = self.service()
+        self.assertEqual(self.query('PRAGMA user_version'), [(analytics_schema.SCHEMA_VERSION,)])
+        for _ in range(3):
+            self.assertTrue(service.track_profile_discovery(1, {'platform_type': 'discord'})['success'])
+        self.assertEqual(self.query('SELECT platform_type, profile_views FROM platform_metrics'), [('discord', 3)])
+        self.assertEqual(self.query('SELECT profile_id, total_views FROM profile_discovery_stats'), [(1, 3)])
+        self.assertEqual(service.get_platform_performance_metrics()['platform_metrics'][0]['total_views'], 3)
+    
+    def test_unversioned_file_is_migrated_in_place(self):
+        """Existing events survive, duplicate metric days merge and the missing tables and indexes appear"""
+        conn = sqlite3.connect(self.analytics_db_path)
+        analytics_schema.MIGRATIONS[0](conn.cursor())
+        conn.execute('''
+            CREATE TABLE platform_metrics (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, platform_type TEXT NOT NULL, metric_date DATE NOT NULL,
+                profile_views INTEGER DEFAULT 0, contact_attempts INTEGER DEFAULT 0,
+                successful_engagements INTEGER DEFAULT 0, threat_detections INTEGER DEFAULT 0,
+                evidence_captured INTEGER DEFAULT 0, average_discovery_time REAL DEFAULT 0.0
+            )
+        ''')
+        conn.executemany('INSERT INTO platform_metrics (platform_type, metric_date, profile_views) VALUES (?, ?, ?)',
+                         [('discord', '2024-03-01', 2), ('discord', '2024-03-01', 5), ('tiktok', '2024-03-01', 1)])
+        conn.execute('INSERT INTO engagement_events (profile_id, session_id, event_type, threat_level, '
+                     'escalation_indicators) VALUES (?, ?, ?, ?, ?)',
+                     (1, 'case-a', 'message', 3, '["meeting_requests", "age_focused"]'))
+        conn.commit()
+        conn.close()
+        self.assertEqual(self.query('PRAGMA user_version'), [(0,)])
+        
+        service = self.service()
+        self.assertEqual(self.query('PRAGMA user_version'), [(analytics_schema.SCHEMA_VERSION,)])
+        self.assertEqual(self.query('SELECT platform_type, profile_views FROM platform_metrics ORDER BY 1'),
+                         [('discord', 7), ('tiktok', 1)])
+        self.assertEqual(self.query('SELECT COUNT(*) FROM engagement_events'), [(1,)])
+        indexes = {row[0] for row in self.query("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertTrue({'idx_discovery_events_time', 'idx_threat_analysis_risk'} <= indexes)
+        # The rollups were built from the event that was already there
+        self.assertEqual(self.query("SELECT threat_level, events FROM engagement_rollups WHERE granularity = 'day'"),
+                         [(3, 1)])
+        # ...and its indicators split into rows of their own
+        self.assertEqual(self.query('SELECT engagement_id, indicator FROM engagement_indicators'),
+                         [(1, 'age_focused'), (1, 'meeting_requests')])
+        self.assertEqual(self.query("SELECT indicator, co_indicator, events FROM indicator_rollups "
+                                    "WHERE granularity = 'day'"),
+                         [('age_focused', 'age_focused', 1), ('age_focused', 'meeting_requests', 1),
+                          ('meeting_requests', 'meeting_requests', 1)])
+        
+        with service.db.connection() as conn:
+            self.assertEqual(analytics_schema.migrate(conn), (analytics_schema.SCHEMA_VERSION,) * 2)
+    
+    def test_every_version_migrates_to_the_new_schema(self):
+        """A file left at any earlier version ends up with exactly the schema of a new one"""
+        def schema(path):
+            conn = sqlite3.connect(path)
+            try:
+                return sorted(conn.execute("SELECT type, name, sql FROM sqlite_master "
+                                           "WHERE name NOT LIKE 'sqlite_%'").fetchall())
+            finally:
+                conn.close()
+        
+        self.service()
+        current = schema(self.analytics_db_path)
+        for version in range(1, analytics_schema.SCHEMA_VERSION):
+            path = os.path.join(self.workdir, f'v{version}.db')
+            conn = sqlite3.connect(path)
+            for migration in analytics_schema.MIGRATIONS[:version]:
+                migration(conn.cursor())
+            conn.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+            self.assertEqual(analytics_schema.migrate(conn), (version, analytics_schema.SCHEMA_VERSION))
+            conn.close()
+            self.assertEqual(schema(path), current, f'migrated from version {version}')
+    
+    def test_newer_schema_is_left_alone(self):
+        """A file from a newer release is not downgraded or touched"""
+        self.service()
+        conn = sqlite3.connect(self.analytics_db_path)
+        conn.execute('PRAGMA user_version = 99')
+        conn.close()
+        with self.services[0].db.connection() as conn:
+            self.assertEqual(analytics_schema.migrate(conn), (99, 99))
+        self.assertEqual(self.query('PRAGMA user_version'), [(99,)])
+
+
+class TestAnalyticsQueryPlans(unittest.TestCase):
+    """Every query the analytics code runs is answered from an index"""
+    
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.analytics_db_path = os.path.join(self.workdir, 'analytics.db')
+        self.service = DiscoveryAnalyticsService(self.analytics_db_path)
+        self.db = self.service.db
+        
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(self.workdir, 'app.db')}"
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        persona = Persona(name='Emma', age=13, platform_type='discord', personality_traits='{}',
+                          language_style='{}', response_patterns='{}')
+        db.session.add_all([persona, DecoyProfile(name='Mia', username='mia', age=13, location='Leeds',
+                                                  platform_type='discord')])
+        db.session.flush()
+        chat_session = ChatSession(session_id='case-a', persona_id=persona.id, user_ip='127.0.0.1')
+        db.session.add(chat_session)
+        db.session.flush()
+        db.session.add(ChatMessage(session_id=chat_session.id, sender_type='user', message_content='hi'))
+        db.session.commit()
+    
+    def tearDown(self):
+        self.db.close()
+        db.session.remove()
+        self.ctx.pop()
+        shutil.rmtree(self.workdir)
+    
+    def traced_statements(self):
+        """Statements run on analytics connections while tracking events and serving every report"""
+        statements = []
+        checkout = self.db._checkout
+        
+        def traced_checkout():
+            conn = checkout()
+            conn.set_trace_callback(statements.append)
+            return conn
+        
+        with mock.patch.object(self.db, '_checkout', traced_checkout):
+            self.service.track_profile_discovery(1, {'platform_type': 'discord', 'session_id': 'visit'})
+            self.service.track_engagement_event(1, 'case-a', GROOMING)
+            self.service.track_engagement_event(1, 'case-a', GROOMING)  # Updates the session's analysis
+            self.service.record_event_batch(
+                [(1, {'platform_type': 'discord', 'session_id': 'visit'}, '2024-03-01 20:00:00')],
+                [(1, 'case-b', GROOMING, self.service.assess_engagement_event(GROOMING), '2024-03-01 20:00:00')]
+            )
+            self.service.get_discovery_analytics()
+            self.service.get_discovery_analytics(profile_id=1, days=365)
+            self.assertNotIn('error', self.service.get_threat_analytics())
+            self.service.generate_comprehensive_report()
+            ThreatTimeline(self.analytics_db_path).get_timeline('case-a')
+            now = datetime.utcnow()
+            for dataset in DATASETS.values():
+                if dataset.source == ANALYTICS:
+                    list(iter_batches(dataset, list(dataset.columns), now - timedelta(days=1), now,
+                                      self.analytics_db_path))
+        return statements
+    
+    def test_queries_use_indexes(self):
+        statements = {
+            ' '.join(sql.split()) for sql in self.traced_statements()
+            if not re.match(r'\s*(BEGIN|COMMIT|ROLLBACK|PRAGMA)\b', sql, re.IGNORECASE)
+        }
+        self.assertGreater(len(statements), 20)
+        
+        with self.db.connection() as conn:
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            for sql in sorted(statements):
+                for _, _, _, detail in conn.execute(f'EXPLAIN QUERY PLAN {sql}'):
+                    scanned = re.match(r'SCAN (\w+)', detail)
+                    self.assertFalse(scanned and scanned.group(1) in tables, f'{detail} in: {sql}')
+
+
+if __name__ == '__main__':
+    unittest.main()
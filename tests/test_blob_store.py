@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Blob Store Tests
+Tests for content-addressed evidence storage, deduplication and reference counting
+"""
+
+import hashlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'honeytrap-backend'))
+
+from flask import Flask
+from src.models.user import db
+from src.models.chat import ChatSession, Evidence, EvidenceBlob
+from src.services.blob_store import BlobStore, blob_reference
+from src.services.evidence_audit import hash_file
+
+
+class TestBlobStore(unittest.TestCase):
+    """Test the content-addressed blob store"""
+    
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        self.root = tempfile.mkdtemp()
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{self.db_path}'
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        
+        self.session = ChatSession(session_id='s1', persona_id=1, user_ip='127.0.0.1')
+        db.session.add(self.session)
+        db.session.commit()
+        self.store = BlobStore(self.root)
+    
+    def tearDown(self):
+        db.session.remove()
+        self.ctx.pop()
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+        shutil.rmtree(self.root)
+    
+    def _store_evidence(self, data):
+        with self.store.batch() as batch:
+            evidence = self.store.add_evidence(batch, self.session.id, 'screenshot', io.BytesIO(data),
+                                               {'filename': 'shot.png'})
+            db.session.flush()
+        db.session.commit()
+        return evidence
+    
+    def test_blob_is_stored_under_its_hash(self):
+        """Blobs land in a sharded path named by their SHA-256"""
+        data = os.urandom(3 * 1024 * 1024 + 7)
+        sha256, size = self.store.write(data)
+        
+        self.assertEqual(sha256, hashlib.sha256(data).hexdigest())
+        self.assertEqual(size, len(data))
+        path = self.store.path_for(sha256)
+        self.assertEqual(path, os.path.join(self.root, sha256[:2], sha256[2:4], sha256))
+        self.assertEqual(hash_file(path), sha256)
+        self.assertEqual(os.listdir(self.store.temp_dir), [])
+        with self.store.open(sha256) as view:
+            self.assertEqual(bytes(view[:16]), data[:16])
+    
+    def test_identical_evidence_is_stored_once(self):
+        """Byte-identical files share one blob with a reference per evidence row"""
+        first = self._store_evidence(b'same screenshot')
+        second = self._store_evidence(b'same screenshot')
+        
+        self.assertEqual(first.file_path, second.file_path)
+        self.assertEqual(first.file_path, blob_reference(first.hash_value))
+        self.assertEqual(db.session.get(EvidenceBlob, first.hash_value).ref_count, 2)
+        shard = os.path.dirname(self.store.path_for(first.hash_value))
+        self.assertEqual(os.listdir(shard), [first.hash_value])
+    
+    def test_failed_batch_leaves_nothing_behind(self):
+        """Blobs only appear once their batch commits"""
+        with self.assertRaises(RuntimeError):
+            with self.store.batch() as batch:
+                sha256, _ = batch.write(b'partial upload')
+                self.assertFalse(self.store.exists(sha256))
+                raise RuntimeError('upload interrupted')
+        
+        self.assertFalse(self.store.exists(sha256))
+        self.assertEqual(os.listdir(self.store.temp_dir), [])
+    
+    def test_garbage_collection_respects_references(self):
+        """Only blobs without references past the grace period are deleted"""
+        evidence = self._store_evidence(b'attachment')
+        self.assertEqual(self.store.collect_garbage(grace_seconds=0), 0)
+        
+        self.store.release(evidence.hash_value)
+        db.session.commit()
+        self.assertEqual(self.store.collect_garbage(grace_seconds=3600), 0)
+        self.assertTrue(self.store.exists(evidence.hash_value))
+        
+        self.assertEqual(self.store.collect_garbage(grace_seconds=0), 1)
+        self.assertFalse(self.store.exists(evidence.hash_value))
+        self.assertIsNone(db.session.get(EvidenceBlob, evidence.hash_value))
+    
+    def test_deleted_evidence_releases_its_blob(self):
+        """Deleting evidence or pointing it elsewhere drops its reference, so the blob can be collected"""
+        first = self._store_evidence(b'attachment')
+        second = self._store_evidence(b'attachment')
+        sha256 = first.hash_value
+        
+        db.session.delete(first)
+        db.session.commit()
+        self.assertEqual(db.session.get(EvidenceBlob, sha256).ref_count, 1)
+        self.assertEqual(self.store.collect_garbage(grace_seconds=0), 0)
+        
+        second.file_path = '/evidence/elsewhere.png'
+        db.session.commit()
+        self.assertEqual(db.session.get(EvidenceBlob, sha256).ref_count, 0)
+        self.assertEqual(self.store.collect_garbage(grace_seconds=0), 1)
+        self.assertFalse(self.store.exists(sha256))
+    
+    def test_deleted_session_releases_its_blobs(self):
+        """Evidence removed with its chat session releases its blobs too"""
+        evidence = self._store_evidence(b'attachment')
+        db.session.delete(self.session)
+        db.session.commit()
+        
+        self.assertEqual(db.session.get(EvidenceBlob, evidence.hash_value).ref_count, 0)
+    
+    def test_failed_collection_keeps_the_file(self):
+        """A blob whose row deletion fails to commit is still readable"""
+        evidence = self._store_evidence(b'attachment')
+        self.store.release(evidence.hash_value)
+        db.session.commit()
+        
+        with mock.patch.object(db.session, 'commit', side_effect=RuntimeError('database is locked')):
+            with self.assertRaises(RuntimeError):
+                self.store.collect_garbage(grace_seconds=0)
+        
+        self.assertTrue(self.store.exists(evidence.hash_value))
+        self.assertIsNotNone(db.session.get(EvidenceBlob, evidence.hash_value))
+        self.assertEqual(self.store.collect_garbage(grace_seconds=0), 1)
+        self.assertFalse(self.store.exists(evidence.hash_value))
+    
+    def test_collected_blob_can_be_stored_again(self):
+        """Re-adding a collected blob writes it back"""
+        evidence = self._store_evidence(b'attachment')
+        self.store.release(evidence.hash_value)
+        db.session.commit()
+        self.store.collect_garbage(grace_seconds=0)
+        
+        again = self._store_evidence(b'attachment')
+        self.assertTrue(self.store.exists(again.hash_value))
+        self.assertEqual(db.session.get(EvidenceBlob, again.hash_value).ref_count, 1)
+    
+    def test_rejects_invalid_hashes(self):
+        """Blob paths can't escape the store"""
+        with self.assertRaises(ValueError):
+            self.store.path_for('../../etc/passwd')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Case Export Tests
+Tests for streaming, resumable case bundles
+"""
+
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import unittest
+from unittest import mock
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'honeytrap-backend'))
+
+from flask import Flask
+from src.models.user import db
+from src.models.chat import ChatSession, ChatMessage, Persona, Evidence
+from src.routes.admin import admin_bp
+from src.security import security_manager
+from src.services import report_service as report_module
+from src.services.case_export import CaseBundle
+from src.services.evidence_ledger import evidence_ledger
+from src.services.report_service import report_service
+from src.services.transcripts import last_message_id
+
+
+class TestCaseExport(unittest.TestCase):
+    """Test case bundle generation"""
+    
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        self.report_fd, self.report_path = tempfile.mkstemp(suffix='.pdf')
+        os.write(self.report_fd, b'%PDF-1.4 test report')
+        os.close(self.report_fd)
+        self.file_fd, self.file_path = tempfile.mkstemp(suffix='.png')
+        os.write(self.file_fd, b'\x89PNG' * 300)
+        os.close(self.file_fd)
+        
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{self.db_path}'
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        
+        persona = Persona(name='Emma', age=13, platform_type='discord', personality_traits='{}',
+                          language_style='{}', response_patterns='{}')
+        db.session.add(persona)
+        db.session.flush()
+        self.session = ChatSession(session_id='case-1', persona_id=persona.id, user_ip='203.0.113.7')
+        db.session.add(self.session)
+        db.session.flush()
+        for i in range(50):
+            db.session.add(ChatMessage(session_id=self.session.id, sender_type='user' if i % 2 == 0 else 'decoy',
+                                       message_content=f'message {i}'))
+        db.session.add(Evidence(session_id=self.session.id, evidence_type='screenshot', file_path=self.file_path,
+                                evidence_metadata=json.dumps({'filename': 'shot.png'}),
+                                hash_value=hashlib.sha256(b'\x89PNG' * 300).hexdigest()))
+        db.session.add(Evidence(session_id=self.session.id, evidence_type='chat_log', content='snapshot',
+                                hash_value=hashlib.sha256(b'snapshot').hexdigest()))
+        db.session.commit()
+        evidence_ledger.backfill()
+    
+    def tearDown(self):
+        db.session.remove()
+        self.ctx.pop()
+        os.close(self.db_fd)
+        for path in (self.db_path, self.report_path, self.file_path):
+            if os.path.exists(path):
+                os.unlink(path)
+    
+    def _bundle(self):
+        return CaseBundle(self.session, Evidence.query.order_by(Evidence.id).all(), self.report_path,
+                          last_message_id(self.session.id))
+    
+    def test_bundle_is_a_valid_tar_with_manifest(self):
+        """The stream is a tar archive whose manifest matches every member"""
+        bundle = self._bundle()
+        data = b''.join(bundle.stream())
+        self.assertEqual(len(data), bundle.size)
+        
+        with tarfile.open(fileobj=io.BytesIO(data)) as archive:
+            members = {member.name: archive.extractfile(member).read() for member in archive.getmembers()}
+        
+        manifest = members.pop('case_case-1/manifest.sha256').decode().splitlines()
+        self.assertEqual(len(manifest), len(members))
+        for line in manifest:
+            digest, path = line.split('  ')
+            self.assertEqual(hashlib.sha256(members[f'case_case-1/{path}']).hexdigest(), digest)
+        
+        transcript = members['case_case-1/transcript.ndjson'].decode().splitlines()
+        self.assertEqual(len(transcript), 50)
+        self.assertEqual(json.loads(transcript[0])['message_content'], 'message 0')
+        metadata = json.loads(members['case_case-1/metadata.json'])
+        self.assertEqual(metadata['evidence'][0]['bundle_path'], 'evidence/000001_screenshot.png')
+        self.assertEqual(metadata['evidence'][0]['ledger']['entry']['evidence_id'], 1)
+    
+    def test_resume_from_any_offset(self):
+        """Every byte range of a rebuilt bundle matches the original stream"""
+        data = b''.join(self._bundle().stream())
+        
+        for start in (0, 1, 511, 512, 1500, len(data) // 2, len(data) - 1):
+            resumed = self._bundle()
+            self.assertEqual(b''.join(resumed.stream(start)), data[start:])
+            self.assertEqual(b''.join(resumed.stream(start, start + 700)), data[start:start + 700])
+    
+    def test_new_messages_do_not_change_a_pinned_bundle(self):
+        """Messages added after `until` are left out, so the ETag stays put"""
+        bundle = self._bundle()
+        db.session.add(ChatMessage(session_id=self.session.id, sender_type='user', message_content='late'))
+        db.session.commit()
+        
+        again = CaseBundle(self.session, Evidence.query.order_by(Evidence.id).all(), self.report_path, bundle.until)
+        self.assertEqual(again.etag, bundle.etag)
+        self.assertNotEqual(self._bundle().etag, bundle.etag)
+    
+    def test_export_route_reuses_report_and_checks_resumes(self):
+        """Resumes reuse the first render, and only splice onto the bundle the client started"""
+        self.app.register_blueprint(admin_bp, url_prefix='/api')
+        client = self.app.test_client()
+        headers = {'Authorization': f"Bearer {security_manager.generate_session_token('admin')}"}
+        url = f'/api/admin/sessions/{self.session.id}/export'
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        
+        def get(path, **kwargs):
+            # Read and close each streamed response before the next request
+            response = client.get(path, headers={**headers, **kwargs})
+            response.get_data()
+            response.close()
+            return response
+        
+        with mock.patch.object(report_service, 'cache_dir', cache_dir), \
+                mock.patch.object(report_service, 'app', self.app), \
+                mock.patch.object(report_module, 'generate_pdf_report',
+                                  wraps=report_module.generate_pdf_report) as render:
+            full = get(url)
+            self.assertEqual(full.status_code, 200)
+            etag = full.get_etag()[0]
+            
+            resumed = get(f'{url}?offset=1000&etag={etag}')
+            self.assertEqual(resumed.status_code, 206)
+            self.assertEqual(resumed.data, full.data[1000:])
+            ranged = get(url, **{'Range': 'bytes=1000-', 'If-Range': f'"{etag}"'})
+            self.assertEqual(ranged.status_code, 206)
+            self.assertEqual(get(url, Range='bytes=1000-').data, full.data[1000:])
+            self.assertEqual(render.call_count, 1)
+            
+            # Without the etag, or once the bundle has changed, the whole new bundle is sent
+            self.assertEqual(get(f'{url}?offset=1000').status_code, 200)
+            db.session.add(ChatMessage(session_id=self.session.id, sender_type='user', message_content='new'))
+            db.session.commit()
+            changed = get(f'{url}?offset=1000&etag={etag}')
+            self.assertEqual(changed.status_code, 200)
+            self.assertNotEqual(changed.get_etag()[0], etag)
+            self.assertEqual(len(changed.data), int(changed.headers['Content-Length']))
+
+
+if __name__ == '__main__':
+    unittest.main()
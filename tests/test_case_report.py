@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Case Report Tests
+Tests for consolidated multi-session case reports
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'honeytrap-backend'))
+
+from flask import Flask
+from pypdf import PdfReader
+from src.models.user import db
+from src.models.chat import ChatSession, ChatMessage, Persona, Evidence
+from src.routes.admin import admin_bp
+from src.security import security_manager
+from src.services.case_report import render_case_report, timeline_events
+from src.services.report_service import ReportService, DONE
+
+
+class TestCaseReport(unittest.TestCase):
+    """Test consolidated case report rendering"""
+    
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.database_uri = f"sqlite:///{os.path.join(self.workdir, 'case.db')}"
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = self.database_uri
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        
+        persona = Persona(name='Emma', age=13, platform_type='discord', personality_traits='{}',
+                          language_style='{}', response_patterns='{}')
+        db.session.add(persona)
+        db.session.flush()
+        
+        start = datetime(2024, 1, 1, 12, 0, 0)
+        self.session_ids = []
+        for number, message_count in enumerate([120, 10, 40]):
+            opened = start + timedelta(minutes=number)
+            chat_session = ChatSession(session_id=f'case-{number}', persona_id=persona.id, user_ip='203.0.113.7',
+                                       created_at=opened)
+            db.session.add(chat_session)
+            db.session.flush()
+            self.session_ids.append(chat_session.id)
+            for i in range(message_count):
+                db.session.add(ChatMessage(
+                    session_id=chat_session.id, sender_type='user' if i % 2 == 0 else 'decoy',
+                    message_content=f'session {number} message {i} <b>not markup</b>',
+                    threat_level=2 if i % 7 == 0 else 0, timestamp=opened + timedelta(seconds=5 * i + 1)
+                ))
+            db.session.add(Evidence(session_id=chat_session.id, evidence_type='chat_log', file_path='unused',
+                                    hash_value=f'{number:064x}', created_at=opened + timedelta(seconds=30)))
+        db.session.commit()
+    
+    def tearDown(self):
+        db.session.remove()
+        self.ctx.pop()
+        shutil.rmtree(self.workdir)
+    
+    def test_timeline_interleaves_sessions_in_time_order(self):
+        """Session starts, flagged messages and evidence from every session merge into one ordered stream"""
+        events = list(timeline_events(self.session_ids))
+        times = [event[0] for event in events]
+        
+        self.assertEqual(times, sorted(times))
+        self.assertEqual({event[1] for event in events}, {'case-0', 'case-1', 'case-2'})
+        self.assertEqual(sum(1 for event in events if event[2] == 'session_started'), 3)
+        self.assertEqual(sum(1 for event in events if event[2] == 'evidence'), 3)
+        self.assertTrue(all(event[4] >= 1 for event in events if event[2] == 'message'))
+    
+    def test_renders_sections_in_parallel_and_merges_with_bookmarks(self):
+        """The merged PDF has an index, one bookmark per section and correct first pages"""
+        output_path = os.path.join(self.workdir, 'case.pdf')
+        result = render_case_report(self.session_ids, output_path, self.database_uri, workers=2)
+        
+        reader = PdfReader(output_path)
+        self.assertEqual(len(reader.pages), result['pages'])
+        self.assertEqual(result['sessions'], 3)
+        
+        titles = [section['title'] for section in result['sections']]
+        self.assertEqual(titles[-2:], ['Case Timeline', 'Hash Appendix'])
+        self.assertEqual(len(titles), 5)
+        self.assertEqual([item.title for item in reader.outline], ['Index'] + titles)
+        
+        # Each bookmark points at the page the index lists
+        for item, section in zip(reader.outline[1:], result['sections']):
+            self.assertEqual(reader.get_destination_page_number(item) + 1, section['first_page'])
+        self.assertIn('CASE TIMELINE', reader.pages[result['sections'][-2]['first_page'] - 1].extract_text())
+    
+    def test_unknown_session_is_rejected(self):
+        """A case naming a missing session fails before rendering anything"""
+        with self.assertRaises(ValueError):
+            render_case_report(self.session_ids + [9999], os.path.join(self.workdir, 'case.pdf'), self.database_uri)
+    
+    def test_service_renders_case_job(self):
+        """Case jobs render through the report service's subprocess and are cached"""
+        service = ReportService(cache_dir=os.path.join(self.workdir, 'reports'), workers=1)
+        service.init_app(self.app)
+        
+        job = service.submit_case(self.session_ids[:2])
+        self.assertTrue(service.wait(job, 120))
+        self.assertEqual(job.status, DONE, job.error)
+        self.assertTrue(job.download_name.startswith('case_report_'))
+        self.assertEqual(len(PdfReader(job.path).outline), 5)
+        
+        # Same sessions in another order hit the cache
+        cached = service.submit_case(list(reversed(self.session_ids[:2])))
+        self.assertEqual(cached.status, DONE)
+        self.assertEqual(cached.path, job.path)
+        self.assertIsNone(service.submit_case([9999]))
+    
+    def test_case_jobs_render_one_at_a_time(self):
+        """Case jobs queue behind each other without holding up session reports"""
+        service = ReportService(cache_dir=os.path.join(self.workdir, 'reports'), workers=2, case_workers=1)
+        service.init_app(self.app)
+        lock = threading.Lock()
+        running = []
+        peak = []
+        
+        def slow_render(job, path):
+            with lock:
+                running.append(job)
+                peak.append(len(running))
+            threading.Event().wait(0.2)
+            with open(path, 'wb') as handle:
+                handle.write(b'%PDF-1.4 case')
+            with lock:
+                running.remove(job)
+        
+        with mock.patch.object(service, '_render_case', slow_render):
+            jobs = [service.submit_case(self.session_ids[:2]), service.submit_case(self.session_ids[1:]),
+                    service.submit_case(self.session_ids[::2])]
+            for job in jobs:
+                self.assertTrue(service.wait(job, 30))
+                self.assertEqual(job.status, DONE, job.error)
+        
+        self.assertEqual(max(peak), 1)
+        self.assertIsNot(service.case_executor, service.executor)
+    
+    def test_case_job_route_requires_auth(self):
+        """Only an authenticated admin can queue a case report"""
+        self.app.register_blueprint(admin_bp, url_prefix='/api')
+        client = self.app.test_client()
+        body = {'session_ids': self.session_ids[:2]}
+        
+        self.assertEqual(client.post('/api/admin/cases/report/jobs', json=body).status_code, 401)
+        
+        headers = {'Authorization': f"Bearer {security_manager.generate_session_token('admin')}"}
+        service = ReportService(cache_dir=os.path.join(self.workdir, 'reports'), workers=1)
+        service.init_app(self.app)
+        with mock.patch('src.routes.admin.report_service', service), \
+                mock.patch.object(service, '_render_case', lambda job, path: open(path, 'wb').close()):
+            response = client.post('/api/admin/cases/report/jobs', json=body, headers=headers)
+            self.assertEqual(response.status_code, 202, response.get_json())
+            self.assertTrue(service.wait(service.jobs[response.get_json()['job_id']], 30))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Dashboard Counters Tests
+Tests for incrementally maintained dashboard statistics and their deltas
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'honeytrap-backend'))
+
+from flask import Flask
+from src.models.user import db
+from src.models.chat import ChatSession, Evidence
+from src.services.dashboard_counters import DashboardCounters
+from src.services.alert_stream import ADMIN_ROOM
+
+
+class FakeSocketIO:
+    """Records emits and background tasks instead of running a server"""
+    
+    def __init__(self):
+        self.emitted = []
+        self.tasks = []
+    
+    def emit(self, event, data, to=None):
+        self.emitted.append((event, data, to))
+    
+    def start_background_task(self, target, *args):
+        self.tasks.append(target)
+    
+    def sleep(self, seconds):
+        pass
+
+
+class FakeClock:
+    """Manually advanced wall clock"""
+    
+    def __init__(self):
+        self.now = datetime(2024, 6, 1, 12, 0)
+    
+    def __call__(self):
+        return self.now
+
+
+class TestDashboardCounters(unittest.TestCase):
+    """Test dashboard counters"""
+    
+    def setUp(self):
+        self.clock = FakeClock()
+        self.socketio = FakeSocketIO()
+        self.counters = DashboardCounters(window_days=30, clock=self.clock)
+        self.counters.init_socketio(self.socketio)
+    
+    def test_changes_are_pushed_as_one_delta(self):
+        """Events within the flush interval cost one task and one emit"""
+        self.counters.session_started('discord', self.clock.now)
+        self.counters.session_started('tiktok', self.clock.now)
+        self.counters.evidence_captured(self.clock.now)
+        
+        self.assertEqual(len(self.socketio.tasks), 1)
+        self.socketio.tasks[0]()
+        
+        self.assertEqual(len(self.socketio.emitted), 1)
+        event, delta, room = self.socketio.emitted[0]
+        self.assertEqual((event, room), ('dashboard_delta', ADMIN_ROOM))
+        self.assertEqual(delta['version'], 1)
+        self.assertEqual(delta['changes'], {
+            'total_sessions': 2,
+            'active_sessions': 2,
+            'platforms': {'discord': 1, 'tiktok': 1},
+            'evidence_count': 1
+        })
+    
+    def test_delta_only_carries_changed_counters(self):
+        """A flush sends just what changed since the previous one"""
+        self.counters.session_started('discord', self.clock.now)
+        self.counters.flush()
+        
+        self.counters.session_escalated(self.clock.now)
+        delta = self.counters.flush()
+        
+        self.assertEqual(delta['version'], 2)
+        self.assertEqual(delta['changes'], {'high_risk_sessions': 1, 'high_risk_active': 1})
+        self.assertIsNone(self.counters.flush())
+    
+    def test_changed_session_rows_ride_along(self):
+        """The latest row of each changed session is pushed once with the counters"""
+        opened = {'id': 7, 'escalation_level': 0, 'last_activity': '2024-06-01T12:00:00'}
+        escalated = {'id': 7, 'escalation_level': 2, 'last_activity': '2024-06-01T12:00:05'}
+        self.counters.session_started('discord', self.clock.now, opened)
+        self.counters.session_escalated(self.clock.now, session=escalated)
+        
+        self.assertEqual(self.counters.flush()['sessions'], [escalated])
+        
+        self.counters.session_changed({**escalated, 'escalation_level': 3})
+        delta = self.counters.flush()
+        self.assertEqual(delta['changes'], {})
+        self.assertEqual(delta['sessions'][0]['escalation_level'], 3)
+        self.assertIsNone(self.counters.flush())
+    
+    def test_session_ended_releases_live_counters(self):
+        """Ending a session only affects the live counters"""
+        self.counters.session_started('discord', self.clock.now)
+        self.counters.session_escalated(self.clock.now)
+        self.counters.session_ended('discord', high_risk=True)
+        
+        counters = self.counters.snapshot()['counters']
+        
+        self.assertEqual(counters['active_sessions'], 0)
+        self.assertEqual(counters['high_risk_active'], 0)
+        self.assertEqual(counters['platforms'], {})
+        self.assertEqual(counters['total_sessions'], 1)
+        self.assertEqual(counters['high_risk_sessions'], 1)
+    
+    def test_old_days_leave_the_window(self):
+        """Day buckets older than the window are subtracted"""
+        self.counters.session_started('discord', self.clock.now - timedelta(days=29))
+        self.counters.session_started('discord', self.clock.now)
+        
+        self.clock.now += timedelta(days=2)
+        
+        self.assertEqual(self.counters.snapshot()['counters']['total_sessions'], 1)
+
+
+class TestDashboardCountersSeed(unittest.TestCase):
+    """Test loading the counters from the database"""
+    
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{self.db_path}'
+        db.init_app(self.app)
+        with self.app.app_context():
+            db.create_all()
+    
+    def tearDown(self):
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+    
+    def test_seed_matches_dashboard_queries(self):
+        """Seeded counters agree with the admin dashboard's COUNT queries"""
+        now = datetime.utcnow()
+        with self.app.app_context():
+            sessions = [
+                ChatSession(session_id='recent', persona_id=1, user_ip='127.0.0.1', escalation_level=2, created_at=now),
+                ChatSession(session_id='yesterday', persona_id=1, user_ip='127.0.0.1', escalation_level=0,
+                            created_at=now - timedelta(days=1)),
+                ChatSession(session_id='old', persona_id=1, user_ip='127.0.0.1', escalation_level=3,
+                            created_at=now - timedelta(days=45))
+            ]
+            db.session.add_all(sessions)
+            db.session.flush()
+            for session in sessions:
+                db.session.add(Evidence(session_id=session.id, evidence_type='test',
+                                        content='{}', hash_value='0' * 64))
+            db.session.commit()
+            
+            counters = DashboardCounters(window_days=30)
+            counters.seed()
+        
+        snapshot = counters.snapshot()['counters']
+        self.assertEqual(snapshot['total_sessions'], 2)
+        self.assertEqual(snapshot['high_risk_sessions'], 1)
+        self.assertEqual(snapshot['evidence_count'], 2)
+    
+    def test_reseed_picks_up_other_writers(self):
+        """Reseeding pushes counters changed by rows this process never saw as a delta"""
+        socketio = FakeSocketIO()
+        counters = DashboardCounters(window_days=30)
+        counters.init_socketio(socketio)
+        with self.app.app_context():
+            counters.seed()
+            db.session.add(ChatSession(session_id='rest', persona_id=1, user_ip='127.0.0.1',
+                                       created_at=datetime.utcnow()))
+            db.session.commit()
+            counters.seed()
+        
+        self.assertEqual(len(socketio.tasks), 1)
+        delta = counters.flush()
+        self.assertEqual(delta['changes'], {'total_sessions': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Evidence Audit Tests
+Tests for the streaming integrity audit of the evidence store
+"""
+
+import hashlib
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'honeytrap-backend'))
+
+from flask import Flask
+from src.models.user import db
+from src.models.chat import ChatSession, Evidence
+from src.security import security_manager
+from src.services import evidence_audit
+from src.services.evidence_audit import audit_evidence_store, hash_file
+from src.services.evidence_ledger import EvidenceLedger
+
+
+class TestEvidenceAudit(unittest.TestCase):
+    """Test the evidence store audit"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(self.temp_dir.name, 'app.db')}"
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        
+        self.session = ChatSession(session_id='s1', persona_id=1, user_ip='127.0.0.1')
+        db.session.add(self.session)
+        db.session.commit()
+        self.ledger = EvidenceLedger()
+    
+    def tearDown(self):
+        db.session.remove()
+        self.ctx.pop()
+        self.temp_dir.cleanup()
+    
+    def _add_content(self, content, hash_value=None):
+        evidence = Evidence(session_id=self.session.id, evidence_type='test', content=content,
+                            hash_value=hash_value or hashlib.sha256(content.encode()).hexdigest())
+        db.session.add(evidence)
+        db.session.commit()
+        self.ledger.record(evidence)
+        return evidence
+    
+    def _add_file(self, name, data):
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        evidence = Evidence(session_id=self.session.id, evidence_type='screenshot', file_path=path,
+                            hash_value=hashlib.sha256(data).hexdigest())
+        db.session.add(evidence)
+        db.session.commit()
+        return evidence, path
+    
+    def test_hash_file_matches_hashlib(self):
+        """Memory-mapped hashing agrees with hashing the bytes directly, including empty files"""
+        for data in (b'', b'evidence' * 1000):
+            evidence, path = self._add_file('f.bin', data)
+            self.assertEqual(hash_file(path), hashlib.sha256(data).hexdigest())
+        self.assertIsNone(hash_file(os.path.join(self.temp_dir.name, 'absent.bin')))
+    
+    def test_audit_classifies_items(self):
+        """Verified, mismatched and missing items are counted and listed"""
+        self._add_content('{"message": "ok"}')
+        altered = self._add_content('{"message": "original"}')
+        self._add_file('ok.png', b'image bytes')
+        missing, path = self._add_file('gone.png', b'deleted later')
+        os.remove(path)
+        
+        altered.content = '{"message": "altered"}'
+        db.session.commit()
+        
+        result = audit_evidence_store(workers=1, chunk_size=2)
+        summary = result['summary']
+        
+        self.assertEqual((summary['verified'], summary['mismatched'], summary['missing']), (2, 1, 1))
+        self.assertEqual(summary['mismatched_items'][0]['evidence_id'], altered.id)
+        self.assertEqual(summary['missing_items'][0]['evidence_id'], missing.id)
+    
+    def test_large_files_use_process_pool(self):
+        """Files above the threshold are hashed by worker processes"""
+        evidence, path = self._add_file('video.bin', os.urandom(4096))
+        
+        with patch.object(evidence_audit, 'LARGE_FILE_BYTES', 1024):
+            result = audit_evidence_store(workers=2)
+        
+        self.assertEqual(result['summary']['verified'], 1)
+        self.assertEqual(result['summary']['bytes_hashed'], 4096)
+    
+    def test_summary_is_signed_and_reports_progress(self):
+        """The summary carries a valid signature and progress is reported"""
+        for i in range(5):
+            self._add_content(f'{{"message": "{i}"}}')
+        updates = []
+        
+        result = audit_evidence_store(workers=1, chunk_size=2, progress=updates.append)
+        
+        self.assertTrue(security_manager.verify_signature(result['summary'], result['signature']))
+        result['summary']['verified'] = 0
+        self.assertFalse(security_manager.verify_signature(result['summary'], result['signature']))
+        self.assertEqual(updates[-1]['percent_complete'], 100.0)
+        self.assertGreater(len(updates), 1)
+    
+    def test_auditor_survives_noisy_stderr(self):
+        """An audit process writing more to stderr than a pipe holds still finishes and reports it"""
+        script = os.path.join(self.temp_dir.name, 'noisy_audit.py')
+        with open(script, 'w') as f:
+            f.write("import sys\n"
+                    "sys.stderr.write('warning\\n' * 100000 + 'audit failed')\n"
+                    "print('{\"progress\": {\"percent_complete\": 50.0}}')\n"
+                    "sys.exit(1)\n")
+        auditor = evidence_audit.EvidenceAuditor()
+        
+        with patch.object(evidence_audit, 'AUDIT_SCRIPT', script):
+            self.assertTrue(auditor.start('sqlite://'))
+        auditor.follower.join(timeout=30)
+        
+        self.assertFalse(auditor.is_running())
+        self.assertEqual(auditor.progress, {'percent_complete': 50.0})
+        self.assertTrue(auditor.error.endswith('audit failed'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Evidence Capture Tests
+Tests for the durable evidence capture queue and its worker
+"""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'honeytrap-backend'))
+
+from flask import Flask
+from src.models.user import db
+from src.models.chat import ChatSession, ChatMessage, Evidence, EvidenceCaptureRequest, EvidenceLedgerEntry
+from src.services.evidence_capture import EvidenceCaptureWorker, enqueue_capture
+
+
+class TestEvidenceCapture(unittest.TestCase):
+    """Test queued evidence capture"""
+    
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{self.db_path}'
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        
+        self.session = ChatSession(session_id='s1', persona_id=1, user_ip='203.0.113.7', user_agent='test-agent')
+        db.session.add(self.session)
+        db.session.commit()
+        self.worker = EvidenceCaptureWorker(batch_size=2, context_messages=3)
+    
+    def tearDown(self):
+        db.session.remove()
+        self.ctx.pop()
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+    
+    def _add_message(self, content, sender_type='user'):
+        message = ChatMessage(session_id=self.session.id, sender_type=sender_type, message_content=content)
+        db.session.add(message)
+        db.session.flush()
+        return message
+    
+    def test_enqueue_commits_with_message(self):
+        """The capture request is part of the message's transaction"""
+        message = self._add_message('are you home alone')
+        enqueue_capture(self.session.id, message.id, 2, 'rest_api')
+        db.session.rollback()
+        
+        self.assertEqual(EvidenceCaptureRequest.query.count(), 0)
+        self.assertEqual(Evidence.query.count(), 0)
+    
+    def test_snapshot_references_context_by_id(self):
+        """Snapshots hold message ids and hashes, session metadata and detector spans"""
+        for i in range(5):
+            self._add_message(f'hello {i}', 'user' if i % 2 == 0 else 'decoy')
+        trigger = self._add_message('is this our little secret? are you alone')
+        enqueue_capture(self.session.id, trigger.id, 2, 'websocket_realtime')
+        db.session.commit()
+        
+        captured = self.worker.drain()
+        
+        self.assertEqual(len(captured), 1)
+        self.assertTrue(captured[0]['session']['evidence_captured'])
+        evidence = db.session.get(Evidence, captured[0]['evidence_id'])
+        snapshot = json.loads(evidence.content)
+        self.assertEqual([m['message_id'] for m in snapshot['messages']][-1], trigger.id)
+        self.assertEqual(len(snapshot['messages']), 4)
+        self.assertNotIn('hello', evidence.content)
+        self.assertEqual(snapshot['session']['user_ip'], '203.0.113.7')
+        self.assertIn('our little secret', [span['keyword'] for span in snapshot['detector_spans']])
+        self.assertTrue(db.session.get(ChatSession, self.session.id).evidence_captured)
+        self.assertEqual(EvidenceLedgerEntry.query.filter_by(evidence_id=evidence.id).count(), 1)
+    
+    def test_drain_processes_in_batches(self):
+        """Every pending request is captured once, across several batches"""
+        for i in range(5):
+            message = self._add_message(f'meet me {i}')
+            enqueue_capture(self.session.id, message.id, 2, 'rest_api')
+        db.session.commit()
+        
+        self.assertEqual(len(self.worker.drain()), 5)
+        self.assertEqual(self.worker.drain(), [])
+        self.assertEqual(EvidenceCaptureRequest.query.filter_by(status='done').count(), 5)
+    
+    def test_broken_request_fails_after_retries(self):
+        """A request whose message is gone is retried, then marked failed"""
+        db.session.add(EvidenceCaptureRequest(session_id=self.session.id, message_id=999,
+                                              threat_level=2, capture_method='rest_api'))
+        db.session.commit()
+        
+        for _ in range(3):
+            self.worker.process_batch()
+        
+        capture_request = EvidenceCaptureRequest.query.first()
+        self.assertEqual(capture_request.status, 'failed')
+        self.assertEqual(capture_request.attempts, 3)
+        self.assertEqual(Evidence.query.count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Evidence Ledger Tests
+Tests for the hash-chained, Merkle-batched evidence ledger
+"""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'honeytrap-backend'))
+
+from flask import Flask
+from src.models.user import db
+from src.models.chat import ChatSession, Evidence, EvidenceLedgerEntry, LedgerBatch
+from src.services.evidence_ledger import (
+    EvidenceLedger, build_merkle_tree, verify_inclusion, chain_entry_hash, chain_batch_hash, content_hash,
+    GENESIS_HASH
+)
+
+
+class TestMerkleTree(unittest.TestCase):
+    """Test Merkle roots and inclusion proofs"""
+    
+    def test_every_leaf_has_a_valid_proof(self):
+        """Proofs verify for all leaves, including odd-sized levels"""
+        for size in (1, 2, 3, 5, 8, 13):
+            leaves = [f'{i:064x}' for i in range(size)]
+            root, proofs = build_merkle_tree(leaves)
+            for leaf, proof in zip(leaves, proofs):
+                self.assertTrue(verify_inclusion(leaf, proof, root))
+                self.assertLessEqual(len(proof), size.bit_length())
+    
+    def test_proof_fails_for_other_leaf(self):
+        """A proof does not verify a different leaf"""
+        leaves = [f'{i:064x}' for i in range(4)]
+        root, proofs = build_merkle_tree(leaves)
+        
+        self.assertFalse(verify_inclusion(leaves[1], proofs[0], root))
+
+
+class TestEvidenceLedger(unittest.TestCase):
+    """Test ledger recording, sealing and verification"""
+    
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{self.db_path}'
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        
+        self.session = ChatSession(session_id='s1', persona_id=1, user_ip='127.0.0.1')
+        db.session.add(self.session)
+        db.session.commit()
+        self.ledger = EvidenceLedger(batch_size=3)
+    
+    def tearDown(self):
+        db.session.remove()
+        self.ctx.pop()
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+    
+    def _add_evidence(self, count):
+        items = []
+        for i in range(count):
+            evidence = Evidence(session_id=self.session.id, evidence_type='test',
+                                content=f'{{"message": "item {i}"}}', hash_value='0' * 64)
+            db.session.add(evidence)
+            db.session.commit()
+            self.ledger.record(evidence)
+            items.append(evidence)
+        return items
+    
+    def test_entries_are_chained(self):
+        """Each entry links to the previous entry's hash"""
+        self._add_evidence(3)
+        entries = EvidenceLedgerEntry.query.order_by(EvidenceLedgerEntry.id).all()
+        
+        self.assertEqual([entry.id for entry in entries], [1, 2, 3])
+        for previous, entry in zip(entries, entries[1:]):
+            self.assertEqual(entry.prev_hash, previous.entry_hash)
+    
+    def test_seal_pending_creates_chained_batches(self):
+        """Entries are sealed into batches of batch_size whose roots are chained"""
+        self._add_evidence(7)
+        
+        batches = self.ledger.seal_pending()
+        
+        self.assertEqual([batch.entry_count for batch in batches], [3, 3, 1])
+        self.assertEqual(batches[1].prev_chain_hash, batches[0].chain_hash)
+        self.assertEqual(EvidenceLedgerEntry.query.filter_by(batch_id=None).count(), 0)
+    
+    def test_verify_case_and_full_store(self):
+        """Untouched evidence verifies both per item and in one pass"""
+        self._add_evidence(5)
+        self.ledger.seal_pending()
+        
+        case = self.ledger.verify_case(self.session.id)
+        full = self.ledger.verify_all(chunk_size=2)
+        
+        self.assertTrue(case['verified'])
+        self.assertEqual({item['status'] for item in case['items']}, {'verified'})
+        self.assertTrue(full['verified'])
+        self.assertEqual(full['entries_checked'], 5)
+    
+    def test_modified_evidence_is_detected(self):
+        """Changing evidence content, even with a matching hash_value, is caught"""
+        items = self._add_evidence(4)
+        self.ledger.seal_pending()
+        
+        items[2].content = '{"message": "altered"}'
+        db.session.commit()
+        
+        case = self.ledger.verify_case(self.session.id)
+        full = self.ledger.verify_all()
+        
+        self.assertFalse(case['verified'])
+        self.assertEqual(case['items'][2]['reason'], 'evidence modified')
+        self.assertFalse(full['verified'])
+        self.assertEqual(full['failures'][0]['evidence_id'], items[2].id)
+    
+    def test_rewritten_ledger_entry_breaks_batch_root(self):
+        """Recomputing an entry to match altered evidence still fails against the batch root"""
+        from src.services.evidence_ledger import chain_entry_hash, content_hash
+        items = self._add_evidence(3)
+        self.ledger.seal_pending()
+        
+        items[0].content = '{"message": "altered"}'
+        entry = EvidenceLedgerEntry.query.filter_by(evidence_id=items[0].id).first()
+        entry.content_hash = content_hash(items[0])
+        entry.entry_hash = chain_entry_hash(entry.id, entry.prev_hash, entry.content_hash)
+        db.session.commit()
+        
+        case = self.ledger.verify_case(self.session.id)
+        
+        self.assertEqual(case['items'][0]['reason'], 'inclusion proof does not match batch root')
+        self.assertFalse(self.ledger.verify_all()['verified'])
+    
+    def test_consistently_rewritten_ledger_fails_signature(self):
+        """Rewriting evidence, every entry and every batch to match is caught without the signing key"""
+        items = self._add_evidence(5)
+        self.ledger.seal_pending()
+        
+        items[1].content = '{"message": "altered"}'
+        prev_hash = GENESIS_HASH
+        entries = EvidenceLedgerEntry.query.order_by(EvidenceLedgerEntry.id).all()
+        for entry in entries:
+            entry.content_hash = content_hash(db.session.get(Evidence, entry.evidence_id))
+            entry.prev_hash = prev_hash
+            entry.entry_hash = prev_hash = chain_entry_hash(entry.id, prev_hash, entry.content_hash)
+        
+        prev_chain_hash = GENESIS_HASH
+        for batch in LedgerBatch.query.order_by(LedgerBatch.id).all():
+            members = [entry for entry in entries if entry.batch_id == batch.id]
+            batch.merkle_root, proofs = build_merkle_tree([entry.entry_hash for entry in members])
+            for entry, proof in zip(members, proofs):
+                entry.proof = json.dumps(proof)
+            batch.prev_chain_hash = prev_chain_hash
+            batch.chain_hash = prev_chain_hash = chain_batch_hash(
+                prev_chain_hash, batch.merkle_root, batch.first_entry_id, batch.last_entry_id)
+        db.session.commit()
+        
+        case = self.ledger.verify_case(self.session.id)
+        full = self.ledger.verify_all()
+        
+        self.assertFalse(case['verified'])
+        self.assertEqual({item['reason'] for item in case['items']}, {'batch signature invalid'})
+        self.assertFalse(full['verified'])
+        self.assertEqual({failure['reason'] for failure in full['failures']},
+                         {'batch 1 signature invalid', 'batch 2 signature invalid'})
+    
+    def test_backfill_and_unsealed_entries(self):
+        """Evidence stored before the ledger is backfilled; unsealed entries are reported as such"""
+        db.session.add(Evidence(session_id=self.session.id, evidence_type='test', content='{}', hash_value='0' * 64))
+        db.session.commit()
+        
+        self.assertEqual(self.ledger.backfill(), 1)
+        self.assertEqual(self.ledger.verify_case(self.session.id)['items'][0]['status'], 'unsealed')
+        self.assertEqual(LedgerBatch.query.count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
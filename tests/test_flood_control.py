@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Flood Control Tests
+Tests for the send_message token buckets and per-session inbound queues
+"""
+
+import os
+import sys
+import unittest
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'honeytrap-backend'))
+
+from src.flood_control import TokenBucketLimiter, SessionInbox
+
+
+class FakeClock:
+    """Manually advanced monotonic clock"""
+    
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucketLimiter(unittest.TestCase):
+    """Test token bucket rate limiting"""
+    
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = TokenBucketLimiter(rate=1.0, capacity=3, idle_timeout=60, clock=self.clock)
+    
+    def test_burst_then_throttle(self):
+        """A full bucket allows a burst and then reports the wait time"""
+        for _ in range(3):
+            self.assertEqual(self.limiter.consume('sid-1'), 0.0)
+        
+        self.assertAlmostEqual(self.limiter.consume('sid-1'), 1.0)
+        
+        self.clock.now += 1.0
+        self.assertEqual(self.limiter.consume('sid-1'), 0.0)
+    
+    def test_keys_are_independent(self):
+        """Throttling one connection does not affect another"""
+        for _ in range(4):
+            self.limiter.consume('sid-1')
+        
+        self.assertEqual(self.limiter.consume('sid-2'), 0.0)
+    
+    def test_refund_returns_tokens_up_to_capacity(self):
+        """Refunded tokens can be spent again, but never overfill the bucket"""
+        for _ in range(3):
+            self.limiter.consume('sid-1')
+        self.limiter.refund('sid-1')
+        self.assertEqual(self.limiter.consume('sid-1'), 0.0)
+        
+        self.limiter.refund('sid-1', tokens=10)
+        self.assertAlmostEqual(self.limiter.buckets['sid-1'][0], 3.0)
+    
+    def test_idle_buckets_are_evicted(self):
+        """Buckets idle longer than the timeout are dropped"""
+        self.limiter.consume('sid-1')
+        self.clock.now += 120
+        self.limiter.consume('sid-2')
+        
+        self.assertEqual(len(self.limiter), 1)
+        self.assertNotIn('sid-1', self.limiter.buckets)
+    
+    def test_max_keys_is_enforced(self):
+        """The least recently used bucket is dropped beyond max_keys"""
+        limiter = TokenBucketLimiter(rate=1.0, capacity=3, max_keys=2, clock=self.clock)
+        for key in ('a', 'b', 'c'):
+            limiter.consume(key)
+        
+        self.assertEqual(list(limiter.buckets), ['b', 'c'])
+
+
+class TestSessionInbox(unittest.TestCase):
+    """Test bounded per-session queues"""
+    
+    def test_first_message_starts_worker(self):
+        """Only the first message for an idle session asks for a worker"""
+        inbox = SessionInbox(max_pending=2)
+        
+        self.assertEqual(inbox.offer('s1', 'hello'), (SessionInbox.QUEUED, True))
+        self.assertEqual(inbox.offer('s1', 'again'), (SessionInbox.QUEUED, False))
+    
+    def test_coalesce_when_full(self):
+        """A full coalescing inbox folds new messages into the last one"""
+        inbox = SessionInbox(max_pending=1, policy='coalesce')
+        inbox.offer('s1', 'hello')
+        
+        outcome, start_worker = inbox.offer('s1', 'are you there')
+        
+        self.assertEqual(outcome, SessionInbox.COALESCED)
+        self.assertFalse(start_worker)
+        self.assertEqual(inbox.next_message('s1'), 'hello\nare you there')
+    
+    def test_reject_when_full(self):
+        """A full rejecting inbox drops new messages"""
+        inbox = SessionInbox(max_pending=1, policy='reject')
+        inbox.offer('s1', 'hello')
+        
+        self.assertEqual(inbox.offer('s1', 'spam'), (SessionInbox.REJECTED, False))
+        self.assertEqual(inbox.pending('s1'), 1)
+    
+    def test_worker_stops_when_drained(self):
+        """Draining the queue releases the session for a new worker"""
+        inbox = SessionInbox(max_pending=2)
+        inbox.offer('s1', 'hello')
+        
+        self.assertEqual(inbox.next_message('s1'), 'hello')
+        self.assertIsNone(inbox.next_message('s1'))
+        self.assertEqual(inbox.offer('s1', 'later'), (SessionInbox.QUEUED, True))
+    
+    def test_clear_idle_session_frees_state(self):
+        """Clearing a session with no worker leaves nothing behind"""
+        inbox = SessionInbox(max_pending=2)
+        inbox.offer('s1', 'hello')
+        inbox.next_message('s1')
+        inbox.next_message('s1')
+        
+        inbox.clear('s1')
+        
+        self.assertEqual(inbox.queues, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Message Search Tests
+Tests for full-text search across chat transcripts
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'honeytrap-backend'))
+
+from flask import Flask
+from src.models.user import db
+from src.models.chat import ChatSession, ChatMessage, Persona
+from src.models.schema import ensure_schema
+from src.routes.admin import admin_bp
+from src.security import security_manager
+from src.services.message_search import parse_query, search_messages, rebuild_search_index
+
+START = datetime(2024, 3, 1, 20, 0)
+MESSAGES = [
+    ('user', "hey, don't tell your parents <b>ok</b>"),
+    ('decoy', 'why not?'),
+    ('user', "let's meet at the park after school"),
+    ('decoy', 'which park'),
+    ('user', 'the park by the station, send a picture first'),
+]
+
+
+class TestMessageSearch(unittest.TestCase):
+    """Test transcript search"""
+    
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{self.db_path}'
+        self.app.register_blueprint(admin_bp, url_prefix='/api')
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        
+        db.create_all()
+        persona = Persona(name='Emma', age=13, platform_type='discord', personality_traits='{}',
+                          language_style='{}', response_patterns='{}')
+        db.session.add(persona)
+        db.session.flush()
+        self.sessions = []
+        for label in ('case-a', 'case-b'):
+            chat_session = ChatSession(session_id=label, persona_id=persona.id, user_ip='127.0.0.1')
+            db.session.add(chat_session)
+            db.session.flush()
+            self.sessions.append(chat_session)
+        for i, (sender, content) in enumerate(MESSAGES):
+            db.session.add(ChatMessage(session_id=self.sessions[0].id, sender_type=sender, message_content=content,
+                                       timestamp=START + timedelta(minutes=i)))
+        db.session.commit()
+        
+        # Messages stored before the index existed are indexed when it is created
+        ensure_schema()
+        self.client = self.app.test_client()
+        self.headers = {'Authorization': f"Bearer {security_manager.generate_session_token('admin')}"}
+    
+    def tearDown(self):
+        db.session.remove()
+        self.ctx.pop()
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+    
+    def ids(self, query, **filters):
+        return [result['id'] for result in search_messages(query, **filters)['results']]
+    
+    def test_query_syntax(self):
+        """Words, phrases, prefixes and boolean operators match like the index does"""
+        self.assertEqual(self.ids('park'), [5, 4, 3])
+        self.assertEqual(self.ids('"meet at the park"'), [3])
+        self.assertEqual(self.ids('par*'), [5, 4, 3, 1])
+        self.assertEqual(self.ids('park NOT (school OR station)'), [4])
+        self.assertEqual(self.ids('park picture'), [5])
+        self.assertEqual(self.ids("don't"), [1])
+        for invalid in ('AND', 'park OR', '(park', 'park)', 'NOT park', '""'):
+            with self.assertRaises(ValueError):
+                parse_query(invalid)
+    
+    def test_filters_and_paging(self):
+        """Session, sender and time filters narrow results; pages continue from next_before"""
+        self.assertEqual(self.ids('park', sender_type='decoy'), [4])
+        self.assertEqual(self.ids('park', session_id=self.sessions[1].id), [])
+        self.assertEqual(self.ids('park', since=START + timedelta(minutes=3)), [5, 4])
+        self.assertEqual(self.ids('park', until=START + timedelta(minutes=3)), [3])
+        
+        first = search_messages('park', limit=2)
+        self.assertTrue(first['has_more'])
+        second = search_messages('park', limit=2, before=first['next_before'])
+        self.assertEqual([r['id'] for r in second['results']], [3])
+        self.assertFalse(second['has_more'])
+    
+    def test_snippets_are_escaped_and_highlighted(self):
+        """Message text is HTML-escaped; only the matches are wrapped in <mark>"""
+        result = search_messages('parents')['results'][0]
+        self.assertEqual(result['chat_session_id'], 'case-a')
+        self.assertIn('<mark>parents</mark>', result['snippet'])
+        self.assertIn('&lt;b&gt;ok&lt;/b&gt;', result['snippet'])
+    
+    def test_index_follows_writes(self):
+        """Inserts (including bulk ones), edits and deletes are reflected, and the index rebuilds"""
+        db.session.execute(ChatMessage.__table__.insert(), [
+            {'session_id': self.sessions[1].id, 'sender_type': 'user', 'message_content': 'snapchat me tonight',
+             'timestamp': START}
+        ])
+        message = db.session.get(ChatMessage, 2)
+        message.message_content = 'which snapchat'
+        db.session.delete(db.session.get(ChatMessage, 4))
+        db.session.commit()
+        
+        self.assertEqual(self.ids('snapchat'), [6, 2])
+        self.assertEqual(self.ids('park'), [5, 3])
+        self.assertEqual(rebuild_search_index(), 5)
+        self.assertEqual(self.ids('snapchat OR park'), [6, 5, 3, 2])
+    
+    def test_search_route(self):
+        """The admin route needs a token, rejects bad queries and returns results"""
+        self.assertEqual(self.client.get('/api/admin/search/messages?q=park').status_code, 401)
+        response = self.client.get('/api/admin/search/messages?q=park&sender_type=user', headers=self.headers)
+        self.assertEqual([r['id'] for r in response.get_json()['results']], [5, 3])
+        response = self.client.get('/api/admin/search/messages?q=park%20OR', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Pagination Tests
+Tests for keyset pagination of admin sessions and audit logs
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'honeytrap-backend'))
+
+from flask import Flask
+from src.models.user import db
+from src.models.chat import ChatSession, Persona, AuditLog
+from src.routes.admin import admin_bp
+from src.services.pagination import keyset_page, encode_cursor, decode_cursor
+
+START = datetime(2024, 6, 1, 12, 0)
+
+
+class TestKeysetPagination(unittest.TestCase):
+    """Test keyset pagination"""
+    
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{self.db_path}'
+        self.app.register_blueprint(admin_bp, url_prefix='/api')
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        
+        persona = Persona(name='Emma', age=13, platform_type='discord', personality_traits='{}',
+                          language_style='{}', response_patterns='{}')
+        db.session.add(persona)
+        db.session.flush()
+        # Pairs of sessions share a last_activity, so pages must break ties on id
+        for i in range(45):
+            db.session.add(ChatSession(session_id=f's{i}', persona_id=persona.id, user_ip='127.0.0.1',
+                                       escalation_level=2 if i % 5 == 0 else 0, created_at=START,
+                                       last_activity=START + timedelta(minutes=i // 2)))
+        for i in range(30):
+            db.session.add(AuditLog(action='login' if i % 3 else 'export', timestamp=START + timedelta(seconds=i)))
+        db.session.commit()
+        self.client = self.app.test_client()
+    
+    def tearDown(self):
+        db.session.remove()
+        self.ctx.pop()
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+    
+    def test_pages_cover_every_row_once_in_order(self):
+        """Following cursors visits each row once, newest first, with ties broken by id"""
+        seen, cursor = [], None
+        while True:
+            page = keyset_page(ChatSession.query, ChatSession.last_activity, ChatSession.id, cursor, 10)
+            seen += [(session.last_activity, session.id) for session in page['items']]
+            if not page['has_more']:
+                break
+            cursor = page['next_cursor']
+        
+        self.assertEqual(len(seen), 45)
+        self.assertEqual(seen, sorted(seen, reverse=True))
+        self.assertIsNone(page['next_cursor'])
+    
+    def test_cursor_round_trip(self):
+        """Cursors are opaque but decode to the row they point past; garbage is rejected"""
+        self.assertEqual(decode_cursor(encode_cursor(START, 7)), (START, 7))
+        with self.assertRaises(ValueError):
+            decode_cursor('not-a-cursor')
+    
+    def test_sessions_route(self):
+        """The sessions listing pages by cursor and takes its total from the stats buckets"""
+        first = self.client.get('/api/admin/sessions?per_page=20&escalation_level=2&include_total=true').get_json()
+        self.assertEqual(len(first['sessions']), 9)
+        self.assertEqual(first['pagination']['total'], 9)
+        self.assertFalse(first['pagination']['has_more'])
+        
+        first = self.client.get('/api/admin/sessions?per_page=20').get_json()
+        self.assertIsNone(first['pagination']['total'])
+        second = self.client.get(f"/api/admin/sessions?per_page=20&cursor={first['pagination']['next_cursor']}")
+        ids = [s['id'] for s in first['sessions']] + [s['id'] for s in second.get_json()['sessions']]
+        self.assertEqual(len(set(ids)), 40)
+        
+        self.assertEqual(self.client.get('/api/admin/sessions?cursor=bogus').status_code, 400)
+    
+    def test_audit_log_route(self):
+        """Audit logs page newest first, filtered by action"""
+        data = self.client.get('/api/admin/audit-logs?per_page=25&include_total=true').get_json()
+        self.assertEqual(data['pagination']['total'], 30)
+        self.assertTrue(data['pagination']['has_more'])
+        self.assertEqual(data['logs'][0]['id'], 30)
+        
+        data = self.client.get('/api/admin/audit-logs?action=export&include_total=true').get_json()
+        self.assertEqual(len(data['logs']), 10)
+        self.assertIsNone(data['pagination']['total'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Query Cache Tests
+Tests for cached endpoint results and their invalidation by committed writes
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+from itertools import chain
+from unittest import mock
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'honeytrap-backend'))
+
+from flask import Flask
+from src.models.user import db
+from src.models.chat import ChatSession, ChatMessage, Persona, Evidence
+from src.models.profile import DecoyProfile
+from src.routes.admin import admin_bp
+from src.security import security_manager
+from src.services.query_cache import (
+    QueryCache, DatabaseBackend, query_cache, succeeded, cache_key, ENDPOINT_TAGS, SESSIONS, SESSION_ACTIVITY,
+    PROFILES, THREATS
+)
+
+
+class DictBackend:
+    """Shared backend kept in a dict, standing in for the store two workers would share"""
+    
+    def __init__(self):
+        self.values = {}
+        self.tags = {}
+    
+    def generations(self, tags):
+        return tuple(self.tags.get(tag, 0) for tag in tags)
+    
+    def bump(self, tags):
+        for tag in tags:
+            self.tags[tag] = self.tags.get(tag, 0) + 1
+    
+    def get(self, key):
+        return self.values.get(key), 60
+    
+    def set(self, key, payload, ttl):
+        self.values[key] = payload
+
+
+class TestQueryCache(unittest.TestCase):
+    """Test the query result cache"""
+    
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{self.db_path}'
+        self.app.register_blueprint(admin_bp, url_prefix='/api')
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        
+        self.persona = Persona(name='Emma', age=13, platform_type='discord', personality_traits='{}',
+                               language_style='{}', response_patterns='{}')
+        db.session.add(self.persona)
+        db.session.commit()
+        
+        query_cache.clear()
+        self.calls = 0
+        self.client = self.app.test_client()
+        self.headers = {'Authorization': f"Bearer {security_manager.generate_session_token('admin')}"}
+    
+    def tearDown(self):
+        query_cache.backend = None
+        db.session.remove()
+        self.ctx.pop()
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+    
+    def compute(self):
+        self.calls += 1
+        return {'calls': self.calls}
+    
+    def add_session(self, label, **fields):
+        db.session.add(ChatSession(session_id=label, persona_id=self.persona.id, user_ip='127.0.0.1', **fields))
+    
+    def test_hits_until_a_tag_is_invalidated(self):
+        """Results are reused per endpoint and parameters until one of their tags is bumped"""
+        cache = QueryCache()
+        self.assertEqual(cache.get_or_compute('a', {'days': 7}, (SESSIONS,), self.compute), {'calls': 1})
+        self.assertEqual(cache.get_or_compute('a', {'days': 7}, (SESSIONS,), self.compute), {'calls': 1})
+        self.assertEqual(cache.get_or_compute('a', {'days': 30}, (SESSIONS,), self.compute), {'calls': 2})
+        
+        cache.invalidate(PROFILES)
+        self.assertEqual(cache.get_or_compute('a', {'days': 7}, (SESSIONS,), self.compute), {'calls': 1})
+        cache.invalidate(SESSIONS)
+        self.assertEqual(cache.get_or_compute('a', {'days': 7}, (SESSIONS,), self.compute), {'calls': 3})
+        
+        self.assertEqual(cache.stats()['a'], {'lookups': 5, 'hits': 2, 'shared_hits': 0, 'misses': 3,
+                                              'hit_rate': 0.4})
+        self.assertEqual(cache_key('a', {'y': 1, 'x': None}), cache_key('a', {'x': None, 'y': 1}))
+    
+    def test_ttl_lru_and_uncacheable_results(self):
+        """Entries expire, the least recently used is evicted, and error reports are never stored"""
+        now = [0.0]
+        cache = QueryCache(max_entries=2, ttl=10, clock=lambda: now[0])
+        cache.get_or_compute('a', {}, (), self.compute)
+        cache.get_or_compute('b', {}, (), self.compute)
+        cache.get_or_compute('a', {}, (), self.compute)
+        cache.get_or_compute('c', {}, (), self.compute)
+        self.assertEqual(list(cache.entries), [cache_key('a', {}), cache_key('c', {})])
+        
+        now[0] = 11
+        self.assertEqual(cache.get_or_compute('a', {}, (), self.compute), {'calls': 4})
+        
+        failing = lambda: {'error': 'database is locked'}
+        cache.get_or_compute('d', {}, (), failing, succeeded)
+        self.assertNotIn(cache_key('d', {}), cache.entries)
+    
+    def test_commits_invalidate_their_tags(self):
+        """Committed inserts, updates and bulk updates invalidate; rolled-back ones don't"""
+        lookup = lambda: query_cache.get_or_compute('sessions', {}, (SESSIONS,), self.compute)
+        lookup()
+        
+        self.add_session('s1')
+        db.session.rollback()
+        self.assertEqual(lookup(), {'calls': 1})
+        
+        self.add_session('s1')
+        db.session.commit()
+        self.assertEqual(lookup(), {'calls': 2})
+        
+        # Loading a row or committing no changes leaves the result alone
+        chat_session = ChatSession.query.first()
+        chat_session.escalation_level = chat_session.escalation_level
+        db.session.commit()
+        self.assertEqual(lookup(), {'calls': 2})
+        
+        chat_session.escalation_level = 2
+        db.session.commit()
+        self.assertEqual(lookup(), {'calls': 3})
+        
+        ChatSession.query.filter_by(session_id='s1').update({'escalation_level': 3})
+        db.session.commit()
+        self.assertEqual(lookup(), {'calls': 4})
+        
+        db.session.add(DecoyProfile(name='Mia', username='mia', age=13, location='Leeds', platform_type='discord'))
+        db.session.commit()
+        self.assertEqual(lookup(), {'calls': 4})
+    
+    def test_shared_backend(self):
+        """A result computed by one worker is served to another, and invalidations reach both"""
+        backend = DictBackend()
+        first, second = QueryCache(backend=backend), QueryCache(backend=backend)
+        first.get_or_compute('a', {}, (SESSIONS,), self.compute)
+        self.assertEqual(second.get_or_compute('a', {}, (SESSIONS,), self.compute), {'calls': 1})
+        self.assertEqual(second.stats()['a']['shared_hits'], 1)
+        
+        second.invalidate(SESSIONS)
+        self.assertEqual(first.get_or_compute('a', {}, (SESSIONS,), self.compute), {'calls': 2})
+    
+    def test_activity_alone_has_its_own_tag(self):
+        """A session whose last_activity alone moved leaves results depending on sessions alone"""
+        self.add_session('s1')
+        db.session.commit()
+        sessions = lambda: query_cache.get_or_compute('sessions', {}, (SESSIONS,), self.compute)
+        activity = lambda: query_cache.get_or_compute('activity', {}, (SESSION_ACTIVITY,), self.compute)
+        sessions(), activity()
+        
+        chat_session = ChatSession.query.first()
+        chat_session.last_activity = datetime.utcnow()
+        db.session.commit()
+        self.assertEqual(sessions(), {'calls': 1})
+        self.assertEqual(activity(), {'calls': 3})
+        
+        chat_session.last_activity = datetime.utcnow()
+        chat_session.escalation_level = 2
+        db.session.commit()
+        self.assertEqual(sessions(), {'calls': 4})
+    
+    def test_database_backend(self):
+        """Generations kept in the application database reach another process's cache, and move with the write"""
+        query_cache.init_app(self.app)
+        other_process = QueryCache(backend=DatabaseBackend(db.engine))
+        lookup = lambda: other_process.get_or_compute('sessions', {}, (SESSIONS, THREATS), self.compute)
+        lookup()
+        self.assertEqual(lookup(), {'calls': 1})
+        
+        self.add_session('s1')
+        db.session.flush()
+        self.assertEqual(lookup(), {'calls': 1})  # Not committed yet
+        db.session.rollback()
+        self.assertEqual(lookup(), {'calls': 1})
+        
+        self.add_session('s1')
+        db.session.commit()
+        self.assertEqual(lookup(), {'calls': 2})
+        
+        # Invalidations outside an ORM transaction (e.g. analytics writes) bump on their own
+        query_cache.invalidate(THREATS)
+        self.assertEqual(lookup(), {'calls': 3})
+        self.assertEqual(lookup(), {'calls': 3})
+    
+    def test_unwatched_tags_are_not_bumped(self):
+        """A chat message, which no cached endpoint depends on, writes no generations"""
+        query_cache.init_app(self.app)
+        self.add_session('s1')
+        db.session.commit()
+        generations = lambda: dict(db.session.execute(
+            db.text('SELECT tag, generation FROM query_cache_generations')
+        ).all())
+        before = generations()
+        
+        with mock.patch.object(query_cache, 'watched', set(chain.from_iterable(ENDPOINT_TAGS.values()))):
+            chat_session = ChatSession.query.first()
+            db.session.add(ChatMessage(session_id=chat_session.id, sender_type='user', message_content='hi'))
+            chat_session.last_activity = datetime.utcnow()
+            db.session.commit()
+            self.assertEqual(generations(), before)
+            
+            chat_session.escalation_level = 2
+            db.session.commit()
+            self.assertEqual(generations()[SESSIONS], before[SESSIONS] + 1)
+    
+    def test_dashboard_route(self):
+        """The dashboard is served from the cache until a session or evidence write commits"""
+        self.add_session('s1', escalation_level=2, created_at=datetime.utcnow())
+        db.session.commit()
+        first = self.client.get('/api/admin/dashboard', headers=self.headers).get_json()
+        self.assertEqual(first['stats']['high_risk_sessions'], 1)
+        self.assertEqual(self.client.get('/api/admin/dashboard', headers=self.headers).get_json(), first)
+        
+        db.session.add(Evidence(session_id=1, evidence_type='chat_log', hash_value='abc'))
+        db.session.commit()
+        self.assertEqual(
+            self.client.get('/api/admin/dashboard', headers=self.headers).get_json()['stats']['evidence_count'], 1
+        )
+        
+        cache_stats = self.client.get('/api/admin/metrics', headers=self.headers).get_json()['query_cache']
+        self.assertEqual(cache_stats['admin_dashboard']['hits'], 1)
+        self.assertEqual(cache_stats['admin_dashboard']['misses'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Report Renderer Tests
+Tests for streaming PDF report rendering
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'honeytrap-backend'))
+
+from src.services.report_renderer import (
+    StreamingStory, generate_pdf_report, message_style,
+    NORMAL_MESSAGE_STYLE, SUSPICIOUS_MESSAGE_STYLE, HIGH_RISK_MESSAGE_STYLE
+)
+
+
+class TestReportRenderer(unittest.TestCase):
+    """Test the streaming report renderer"""
+    
+    def setUp(self):
+        persona = SimpleNamespace(name='Emma', age=13, platform_type='discord', personality_traits='{}')
+        self.chat_session = SimpleNamespace(
+            session_id='s1', created_at=datetime(2024, 1, 1), last_activity=datetime(2024, 1, 2),
+            escalation_level=2, evidence_captured=True, user_ip='203.0.113.7', user_agent=None, persona=persona
+        )
+        self.output_fd, self.output_path = tempfile.mkstemp(suffix='.pdf')
+        os.close(self.output_fd)
+    
+    def tearDown(self):
+        os.unlink(self.output_path)
+    
+    def test_story_buffers_a_bounded_number_of_flowables(self):
+        """The story only pulls flowables as the document consumes them"""
+        pulled = []
+        
+        def flowables():
+            for i in range(1000):
+                pulled.append(i)
+                yield i
+        
+        story = StreamingStory(flowables(), buffer_size=8)
+        self.assertEqual(len(story), 8)
+        del story[0]
+        self.assertEqual(story[0], 1)
+        self.assertEqual(len(pulled), 9)
+        
+        story[0:0] = ['split remainder']
+        self.assertEqual(len(story), 9)
+        self.assertEqual(len(pulled), 9)
+    
+    def test_threat_bands_share_styles(self):
+        """Messages reuse one style per threat band"""
+        self.assertIs(message_style(0), NORMAL_MESSAGE_STYLE)
+        self.assertIs(message_style(1), SUSPICIOUS_MESSAGE_STYLE)
+        self.assertIs(message_style(3), HIGH_RISK_MESSAGE_STYLE)
+    
+    def test_renders_from_generators(self):
+        """Messages and evidence can be streamed straight from the database"""
+        messages = (
+            SimpleNamespace(sender_type='user' if i % 2 == 0 else 'decoy', timestamp=datetime(2024, 1, 1),
+                            threat_level=i % 3, message_content=f'message {i} <3 & <b>bold')
+            for i in range(300)
+        )
+        evidence = (SimpleNamespace(evidence_type='chat_log', created_at=datetime(2024, 1, 1), hash_value='0' * 64)
+                    for _ in range(2))
+        
+        generate_pdf_report(self.chat_session, messages, evidence, self.output_path)
+        
+        with open(self.output_path, 'rb') as f:
+            self.assertEqual(f.read(5), b'%PDF-')
+    
+    def test_invariant_reports_are_reproducible(self):
+        """Invariant rendering produces identical bytes for identical data"""
+        outputs = []
+        for _ in range(2):
+            generate_pdf_report(self.chat_session, [], [], self.output_path, invariant=True)
+            with open(self.output_path, 'rb') as f:
+                outputs.append(f.read())
+        self.assertEqual(outputs[0], outputs[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
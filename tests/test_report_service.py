@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Report Service Tests
+Tests for background report rendering, caching and request coalescing
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'honeytrap-backend'))
+
+from flask import Flask
+from src.models.user import db
+from src.models.chat import ChatSession, ChatMessage, Persona
+from src.routes.admin import admin_bp
+from src.security import security_manager
+from src.services import report_service as report_module
+from src.services.report_service import ReportService, DONE, FAILED
+
+
+class TestReportService(unittest.TestCase):
+    """Test the background report service"""
+    
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        self.cache_dir = tempfile.mkdtemp()
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{self.db_path}'
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        
+        persona = Persona(name='Emma', age=13, platform_type='discord', personality_traits='{}',
+                          language_style='{}', response_patterns='{}')
+        db.session.add(persona)
+        db.session.flush()
+        self.session = ChatSession(session_id='s1', persona_id=persona.id, user_ip='127.0.0.1')
+        db.session.add(self.session)
+        db.session.flush()
+        for i in range(20):
+            db.session.add(ChatMessage(session_id=self.session.id, sender_type='user', message_content=f'hi {i}'))
+        db.session.commit()
+        
+        self.service = ReportService(cache_dir=self.cache_dir, workers=2)
+        self.service.init_app(self.app)
+    
+    def tearDown(self):
+        db.session.remove()
+        self.ctx.pop()
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+        shutil.rmtree(self.cache_dir)
+    
+    def test_renders_report_in_background(self):
+        """A submitted job renders the PDF into the cache"""
+        job = self.service.submit(self.session.id)
+        self.assertTrue(self.service.wait(job, 30))
+        
+        self.assertEqual(job.status, DONE)
+        with open(job.path, 'rb') as f:
+            self.assertEqual(f.read(5), b'%PDF-')
+        self.assertEqual([name for name in os.listdir(self.cache_dir) if name.endswith('.tmp')], [])
+    
+    def test_unknown_session(self):
+        """Submitting for a missing session returns None"""
+        self.assertIsNone(self.service.submit(9999))
+    
+    def test_concurrent_requests_share_one_render(self):
+        """Requests for a report that is rendering join the running job"""
+        started = threading.Event()
+        release = threading.Event()
+        renders = []
+        render = report_module.generate_pdf_report
+        
+        def slow_render(*args):
+            renders.append(args)
+            started.set()
+            release.wait(10)
+            return render(*args)
+        
+        with mock.patch.object(report_module, 'generate_pdf_report', slow_render):
+            first = self.service.submit(self.session.id)
+            started.wait(10)
+            second = self.service.submit(self.session.id)
+            release.set()
+            self.assertTrue(self.service.wait(first, 30))
+        
+        self.assertIs(first, second)
+        self.assertEqual(len(renders), 1)
+    
+    def test_cached_until_content_changes(self):
+        """Unchanged sessions reuse the cached PDF; new messages render a fresh one"""
+        first = self.service.submit(self.session.id)
+        self.service.wait(first, 30)
+        
+        cached = self.service.submit(self.session.id)
+        self.assertEqual(cached.status, DONE)
+        self.assertEqual(cached.path, first.path)
+        
+        db.session.add(ChatMessage(session_id=self.session.id, sender_type='user', message_content='new'))
+        db.session.commit()
+        fresh = self.service.submit(self.session.id)
+        self.service.wait(fresh, 30)
+        
+        self.assertNotEqual(fresh.cache_key, first.cache_key)
+        self.assertTrue(os.path.exists(fresh.path))
+        self.assertFalse(os.path.exists(first.path))
+    
+    def test_failed_render_cleans_up(self):
+        """A render error fails the job without leaving temporary files"""
+        with mock.patch.object(report_module, 'generate_pdf_report', side_effect=RuntimeError('boom')):
+            job = self.service.submit(self.session.id)
+            self.service.wait(job, 30)
+        
+        self.assertEqual(job.status, FAILED)
+        self.assertEqual(job.error, 'boom')
+        self.assertEqual(os.listdir(self.cache_dir), [])
+        self.assertNotIn(job.cache_key, self.service.in_flight)
+    
+    def test_job_routes_require_auth(self):
+        """Report jobs can only be queued, polled and downloaded by an authenticated admin"""
+        self.app.register_blueprint(admin_bp, url_prefix='/api')
+        client = self.app.test_client()
+        headers = {'Authorization': f"Bearer {security_manager.generate_session_token('admin')}"}
+        
+        with mock.patch('src.routes.admin.report_service', self.service):
+            submit_url = f'/api/admin/sessions/{self.session.id}/report/jobs'
+            self.assertEqual(client.post(submit_url).status_code, 401)
+            response = client.post(submit_url, headers=headers)
+            self.assertIn(response.status_code, (200, 202))
+            job_id = response.get_json()['job_id']
+            self.assertTrue(self.service.wait(self.service.get(job_id), 30))
+            
+            for url in (f'/api/admin/reports/jobs/{job_id}', f'/api/admin/reports/jobs/{job_id}/download'):
+                self.assertEqual(client.get(url).status_code, 401)
+                self.assertEqual(client.get(url, headers=headers).status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Transcript Snapshot Tests
+Tests for platform-styled transcript snapshots and their capture as evidence
+"""
+
+import hashlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'honeytrap-backend'))
+
+from flask import Flask
+from PIL import Image
+from src.models.user import db
+from src.models.chat import ChatSession, ChatMessage, Persona, Evidence, EvidenceLedgerEntry
+from src.services import snapshots as snapshots_module
+from src.services.blob_store import BlobStore, parse_blob_reference
+from src.services.snapshot_renderer import PLATFORM_STYLES, render_snapshot, text_width, wrap_text
+from src.services.snapshots import SNAPSHOT_SCRIPT, capture_snapshots, transcript_windows
+
+START = datetime(2024, 1, 1, 18, 0, 0)
+MESSAGES = [
+    (i + 1, 'user' if i % 2 == 0 else 'decoy', f'message {i} do you want to meet up somewhere quiet this weekend',
+     START + timedelta(minutes=i), 2 if i == 3 else 0)
+    for i in range(8)
+]
+
+
+class TestSnapshotRenderer(unittest.TestCase):
+    """Test the snapshot renderer"""
+    
+    def test_rendering_is_deterministic(self):
+        """The same messages always produce the same PNG bytes"""
+        for platform in PLATFORM_STYLES:
+            first = render_snapshot(platform, 'Emma', 's1', MESSAGES)
+            self.assertEqual(first, render_snapshot(platform, 'Emma', 's1', MESSAGES))
+            self.assertEqual(first[:8], b'\x89PNG\r\n\x1a\n')
+    
+    def test_platforms_have_distinct_styles(self):
+        """Each platform draws a different image; unknown platforms fall back to the default"""
+        hashes = {platform: hashlib.sha256(render_snapshot(platform, 'Emma', 's1', MESSAGES)).hexdigest()
+                  for platform in PLATFORM_STYLES}
+        self.assertEqual(len(set(hashes.values())), len(PLATFORM_STYLES))
+        image = Image.open(io.BytesIO(render_snapshot('myspace', 'Emma', 's1', MESSAGES)))
+        self.assertEqual(image.getpixel((5, image.height - 2)), PLATFORM_STYLES['discord']['background'])
+    
+    def test_wrapped_lines_fit(self):
+        """Wrapping keeps every line within the width, splitting words that are too long"""
+        lines = wrap_text('short words then ' + 'x' * 200 + '\nnew paragraph', 15, 300)
+        self.assertTrue(all(text_width(15, line) <= 300 for line in lines))
+        self.assertEqual(''.join(lines).count('x'), 200)
+        self.assertEqual(lines[-1], 'new paragraph')
+
+
+class TestSnapshotCapture(unittest.TestCase):
+    """Test storing snapshots as screenshot evidence"""
+    
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.database_uri = f"sqlite:///{os.path.join(self.workdir, 'app.db')}"
+        self.blob_dir = os.path.join(self.workdir, 'blobs')
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = self.database_uri
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        
+        persona = Persona(name='Emma', age=13, platform_type='snapchat', personality_traits='{}',
+                          language_style='{}', response_patterns='{}')
+        db.session.add(persona)
+        db.session.flush()
+        self.session = ChatSession(session_id='s1', persona_id=persona.id, user_ip='127.0.0.1')
+        db.session.add(self.session)
+        db.session.flush()
+        for i in range(25):
+            db.session.add(ChatMessage(session_id=self.session.id, sender_type='user' if i % 2 == 0 else 'decoy',
+                                       message_content=f'message {i}', threat_level=2 if i == 12 else 0,
+                                       timestamp=START + timedelta(minutes=i)))
+        db.session.commit()
+        
+        self.store = BlobStore(self.blob_dir)
+        patcher = mock.patch.object(snapshots_module, 'blob_store', self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def tearDown(self):
+        db.session.remove()
+        self.ctx.pop()
+        shutil.rmtree(self.workdir)
+    
+    def test_windows(self):
+        """Transcripts split into fixed windows, optionally only flagged ones"""
+        self.assertEqual([len(w) for w in transcript_windows(self.session.id, 10)], [10, 10, 5])
+        flagged = list(transcript_windows(self.session.id, 10, flagged_only=True))
+        self.assertEqual(len(flagged), 1)
+        self.assertEqual(flagged[0][0][0], 11)
+    
+    def test_capture_stores_ledgered_evidence_once(self):
+        """Snapshots become screenshot evidence in the ledger; capturing again adds nothing"""
+        result = capture_snapshots(self.session, window=10)
+        self.assertEqual(len(result['evidence_ids']), 3)
+        
+        evidence = db.session.get(Evidence, result['evidence_ids'][0])
+        self.assertEqual(evidence.evidence_type, 'screenshot')
+        metadata = json.loads(evidence.evidence_metadata)
+        self.assertEqual((metadata['first_message_id'], metadata['last_message_id']), (1, 10))
+        with open(self.store.path_for(parse_blob_reference(evidence.file_path)), 'rb') as f:
+            self.assertEqual(hashlib.sha256(f.read()).hexdigest(), evidence.hash_value)
+        self.assertEqual(EvidenceLedgerEntry.query.count(), 3)
+        self.assertTrue(self.session.evidence_captured)
+        
+        again = capture_snapshots(self.session, window=10)
+        self.assertEqual((again['evidence_ids'], again['skipped']), ([], 3))
+    
+    def test_script_renders_on_process_pool(self):
+        """The bulk script renders with worker processes and stores the results"""
+        env = dict(os.environ, HONEYTRAP_BLOB_DIR=self.blob_dir)
+        completed = subprocess.run(
+            [sys.executable, SNAPSHOT_SCRIPT, '--database-uri', self.database_uri, '--sessions', str(self.session.id),
+             '--window', '5', '--workers', '2'],
+            capture_output=True, text=True, env=env
+        )
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        self.assertEqual(result['snapshots'], 5)
+        self.assertEqual(Evidence.query.filter_by(evidence_type='screenshot').count(), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Stats Bucket Tests
+Tests for the hourly and daily aggregate tables behind the dashboard statistics
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'honeytrap-backend'))
+
+from flask import Flask
+from src.models.user import db
+from src.models.chat import ChatSession, ChatMessage, Persona, Evidence, StatsBucket
+from src.models.profile import DecoyProfile, ProfileContent
+from sqlalchemy.dialects import postgresql, sqlite
+from src.services.stats_buckets import (
+    window_total, reconcile, daily_counts, _bucket_expression, DAY, HOUR,
+    SESSIONS_STARTED, HIGH_RISK_SESSIONS, EVIDENCE_CAPTURED, CONTENT_POSTED
+)
+
+NOW = datetime(2024, 6, 10, 15, 30)
+
+
+class TestStatsBuckets(unittest.TestCase):
+    """Test stats buckets"""
+    
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(self.workdir, 'app.db')}"
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        
+        self.persona = Persona(name='Emma', age=13, platform_type='discord', personality_traits='{}',
+                               language_style='{}', response_patterns='{}')
+        db.session.add(self.persona)
+        db.session.commit()
+    
+    def tearDown(self):
+        db.session.remove()
+        self.ctx.pop()
+        shutil.rmtree(self.workdir)
+    
+    def add_session(self, created_at, escalation_level=0):
+        session = ChatSession(session_id=f's{created_at.timestamp()}', persona_id=self.persona.id,
+                              user_ip='127.0.0.1', escalation_level=escalation_level,
+                              created_at=created_at, last_activity=created_at)
+        db.session.add(session)
+        db.session.commit()
+        return session
+    
+    def raw_count(self, query_filter, start):
+        return ChatSession.query.filter(query_filter, ChatSession.created_at >= start).count()
+    
+    def test_orm_writes_maintain_buckets(self):
+        """Creating, escalating and deleting sessions keeps the buckets in step"""
+        session = self.add_session(NOW - timedelta(days=2))
+        self.add_session(NOW - timedelta(hours=3), escalation_level=2)
+        db.session.add(Evidence(session_id=session.id, evidence_type='chat_log', hash_value='a'))
+        db.session.commit()
+        
+        start = NOW - timedelta(days=7)
+        self.assertEqual(window_total(SESSIONS_STARTED, start, NOW), 2)
+        self.assertEqual(window_total(HIGH_RISK_SESSIONS, start, NOW), 1)
+        self.assertEqual(window_total(EVIDENCE_CAPTURED, start, NOW), 1)
+        
+        session.escalation_level = 2
+        db.session.commit()
+        self.assertEqual(window_total(HIGH_RISK_SESSIONS, start, NOW), 2)
+        
+        db.session.delete(session)
+        db.session.commit()
+        self.assertEqual(window_total(SESSIONS_STARTED, start, NOW), 1)
+        self.assertEqual(window_total(HIGH_RISK_SESSIONS, start, NOW), 1)
+        self.assertEqual(window_total(EVIDENCE_CAPTURED, start, NOW), 0)
+        self.assertEqual(daily_counts(SESSIONS_STARTED, start), {(NOW - timedelta(hours=3)).date(): 1})
+    
+    def test_content_buckets(self):
+        """Posted content counts by posting time; session activity alone leaves the buckets alone"""
+        session = self.add_session(NOW - timedelta(hours=5))
+        buckets = {(row.metric, row.granularity, row.bucket_start): row.count for row in StatsBucket.query}
+        session.last_activity = NOW
+        db.session.commit()
+        self.assertEqual({(row.metric, row.granularity, row.bucket_start): row.count for row in StatsBucket.query},
+                         buckets)
+        
+        profile = DecoyProfile(name='Emma', username='emma', age=13, location='Southampton', platform_type='discord')
+        db.session.add(profile)
+        db.session.flush()
+        content = ProfileContent(profile_id=profile.id, platform_type='discord', content_type='post',
+                                 content_text='hello', status='scheduled')
+        db.session.add(content)
+        db.session.commit()
+        self.assertEqual(window_total(CONTENT_POSTED, NOW - timedelta(days=7), NOW), 0)
+        content.status, content.posted_time = 'posted', NOW - timedelta(days=1)
+        db.session.commit()
+        self.assertEqual(window_total(CONTENT_POSTED, NOW - timedelta(days=7), NOW), 1)
+    
+    def test_window_total_matches_raw_counts(self):
+        """Summing hourly and daily buckets gives the same counts as scanning the table"""
+        for hours in range(0, 24 * 40, 7):
+            self.add_session(NOW - timedelta(hours=hours), escalation_level=2 if hours % 3 == 0 else 0)
+        
+        for days in (1, 7, 30):
+            start = (NOW - timedelta(days=days)).replace(minute=0)
+            self.assertEqual(window_total(SESSIONS_STARTED, start, NOW), self.raw_count(db.true(), start))
+            self.assertEqual(window_total(HIGH_RISK_SESSIONS, start, NOW),
+                             self.raw_count(ChatSession.escalation_level >= 2, start))
+        
+        # A window of any length reads at most a few dozen buckets
+        start = NOW - timedelta(days=30)
+        rows = StatsBucket.query.filter(StatsBucket.metric == SESSIONS_STARTED, db.or_(
+            db.and_(StatsBucket.granularity == DAY, StatsBucket.bucket_start >= start.replace(hour=0)),
+            db.and_(StatsBucket.granularity == HOUR, StatsBucket.bucket_start >= NOW.replace(hour=0))
+        )).count()
+        self.assertLess(rows, 60)
+    
+    def test_reconcile_corrects_bulk_writes(self):
+        """Writes that bypass the ORM are picked up when the buckets are rebuilt"""
+        session = self.add_session(NOW - timedelta(days=1))
+        db.session.execute(ChatSession.__table__.insert(), [
+            {'session_id': f'bulk{i}', 'persona_id': self.persona.id, 'user_ip': '127.0.0.1',
+             'escalation_level': 2, 'created_at': NOW - timedelta(days=i)}
+            for i in range(5)
+        ])
+        db.session.execute(ChatMessage.__table__.insert(), [
+            {'session_id': session.id, 'sender_type': 'user', 'message_content': 'hi', 'timestamp': NOW}
+        ])
+        db.session.commit()
+        start = NOW - timedelta(days=7)
+        self.assertEqual(window_total(SESSIONS_STARTED, start, NOW + timedelta(hours=1)), 1)
+        
+        result = reconcile()
+        self.assertGreater(result['corrected'], 0)
+        self.assertEqual(window_total(SESSIONS_STARTED, start, NOW + timedelta(hours=1)), 6)
+        self.assertEqual(window_total(HIGH_RISK_SESSIONS, start, NOW + timedelta(hours=1)), 5)
+        
+        # Rebuilding again finds nothing to correct, and live updates carry on from the rebuilt counts
+        self.assertEqual(reconcile(NOW - timedelta(days=2))['corrected'], 0)
+        self.add_session(NOW)
+        self.assertEqual(window_total(SESSIONS_STARTED, start, NOW + timedelta(hours=1)), 7)
+        self.assertEqual(reconcile()['corrected'], 0)
+    
+    def test_bucket_expression_per_dialect(self):
+        """Rebuilds truncate timestamps with the functions of the database in use"""
+        def sql(granularity, dialect):
+            expression = _bucket_expression(ChatSession.created_at, granularity, dialect.name)
+            return str(expression.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+        
+        self.assertIn("date_trunc('hour'", sql(HOUR, postgresql.dialect()))
+        self.assertIn("date_trunc('day'", sql(DAY, postgresql.dialect()))
+        self.assertIn("strftime('%Y-%m-%d %H:00:00'", sql(HOUR, sqlite.dialect()))
+
+
+if __name__ == '__main__':
+    unittest.main()
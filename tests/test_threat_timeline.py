@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Threat Timeline Tests
+Tests for per-session timelines merged from chat, engagement, threat analysis and evidence
+"""
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'honeytrap-backend'))
+
+from flask import Flask
+from src.models.user import db
+from src.models.chat import ChatSession, ChatMessage, Persona, Evidence
+from src.security import security_manager
+from src.routes import discovery_analytics as analytics_routes
+from src.services.discovery_analytics import DiscoveryAnalyticsService
+from src.services.threat_timeline import ThreatTimeline
+
+START = datetime(2024, 3, 1, 20, 0)
+
+
+def stamp(minutes):
+    return (START + timedelta(minutes=minutes)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class TestThreatTimeline(unittest.TestCase):
+    """Test merged threat timelines"""
+    
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.analytics_db_path = os.path.join(self.workdir, 'analytics.db')
+        DiscoveryAnalyticsService(self.analytics_db_path)
+        self.timeline = ThreatTimeline(self.analytics_db_path)
+        
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(self.workdir, 'app.db')}"
+        db.init_app(self.app)
+        self.app.register_blueprint(analytics_routes.discovery_analytics_bp, url_prefix='/api')
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        
+        persona = Persona(name='Emma', age=13, platform_type='discord', personality_traits='{}',
+                          language_style='{}', response_patterns='{}')
+        db.session.add(persona)
+        db.session.flush()
+        self.chat_session = ChatSession(session_id='case-a', persona_id=persona.id, user_ip='127.0.0.1',
+                                        escalation_level=1)
+        db.session.add(self.chat_session)
+        db.session.flush()
+        # Messages at minutes 0, 2, 4; engagement at 1 and 3; evidence at 4; analysis at 5
+        for minutes, sender, level in ((0, 'user', 0), (2, 'decoy', 0), (4, 'user', 2)):
+            self.add_message(minutes, sender, level)
+        db.session.add(Evidence(session_id=self.chat_session.id, evidence_type='screenshot', file_path='a.png',
+                                hash_value='abc', created_at=START + timedelta(minutes=4)))
+        db.session.commit()
+        
+        self.execute(
+            'INSERT INTO engagement_events (profile_id, session_id, event_type, event_data, timestamp, threat_level, '
+            'escalation_indicators) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(1, 'case-a', 'message', '{}', stamp(1), 1, '["age_focused"]'),
+             (1, 'case-a', 'message', '{}', stamp(3), 3, '["meeting_requests"]'),
+             (1, 'case-b', 'message', '{}', stamp(3), 3, '["isolation_attempts"]')]
+        )
+        self.execute(
+            'INSERT INTO threat_analysis (session_id, profile_id, threat_indicators, risk_score, behavior_patterns, '
+            'analysis_timestamp) VALUES (?, ?, ?, ?, ?, ?)',
+            [('case-a', 1, '["meeting_requests"]', 0.8, '{"threat_level": 3, "risk_level": "high"}', stamp(5))]
+        )
+        
+        self.original_timeline = analytics_routes.threat_timeline
+        analytics_routes.threat_timeline = self.timeline
+        self.client = self.app.test_client()
+        self.headers = {'Authorization': f"Bearer {security_manager.generate_session_token('admin')}"}
+    
+    def tearDown(self):
+        analytics_routes.threat_timeline = self.original_timeline
+        self.timeline.db.close()
+        db.session.remove()
+        self.ctx.pop()
+        shutil.rmtree(self.workdir)
+    
+    def add_message(self, minutes, sender='user', level=0):
+        db.session.add(ChatMessage(session_id=self.chat_session.id, sender_type=sender, message_content='hi',
+                                   threat_level=level, timestamp=START + timedelta(minutes=minutes)))
+    
+    def execute(self, sql, rows):
+        conn = sqlite3.connect(self.analytics_db_path)
+        conn.executemany(sql, rows)
+        conn.commit()
+        conn.close()
+    
+    def ids(self, timeline):
+        return [event['id'] for event in timeline['timeline_events']]
+    
+    def test_sources_merge_in_time_order(self):
+        """Events from every source for the session interleave by time"""
+        timeline = self.timeline.get_timeline('case-a')
+        self.assertEqual(self.ids(timeline), [
+            'message:1', 'engagement:1', 'message:2', 'engagement:2', 'message:3', 'evidence:1', 'threat_analysis:1'
+        ])
+        self.assertEqual(timeline['total_events'], 7)
+        self.assertIsNone(self.timeline.get_timeline('unknown'))
+        # Engagement events alone are enough for a session with no chat
+        self.assertEqual(self.ids(self.timeline.get_timeline('case-b')), ['engagement:3'])
+    
+    def test_summary(self):
+        """Progression and risk assessment are derived from the merged events"""
+        timeline = self.timeline.get_timeline('case-a')
+        progression = timeline['threat_progression']
+        self.assertEqual(progression['initial_contact'], START.isoformat())
+        self.assertEqual([point['event_id'] for point in progression['escalation_points']],
+                         ['engagement:1', 'engagement:2'])
+        self.assertEqual(progression['current_threat_level'], 3)
+        self.assertEqual([item['evidence_id'] for item in progression['evidence_collected']], [1])
+        risk = timeline['risk_assessment']
+        self.assertEqual(risk['current_risk_score'], 0.8)
+        self.assertEqual(risk['risk_factors'], ['age_focused', 'meeting_requests'])
+        self.assertIn('Escalate to the duty officer immediately', risk['recommended_actions'])
+    
+    def test_since_and_limit(self):
+        """Pages continue from next_since, repeating only events at that instant"""
+        first = self.timeline.get_timeline('case-a', limit=3)
+        self.assertTrue(first['has_more'])
+        self.assertEqual(self.ids(first), ['message:1', 'engagement:1', 'message:2'])
+        second = self.timeline.get_timeline('case-a', since=datetime.fromisoformat(first['next_since']))
+        self.assertEqual(self.ids(second)[0], 'message:2')
+        self.assertFalse(second['has_more'])
+        self.assertEqual(self.ids(self.timeline.get_timeline('case-a', since=START + timedelta(minutes=6))), [])
+    
+    def test_cache_extends_and_rebuilds(self):
+        """New rows are appended to the cached timeline; deletions force a rebuild"""
+        self.timeline.get_timeline('case-a')
+        cached = self.timeline.cache['case-a']
+        self.add_message(6, level=1)
+        # A late engagement event lands inside the timeline
+        self.execute(
+            'INSERT INTO engagement_events (profile_id, session_id, event_type, event_data, timestamp, threat_level) '
+            'VALUES (?, ?, ?, ?, ?, ?)', [(1, 'case-a', 'message', '{}', stamp(0), 0)]
+        )
+        db.session.commit()
+        timeline = self.timeline.get_timeline('case-a')
+        self.assertIs(self.timeline.cache['case-a'], cached)
+        self.assertEqual(self.ids(timeline)[:2], ['message:1', 'engagement:4'])
+        self.assertEqual(self.ids(timeline)[-2:], ['threat_analysis:1', 'message:4'])
+        
+        db.session.delete(db.session.get(ChatMessage, 2))
+        db.session.commit()
+        timeline = self.timeline.get_timeline('case-a')
+        self.assertIsNot(self.timeline.cache['case-a'], cached)
+        self.assertNotIn('message:2', self.ids(timeline))
+        self.assertEqual(timeline['total_events'], 8)
+    
+    def test_timeline_route(self):
+        """The route needs a token, validates `since` and 404s unknown sessions"""
+        self.assertEqual(self.client.get('/api/analytics/threat-timeline/case-a').status_code, 401)
+        response = self.client.get('/api/analytics/threat-timeline/case-a?limit=2', headers=self.headers)
+        self.assertEqual(len(response.get_json()['threat_timeline']['timeline_events']), 2)
+        response = self.client.get('/api/analytics/threat-timeline/case-a?since=yesterday', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/analytics/threat-timeline/unknown', headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
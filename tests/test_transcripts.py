@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Transcript Tests
+Tests for keyset-paginated chat transcripts
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'honeytrap-backend'))
+
+from flask import Flask
+from src.models.user import db
+from src.models.chat import ChatSession, ChatMessage
+from src.models.schema import ensure_schema
+from src.services.transcripts import get_transcript_page, iter_transcript
+
+
+class TestTranscripts(unittest.TestCase):
+    """Test transcript pagination"""
+    
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{self.db_path}'
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        ensure_schema()
+        
+        # Two sessions with interleaved messages
+        self.session = ChatSession(session_id='s1', persona_id=1, user_ip='127.0.0.1')
+        other = ChatSession(session_id='s2', persona_id=1, user_ip='127.0.0.1')
+        db.session.add_all([self.session, other])
+        db.session.flush()
+        for i in range(7):
+            db.session.add(ChatMessage(session_id=self.session.id, sender_type='user', message_content=f'm{i}'))
+            db.session.add(ChatMessage(session_id=other.id, sender_type='user', message_content=f'other {i}'))
+        db.session.commit()
+    
+    def tearDown(self):
+        db.session.remove()
+        self.ctx.pop()
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+    
+    def _contents(self, page):
+        return [message['message_content'] for message in page['messages']]
+    
+    def test_pages_forward_with_cursor(self):
+        """next_since walks the transcript without gaps or repeats"""
+        first = get_transcript_page(self.session.id, limit=3)
+        second = get_transcript_page(self.session.id, since=first['next_since'], limit=3)
+        third = get_transcript_page(self.session.id, since=second['next_since'], limit=3)
+        
+        self.assertEqual(self._contents(first), ['m0', 'm1', 'm2'])
+        self.assertEqual(self._contents(second), ['m3', 'm4', 'm5'])
+        self.assertEqual(self._contents(third), ['m6'])
+        self.assertTrue(first['has_more'])
+        self.assertFalse(third['has_more'])
+    
+    def test_tail_returns_only_new_messages(self):
+        """Polling with the last cursor returns nothing until a message arrives"""
+        page = get_transcript_page(self.session.id)
+        empty = get_transcript_page(self.session.id, since=page['next_since'])
+        self.assertEqual(empty['messages'], [])
+        self.assertEqual(empty['next_since'], page['next_since'])
+        
+        db.session.add(ChatMessage(session_id=self.session.id, sender_type='decoy', message_content='new'))
+        db.session.commit()
+        
+        self.assertEqual(self._contents(get_transcript_page(self.session.id, since=page['next_since'])), ['new'])
+    
+    def test_before_scrolls_back(self):
+        """before returns the preceding page in chronological order"""
+        latest = get_transcript_page(self.session.id, limit=7)
+        first_id = latest['messages'][4]['id']
+        
+        page = get_transcript_page(self.session.id, before=first_id, limit=2)
+        
+        self.assertEqual(self._contents(page), ['m2', 'm3'])
+        self.assertTrue(page['has_more'])
+    
+    def test_iter_transcript_batches(self):
+        """Iterating in small batches yields every message once, in order"""
+        contents = [message.message_content for message in iter_transcript(self.session.id, batch_size=2)]
+        
+        self.assertEqual(contents, [f'm{i}' for i in range(7)])
+    
+    def test_ensure_schema_adds_missing_index(self):
+        """Existing databases get the transcript index"""
+        db.session.execute(db.text('DROP INDEX ix_chat_messages_session_id_id'))
+        db.session.commit()
+        
+        ensure_schema()
+        
+        indexes = db.inspect(db.engine).get_indexes('chat_messages')
+        self.assertIn('ix_chat_messages_session_id_id', [index['name'] for index in indexes])
+
+
+if __name__ == '__main__':
+    unittest.main()